@@ -3,18 +3,56 @@
 User registration and management for Stackademy.
 """
 
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from .logging_config import get_logger, setup_logging
-from .prompt import completion
+from .metrics import start_file_export
+from .prompt import completion, completion_cache, session_store
+from .session import ConversationSession
+from .settings import LLM_STREAM, METRICS_FILE, METRICS_FILE_INTERVAL
 
 
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+
 setup_logging()
 logger = get_logger(__name__)
 
 
-def main(prompts: Optional[Tuple[str, ...]] = None) -> None:
-    """Main function to demonstrate user registration."""
+def ask(prompt: str, session: ConversationSession, stream: bool) -> Tuple[Optional["ChatCompletion"], List[str]]:
+    """
+    Send the user's prompt, printing the reply token by token when streaming.
+
+    Returns:
+        tuple: The final ChatCompletion and the functions called, as returned by completion()
+    """
+    if not stream:
+        return completion(prompt=prompt, session=session)
+    reply = completion(prompt=prompt, session=session, stream=True)
+    printed = False
+    for delta in reply:
+        if not printed:
+            print("ChatGPT: ", end="")
+            printed = True
+        print(delta, end="", flush=True)
+    if printed:
+        print()
+    return reply.response, reply.functions_called
+
+
+def main(
+    prompts: Optional[Tuple[str, ...]] = None, session: Optional[ConversationSession] = None, stream: bool = LLM_STREAM
+) -> None:
+    """
+    Main function to demonstrate user registration.
+
+    Args:
+        prompts: Scripted user prompts to use instead of reading from stdin
+        session: The conversation to continue. A new session is started by default.
+        stream: Print the replies as they are generated, instead of logging each one when it is complete
+    """
+    session = session or session_store.create()
+    start_file_export(METRICS_FILE, METRICS_FILE_INTERVAL)
     print("=" * 50)
     print("Stackademy User Registration Demo")
     print("=" * 50)
@@ -22,12 +60,15 @@ def main(prompts: Optional[Tuple[str, ...]] = None) -> None:
     i = 0
     user_prompt = prompts[i] if prompts else input("Welcome to Stackademy! How can I assist you today? ")
 
-    response, functions_called = completion(prompt=user_prompt)
+    response, functions_called = ask(user_prompt, session, stream)
     while response and response.choices[0].message.content != "Goodbye!":
         i += 1
         message = response.choices[0].message
         response_message = message.content or ""
-        logger.info("ChatGPT: %s", response_message.strip())
+        if stream:
+            logger.debug("ChatGPT: %s", response_message.strip())
+        else:
+            logger.info("ChatGPT: %s", response_message.strip())
 
         # Check if there's a follow-up question in the response
         if "QUESTION:" in response_message:
@@ -61,7 +102,10 @@ def main(prompts: Optional[Tuple[str, ...]] = None) -> None:
             print("Thank you for using Stackademy! Goodbye!")
             break
 
-        response, functions_called = completion(prompt=user_prompt)
+        response, functions_called = ask(user_prompt, session, stream)
+
+    if completion_cache is not None:
+        logger.info("Completion cache: %s", completion_cache.stats())
 
 
 if __name__ == "__main__":
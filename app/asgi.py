@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal HTTP/1.1 host for ASGI applications, so that the Stackademy server
+runs without third-party dependencies.
+
+It supports keep-alive connections, request bodies framed by a single
+Content-Length (requests with any Transfer-Encoding, or with a repeated or
+invalid Content-Length, are rejected, so that a proxy in front of it cannot
+frame a request differently than it does),
+streamed (chunked) responses, client disconnects reported to the application
+while it runs, and the lifespan protocol. It does not speak
+WebSocket or HTTP/2; run the app under an ASGI server such as uvicorn for
+those:
+
+    uvicorn app.server:app
+"""
+
+import asyncio
+import contextlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote
+
+from app.logging_config import get_logger, setup_logging
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+ASGIApp = Callable[[Dict[str, Any], Callable[[], Awaitable[Dict[str, Any]]], Callable[[Dict[str, Any]], Any]], Any]
+
+READ_CHUNK_BYTES = 65536
+# pipelined requests read while watching for a disconnect
+MAX_READ_AHEAD_BYTES = 1024 * 1024
+MAX_HEADERS = 100
+STATUS_PHRASES = {
+    200: "OK",
+    201: "Created",
+    204: "No Content",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    426: "Upgrade Required",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    501: "Not Implemented",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class BadRequest(Exception):
+    """The request could not be parsed."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request_head(reader: "_Reader") -> Optional[Tuple[str, str, str, List[Tuple[bytes, bytes]]]]:
+    """
+    Read the request line and headers.
+
+    Returns:
+        tuple: method, target, HTTP version and headers with lower-cased names, or None at end of stream
+    """
+    try:
+        line = await reader.readline()
+        while line in (b"\r\n", b"\n"):
+            line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise BadRequest(400, "Malformed request line")
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, separator, value = line.partition(b":")
+            if not separator:
+                raise BadRequest(400, "Malformed header")
+            headers.append((name.strip().lower(), value.strip()))
+            if len(headers) > MAX_HEADERS:
+                raise BadRequest(431, "Too many headers")
+    except (ValueError, asyncio.LimitOverrunError) as e:
+        raise BadRequest(431, "Request line or header too long") from e
+    return parts[0].upper(), parts[1], parts[2], headers
+
+
+def body_length(headers: List[Tuple[bytes, bytes]]) -> int:
+    """
+    The length of the request body, from its only Content-Length header.
+
+    Args:
+        headers: The request headers, with lower-cased names
+
+    Returns:
+        int: The body length in bytes, 0 without a Content-Length
+
+    Raises:
+        BadRequest: With any Transfer-Encoding, more than one Content-Length, or one that is not a number
+    """
+    if any(name == b"transfer-encoding" for name, _ in headers):
+        raise BadRequest(400, "Transfer-Encoding is not supported")
+    lengths = [value for name, value in headers if name == b"content-length"]
+    if len(lengths) > 1:
+        raise BadRequest(400, "Repeated Content-Length")
+    if not lengths:
+        return 0
+    if not lengths[0].isdigit():
+        raise BadRequest(400, "Invalid Content-Length")
+    return int(lengths[0])
+
+
+def http_scope(
+    method: str, target: str, version: str, headers: List[Tuple[bytes, bytes]], writer: asyncio.StreamWriter
+) -> Dict[str, Any]:
+    """The ASGI scope of an HTTP request received on the connection of writer."""
+    peer = writer.get_extra_info("peername")
+    sock = writer.get_extra_info("sockname")
+    path, _, query = target.partition("?")
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": version.split("/")[1],
+        "method": method,
+        "scheme": "http",
+        "path": unquote(path),
+        "raw_path": path.encode("latin-1"),
+        "query_string": query.encode("latin-1"),
+        "root_path": "",
+        "headers": headers,
+        "client": peer[:2] if peer else None,
+        "server": sock[:2] if sock else None,
+    }
+
+
+class _Reader:
+    """
+    A stream reader that bytes can be pushed back into.
+
+    Watching a connection for a disconnect means reading from it; bytes of a
+    pipelined request read that way are pushed back for the next request.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self._reader = reader
+        self._pushed_back = b""
+
+    def unread(self, data: bytes) -> None:
+        """Push bytes back, to be read again first."""
+        self._pushed_back = data + self._pushed_back
+
+    @property
+    def pushed_back(self) -> int:
+        """The number of bytes pushed back."""
+        return len(self._pushed_back)
+
+    async def read_ahead(self, n: int) -> bool:
+        """Read up to n more bytes from the stream, after those pushed back. Returns False at end of stream."""
+        data = await self._reader.read(n)
+        self._pushed_back += data
+        return bool(data)
+
+    async def read(self, n: int) -> bytes:
+        """Read up to n bytes; b"" at end of stream."""
+        if self._pushed_back:
+            data, self._pushed_back = self._pushed_back[:n], self._pushed_back[n:]
+            return data
+        return await self._reader.read(n)
+
+    async def readline(self) -> bytes:
+        """Read one line, including its end of line; b"" at end of stream."""
+        if b"\n" in self._pushed_back:
+            line, _, self._pushed_back = self._pushed_back.partition(b"\n")
+            return line + b"\n"
+        data, self._pushed_back = self._pushed_back, b""
+        return data + await self._reader.readline()
+
+
+class _Exchange:  # pylint: disable=too-many-instance-attributes
+    """One request and its response on a connection."""
+
+    def __init__(self, reader: _Reader, writer: asyncio.StreamWriter, keep_alive: bool, length: int):
+        self.reader = reader
+        self.writer = writer
+        self.keep_alive = keep_alive
+        self.remaining = length
+        self.body_delivered = False
+        self.started = False
+        self.finished = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self.chunked = False
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def receive(self) -> Dict[str, Any]:
+        """
+        ASGI receive: the request body in chunks, then a disconnect once the
+        response is complete or the client has closed the connection.
+        """
+        if not self.body_delivered:
+            if self.remaining > 0:
+                body = await self.reader.read(min(self.remaining, READ_CHUNK_BYTES))
+                if not body:
+                    self.keep_alive = False
+                    self.body_delivered = True
+                    self.disconnected.set()
+                    return {"type": "http.disconnect"}
+                self.remaining -= len(body)
+                self.body_delivered = self.remaining == 0
+                return {"type": "http.request", "body": body, "more_body": self.remaining > 0}
+            self.body_delivered = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        if self._watcher is None:
+            self._watcher = asyncio.ensure_future(self._watch())
+        waiters = [asyncio.ensure_future(self.finished.wait()), asyncio.ensure_future(self.disconnected.wait())]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        return {"type": "http.disconnect"}
+
+    async def _watch(self) -> None:
+        """
+        Read from the connection until the client closes it. Bytes of requests
+        sent early are kept for later, up to MAX_READ_AHEAD_BYTES; beyond that
+        the client is not read from, and so not watched, until it is served.
+        """
+        try:
+            while self.reader.pushed_back < MAX_READ_AHEAD_BYTES:
+                if not await self.reader.read_ahead(READ_CHUNK_BYTES):
+                    break
+            else:
+                return
+        except ConnectionError:
+            pass
+        self.keep_alive = False
+        self.disconnected.set()
+
+    async def close(self) -> None:
+        """Stop watching the connection, once the application has returned."""
+        if self._watcher is not None and not self._watcher.done():
+            self._watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._watcher
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        """ASGI send: write the status line, headers and body, chunked unless a Content-Length was given."""
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers = [(bytes(name).lower(), bytes(value)) for name, value in message.get("headers", [])]
+            self.chunked = not any(name == b"content-length" for name, _ in headers) and status not in (204, 304)
+            lines = [f"HTTP/1.1 {status} {STATUS_PHRASES.get(status, '')}".encode("latin-1")]
+            lines.extend(name + b": " + value for name, value in headers)
+            if self.chunked:
+                lines.append(b"transfer-encoding: chunked")
+            if not self.keep_alive:
+                lines.append(b"connection: close")
+            self.writer.write(b"\r\n".join(lines) + b"\r\n\r\n")
+            self.started = True
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if self.chunked:
+                if body:
+                    self.writer.write(b"%x\r\n%s\r\n" % (len(body), body))
+                if not more_body:
+                    self.writer.write(b"0\r\n\r\n")
+            elif body:
+                self.writer.write(body)
+            await self.writer.drain()
+            if not more_body:
+                self.finished.set()
+
+
+class ASGIServer:  # pylint: disable=too-many-instance-attributes
+    """
+    Serve an ASGI application over HTTP/1.1 with asyncio streams.
+
+    Args:
+        app: The ASGI application
+        host: The interface to listen on
+        port: The port, 0 for any free port
+        keepalive_timeout: Seconds an idle keep-alive connection is kept open
+        backlog: Connections the kernel queues before they are accepted
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        keepalive_timeout: float = 75.0,
+        backlog: int = 2048,
+    ):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.keepalive_timeout = keepalive_timeout
+        self.backlog = backlog
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lifespan_queue: Optional[asyncio.Queue] = None
+        self._lifespan_events: Dict[str, asyncio.Event] = {}
+        self._lifespan_task: Optional[asyncio.Task] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def base_url(self) -> str:
+        """The URL of the server."""
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> "ASGIServer":
+        """Run the application's startup and begin accepting connections."""
+        await self._lifespan("startup")
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=self.backlog)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Serving on %s", self.base_url)
+        return self
+
+    async def stop(self) -> None:
+        """Stop accepting connections and run the application's shutdown."""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self._lifespan("shutdown")
+
+    async def serve_forever(self) -> None:
+        """Serve until cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def __aenter__(self) -> "ASGIServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _lifespan(self, phase: str) -> None:
+        """Send a lifespan event and wait for the application to complete it, if it supports lifespan."""
+        if self._lifespan_task is None:
+            if phase != "startup":
+                return
+            self._lifespan_queue = asyncio.Queue()
+            self._lifespan_events = {"startup": asyncio.Event(), "shutdown": asyncio.Event()}
+
+            async def send(message: Dict[str, Any]) -> None:
+                event_phase = message["type"].split(".")[1]
+                if message["type"].endswith(".failed"):
+                    logger.error("Application %s failed: %s", event_phase, message.get("message", ""))
+                self._lifespan_events[event_phase].set()
+
+            scope = {"type": "lifespan", "asgi": {"version": "3.0", "spec_version": "2.0"}, "state": {}}
+            self._lifespan_task = asyncio.ensure_future(self.app(scope, self._lifespan_queue.get, send))
+        await self._lifespan_queue.put({"type": f"lifespan.{phase}"})
+        waiter = asyncio.ensure_future(self._lifespan_events[phase].wait())
+        await asyncio.wait({waiter, self._lifespan_task}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        if self._lifespan_task.done():
+            if self._lifespan_task.exception() is not None:
+                logger.debug("Application does not support lifespan: %s", self._lifespan_task.exception())
+            if phase == "shutdown":
+                self._lifespan_task = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of one connection."""
+        self._writers.add(writer)
+        reader = _Reader(reader)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(read_request_head(reader), self.keepalive_timeout)
+                except BadRequest as e:
+                    await self._error(writer, e.status, str(e))
+                    break
+                except asyncio.TimeoutError:
+                    break
+                if head is None:
+                    break
+                method, target, version, headers = head
+                try:
+                    length = body_length(headers)
+                except BadRequest as e:
+                    await self._error(writer, e.status, str(e))
+                    break
+                connection = dict(headers).get(b"connection", b"").lower()
+                keep_alive = (version == "HTTP/1.1" and connection != b"close") or connection == b"keep-alive"
+                scope = http_scope(method, target, version, headers, writer)
+                exchange = _Exchange(reader, writer, keep_alive, length)
+                try:
+                    await self.app(scope, exchange.receive, exchange.send)
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.error("Unhandled error serving %s %s: %s", method, scope["path"], e, exc_info=True)
+                    if not exchange.started and not exchange.disconnected.is_set():
+                        await self._error(writer, 500, "Internal Server Error")
+                    break
+                finally:
+                    await exchange.close()
+                if not exchange.finished.is_set() or exchange.disconnected.is_set():
+                    break
+                # an unread request body leaves the connection in an unknown state
+                keep_alive = exchange.keep_alive and exchange.remaining == 0
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    @staticmethod
+    async def _error(writer: asyncio.StreamWriter, status: int, message: str) -> None:
+        """Answer with a plain text error and close the connection."""
+        body = message.encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {STATUS_PHRASES.get(status, '')}\r\n"
+            f"content-type: text/plain; charset=utf-8\r\ncontent-length: {len(body)}\r\nconnection: close\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def serve(app: ASGIApp, host: str = "127.0.0.1", port: int = 8000) -> None:
+    """Serve an ASGI application until interrupted."""
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(ASGIServer(app, host=host, port=port).serve_forever())
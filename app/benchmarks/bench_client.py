@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: per-request latency of OpenAI client strategies against a local stub server.
+
+Compares the baseline, the openai module-level client that handle_completion()
+used before app.openai_client existed (openai.api_key set on every call, then
+openai.chat.completions.create()), with the shared client from
+app.openai_client. Both reuse keep-alive connections; the shared client adds
+explicit connection limits and timeouts, so this mostly checks that it costs
+nothing per request.
+
+usage: python -m app.benchmarks.bench_client [requests]
+"""
+
+import statistics
+import sys
+import time
+from unittest.mock import patch
+
+import openai
+
+from app import openai_client
+from app.stubs.openai_server import StubOpenAIServer
+
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def timed_requests(get_clients: dict, count: int) -> dict:
+    """
+    Send count requests with each client, alternating between them so that
+    drift of the machine or the stub server affects them alike.
+
+    Returns:
+        dict: Per-request latencies in milliseconds, by client name
+    """
+    latencies: dict = {name: [] for name in get_clients}
+    for _ in range(count):
+        for name, get_client in get_clients.items():
+            start = time.perf_counter()
+            get_client().chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+            latencies[name].append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: list) -> None:
+    """Print latency statistics."""
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<28} mean {statistics.mean(latencies):7.3f} ms   p50 {statistics.median(latencies):7.3f} ms   p95 {p95:7.3f} ms"
+    )
+
+
+def main(count: int = 500) -> None:
+    """Run the benchmark."""
+    with StubOpenAIServer() as server:
+        with (
+            patch("app.settings.OPENAI_BASE_URL", server.base_url),
+            patch("app.settings.OPENAI_API_KEY", "stub"),
+        ):
+            openai_client.reset_clients()
+            openai.base_url = server.base_url.rstrip("/") + "/"
+
+            def module_client():
+                # as the baseline did on every call; the module client itself is built once
+                openai.api_key = "stub"
+                return openai
+
+            clients = {"module-level client": module_client, "shared tuned client": openai_client.get_client}
+            # warm up both paths once
+            timed_requests(clients, 5)
+            for name, latencies in timed_requests(clients, count).items():
+                report(name, latencies)
+            openai_client.reset_clients()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Load test: concurrent idempotent registrations.
+
+Worker threads call register_course() concurrently. A share of the calls
+(--overlap) repeats registrations that other workers also make, as retried
+LLM tool calls do, so that they contend for the same rows of the unique
+(course_code, email) index. Reports throughput, latency percentiles,
+failures and whether exactly one row per registration was stored.
+
+Runs against a SQLite file by default. Pass --mysql to use the database
+configured in .env, bootstrapped with python -m app.bootstrap_db --seed.
+
+usage: python -m app.benchmarks.bench_enrollments [--mysql] [--workers 8] [--registrations 2000] [--overlap 0.3]
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from app.stackademy import Stackademy
+
+
+COURSE_CODES = ["AI101", "WEB101", "DB101", "MOB101", "NET101", "NN201"]
+
+
+def workload(registrations: int, overlap: float, seed: int = 42) -> list:
+    """Build (course_code, email, full_name) calls; overlap is the share of calls that repeat an earlier one."""
+    rng = random.Random(seed)
+    unique = max(1, int(registrations * (1 - overlap)))
+    keys = [(COURSE_CODES[i % len(COURSE_CODES)], f"load{i}@example.com", f"load student {i}") for i in range(unique)]
+    calls = keys + [rng.choice(keys) for _ in range(registrations - unique)]
+    rng.shuffle(calls)
+    return calls
+
+
+def run(app: Stackademy, calls: list, workers: int) -> dict:
+    """Run the calls on worker threads and collect per-call latencies."""
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    chunks = [calls[i::workers] for i in range(workers)]
+
+    def worker(chunk):
+        local_latencies, local_failures = [], 0
+        for course_code, email, full_name in chunk:
+            start = time.perf_counter()
+            if not app.register_course(course_code=course_code, email=email, full_name=full_name):
+                local_failures += 1
+            local_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local_latencies)
+            failures.append(local_failures)
+
+    threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "throughput": len(calls) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "failures": sum(failures),
+    }
+
+
+def main() -> None:
+    """Run the load test and print a report."""
+    parser = argparse.ArgumentParser(description="Concurrent idempotent registration load test.")
+    parser.add_argument("--mysql", action="store_true", help="use the MySQL database configured in .env")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--registrations", type=int, default=2000)
+    parser.add_argument("--overlap", type=float, default=0.3, help="share of repeated registrations")
+    args = parser.parse_args()
+
+    # register_course() logs and prints every success; keep the output readable
+    logging.getLogger("app").setLevel(logging.WARNING)
+    app = Stackademy(catalog_snapshot=False)
+    app._log_success = lambda message: None  # pylint: disable=protected-access
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not args.mysql:
+            # pylint: disable=import-outside-toplevel
+            from app.stubs.sqlite_db import SQLiteDatabase
+
+            app.db = SQLiteDatabase(os.path.join(tmpdir, "load.sqlite3"))
+            app.db.add_courses([{"course_code": code, "course_name": code, "cost": 100} for code in COURSE_CODES])
+
+        calls = workload(args.registrations, args.overlap)
+        cleanup = ("DELETE FROM enrollments WHERE email LIKE %s", ("load%@example.com",))
+        app.db.execute_update(*cleanup)
+        report = run(app, calls, args.workers)
+        stored = app.db.execute_query(
+            "SELECT COUNT(*) AS n FROM enrollments WHERE email LIKE %s", ("load%@example.com",)
+        )[0]["n"]
+        app.db.execute_update(*cleanup)
+
+    expected = len(set(calls))
+    print(f"{args.registrations} registrations, {expected} unique, {args.workers} workers, {app.db.connection_string}")
+    print(f"throughput:  {report['throughput']:.0f} registrations/s ({report['elapsed']:.2f}s)")
+    print(f"latency:     p50 {report['p50_ms']:.2f} ms, p99 {report['p99_ms']:.2f} ms, max {report['max_ms']:.2f} ms")
+    print(f"failures:    {report['failures']}")
+    print(f"rows stored: {stored} (expected {expected}{', OK' if stored == expected else ', MISMATCH'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: cold-start import time of the app's entry points.
+
+Every short-lived process (a CLI run, a test worker, a forked tool worker)
+pays for importing the app before doing any work. Imports each entry
+module in fresh interpreters with python -X importtime, and reports the
+median and p95 of its cumulative import time, the slowest packages it
+pulls in, and whether openai and pymysql were really imported (they are
+loaded on first use, see app.utils.lazy_import).
+
+Results are saved as JSON in the format of app.benchmarks.suite and
+compared with a baseline in the same way, so import time regressions are
+flagged: app/benchmarks/results/importtime-latest.json and
+importtime-baseline.json.
+
+usage: python -m app.benchmarks.bench_importtime [--runs 15] [--save-baseline] [module ...]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.benchmarks.suite import (
+    RESULTS_DIR,
+    RESULTS_VERSION,
+    add_baseline_arguments,
+    git_commit,
+    save_and_compare,
+    summarize,
+)
+
+
+MODULES = ("app.settings", "app.database", "app.stackademy", "app.prompt", "app.agent", "app.server")
+HEAVY_MODULES = ("openai", "pymysql")
+LATEST_PATH = os.path.join(RESULTS_DIR, "importtime-latest.json")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "importtime-baseline.json")
+# import time:     self [us] |  cumulative | imported package
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+# prints which heavy modules were imported; lazy_import does not register them in sys.modules
+PROBE = "import sys; import {module}; print(' '.join(name for name in {heavy!r} if name in sys.modules))"
+
+
+def import_once(module: str) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        tuple: the cumulative import time of the module and of every module it imported,
+            in microseconds, and the heavy modules that were executed
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    # nested imports are listed before the module that imported them, one level deeper
+    cumulative: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative[match.group(4)] = int(match.group(2))
+        if len(match.group(3)) == 1:
+            if match.group(4) == module:
+                break
+            cumulative = {}
+    return cumulative, completed.stdout.split()
+
+
+def measure(module: str, runs: int) -> Dict[str, Any]:
+    """Import a module runs times and summarize its cumulative import time."""
+    samples: List[float] = []
+    packages: Dict[str, List[int]] = {}
+    loaded: List[str] = []
+    for _ in range(runs):
+        cumulative, loaded = import_once(module)
+        samples.append(cumulative[module] / 1e6)
+        for name, micros in cumulative.items():
+            if "." not in name and name != module:
+                packages.setdefault(name, []).append(micros)
+    result: Dict[str, Any] = {"number": runs}
+    result.update(summarize(samples))
+    del result["ops_per_second"]
+    slowest = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:5]
+    result["slowest_packages"] = {name: int(statistics.median(micros)) for name, micros in slowest}
+    result["heavy_modules_loaded"] = loaded
+    return result
+
+
+def report(results: Dict[str, Any], regressions: Sequence[Dict[str, Any]] = ()) -> None:
+    """Print one line per module, marking the regressed ones."""
+    regressed = {regression["benchmark"] for regression in regressions}
+    print(f"{results['commit'] or '-'} python {results['python']} on {results['platform']}")
+    print(f"  {'module':<16} {'p50 ms':>8} {'p95 ms':>8}  {'loaded':<16} slowest packages (ms)")
+    for name, result in results["benchmarks"].items():
+        slowest = ", ".join(f"{package} {micros / 1000:.0f}" for package, micros in result["slowest_packages"].items())
+        print(
+            f"{'!' if name in regressed else ' '} {name:<16} {result['p50_us'] / 1000:>8.1f}"
+            f" {result['p95_us'] / 1000:>8.1f}  {' '.join(result['heavy_modules_loaded']) or '-':<16} {slowest}"
+        )
+    for regression in regressions:
+        print(
+            f"regression: {regression['benchmark']} {regression['metric']} {regression['baseline']:g} ->"
+            f" {regression['current']:g} (+{regression['change']:.0%})"
+        )
+
+
+def main() -> None:
+    """Measure the import time of the entry points, save it and compare it with the baseline."""
+    parser = argparse.ArgumentParser(description="Measure the cold-start import time of the app.")
+    parser.add_argument("modules", nargs="*", help=f"modules to import (default: {', '.join(MODULES)})")
+    parser.add_argument("--runs", type=int, default=15, help="fresh interpreters per module")
+    add_baseline_arguments(parser, LATEST_PATH, BASELINE_PATH)
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "version": RESULTS_VERSION,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": {module: measure(module, args.runs) for module in args.modules or MODULES},
+    }
+    save_and_compare(results, args, report, metrics=("p50_us",))
+
+
+if __name__ == "__main__":
+    main()
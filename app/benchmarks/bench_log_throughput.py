@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Load test: log throughput per request thread, with and without the logging queue.
+
+Request threads log INFO records with a JSON payload, as the agent does for
+every tool call, to a stream that takes --sink-delay-us per write (stdout
+piped to a slow consumer, e.g. a container log driver). Compares writing
+synchronously from the request threads with the bounded queue of
+app.logging_config under each drop policy, and reports per thread the
+latency of a logging call (p50/p99), the records per second the thread
+could log, and how many records were written and dropped.
+
+usage: python -m app.benchmarks.bench_log_throughput [--threads 8] [--records 2000] [--sink-delay-us 50]
+"""
+
+import argparse
+import logging
+import threading
+import time
+from typing import Any, Dict, List
+
+from app.benchmarks.suite import summarize
+from app.logging_config import create_handler, start_queue, stop_queue
+from app.utils import lazy_json
+
+
+PAYLOAD = [{"role": "user", "content": f"message {i}: " + "lorem ipsum dolor sit amet " * 4} for i in range(5)]
+CONFIGURATIONS = (
+    ("sync text", "text", None),
+    ("sync json", "json", None),
+    ("queue json, block", "json", "block"),
+    ("queue json, oldest", "json", "oldest"),
+    ("queue json, newest", "json", "newest"),
+)
+
+
+class SlowStream:
+    """A text stream that takes delay seconds per write and counts the writes; a handler writes a record at once."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        """Write, slowly."""
+        if self.delay:
+            time.sleep(self.delay)
+        self.writes += 1
+        return len(text)
+
+    def flush(self) -> None:
+        """Nothing to flush."""
+
+
+def run(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    log_format: str, policy: Any, threads: int, records: int, delay: float, queue_size: int
+) -> Dict[str, Any]:
+    """
+    Log from request threads to a slow stream.
+
+    Returns:
+        Dict[str, Any]: the latency of a logging call, records per second per thread,
+            the wall time until every record was written, and the records written and dropped
+    """
+    stream = SlowStream(delay)
+    handler: logging.Handler = create_handler(stream, log_format, color=False)
+    if policy is not None:
+        handler = start_queue(handler, size=queue_size, policy=policy)
+    logger = logging.getLogger(f"app.benchmarks.bench_log_throughput.{log_format}.{policy}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    samples: List[List[float]] = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads)
+
+    def request_thread(index: int) -> None:
+        timings = samples[index]
+        barrier.wait()
+        for _ in range(records):
+            start = time.perf_counter()
+            logger.info("Calling function: %s with args %s", "get_courses", lazy_json(PAYLOAD, "blue"))
+            timings.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=request_thread, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    logged = time.perf_counter() - start
+    dropped = getattr(handler, "dropped", 0)
+    stop_queue()
+    elapsed = time.perf_counter() - start
+
+    result = summarize([sample for timings in samples for sample in timings])
+    result["per_thread_records_per_second"] = round(records / logged, 1)
+    result["logged_seconds"] = round(logged, 3)
+    result["drained_seconds"] = round(elapsed, 3)
+    result["written"] = stream.writes
+    result["dropped"] = dropped
+    return result
+
+
+def main() -> None:
+    """Compare synchronous and queued logging."""
+    parser = argparse.ArgumentParser(description="Measure log throughput per request thread.")
+    parser.add_argument("--threads", type=int, default=8, help="request threads")
+    parser.add_argument("--records", type=int, default=2000, help="records logged per thread")
+    parser.add_argument("--sink-delay-us", type=float, default=50, help="time the stream takes per write")
+    parser.add_argument("--queue-size", type=int, default=1000, help="records the logging queue holds")
+    args = parser.parse_args()
+
+    print(
+        f"{args.threads} threads x {args.records} records, {args.sink_delay_us:g} us per write,"
+        f" queue of {args.queue_size}"
+    )
+    print(
+        f"{'configuration':<20} {'p50 us':>8} {'p99 us':>9} {'records/s/thread':>17} {'logged s':>9}"
+        f" {'drained s':>10} {'written':>8} {'dropped':>8}"
+    )
+    for name, log_format, policy in CONFIGURATIONS:
+        result = run(log_format, policy, args.threads, args.records, args.sink_delay_us / 1e6, args.queue_size)
+        print(
+            f"{name:<20} {result['p50_us']:>8.1f} {result['p99_us']:>9.1f}"
+            f" {result['per_thread_records_per_second']:>17.0f} {result['logged_seconds']:>9.3f}"
+            f" {result['drained_seconds']:>10.3f} {result['written']:>8} {result['dropped']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: per-turn cost of debug logging when DEBUG is disabled.
+
+Compares the eager debug payloads that completion() used to build on every
+OpenAI round-trip against the lazy formatting in app.utils, for conversation
+histories of 10, 100 and 1000 messages.
+
+usage: python -m app.benchmarks.bench_logging
+"""
+
+import logging
+import timeit
+
+from openai.types.chat import ChatCompletion
+
+from app.utils import dump_json_colored, lazy_json
+
+
+logger = logging.getLogger("app.benchmarks.bench_logging")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+HISTORY_SIZES = (10, 100, 1000)
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_courses",
+            "description": "returns up to 10 rows of course detail data",
+            "parameters": {"type": "object", "properties": {"max_cost": {"type": "number"}}},
+        },
+    }
+]
+
+RESPONSE = ChatCompletion.model_validate(
+    {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "Here are the courses you asked for."},
+            }
+        ],
+    }
+)
+
+
+def build_messages(count: int) -> list:
+    """Build a synthetic conversation history."""
+    messages = []
+    for i in range(count):
+        role = "user" if i % 2 else "assistant"
+        messages.append({"role": role, "content": f"message {i}: " + "lorem ipsum dolor sit amet " * 8})
+    return messages
+
+
+def eager_turn(messages: list) -> None:
+    """The logging work of one tool-calling turn, with eagerly built payloads (previous behavior)."""
+    for _ in range(2):
+        logger.debug(
+            "Sending messages to OpenAI: %s %s",
+            dump_json_colored(messages, "blue"),
+            dump_json_colored(TOOLS, "blue"),
+        )
+        logger.debug("OpenAI response: %s", dump_json_colored(RESPONSE.model_dump(), "green"))
+        logger.debug("Updated response: %s", dump_json_colored(RESPONSE.model_dump(), "green"))
+    logger.debug(
+        "Updated messages: %s",
+        [dump_json_colored(msg.model_dump(), "blue") if not isinstance(msg, dict) else msg for msg in messages],
+    )
+
+
+def lazy_turn(messages: list) -> None:
+    """The logging work of one tool-calling turn, with lazy payloads (current behavior)."""
+    for _ in range(2):
+        logger.debug("Sending messages to OpenAI: %s %s", lazy_json(messages, "blue"), lazy_json(TOOLS, "blue"))
+        logger.debug("OpenAI response: %s", lazy_json(RESPONSE, "green"))
+        logger.debug("Updated response: %s", lazy_json(RESPONSE, "green"))
+    logger.debug("Updated messages: %s", lazy_json(messages, "blue"))
+
+
+def measure(func, messages: list, number: int) -> float:
+    """Return the best per-call time in microseconds."""
+    timer = timeit.Timer(lambda: func(messages))
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e6
+
+
+def main() -> None:
+    """Run the benchmark at INFO level and print a summary table."""
+    logger.setLevel(logging.INFO)
+    print(f"{'messages':>10} {'eager (us/turn)':>18} {'lazy (us/turn)':>18} {'speedup':>10}")
+    for size in HISTORY_SIZES:
+        messages = build_messages(size)
+        number = max(10, 10000 // size)
+        eager = measure(eager_turn, messages, number)
+        lazy = measure(lazy_turn, messages, number)
+        print(f"{size:>10} {eager:>18.1f} {lazy:>18.2f} {eager / lazy:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark: buffered execute_query() versus streaming iter_query().
+
+Generates synthetic enrollment rows with a cross join, so no table has to be
+populated, and reports the peak Python memory (tracemalloc) and time to read
+them all. Times include the considerable overhead of tracemalloc.
+
+Runs against the SQLite stand-in by default. Pass --mysql to stream from the
+database configured in .env.
+
+usage: python -m app.benchmarks.bench_query_memory [--mysql] [--rows 1000000]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+
+DIGITS = " UNION ALL ".join(f"SELECT {i} AS n" for i in range(10))
+
+
+def synthetic_query(rows: int) -> str:
+    """A portable query returning rows synthetic enrollment rows."""
+    places = max(1, len(str(max(rows - 1, 1))))
+    tables = ", ".join(f"({DIGITS}) d{i}" for i in range(places))
+    enrollment_id = " + ".join(f"{10 ** i} * d{i}.n" for i in range(places))
+    return (
+        f"SELECT {enrollment_id} AS enrollment_id, 'AI101' AS course_code, "
+        f"'student@example.com' AS email, 'Student Name' AS full_name "
+        f"FROM {tables} LIMIT {rows}"
+    )
+
+
+def buffered(database, query: str) -> int:
+    """Read every row with execute_query(), as a list of dicts."""
+    return len(database.execute_query(query))
+
+
+def streamed(database, query: str) -> int:
+    """Stream dict rows with iter_query()."""
+    return sum(1 for _ in database.iter_query(query))
+
+
+def streamed_batches(database, query: str) -> int:
+    """Stream batches of tuples with iter_query()."""
+    return sum(len(batch) for batch in database.iter_query(query, batch_size=1000, as_tuples=True))
+
+
+def measure(func, database, query: str) -> tuple:
+    """Return (rows, peak MiB, seconds)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = func(database, query)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, peak / 2**20, elapsed
+
+
+def main() -> None:
+    """Run the benchmark and print a summary table."""
+    parser = argparse.ArgumentParser(description="Peak memory of buffered versus streamed queries.")
+    parser.add_argument("--mysql", action="store_true", help="use the MySQL database configured in .env")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # pylint: disable=import-outside-toplevel
+    if args.mysql:
+        from app.database import get_db
+
+        database = get_db()
+    else:
+        from app.stubs.sqlite_db import SQLiteDatabase
+
+        database = SQLiteDatabase()
+
+    query = synthetic_query(args.rows)
+    print(f"{args.rows} rows from {database.connection_string}")
+    print(f"{'mode':>28} {'rows':>10} {'peak (MiB)':>12} {'seconds':>9}")
+    for label, func in (
+        ("execute_query (buffered)", buffered),
+        ("iter_query (dict rows)", streamed),
+        ("iter_query (tuple batches)", streamed_batches),
+    ):
+        rows, peak, elapsed = measure(func, database, query)
+        print(f"{label:>28} {rows:>10} {peak:>12.1f} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
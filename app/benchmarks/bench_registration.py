@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: registrations per second, one at a time versus in bulk.
+
+The one-at-a-time path verifies the course and inserts the registration in
+separate transactions for every student, as register_course() would. The
+bulk path is register_courses_bulk(): one verification query and one
+executemany() transaction per cohort.
+
+Runs against a SQLite file by default. Pass --mysql to use the database
+configured in .env; the enrollments table must exist.
+
+usage: python -m app.benchmarks.bench_registration [--mysql] [--students 5000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from app.stackademy import (
+    ENROLLMENTS_UPSERT,
+    Stackademy,
+    StackademyRegisterCourseParams,
+    normalize_registration,
+)
+from app.stubs.sqlite_db import SQLiteDatabase
+
+
+COURSE_CODES = [f"BENCH{i:03d}" for i in range(20)]
+
+
+def cohort(size: int) -> list:
+    """Build a cohort of registrations spread over the benchmark courses."""
+    return [
+        StackademyRegisterCourseParams(
+            course_code=COURSE_CODES[i % len(COURSE_CODES)],
+            email=f"student{i}@example.com",
+            full_name=f"student {i}",
+        )
+        for i in range(size)
+    ]
+
+
+def one_at_a_time(app: Stackademy, registrations: list) -> None:
+    """Verify and insert each registration in its own round-trips and transactions."""
+    for registration in registrations:
+        course_code, email, full_name = normalize_registration(
+            registration.course_code, registration.email, registration.full_name
+        )
+        if app.verify_course(course_code):
+            app.db.execute_update(ENROLLMENTS_UPSERT, (course_code, email, full_name))
+
+
+def bulk(app: Stackademy, registrations: list) -> None:
+    """Register the whole cohort with register_courses_bulk()."""
+    app.register_courses_bulk(registrations)
+
+
+def main() -> None:
+    """Run the benchmark and print registrations per second."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--mysql", action="store_true", help="use the MySQL database configured in .env")
+    parser.add_argument("--students", type=int, default=5000, help="cohort size")
+    args = parser.parse_args()
+
+    app = Stackademy(catalog_snapshot=False)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not args.mysql:
+            app.db = SQLiteDatabase(os.path.join(tmpdir, "bench.sqlite3"))
+            app.db.add_courses([{"course_code": code, "course_name": code, "cost": 100} for code in COURSE_CODES])
+        missing = set(COURSE_CODES) - app.existing_course_codes(COURSE_CODES)
+        if missing:
+            raise SystemExit(f"Benchmark courses missing from {app.db.connection_string}: {sorted(missing)}")
+
+        registrations = cohort(args.students)
+        print(f"{args.students} registrations against {app.db.connection_string}")
+        print(f"{'path':>14} {'seconds':>10} {'registrations/s':>17}")
+        for label, func in (("one at a time", one_at_a_time), ("bulk", bulk)):
+            app.db.execute_update("DELETE FROM enrollments WHERE email LIKE %s", ("student%@example.com",))
+            start = time.perf_counter()
+            func(app, registrations)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>14} {elapsed:>10.3f} {args.students / elapsed:>17.0f}")
+        app.db.execute_update("DELETE FROM enrollments WHERE email LIKE %s", ("student%@example.com",))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Load test: many concurrent users talking to the Stackademy server.
+
+Starts a local stub OpenAI server and the ASGI app on the built-in HTTP/1.1
+host, then runs users concurrently, each with its own session, sending
+messages one after another. Reports throughput, latency percentiles and the
+requests rejected by backpressure.
+
+usage: python -m app.benchmarks.bench_server [users] [messages] [stub latency seconds] [max concurrency]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+from unittest.mock import patch
+
+import httpx
+
+from app import openai_client
+from app.asgi import ASGIServer
+from app.prompt import initial_messages
+from app.server import StackademyServer
+from app.session import SessionStore
+from app.stubs.openai_server import StubOpenAIServer
+
+
+def percentile(values: list, fraction: float) -> float:
+    """The value below which the given fraction of the sorted values fall."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def user(client: httpx.AsyncClient, messages: int, latencies: list, statuses: Counter) -> None:
+    """One user: start a session and send messages, waiting for each reply."""
+    session_id = (await client.post("/sessions")).json()["session_id"]
+    for i in range(messages):
+        start = time.perf_counter()
+        response = await client.post(f"/sessions/{session_id}/messages", json={"message": f"Question {i}"})
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(users: int, messages: int, max_concurrency: int) -> None:
+    """Serve the app and run the users against it."""
+    store = SessionStore(initial_messages=initial_messages, max_sessions=users * 2)
+    app = StackademyServer(store=store, max_concurrency=max_concurrency)
+    latencies: list = []
+    statuses: Counter = Counter()
+    async with ASGIServer(app) as server:
+        limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+        async with httpx.AsyncClient(base_url=server.base_url, limits=limits, timeout=60.0) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(user(client, messages, latencies, statuses) for _ in range(users)))
+            elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{users} users x {messages} messages, max concurrency {max_concurrency}: {elapsed:.2f}s")
+    print(f"  throughput  {sum(statuses.values()) / elapsed:8.1f} turns/s")
+    if latencies:
+        print(
+            f"  latency     mean {statistics.mean(latencies):7.1f} ms   p50 {percentile(latencies, 0.5):7.1f} ms"
+            f"   p95 {percentile(latencies, 0.95):7.1f} ms   p99 {percentile(latencies, 0.99):7.1f} ms"
+        )
+    print(f"  statuses    {dict(sorted(statuses.items()))}")
+    print(f"  server      {app.stats()['rejected']} rejected, {app.stats()['timeouts']} timed out")
+
+
+def main(users: int = 200, messages: int = 5, latency: float = 0.05, max_concurrency: int = 64) -> None:
+    """Run the load test."""
+    with StubOpenAIServer(latency=latency) as stub:
+        with (
+            patch("app.settings.OPENAI_BASE_URL", stub.base_url),
+            patch("app.settings.OPENAI_API_KEY", "stub"),
+            patch("app.settings.OPENAI_HTTP_MAX_CONNECTIONS", max(100, max_concurrency)),
+            patch("app.settings.OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS", max(20, max_concurrency)),
+        ):
+            openai_client.reset_clients()
+            asyncio.run(run(users, messages, max_concurrency))
+            openai_client.reset_clients()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        users=int(args[0]) if len(args) > 0 else 200,
+        messages=int(args[1]) if len(args) > 1 else 5,
+        latency=float(args[2]) if len(args) > 2 else 0.05,
+        max_concurrency=int(args[3]) if len(args) > 3 else 64,
+    )
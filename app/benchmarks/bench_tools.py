@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: per-turn cost of building the tool definitions.
+
+A tool-calling turn offers tools twice: once with the user's message and
+once after the tool results. Compares rebuilding the definitions from the
+pydantic models on every request (previous behavior) against the memoized
+arrays of the tool registry, and reports the cost of serializing them.
+Also shows that dispatching a tool call costs the same with 2 or 100
+registered tools.
+
+usage: python -m app.benchmarks.bench_tools
+"""
+
+import functools
+import json
+import timeit
+
+from openai.types.chat import ChatCompletionFunctionToolParam
+
+from app.stackademy import StackademyGetCoursesParams, StackademyRegisterCourseParams
+from app.tools import ToolRegistry, ToolSpec, tool_registry
+
+
+REGISTRY_SIZES = (2, 10, 100)
+
+
+def build_tool(name: str, description: str, model) -> ChatCompletionFunctionToolParam:
+    """Build a tool definition from scratch, as the tool factories used to."""
+    return ChatCompletionFunctionToolParam(
+        type="function",
+        function={"name": name, "description": description, "parameters": model.model_json_schema()},
+    )
+
+
+def uncached_turn() -> None:
+    """Tool definitions of one tool-calling turn, rebuilt for each request (previous behavior)."""
+    _ = [build_tool("get_courses", "returns course details", StackademyGetCoursesParams)]
+    _ = [
+        build_tool("get_courses", "returns course details", StackademyGetCoursesParams),
+        build_tool("register_course", "registers a student", StackademyRegisterCourseParams),
+    ]
+
+
+def cached_turn() -> None:
+    """Tool definitions of one tool-calling turn, served from the registry (current behavior)."""
+    tool_registry.tools("get_courses")
+    tool_registry.tools("get_courses", "register_course")
+
+
+def uncached_json_turn() -> None:
+    """Serializing the tools array of one turn on every request."""
+    json.dumps(tool_registry.tools("get_courses"))
+    json.dumps(tool_registry.tools("get_courses", "register_course"))
+
+
+def cached_json_turn() -> None:
+    """Pre-serialized tools arrays of one turn."""
+    tool_registry.tools_json("get_courses")
+    tool_registry.tools_json("get_courses", "register_course")
+
+
+def measure(func, number: int = 2000) -> float:
+    """Return the best per-call time in microseconds."""
+    return min(timeit.Timer(func).repeat(repeat=5, number=number)) / number * 1e6
+
+
+def build_registry(size: int) -> ToolRegistry:
+    """Build a registry of size tools with trivial handlers."""
+    registry = ToolRegistry()
+    for i in range(size):
+        registry.register(
+            ToolSpec(
+                name=f"tool_{i}",
+                description=f"Test tool {i}.",
+                params_model=StackademyRegisterCourseParams,
+                handler=lambda **arguments: True,
+            )
+        )
+    return registry
+
+
+def main() -> None:
+    """Run the benchmark and print summary tables."""
+    print(f"{'work per turn':>16} {'uncached (us)':>15} {'cached (us)':>13} {'speedup':>10}")
+    for label, uncached, cached in (
+        ("schema build", uncached_turn, cached_turn),
+        ("serialization", uncached_json_turn, cached_json_turn),
+    ):
+        before = measure(uncached)
+        after = measure(cached)
+        print(f"{label:>16} {before:>15.1f} {after:>13.2f} {before / after:>9.0f}x")
+
+    arguments = {"course_code": "AI101", "email": "a@b.com", "full_name": "Test User"}
+    print()
+    print(f"{'tools':>16} {'dispatch (us)':>15}")
+    for size in REGISTRY_SIZES:
+        registry = build_registry(size)
+        name = f"tool_{size - 1}"
+        dispatch = functools.partial(registry.dispatch, name, arguments)
+        print(f"{size:>16} {measure(dispatch, number=20000):>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: cost of verify_course() with and without the course code caches.
+
+Uses the SQLite stand-in, so the uncached numbers exclude the network
+round-trip to MySQL that the caches also save.
+
+usage: python -m app.benchmarks.bench_verify_course
+"""
+
+import logging
+import timeit
+
+from app.stackademy import Stackademy
+from app.stubs.sqlite_db import SQLiteDatabase
+
+
+def measure(func, number: int = 5000) -> float:
+    """Return the best per-call time in microseconds."""
+    return min(timeit.Timer(func).repeat(repeat=5, number=number)) / number * 1e6
+
+
+def main() -> None:
+    """Run the benchmark and print a summary table."""
+    logging.getLogger("app").setLevel(logging.ERROR)
+    database = SQLiteDatabase()
+    database.add_courses([{"course_code": f"C{i:04d}", "course_name": f"Course {i}"} for i in range(1000)])
+
+    uncached = Stackademy(catalog_snapshot=False, course_code_cache=False)
+    cached = Stackademy(catalog_snapshot=False, course_code_cache=True)
+    uncached.db = cached.db = database
+
+    print(f"{'course code':>14} {'uncached (us)':>15} {'cached (us)':>13}")
+    for label, code in (("existing", "C0500"), ("unknown", "XX999")):
+        before = measure(lambda: uncached.verify_course(code))  # pylint: disable=cell-var-from-loop
+        after = measure(lambda: cached.verify_course(code))  # pylint: disable=cell-var-from-loop
+        print(f"{label:>14} {before:>15.1f} {after:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Replay recorded conversations through the full agent loop, offline and repeatably.
+
+A recorded conversation is a JSON file with the user's prompts and the
+LLM's responses, in order:
+
+    {
+        "name": "browse-and-register",
+        "prompts": ["Show me the AI courses you have for under $500.", "...", "no thanks"],
+        "responses": [
+            {"tool_calls": [{"name": "get_courses", "arguments": {"description": "AI", "max_cost": 500}}]},
+            "We have one AI course under $500: ...",
+            ...
+        ]
+    }
+
+The responses are served by the local stub OpenAI server with a latency
+profile, tool calls run against a seeded SQLite database, and the prompts
+are fed to agent.main(prompts=...). Reports the turns, API requests and
+turn latency of each conversation. conversation_from_session() records a
+live conversation in the same format.
+
+usage: python -m app.benchmarks.replay [--profile fast] [--stream] [--repeat 3] [conversation.json ...]
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import logging
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+from app import agent, openai_client, stackademy
+from app.bootstrap_db import SEED_COURSES
+from app.session import ConversationSession
+from app.stubs.openai_server import PROFILES, LatencyProfile, StubOpenAIServer
+from app.stubs.sqlite_db import SQLiteDatabase
+from app.utils import to_jsonable
+
+
+CONVERSATIONS_DIR = os.path.join(os.path.dirname(__file__), "conversations")
+
+
+def load_conversation(path: str) -> Dict[str, Any]:
+    """Read a recorded conversation."""
+    with open(path, encoding="utf-8") as f:
+        conversation = json.load(f)
+    conversation.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return conversation
+
+
+def conversation_from_session(session: ConversationSession, name: str) -> Dict[str, Any]:
+    """
+    Record a conversation in the replay format.
+
+    Args:
+        session: A finished conversation
+        name: The name of the recording
+
+    Returns:
+        Dict[str, Any]: the user's prompts and the assistant's responses
+    """
+    prompts: List[str] = []
+    responses: List[Any] = []
+    for message in to_jsonable(session.messages):
+        if message.get("role") == "user":
+            prompts.append(message["content"])
+        elif message.get("role") == "assistant" and prompts:
+            if message.get("tool_calls"):
+                calls = [call["function"] for call in message["tool_calls"]]
+                responses.append(
+                    {
+                        "tool_calls": [
+                            {"name": call["name"], "arguments": json.loads(call["arguments"])} for call in calls
+                        ]
+                    }
+                )
+            else:
+                responses.append(message.get("content") or "")
+    return {"name": name, "prompts": prompts, "responses": responses}
+
+
+def seeded_database() -> SQLiteDatabase:
+    """An in-memory database with the sample courses of app.bootstrap_db."""
+    database = SQLiteDatabase()
+    database.add_courses(
+        [
+            {"course_code": code, "course_name": name, "description": description, "cost": cost}
+            for code, name, description, cost in SEED_COURSES
+        ]
+    )
+    return database
+
+
+def replay(
+    conversation: Dict[str, Any], profile: LatencyProfile, stream: bool = False, seed: Optional[int] = 0
+) -> Dict[str, Any]:
+    """
+    Run one recorded conversation through agent.main().
+
+    Returns:
+        Dict[str, Any]: turn latencies (and times to first token when streaming), requests served and totals
+    """
+    latencies: List[float] = []
+    streams: List[Any] = []
+    completion = agent.completion
+
+    def timed_completion(prompt: str, session=None, stream: bool = False):
+        start = time.perf_counter()
+        result = completion(prompt=prompt, session=session, stream=stream)
+        if stream:
+            streams.append(result)
+        else:
+            latencies.append(time.perf_counter() - start)
+        return result
+
+    session = agent.session_store.create()
+    # once the script is exhausted, "Goodbye!" ends the conversation instead of waiting for input
+    with StubOpenAIServer(script=conversation["responses"], content="Goodbye!", profile=profile, seed=seed) as stub:
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(patch("app.settings.OPENAI_BASE_URL", stub.base_url))
+            stack.enter_context(patch("app.settings.OPENAI_API_KEY", "stub"))
+            stack.enter_context(patch.object(stackademy.stackademy_app, "db", seeded_database()))
+            stack.enter_context(patch.object(agent, "completion", timed_completion))
+            stack.enter_context(patch("builtins.input", return_value="bye"))
+            stack.enter_context(openai_client.scoped_clients())
+            stackademy.stackademy_app.invalidate_course_codes()
+            if stackademy.tool_result_cache is not None:
+                stackademy.tool_result_cache.clear()
+            start = time.perf_counter()
+            agent.main(prompts=tuple(conversation["prompts"]), session=session, stream=stream)
+            elapsed = time.perf_counter() - start
+    if stream:
+        latencies = [s.elapsed for s in streams if s.elapsed is not None]
+    agent.session_store.delete(session.id)
+    return {
+        "name": conversation["name"],
+        "turns": len(latencies),
+        "requests": stub.request_count,
+        "unused_responses": stub.remaining,
+        "functions_called": session.functions_called,
+        "total_tokens": session.total_tokens,
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "ttfts": [s.ttft for s in streams if s.ttft is not None],
+    }
+
+
+def milliseconds(values: List[float], fraction: float) -> str:
+    """A percentile of values in seconds, formatted in milliseconds."""
+    if not values:
+        return "-"
+    ordered = sorted(values)
+    return f"{ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000:.1f}"
+
+
+def report(results: List[Dict[str, Any]]) -> None:
+    """Print one line per conversation."""
+    print(
+        f"{'conversation':<24} {'turns':>5} {'requests':>8} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8}"
+        f" {'ttft p50':>9} {'tokens':>7}"
+    )
+    for result in results:
+        print(
+            f"{result['name']:<24} {result['turns']:>5} {result['requests']:>8}"
+            f" {result['turns'] / result['elapsed']:>8.1f} {milliseconds(result['latencies'], 0.5):>8}"
+            f" {milliseconds(result['latencies'], 0.95):>8} {milliseconds(result['ttfts'], 0.5):>9}"
+            f" {result['total_tokens']:>7}"
+        )
+        if result["unused_responses"]:
+            print(f"  warning: {result['unused_responses']} recorded responses were not requested")
+
+
+def main() -> None:
+    """Replay the recorded conversations."""
+    parser = argparse.ArgumentParser(description="Replay recorded conversations through the agent loop.")
+    parser.add_argument("conversations", nargs="*", help="conversation JSON files (default: the bundled ones)")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast", help="stub latency profile")
+    parser.add_argument("--stream", action="store_true", help="stream the replies")
+    parser.add_argument("--repeat", type=int, default=1, help="replay every conversation this many times")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the latency jitter")
+    parser.add_argument("--verbose", action="store_true", help="show the agent's output and logs")
+    args = parser.parse_args()
+
+    paths = args.conversations or sorted(glob.glob(os.path.join(CONVERSATIONS_DIR, "*.json")))
+    conversations = [load_conversation(path) for path in paths]
+    results = []
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            logging.disable(logging.WARNING)
+        for i in range(args.repeat):
+            for conversation in conversations:
+                results.append(replay(conversation, PROFILES[args.profile], stream=args.stream, seed=args.seed + i))
+    logging.disable(logging.NOTSET)
+    print(f"profile {args.profile}: {PROFILES[args.profile]}, stream={args.stream}")
+    report(results)
+    latencies = [latency for result in results for latency in result["latencies"]]
+    if latencies:
+        print(f"all turns: {len(latencies)}, mean {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
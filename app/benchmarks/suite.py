@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the agent loop, with results saved as JSON and compared against a baseline.
+
+Measures the per-call latency (p50/p95/p99), the memory allocated per call
+(tracemalloc) and the throughput of each layer of a turn, from a full
+completion() turn down to a database round-trip:
+
+    completion (text turn)       one request to the stubbed LLM
+    completion (tool turn)       tool call, get_courses and the follow-up request
+    completion (streamed tool)   the same, streamed
+    process_tool_calls           one get_courses tool call, uncached
+    handle_function_call         get_courses dispatched by name, uncached
+    Stackademy.get_courses       the SQL query and its logging
+    database round-trip          one indexed lookup
+
+The LLM is the local stub OpenAI server with the "instant" latency profile,
+so the completion numbers are the agent's and the OpenAI SDK's own overhead,
+and its ops/s are turns per second. The database is an in-memory SQLite
+database seeded with the sample courses, or the MySQL database of the
+settings with --mysql (run python -m app.bootstrap_db --seed first).
+
+Results are written to app/benchmarks/results/latest.json. With a baseline
+(by default app/benchmarks/results/baseline.json, if it exists), any
+benchmark whose p50, p95 or allocations grew by more than --threshold is
+flagged and the exit status is 1. --save-baseline stores the run as the new
+baseline. Only compare runs from the same machine and settings.
+
+usage: python -m app.benchmarks.suite [--scale 0.2] [--mysql] [--baseline path] [--threshold 0.25] [--save-baseline]
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from unittest.mock import patch
+
+from openai.types.chat import ChatCompletionMessage
+
+from app import openai_client, prompt, settings, stackademy
+from app.benchmarks.replay import seeded_database
+from app.database import DatabaseConnection
+from app.session import ConversationSession
+from app.stackademy import Stackademy
+from app.stubs.openai_server import StubOpenAIServer
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+LATEST_PATH = os.path.join(RESULTS_DIR, "latest.json")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+RESULTS_VERSION = 1
+# metrics that flag a regression; p99 is too noisy for a few hundred samples
+REGRESSION_METRICS = ("p50_us", "p95_us", "alloc_peak_bytes")
+# growth below this many bytes is not a regression, however large in relative terms
+ALLOCATION_NOISE_BYTES = 1024
+GET_COURSES_ARGUMENTS = {"description": "AI", "max_cost": 500}
+LOOKUP_QUERY = "SELECT course_code FROM courses WHERE course_code = %s"
+
+
+class Benchmark:
+    """
+    One function to measure.
+
+    Args:
+        name: The name of the benchmark in the results
+        func: The function to call; it receives the result of setup
+        number: The number of timed calls (before scaling)
+        setup: Prepares each call, untimed, e.g. a new conversation or an empty cache
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any], number: int, setup: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.func = func
+        self.number = number
+        self.setup = setup or (lambda: None)
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """
+    Summarize per-call times.
+
+    Args:
+        samples: The time of each call, in seconds
+
+    Returns:
+        Dict[str, float]: mean and percentiles in microseconds, and calls per second
+    """
+    micros = [sample * 1e6 for sample in samples]
+    if len(micros) < 2:
+        micros = micros * 2
+    cuts = statistics.quantiles(micros, n=100, method="inclusive")
+    mean = statistics.fmean(micros)
+    return {
+        "mean_us": round(mean, 2),
+        "p50_us": round(cuts[49], 2),
+        "p95_us": round(cuts[94], 2),
+        "p99_us": round(cuts[98], 2),
+        "ops_per_second": round(1e6 / mean, 1) if mean else 0.0,
+    }
+
+
+def measure_allocations(benchmark: Benchmark, number: int) -> Dict[str, int]:
+    """
+    Measure the memory allocated by calls with tracemalloc, in a separate untimed pass.
+
+    Returns:
+        Dict[str, int]: the median peak of the memory allocated during a call, and the
+            memory still allocated after a call, in bytes
+    """
+    peaks: List[int] = []
+    retained: List[int] = []
+    tracemalloc.start()
+    try:
+        for _ in range(number):
+            argument = benchmark.setup()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            benchmark.func(argument)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_bytes": int(statistics.median(peaks)), "alloc_retained_bytes": int(statistics.median(retained))}
+
+
+def run_benchmark(benchmark: Benchmark, scale: float = 1.0) -> Dict[str, Any]:
+    """Time a benchmark, then measure its allocations."""
+    number = max(2, int(benchmark.number * scale))
+    for _ in range(max(1, number // 10)):
+        benchmark.func(benchmark.setup())
+    samples = []
+    for _ in range(number):
+        argument = benchmark.setup()
+        start = time.perf_counter()
+        benchmark.func(argument)
+        samples.append(time.perf_counter() - start)
+    result: Dict[str, Any] = {"number": number}
+    result.update(summarize(samples))
+    result.update(measure_allocations(benchmark, max(2, number // 10)))
+    return result
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = 0.25,
+    metrics: Sequence[str] = REGRESSION_METRICS,
+) -> List[Dict[str, Any]]:
+    """
+    Find the benchmarks that got worse than the baseline.
+
+    Args:
+        current: The results of this run
+        baseline: The results to compare with
+        threshold: The relative growth that is flagged, e.g. 0.25 for 25%
+        metrics: The metrics to compare; larger values are worse
+
+    Returns:
+        List[Dict[str, Any]]: one entry per regressed metric
+    """
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        for metric in metrics:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            if metric.endswith("_bytes") and new - old < ALLOCATION_NOISE_BYTES:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions.append(
+                    {"benchmark": name, "metric": metric, "baseline": old, "current": new, "change": change}
+                )
+    return regressions
+
+
+def tool_call_message() -> ChatCompletionMessage:
+    """An assistant message that requests get_courses."""
+    return ChatCompletionMessage.model_validate(
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": "call_bench",
+                    "type": "function",
+                    "function": {"name": "get_courses", "arguments": json.dumps(GET_COURSES_ARGUMENTS)},
+                }
+            ],
+        }
+    )
+
+
+def responder(request: Dict[str, Any]) -> Any:
+    """Ask for get_courses after a user's message about courses, and answer in text otherwise."""
+    last = request["messages"][-1]
+    if last["role"] == "user" and "courses" in last["content"]:
+        return {"tool_calls": [{"name": "get_courses", "arguments": GET_COURSES_ARGUMENTS}]}
+    return "We have one AI course under $500: AI101, Foundations of AI."
+
+
+def new_session() -> ConversationSession:
+    """A new conversation with the system prompt."""
+    return ConversationSession(messages=prompt.initial_messages())
+
+
+def clear_tool_results() -> None:
+    """Empty the tool result cache, so that tool calls do their work."""
+    if stackademy.tool_result_cache is not None:
+        stackademy.tool_result_cache.clear()
+
+
+def benchmarks(app: Stackademy) -> List[Benchmark]:
+    """The benchmarks of the suite, from a whole turn down to a database round-trip."""
+
+    def new_tool_session() -> ConversationSession:
+        clear_tool_results()
+        return new_session()
+
+    def streamed_turn(session: ConversationSession) -> None:
+        with prompt.completion("AI courses under $500?", session=session, stream=True) as stream:
+            for _ in stream:
+                pass
+
+    return [
+        Benchmark(
+            "completion (text turn)", lambda session: prompt.completion("Hello!", session=session), 200, new_session
+        ),
+        Benchmark(
+            "completion (tool turn)",
+            lambda session: prompt.completion("AI courses under $500?", session=session),
+            200,
+            new_tool_session,
+        ),
+        Benchmark("completion (streamed tool turn)", streamed_turn, 200, new_tool_session),
+        Benchmark(
+            "process_tool_calls",
+            lambda session: prompt.process_tool_calls(tool_call_message(), session),
+            2000,
+            new_tool_session,
+        ),
+        Benchmark(
+            "handle_function_call",
+            lambda _: prompt.handle_function_call("get_courses", GET_COURSES_ARGUMENTS),
+            2000,
+            clear_tool_results,
+        ),
+        Benchmark("Stackademy.get_courses", lambda _: app.get_courses(**GET_COURSES_ARGUMENTS), 5000),
+        Benchmark("database round-trip", lambda _: app.db.execute_query(LOOKUP_QUERY, ("AI101",)), 5000),
+    ]
+
+
+@contextlib.contextmanager
+def bench_environment(mysql: bool = False) -> Iterator[Stackademy]:
+    """
+    Point the agent at the stub LLM and the benchmark database, with caches of whole responses off.
+
+    Yields:
+        Stackademy: the application that the tools use
+    """
+    app = Stackademy(catalog_snapshot=False)
+    app.db = DatabaseConnection() if mysql else seeded_database()
+    with StubOpenAIServer(responder=responder, profile="instant") as stub:
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(patch("app.settings.OPENAI_BASE_URL", stub.base_url))
+            stack.enter_context(patch("app.settings.OPENAI_API_KEY", "stub"))
+            stack.enter_context(patch.object(stackademy, "stackademy_app", app))
+            stack.enter_context(patch.object(prompt, "completion_cache", None))
+            stack.enter_context(openai_client.scoped_clients())
+            stack.callback(logging.disable, logging.NOTSET)
+            logging.disable(logging.WARNING)
+            yield app
+
+
+def git_commit() -> Optional[str]:
+    """The current commit, if this is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scale: float = 1.0, mysql: bool = False, only: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run the benchmarks.
+
+    Args:
+        scale: Multiplies the number of calls of every benchmark, e.g. 0.1 for a quick run
+        mysql: Use the MySQL database of the settings instead of SQLite
+        only: Run only the benchmarks whose name contains this text
+
+    Returns:
+        Dict[str, Any]: the environment of the run and the results of each benchmark
+    """
+    results: Dict[str, Any] = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": "mysql" if mysql else "sqlite",
+        "settings": {
+            "TOOL_RESULT_CACHE": settings.TOOL_RESULT_CACHE,
+            "COURSE_CODE_CACHE": settings.COURSE_CODE_CACHE,
+            "LLM_TOOL_CHOICE": str(settings.LLM_TOOL_CHOICE),
+        },
+        "benchmarks": {},
+    }
+    with bench_environment(mysql=mysql) as app:
+        for benchmark in benchmarks(app):
+            if only and only.lower() not in benchmark.name.lower():
+                continue
+            results["benchmarks"][benchmark.name] = run_benchmark(benchmark, scale)
+    return results
+
+
+def report(results: Dict[str, Any], regressions: Sequence[Dict[str, Any]] = ()) -> None:
+    """Print one line per benchmark, marking the regressed ones."""
+    regressed = {regression["benchmark"] for regression in regressions}
+    print(f"{results['commit'] or '-'} python {results['python']} on {results['platform']}, {results['database']}")
+    print(
+        f"  {'benchmark':<32} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'ops/s':>10} {'alloc KiB':>10}"
+        f" {'kept KiB':>9}"
+    )
+    for name, result in results["benchmarks"].items():
+        print(
+            f"{'!' if name in regressed else ' '} {name:<32} {result['p50_us']:>10.1f} {result['p95_us']:>10.1f}"
+            f" {result['p99_us']:>10.1f} {result['ops_per_second']:>10.1f} {result['alloc_peak_bytes'] / 1024:>10.1f}"
+            f" {result['alloc_retained_bytes'] / 1024:>9.1f}"
+        )
+    for regression in regressions:
+        print(
+            f"regression: {regression['benchmark']} {regression['metric']} {regression['baseline']:g} ->"
+            f" {regression['current']:g} (+{regression['change']:.0%})"
+        )
+
+
+def write_results(results: Dict[str, Any], path: str) -> None:
+    """Save results as JSON."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+
+def add_baseline_arguments(
+    parser: argparse.ArgumentParser, latest_path: str = LATEST_PATH, baseline_path: str = BASELINE_PATH
+) -> None:
+    """Add the options that save_and_compare() reads: --output, --baseline, --threshold and --save-baseline."""
+    parser.add_argument("--output", default=latest_path, help="where to save the results")
+    parser.add_argument("--baseline", default=baseline_path, help="results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative growth flagged as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+
+
+def save_and_compare(
+    results: Dict[str, Any],
+    args: argparse.Namespace,
+    report_results: Callable[[Dict[str, Any], Sequence[Dict[str, Any]]], None] = report,
+    metrics: Sequence[str] = REGRESSION_METRICS,
+) -> None:
+    """
+    Save the results, compare them with the baseline and print them; exit with status 1 on regressions.
+
+    Args:
+        results: The results of this run
+        args: The parsed options of add_baseline_arguments()
+        report_results: Prints the results and the regressions
+        metrics: The metrics that are compared with the baseline
+    """
+    write_results(results, args.output)
+
+    regressions: List[Dict[str, Any]] = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), threshold=args.threshold, metrics=metrics)
+    report_results(results, regressions)
+    print(f"results saved to {args.output}")
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"baseline saved to {args.baseline}")
+    if regressions:
+        sys.exit(1)
+
+
+def main() -> None:
+    """Run the suite, save the results and compare them with the baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop and flag regressions.")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the number of calls, e.g. 0.1")
+    parser.add_argument("--mysql", action="store_true", help="use the MySQL database of the settings")
+    parser.add_argument("--only", help="run only the benchmarks whose name contains this text")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    results = run_suite(scale=args.scale, mysql=args.mysql, only=args.only)
+    save_and_compare(results, args)
+
+
+if __name__ == "__main__":
+    main()
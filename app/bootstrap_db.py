@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Create the Stackademy tables and indexes in the MySQL database configured in .env.
+
+Safe to run repeatedly: tables are only created when missing, columns are
+only added when missing, and unique indexes are only added when no unique
+index on the same columns exists yet.
+An index of the expected name on other columns is reported, not replaced.
+
+usage: python -m app.bootstrap_db [--seed]
+"""
+
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+from app.database import DatabaseConnection, get_db
+from app.logging_config import get_logger, setup_logging
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+TABLES: List[Tuple[str, str]] = [
+    (
+        "courses",
+        """
+        CREATE TABLE IF NOT EXISTS courses (
+            course_id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+            course_code VARCHAR(20) NOT NULL,
+            course_name VARCHAR(255) NOT NULL,
+            description TEXT,
+            cost DECIMAL(10, 2),
+            prerequisite_id INT UNSIGNED NULL,
+            updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+            PRIMARY KEY (course_id),
+            UNIQUE KEY uq_courses_course_code (course_code),
+            CONSTRAINT fk_courses_prerequisite FOREIGN KEY (prerequisite_id) REFERENCES courses (course_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    ),
+    (
+        "enrollments",
+        """
+        CREATE TABLE IF NOT EXISTS enrollments (
+            enrollment_id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+            course_code VARCHAR(20) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            full_name VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (enrollment_id),
+            UNIQUE KEY uq_enrollments_course_email (course_code, email)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    ),
+]
+
+# columns added to tables that existed before this script created them: (table, column, ddl)
+# courses.updated_at versions the catalog snapshot, see STACKADEMY_CATALOG_VERSION_QUERY; microsecond
+# precision, so that an edit in the same second as a version check still changes the version
+COLUMNS: List[Tuple[str, str, str]] = [
+    (
+        "courses",
+        "updated_at",
+        "ALTER TABLE courses ADD COLUMN updated_at TIMESTAMP(6) NOT NULL "
+        "DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)",
+    ),
+]
+
+COLUMN_EXISTS_QUERY = """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+        """
+
+# unique indexes added to tables that existed before this script created them: (table, index, columns, ddl)
+INDEXES: List[Tuple[str, str, Tuple[str, ...], str]] = [
+    (
+        "courses",
+        "uq_courses_course_code",
+        ("course_code",),
+        "ALTER TABLE courses ADD UNIQUE KEY uq_courses_course_code (course_code)",
+    ),
+    (
+        "enrollments",
+        "uq_enrollments_course_email",
+        ("course_code", "email"),
+        "ALTER TABLE enrollments ADD UNIQUE KEY uq_enrollments_course_email (course_code, email)",
+    ),
+]
+
+UNIQUE_INDEXES_QUERY = """
+        SELECT index_name, column_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND non_unique = 0
+        ORDER BY index_name, seq_in_index
+        """
+
+
+def unique_indexes(cursor, table: str) -> Dict[str, Tuple[str, ...]]:
+    """
+    The unique indexes of a table.
+
+    Args:
+        cursor: An open cursor
+        table: The table name
+
+    Returns:
+        Dict[str, Tuple[str, ...]]: The columns of each unique index, in index order, by index name
+    """
+    cursor.execute(UNIQUE_INDEXES_QUERY, (table,))
+    indexes: Dict[str, Tuple[str, ...]] = {}
+    for row in cursor.fetchall():
+        # information_schema column names are upper case on MySQL 8
+        row = {key.lower(): value for key, value in row.items()}
+        indexes[row["index_name"]] = indexes.get(row["index_name"], ()) + (row["column_name"],)
+    return indexes
+
+
+SEED_COURSES = [
+    ("AI101", "Foundations of AI", "An introduction to AI and machine learning.", 499.00),
+    ("WEB101", "Web Development Basics", "HTML, CSS and JavaScript for the web.", 199.00),
+    ("DB101", "Relational Database Design", "Data modeling for database applications.", 299.00),
+    ("MOB101", "Mobile Apps", "Build mobile apps for iOS and Android.", 399.00),
+    ("NET101", "Networking Fundamentals", "How a network moves data.", 249.00),
+    ("NN201", "Neural Networks", "Deep learning with neural networks.", 899.00),
+]
+
+SEED_QUERY = "INSERT IGNORE INTO courses (course_code, course_name, description, cost) VALUES (%s, %s, %s, %s)"
+
+
+def bootstrap(database: Optional[DatabaseConnection] = None, seed: bool = False) -> List[str]:
+    """
+    Create missing tables and indexes.
+
+    Args:
+        database: The database to bootstrap, by default the configured one
+        seed: Also insert a few sample courses, if they do not exist
+
+    Returns:
+        List[str]: The tables, columns and indexes that were checked or created, for reporting
+    """
+    database = database or get_db()
+    report = []
+    with database.get_cursor() as cursor:
+        for table, ddl in TABLES:
+            cursor.execute(ddl)
+            report.append(f"table {table}: ok")
+        for table, column, ddl in COLUMNS:
+            cursor.execute(COLUMN_EXISTS_QUERY, (table, column))
+            if cursor.fetchone():
+                report.append(f"column {table}.{column}: exists")
+                continue
+            cursor.execute(ddl)
+            report.append(f"column {table}.{column}: created")
+        for table, index, columns, ddl in INDEXES:
+            existing = unique_indexes(cursor, table)
+            same = [name for name, indexed in existing.items() if indexed == columns]
+            if same:
+                report.append(f"index {table}.{index}: exists as {same[0]}")
+            elif index in existing:
+                logger.warning("Index %s.%s is on %s, expected %s", table, index, existing[index], columns)
+                report.append(f"index {table}.{index}: exists on other columns {', '.join(existing[index])}")
+            else:
+                cursor.execute(ddl)
+                report.append(f"index {table}.{index}: created")
+        if seed:
+            cursor.executemany(SEED_QUERY, SEED_COURSES)
+            report.append(f"seeded {cursor.rowcount} courses")
+    for line in report:
+        logger.info(line)
+    return report
+
+
+def main() -> None:
+    """Bootstrap the configured database."""
+    parser = argparse.ArgumentParser(description="Create the Stackademy tables and indexes.")
+    parser.add_argument("--seed", action="store_true", help="insert sample courses")
+    args = parser.parse_args()
+    logger.info("Bootstrapping %s", get_db().connection_string)
+    bootstrap(seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
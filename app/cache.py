@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""Bounded LRU caches with a TTL, in memory or shared between processes in SQLite or files."""
+
+import abc
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.logging_config import get_logger, setup_logging
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+CACHE_BACKENDS = ("memory", "sqlite", "file")
+
+
+class BaseCache(abc.ABC):  # pylint: disable=too-many-instance-attributes
+    """
+    Common counters and invalidation of the cache backends.
+
+    Keys and values are strings. A ttl of 0 keeps entries until they are
+    evicted. clear() advances the generation, so that a value computed before
+    an invalidation can be discarded instead of stored; see set().
+    """
+
+    backend = "base"
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value, or None."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: str, generation: Optional[int] = None) -> None:
+        """
+        Store a value.
+
+        Args:
+            key: The cache key
+            value: The value
+            generation: The generation read before the value was computed. If
+                the cache has been cleared since, the value is not stored.
+        """
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove one entry."""
+
+    @abc.abstractmethod
+    def _clear(self) -> None:
+        """Remove all entries. Caller must hold the lock."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """The number of entries."""
+
+    def clear(self) -> None:
+        """Remove all entries, e.g. because the data they were computed from changed."""
+        with self._lock:
+            self._clear()
+            self.generation += 1
+            self.invalidations += 1
+        logger.debug("Cleared %s cache", self.backend)
+
+    def _expires_at(self, now: float) -> Optional[float]:
+        return now + self.ttl if self.ttl > 0 else None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report the cache counters.
+
+        Returns:
+            Dict[str, Any]: entries, hits, misses, evictions, expirations, invalidations and hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemoryCache(BaseCache):
+    """Thread-safe in-process LRU cache with a TTL."""
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str, generation: Optional[int] = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = (self._expires_at(time.monotonic()), value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _clear(self) -> None:
+        self._entries.clear()
+
+
+class SQLiteCache(BaseCache):
+    """
+    LRU cache with a TTL in a local SQLite database.
+
+    Every process that opens the same file shares the entries, so a result
+    computed by one worker process is a hit for the others. Put the file on a
+    tmpfs such as /dev/shm to keep it in shared memory. The counters are per
+    process.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 1024, ttl: float = 300.0):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"Invalid cache table name: {table}")
+        self.path = path
+        self.table = table
+        self._connection = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, used_at REAL NOT NULL)"
+        )
+        self._connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_used_at ON {table} (used_at)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        # wall clock time, because the entries are shared with other processes
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                value, expires_at = row
+                if expires_at is None or now < expires_at:
+                    self._connection.execute(f"UPDATE {self.table} SET used_at = ? WHERE key = ?", (now, key))
+                    self.hits += 1
+                    return value
+                self._connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str, generation: Optional[int] = None) -> None:
+        now = time.time()
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, value, self._expires_at(now), now),
+            )
+            excess = self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY used_at LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _clear(self) -> None:
+        self._connection.execute(f"DELETE FROM {self.table}")
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+class FileCache(BaseCache):
+    """
+    LRU cache with a TTL that keeps one JSON file per entry in a directory.
+
+    Entries survive restarts and can be inspected, copied or committed, e.g.
+    to replay recorded conversations. Files are written atomically, so several
+    processes can share the directory. The modification time of a file is its
+    last use. The counters are per process.
+    """
+
+    backend = "file"
+
+    def __init__(self, path: str, max_entries: int = 1024, ttl: float = 300.0):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _files(self):
+        return [entry for entry in os.scandir(self.path) if entry.is_file() and entry.name.endswith(".json")]
+
+    def __len__(self) -> int:
+        return len(self._files())
+
+    def get(self, key: str) -> Optional[str]:
+        filename = self._filename(key)
+        with self._lock:
+            try:
+                with open(filename, encoding="utf-8") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                entry = None
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable cache file %s: %s", filename, e)
+                entry = None
+            if entry is not None and entry.get("key") == key:
+                expires_at = entry.get("expires_at")
+                if expires_at is None or time.time() < expires_at:
+                    self._touch(filename)
+                    self.hits += 1
+                    return entry["value"]
+                self._remove(filename)
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str, generation: Optional[int] = None) -> None:
+        filename = self._filename(key)
+        entry = {"key": key, "value": value, "expires_at": self._expires_at(time.time())}
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, filename)
+            self._touch(filename)
+            files = self._files()
+            excess = len(files) - self.max_entries
+            if excess > 0:
+                files.sort(key=lambda entry: entry.stat().st_mtime)
+                for stale in files[:excess]:
+                    self._remove(stale.path)
+                self.evictions += excess
+
+    @staticmethod
+    def _touch(filename: str) -> None:
+        """Mark a file as used now, with an explicit timestamp, which keeps full precision."""
+        now = time.time_ns()
+        os.utime(filename, ns=(now, now))
+
+    @staticmethod
+    def _remove(filename: str) -> None:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(self._filename(key))
+
+    def _clear(self) -> None:
+        for entry in self._files():
+            self._remove(entry.path)
+
+
+def create_cache(
+    backend: str = "memory",
+    max_entries: int = 1024,
+    ttl: float = 300.0,
+    path: Optional[str] = None,
+    table: str = "cache",
+) -> BaseCache:
+    """
+    Build a cache.
+
+    Args:
+        backend: "memory" for a per-process cache, "sqlite" for one shared through the file at path,
+            "file" for one file per entry in the directory at path
+        max_entries: Maximum number of entries before the least recently used are evicted
+        ttl: Seconds an entry stays valid, 0 for no expiry
+        path: SQLite database file or cache directory, required for the sqlite and file backends
+        table: SQLite table, so that several caches can share one file
+
+    Returns:
+        BaseCache: The cache
+    """
+    if backend == "memory":
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("The sqlite cache backend requires a path")
+        return SQLiteCache(path=path, table=table, max_entries=max_entries, ttl=ttl)
+    if backend == "file":
+        if not path:
+            raise ValueError("The file cache backend requires a path")
+        return FileCache(path=path, max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown cache backend: {backend}. Expected one of {', '.join(CACHE_BACKENDS)}")
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""In-memory snapshot of the Stackademy course catalog with indexed filtering."""
+
+import re
+import threading
+import time
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Optional
+
+from app.logging_config import get_logger, setup_logging
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+COURSES_QUERY = """
+        SELECT
+            c.course_code,
+            c.course_name,
+            c.description,
+            c.cost,
+            prerequisite.course_code AS prerequisite_course_code,
+            prerequisite.course_name AS prerequisite_course_name
+        FROM courses c
+        LEFT JOIN courses prerequisite ON c.prerequisite_id = prerequisite.course_id
+        """
+COURSES_ORDER_BY = " ORDER BY c.prerequisite_id, c.course_id"
+
+
+def like_pattern(text: str) -> "re.Pattern[str]":
+    """Translate the SQL pattern '%text%' into an equivalent case-insensitive regex."""
+    parts = []
+    escaped = False
+    for char in text:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+class CatalogSnapshot:
+    """
+    Immutable, indexed copy of the course catalog.
+
+    Rows are kept in the same order as the SQL query returns them. Lookups by
+    specialization area use an inverted index of row positions, and max_cost
+    filtering bisects a cost-sorted array, so neither requires scanning the
+    whole catalog.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], areas: List[str], version: Any = None):
+        self.rows = rows
+        self.version = version
+
+        # inverted index: casefolded area -> ascending row positions whose description contains it
+        self.area_index: Dict[str, List[int]] = {}
+        folded_descriptions = [str(row.get("description") or "").casefold() for row in rows]
+        for area in areas:
+            needle = area.casefold()
+            self.area_index[needle] = [i for i, text in enumerate(folded_descriptions) if needle in text]
+        self._folded_descriptions = folded_descriptions
+
+        # cost-sorted positions; rows without a cost never satisfy "cost <= x", same as SQL
+        priced = sorted((row["cost"], i) for i, row in enumerate(rows) if row.get("cost") is not None)
+        self.costs = [cost for cost, _ in priced]
+        self.positions_by_cost = [i for _, i in priced]
+        self.cost_rank = {position: rank for rank, position in enumerate(self.positions_by_cost)}
+
+    def _positions_for_description(self, description: str) -> List[int]:
+        """Row positions matching "description LIKE '%<description>%'"."""
+        needle = description.casefold()
+        positions = self.area_index.get(needle)
+        if positions is not None:
+            return positions
+        if any(char in description for char in "%_\\"):
+            pattern = like_pattern(description)
+            return [i for i, text in enumerate(self._folded_descriptions) if pattern.search(text)]
+        return [i for i, text in enumerate(self._folded_descriptions) if needle in text]
+
+    def filter(self, description: Optional[str] = None, max_cost: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Return the rows matching the filters, in catalog order.
+
+        Args:
+            description (str, optional): Text the course description must contain
+            max_cost (float, optional): Maximum course cost
+
+        Returns:
+            List[Dict[str, Any]]: Copies of the matching rows
+        """
+        if max_cost is not None:
+            cutoff = bisect_right(self.costs, max_cost)
+
+        if description is not None:
+            positions = self._positions_for_description(str(getattr(description, "value", description)))
+            if max_cost is not None:
+                positions = [i for i in positions if self.cost_rank.get(i, cutoff) < cutoff]
+        elif max_cost is not None:
+            positions = sorted(self.positions_by_cost[:cutoff])
+        else:
+            positions = range(len(self.rows))
+
+        return [dict(self.rows[i]) for i in positions]
+
+
+class CourseCatalog:  # pylint: disable=too-many-instance-attributes
+    """
+    Lazily loaded, periodically revalidated catalog snapshot.
+
+    The snapshot is loaded on first use. Once it is older than ttl seconds, a
+    cheap version query is run; the snapshot is only reloaded when the version
+    has changed. The version must change with any edit of a row, e.g. the
+    latest updated_at of the courses with their count. Without a version query,
+    or when it fails, the snapshot is reloaded every ttl seconds instead.
+    Listeners registered with add_listener() are notified whenever the catalog
+    content changes or is invalidated.
+    """
+
+    def __init__(
+        self,
+        db,
+        areas: List[str],
+        ttl: float = 300.0,
+        version_query: Optional[str] = None,
+    ):
+        self.db = db
+        self.areas = areas
+        self.ttl = ttl
+        self.version_query = version_query
+        self.generation = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Register a callback that is invoked when the catalog changes."""
+        self._listeners.append(callback)
+
+    def _notify(self) -> None:
+        """Advance the generation and inform listeners of a catalog change."""
+        self.generation += 1
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Catalog change listener failed: %s", e)
+
+    def _fetch_version(self) -> Any:
+        """Run the version query, returning None when versioning is disabled or the query fails."""
+        if not self.version_query:
+            return None
+        try:
+            rows = self.db.execute_query(self.version_query)
+        except Exception as e:  # pylint: disable=broad-except
+            # e.g. courses.updated_at is missing until app.bootstrap_db has been run
+            logger.warning("Catalog version query failed, reloading the catalog instead: %s", e)
+            return None
+        return tuple(rows[0].values()) if rows else None
+
+    def _load(self, version: Any) -> CatalogSnapshot:
+        """Read the full catalog from the database."""
+        rows = self.db.execute_query(COURSES_QUERY + COURSES_ORDER_BY)
+        snapshot = CatalogSnapshot(rows=list(rows), areas=self.areas, version=version)
+        logger.info("Loaded course catalog snapshot with %d rows from %s", len(rows), self.db.connection_string)
+        return snapshot
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Return a current snapshot, loading or revalidating it as needed."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+            return snapshot
+
+        with self._lock:
+            # another thread may have refreshed while we waited for the lock
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self._snapshot
+            previous = self._snapshot
+            version = self._fetch_version()
+            if previous is None or version is None or version != previous.version:
+                self._snapshot = self._load(version)
+                # without a version, only a reload shows whether the content changed
+                if previous is not None and (version is not None or self._snapshot.rows != previous.rows):
+                    self._notify()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def get_courses(self, description: Optional[str] = None, max_cost: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Filter the catalog snapshot exactly as Stackademy.get_courses() filters in SQL."""
+        return self.snapshot().filter(description=description, max_cost=max_cost)
+
+    def invalidate(self) -> None:
+        """Drop the snapshot so that the next read reloads it, e.g. after the catalog was edited."""
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+        self._notify()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Token-budgeted compaction of conversation histories."""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+from app.logging_config import get_logger, setup_logging
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+# rough average for English text and JSON with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+# per-message framing tokens (role, separators) added by the chat format
+TOKENS_PER_MESSAGE = 4
+# end of the note appended to a truncated tool result
+OMITTED_MARKER = " characters of an earlier tool result omitted]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a string without calling a tokenizer."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_role(message: Any) -> Any:
+    """Return the role of a message given as a dict or a pydantic model."""
+    return message.get("role") if isinstance(message, dict) else getattr(message, "role", None)
+
+
+def message_tokens(message: Any) -> int:
+    """Estimate the prompt tokens consumed by one chat message, including tool calls."""
+    if hasattr(message, "model_dump"):
+        message = message.model_dump()
+    tokens = TOKENS_PER_MESSAGE
+    content = message.get("content")
+    if isinstance(content, str):
+        tokens += estimate_tokens(content)
+    elif content:
+        tokens += estimate_tokens(json.dumps(content, default=str))
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function") or {}
+        tokens += estimate_tokens(function.get("name", "")) + estimate_tokens(function.get("arguments", ""))
+    return tokens
+
+
+def messages_tokens(messages: List[Any]) -> int:
+    """Estimate the prompt tokens consumed by a list of chat messages."""
+    return sum(message_tokens(message) for message in messages)
+
+
+def shrink_tool_result(content: str, max_chars: int) -> str:
+    """
+    Shrink a tool result that is being kept for context only.
+
+    JSON results are first re-serialized without indentation, which is
+    lossless. Anything still longer than max_chars is truncated. A result
+    that was already truncated is returned as is, so that it is not shrunk
+    again on every request.
+    """
+    if content.endswith(OMITTED_MARKER):
+        return content
+    try:
+        content = json.dumps(json.loads(content), default=str, separators=(",", ":"))
+    except (TypeError, ValueError):
+        pass
+    if len(content) <= max_chars:
+        return content
+    truncated = f"{content[:max_chars]}...[{len(content) - max_chars}{OMITTED_MARKER}"
+    return truncated if len(truncated) < len(content) else content
+
+
+class HistoryCompactor:
+    """
+    Keep a conversation history within a prompt-token budget.
+
+    The history is split into the preamble (the system prompt and anything
+    before the first user message) and turns, each starting with a user
+    message. Tool results in turns older than the last keep_turns are shrunk;
+    the preamble and the last keep_turns turns are never shrunk. Then whole
+    turns are dropped, oldest first, until the estimated size fits
+    token_budget, which may drop turns among the last keep_turns too. The
+    latest turn is always kept, so that assistant tool calls and their results
+    stay paired.
+    """
+
+    def __init__(self, keep_turns: int = 6, token_budget: int = 8000, tool_result_max_chars: int = 500):
+        self.keep_turns = max(keep_turns, 1)
+        self.token_budget = token_budget
+        self.tool_result_max_chars = tool_result_max_chars
+
+    @staticmethod
+    def split_turns(messages: List[Any]) -> Tuple[List[Any], List[List[Any]]]:
+        """Split a history into its preamble and a list of turns."""
+        preamble: List[Any] = []
+        turns: List[List[Any]] = []
+        for message in messages:
+            if message_role(message) == "user":
+                turns.append([message])
+            elif turns:
+                turns[-1].append(message)
+            else:
+                preamble.append(message)
+        return preamble, turns
+
+    def _shrink_turn(self, turn: List[Any]) -> Tuple[List[Any], int]:
+        """Shrink the tool results of an old turn. Returns the new turn and the number of results shrunk."""
+        shrunk = 0
+        result = []
+        for message in turn:
+            content = message.get("content") if isinstance(message, dict) else None
+            if message_role(message) == "tool" and isinstance(content, str):
+                compact = shrink_tool_result(content, self.tool_result_max_chars)
+                if compact != content:
+                    message = {**message, "content": compact}
+                    shrunk += 1
+            result.append(message)
+        return result, shrunk
+
+    def compact(self, messages: List[Any]) -> Tuple[List[Any], Dict[str, int]]:
+        """
+        Compact a history.
+
+        Args:
+            messages: The conversation history. It is not modified.
+
+        Returns:
+            tuple: The compacted history and statistics about what was saved
+        """
+        preamble, turns = self.split_turns(messages)
+        tokens_before = messages_tokens(messages)
+
+        tool_results_shrunk = 0
+        old_turns = max(len(turns) - self.keep_turns, 0)
+        for i in range(old_turns):
+            turns[i], shrunk = self._shrink_turn(turns[i])
+            tool_results_shrunk += shrunk
+
+        turns_dropped = 0
+        if self.token_budget > 0:
+            turn_tokens = [messages_tokens(turn) for turn in turns]
+            total = messages_tokens(preamble) + sum(turn_tokens)
+            while total > self.token_budget and turns_dropped < len(turns) - 1:
+                total -= turn_tokens[turns_dropped]
+                turns_dropped += 1
+            turns = turns[turns_dropped:]
+
+        compacted = preamble + [message for turn in turns for message in turn]
+        tokens_after = messages_tokens(compacted) if (tool_results_shrunk or turns_dropped) else tokens_before
+        stats = {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "turns_dropped": turns_dropped,
+            "tool_results_shrunk": tool_results_shrunk,
+        }
+        return compacted, stats
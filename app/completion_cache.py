@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Exact-match cache of chat completions for deterministic requests."""
+
+import hashlib
+import json
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from app.cache import BaseCache
+from app.logging_config import get_logger, setup_logging
+from app.utils import to_jsonable
+
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+
+setup_logging()
+logger = get_logger(__name__)
+
+# the request arguments that determine the completion
+KEY_FIELDS = ("model", "messages", "tools", "tool_choice", "temperature", "max_tokens")
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """
+    Build a stable hash of the arguments of a chat completion request.
+
+    Messages may be dicts or pydantic models; dict keys are sorted, so the
+    hash does not depend on the order in which fields were set.
+    """
+    payload = {field: to_jsonable(request.get(field)) for field in KEY_FIELDS}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    Serve repeated chat completion requests from a cache.
+
+    Responses are stored as their ChatCompletion model dump together with the
+    latency and token usage of the original API call, so that every hit
+    reports how much time and how many tokens it saved.
+    """
+
+    def __init__(self, cache: BaseCache):
+        self.cache = cache
+        self.saved_latency = 0.0
+        self.saved_tokens = 0
+        self._lock = threading.Lock()
+
+    def get(self, request: Dict[str, Any]) -> Optional["ChatCompletion"]:
+        """Return the cached response to a request, or None."""
+        # pylint: disable=import-outside-toplevel
+        from openai.types.chat import ChatCompletion
+
+        value = self.cache.get(request_key(request))
+        if value is None:
+            return None
+        try:
+            entry = json.loads(value)
+            response = ChatCompletion.model_validate(entry["response"])
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Discarding unreadable cached completion: %s", e)
+            self.cache.delete(request_key(request))
+            return None
+        with self._lock:
+            self.saved_latency += entry.get("latency", 0.0)
+            self.saved_tokens += entry.get("total_tokens", 0)
+        logger.debug("Completion cache hit %s", response.id)
+        return response
+
+    def put(self, request: Dict[str, Any], response: "ChatCompletion", latency: float) -> None:
+        """
+        Store the response to a request.
+
+        Args:
+            request: The chat completion request arguments
+            response: The API response
+            latency: Seconds the API call took
+        """
+        usage = getattr(response, "usage", None)
+        entry = {
+            "latency": latency,
+            "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+            "response": response.model_dump(mode="json"),
+        }
+        self.cache.set(request_key(request), json.dumps(entry))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report the cache counters.
+
+        Returns:
+            Dict[str, Any]: the backend counters plus saved_latency (seconds) and saved_tokens
+        """
+        return {**self.cache.stats(), "saved_latency": self.saved_latency, "saved_tokens": self.saved_tokens}
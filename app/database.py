@@ -1,28 +1,115 @@
 # -*- coding: utf-8 -*-
 """Database connection and utilities for MySQL."""
 
+import threading
 from contextlib import contextmanager
-from typing import Any, Dict, Iterator, List, Optional
-
-import pymysql
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
 
 from app.exceptions import ConfigurationException
 from app.logging_config import get_logger, setup_logging
+from app.metrics import DB_CONNECT_SECONDS, DB_QUERY_SECONDS, registry
+from app.pool import ConnectionPool, PooledConnection
 from app.settings import (
     MYSQL_CHARSET,
     MYSQL_DATABASE,
     MYSQL_HOST,
     MYSQL_PASSWORD,
+    MYSQL_POOL_CHECKOUT_TIMEOUT,
+    MYSQL_POOL_IDLE_TIMEOUT,
+    MYSQL_POOL_MAX_LIFETIME,
+    MYSQL_POOL_MAX_SIZE,
+    MYSQL_POOL_MIN_SIZE,
+    MYSQL_POOL_PING_ON_CHECKOUT,
     MYSQL_PORT,
     MYSQL_USER,
 )
+from app.tracing import traced
+from app.utils import LazyStr, lazy_import
 
 
 setup_logging()
 logger = get_logger(__name__)
+pymysql = lazy_import("pymysql")
+
+
+def squash_whitespace(query: str) -> str:
+    """Collapse a multi-line SQL statement onto one line for logging."""
+    return " ".join(query.split())
+
+
+class QueryStream:
+    """
+    Iterator over the rows of a query that are streamed from the server.
+
+    The query runs on first use: iterating, or reading columns. Rows are dicts,
+    or tuples in the order of columns when as_tuples is set; with a batch_size
+    the stream yields lists of up to batch_size rows instead. Only the current
+    row or batch is held in memory.
+
+    Iterate to the end, or call close() (or use the stream as a context
+    manager) to release the database connection early.
+    """
+
+    def __init__(self, rows: Callable[["QueryStream"], Iterator[Any]]):
+        self.columns: List[str] = []
+        self.rowcount = 0
+        self._generator = rows(self)
+        self._started = False
+
+    def _start(self) -> None:
+        """Execute the query; the generator sets the columns and pauses before the first row."""
+        if not self._started:
+            self._started = True
+            next(self._generator)
 
+    def __iter__(self) -> "QueryStream":
+        return self
 
-class DatabaseConnection:
+    def __next__(self) -> Any:
+        self._start()
+        return next(self._generator)
+
+    def __enter__(self) -> "QueryStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> List[str]:
+        """Run the query without consuming rows, e.g. to write a header; returns the columns."""
+        self._start()
+        return self.columns
+
+    def close(self) -> None:
+        """Stop streaming and release the connection."""
+        self._generator.close()
+
+    def feed(self, cursor: Any, batch_size: int, rows: Iterable[Any]) -> Iterator[Any]:
+        """
+        The part of a rows generator that follows cursor.execute(): set the columns,
+        pause before the first row, then yield the rows or batches and count them.
+
+        Args:
+            cursor: The cursor that executed the query
+            batch_size (int): Yield lists of up to batch_size rows from cursor.fetchmany() instead of rows
+            rows: The rows of the cursor, consumed when batch_size is 0
+        """
+        self.columns = [column[0] for column in cursor.description or ()]
+        yield None
+        if batch_size > 0:
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                self.rowcount += len(batch)
+                yield list(batch)
+        else:
+            for row in rows:
+                self.rowcount += 1
+                yield row
+
+
+class DatabaseConnection:  # pylint: disable=too-many-instance-attributes
     """MySQL database connection manager."""
 
     def __init__(self):
@@ -41,12 +128,30 @@ class DatabaseConnection:
                 "MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DATABASE"
             )
 
+        self.pool: Optional[ConnectionPool] = None
+        if MYSQL_POOL_MAX_SIZE > 0:
+            self.pool = ConnectionPool(
+                connect=lambda: self.get_connection(),  # pylint: disable=unnecessary-lambda
+                min_size=MYSQL_POOL_MIN_SIZE,
+                max_size=MYSQL_POOL_MAX_SIZE,
+                idle_timeout=MYSQL_POOL_IDLE_TIMEOUT,
+                max_lifetime=MYSQL_POOL_MAX_LIFETIME,
+                checkout_timeout=MYSQL_POOL_CHECKOUT_TIMEOUT,
+                ping_on_checkout=MYSQL_POOL_PING_ON_CHECKOUT,
+            )
+        # the pool is warmed on the first checkout, not here: the shared instance is
+        # created on import, which must not need a reachable database
+        self._warmed = False
+        self._warm_lock = threading.Lock()
+
     @property
     def connection_string(self) -> str:
         """Return the database connection string."""
         return f"{self.user}@{self.host}:{self.port}/{self.database}"
 
-    def get_connection(self) -> pymysql.Connection:
+    @traced("DatabaseConnection.get_connection")
+    @DB_CONNECT_SECONDS.timed()
+    def get_connection(self) -> "pymysql.Connection":
         """
         Create and return a new MySQL connection.
 
@@ -73,10 +178,15 @@ class DatabaseConnection:
             raise pymysql.Error(f"Failed to connect to MySQL database: {e}")
 
     @contextmanager
-    def get_cursor(self) -> Iterator[pymysql.cursors.DictCursor]:
+    def get_cursor(self) -> Iterator["pymysql.cursors.DictCursor"]:
         """
         Context manager for database operations with automatic connection handling.
 
+        Connections are checked out of the connection pool and returned to it
+        afterwards. A connection that raised an error is closed rather than
+        returned, since its session state is unknown. When pooling is disabled
+        a new connection is opened and closed for every call.
+
         Yields:
             pymysql.cursors.DictCursor: Database cursor for executing queries
 
@@ -85,6 +195,42 @@ class DatabaseConnection:
                 cursor.execute("SELECT * FROM courses")
                 results = cursor.fetchall()
         """
+        if self.pool is None:
+            with self._unpooled_cursor() as cursor:
+                yield cursor
+            return
+
+        pooled = self._acquire()
+        connection = pooled.connection
+        succeeded = False
+        try:
+            cursor = connection.cursor()
+            yield cursor
+            connection.commit()
+            succeeded = True
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            # any other exit, including KeyboardInterrupt, CancelledError and
+            # GeneratorExit, discards the connection rather than leaking its slot
+            self.pool.release(pooled, discard=not succeeded)
+
+    def _acquire(self) -> PooledConnection:
+        """Check a connection out of the pool, opening its MYSQL_POOL_MIN_SIZE connections on the first checkout."""
+        if not self._warmed:
+            with self._warm_lock:
+                if not self._warmed:
+                    try:
+                        self.pool.warm()
+                    except Exception as e:  # pylint: disable=broad-except
+                        logger.warning("Could not open %d pooled connections: %s", self.pool.min_size, e)
+                    self._warmed = True
+        return self.pool.acquire()
+
+    @contextmanager
+    def _unpooled_cursor(self) -> Iterator["pymysql.cursors.DictCursor"]:
+        """Open a dedicated connection for a single unit of work."""
         connection = None
         try:
             connection = self.get_connection()
@@ -99,6 +245,17 @@ class DatabaseConnection:
             if connection:
                 connection.close()
 
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Return connection pool statistics.
+
+        Returns:
+            Dict[str, Any]: Pool counters, or an empty dict when pooling is disabled
+        """
+        return self.pool.stats() if self.pool else {}
+
+    @traced("DatabaseConnection.execute_query")
+    @DB_QUERY_SECONDS.timed("query")
     def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
         """
         Execute a SELECT query and return results.
@@ -110,11 +267,55 @@ class DatabaseConnection:
         Returns:
             List[Dict[str, Any]]: Query results as list of dictionaries
         """
-        logger.debug("Executing query: %s with params: %s", query, params)
+        logger.debug("Executing query: %s with params: %s", LazyStr(squash_whitespace, query), params)
         with self.get_cursor() as cursor:
             cursor.execute(query, params or ())
             return list(cursor.fetchall())
 
+    def iter_query(
+        self, query: str, params: Optional[tuple] = None, batch_size: int = 0, as_tuples: bool = False
+    ) -> QueryStream:
+        """
+        Execute a SELECT query and stream its results with a server-side cursor.
+
+        Unlike execute_query(), memory use does not grow with the size of the
+        result set, e.g. for exports. The connection is busy until the stream is
+        exhausted or closed; a stream that is closed early discards its
+        connection rather than reading the remaining rows.
+
+        Args:
+            query (str): SQL query to execute
+            params (tuple, optional): Parameters for the query
+            batch_size (int): Yield lists of up to batch_size rows instead of single rows
+            as_tuples (bool): Yield tuples in the order of QueryStream.columns instead of dicts
+
+        Returns:
+            QueryStream: The rows or batches
+        """
+        cursor_class = pymysql.cursors.SSCursor if as_tuples else pymysql.cursors.SSDictCursor
+
+        def rows(stream: QueryStream) -> Iterator[Any]:
+            logger.debug("Streaming query: %s with params: %s", LazyStr(squash_whitespace, query), params)
+            pooled = self._acquire() if self.pool is not None else None
+            connection = pooled.connection if pooled is not None else self.get_connection()
+            completed = False
+            try:
+                cursor = connection.cursor(cursor_class)
+                cursor.execute(query, params or ())
+                yield from stream.feed(cursor, batch_size, cursor.fetchall_unbuffered())
+                cursor.close()
+                connection.commit()
+                completed = True
+            finally:
+                if pooled is not None:
+                    self.pool.release(pooled, discard=not completed)
+                else:
+                    connection.close()
+
+        return QueryStream(rows)
+
+    @traced("DatabaseConnection.execute_update")
+    @DB_QUERY_SECONDS.timed("update")
     def execute_update(self, query: str, params: Optional[tuple] = None) -> int:
         """
         Execute an INSERT, UPDATE, or DELETE query.
@@ -126,11 +327,34 @@ class DatabaseConnection:
         Returns:
             int: Number of affected rows
         """
-        logger.debug("Executing update: %s with params: %s", query, params)
+        logger.debug("Executing update: %s with params: %s", LazyStr(squash_whitespace, query), params)
         with self.get_cursor() as cursor:
             cursor.execute(query, params or ())
             return cursor.rowcount
 
+    @traced("DatabaseConnection.execute_many")
+    @DB_QUERY_SECONDS.timed("many")
+    def execute_many(self, query: str, params_seq: Sequence[tuple]) -> int:
+        """
+        Execute an INSERT, UPDATE, or DELETE query once per parameter tuple, in a single transaction.
+
+        PyMySQL rewrites "INSERT ... VALUES (...)" statements into multi-row
+        inserts, so a whole batch costs a few round-trips rather than one per row.
+
+        Args:
+            query (str): SQL query to execute
+            params_seq (Sequence[tuple]): Parameters for each execution
+
+        Returns:
+            int: Number of affected rows
+        """
+        logger.debug("Executing batch: %s with %d parameter sets", LazyStr(squash_whitespace, query), len(params_seq))
+        if not params_seq:
+            return 0
+        with self.get_cursor() as cursor:
+            cursor.executemany(query, params_seq)
+            return cursor.rowcount
+
     def test_connection(self) -> bool:
         """
         Test the database connection.
@@ -148,5 +372,44 @@ class DatabaseConnection:
             return False
 
 
-# Global database instance
-db = DatabaseConnection()
+_db: Optional[DatabaseConnection] = None
+_db_lock = threading.Lock()
+
+
+def get_db() -> DatabaseConnection:
+    """Return the shared database connection manager, creating it on first use."""
+    global _db  # pylint: disable=global-statement
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = DatabaseConnection()
+    return _db
+
+
+def pool_metrics():
+    """Metrics collector of the shared database's connection pool, once it exists."""
+    if _db is None or _db.pool is None:
+        return
+    stats = _db.pool.stats()
+    yield (
+        "stackademy_db_pool_connections",
+        "gauge",
+        "Open connections of the MySQL connection pool.",
+        [("", {"state": "idle"}, stats["idle"]), ("", {"state": "checked_out"}, stats["checked_out"])],
+    )
+    for name, key, documentation in (
+        ("stackademy_db_pool_checkouts_total", "checkouts", "Connections checked out of the pool."),
+        ("stackademy_db_pool_waits_total", "waits", "Checkouts that waited for a free connection."),
+        ("stackademy_db_pool_timeouts_total", "timeouts", "Checkouts that timed out."),
+    ):
+        yield name, "counter", documentation, [("", {}, stats[key])]
+
+
+registry.add_collector(pool_metrics)
+
+
+def __getattr__(name: str) -> Any:
+    """The global database instance db is created on first access, not on import."""
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
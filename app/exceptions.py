@@ -4,3 +4,11 @@
 
 class ConfigurationException(Exception):
     """Exception raised for errors in the configuration."""
+
+
+class ConnectionPoolTimeout(Exception):
+    """Exception raised when no pooled database connection becomes available in time."""
+
+
+class ServerOverloaded(Exception):
+    """Exception raised when the server cannot admit another request in time."""
@@ -1,12 +1,201 @@
 # -*- coding: utf-8 -*-
 """
 Centralized logging configuration for the Stackademy application.
+
+Records are written to stdout as text or as JSON lines (LOGGING_FORMAT).
+ANSI colors are only rendered when stdout is a terminal (LOGGING_COLOR).
+With LOGGING_QUEUE, the calling thread only renders the message and puts
+the record on a bounded queue; a QueueListener thread formats and writes
+it, so that a slow stdout never blocks request threads. When the queue is
+full, records are dropped or the caller waits, per LOGGING_QUEUE_DROP.
 """
 
+import atexit
+import copy
+import datetime
+import json
 import logging
+import logging.handlers
+import queue
+import re
 import sys
+import threading
+from typing import Any, Optional, TextIO
+
+from app import utils
+from app.settings import (
+    LOGGING_COLOR,
+    LOGGING_FORMAT,
+    LOGGING_LEVEL,
+    LOGGING_QUEUE,
+    LOGGING_QUEUE_DROP,
+    LOGGING_QUEUE_SIZE,
+)
+
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+ANSI_ESCAPE = re.compile(r"\033\[[0-9;]*m")
+
+_listener: Optional["BoundedQueueListener"] = None
+
+
+def strip_ansi(text: str) -> str:
+    """Remove ANSI color codes from text."""
+    return ANSI_ESCAPE.sub("", text) if "\033" in text else text
+
+
+class TextFormatter(logging.Formatter):
+    """The classic text format, with ANSI colors removed when they are not wanted."""
+
+    def __init__(self, fmt: str = TEXT_FORMAT, color: bool = True):
+        super().__init__(fmt)
+        self.color = color
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        return text if self.color else strip_ansi(text)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time (UTC), level, logger, thread, message and exception."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": strip_ansi(record.getMessage()),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler for a bounded queue that drops records instead of blocking when the queue is full.
+
+    Args:
+        log_queue: A queue.Queue with a maxsize
+        policy: "newest" drops the record being logged, "oldest" the oldest queued record,
+            "block" waits for room
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "newest"):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def _drop(self) -> None:
+        with self._lock:
+            self.dropped += 1
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # a record that will be dropped is not worth rendering
+        if self.policy == "newest" and self.queue.full():
+            self._drop()
+            return
+        super().emit(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Render the message now, while its arguments are unchanged, and leave the
+        rest of the formatting to the listener thread's handler.
+        """
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.policy == "oldest":
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                pass
+        self._drop()
+
+
+class BoundedQueueListener(logging.handlers.QueueListener):
+    """A QueueListener that can be stopped while its bounded queue is full."""
+
+    def enqueue_sentinel(self) -> None:
+        # wait for the listener thread to make room, rather than failing with queue.Full
+        self.queue.put(self._sentinel)
+
+
+def use_color(stream: Any, mode: str = LOGGING_COLOR) -> bool:
+    """Whether to write ANSI colors to a stream: always, never, or auto when it is a terminal."""
+    if mode == "auto":
+        isatty = getattr(stream, "isatty", None)
+        return bool(isatty and isatty())
+    return mode == "always"
+
+
+def create_handler(
+    stream: TextIO, log_format: str = LOGGING_FORMAT, color: Optional[bool] = None
+) -> logging.StreamHandler:
+    """A stream handler with the text or JSON formatter."""
+    handler = logging.StreamHandler(stream)
+    if log_format == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(TextFormatter(color=use_color(stream) if color is None else color))
+    return handler
+
+
+def start_queue(
+    handler: logging.Handler, size: int = LOGGING_QUEUE_SIZE, policy: str = LOGGING_QUEUE_DROP
+) -> DroppingQueueHandler:
+    """
+    Move a handler to a background thread.
+
+    Returns:
+        DroppingQueueHandler: The handler to attach instead, fed by a bounded queue.
+            Its listener is stopped at exit, after the queued records are written.
+    """
+    global _listener  # pylint: disable=global-statement
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=size), policy)
+    _listener = BoundedQueueListener(queue_handler.queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_queue)
+    return queue_handler
+
+
+def stop_queue() -> None:
+    """Write the queued records and stop the listener thread, if there is one."""
+    global _listener  # pylint: disable=global-statement
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
-from app.settings import LOGGING_LEVEL
+def dropped_records() -> int:
+    """The number of records dropped because the logging queue was full."""
+    return sum(getattr(handler, "dropped", 0) for handler in logging.getLogger().handlers)
 
 
 def setup_logging(level: int = LOGGING_LEVEL) -> logging.Logger:
@@ -21,11 +210,12 @@ def setup_logging(level: int = LOGGING_LEVEL) -> logging.Logger:
     """
     # Only configure if not already configured
     if not logging.getLogger().handlers:
-        logging.basicConfig(
-            level=level,
-            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            handlers=[logging.StreamHandler(sys.stdout)],  # This logs to console
-        )
+        handler: logging.Handler = create_handler(sys.stdout)  # This logs to console
+        # skip the work of coloring messages that would not be shown in color
+        utils.set_ansi_colors(LOGGING_FORMAT == "text" and use_color(sys.stdout))
+        if LOGGING_QUEUE:
+            handler = start_queue(handler)
+        logging.basicConfig(level=level, handlers=[handler])
 
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
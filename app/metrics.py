@@ -0,0 +1,532 @@
+# -*- coding: utf-8 -*-
+"""
+In-process metrics in the Prometheus text format.
+
+    TOOL_CALLS.inc("get_courses")
+    OPENAI_REQUEST_SECONDS.observe(0.84, "gpt-4o-mini", "false")
+
+    @DB_QUERY_SECONDS.timed("query")
+    def execute_query(...): ...
+
+Counters and histograms are sharded per thread: every thread records into
+its own dict, so recording takes no lock and threads never contend. The
+shards are only summed when the metrics are rendered. Values that already
+exist elsewhere, like the cache and connection pool counters, are read at
+render time by collectors.
+
+The server exposes registry.render() at GET /metrics, and
+start_file_export() writes it to a file periodically.
+"""
+
+import abc
+import atexit
+import functools
+import os
+import tempfile
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.logging_config import dropped_records, get_logger, setup_logging
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+# (name suffix, labels, value) samples of one metric family, e.g. ("_bucket", {"le": "0.1"}, 3)
+Samples = List[Tuple[str, Dict[str, str], float]]
+# (name, type, help, samples) of the metric families read by a collector
+Collector = Callable[[], Iterable[Tuple[str, str, str, Samples]]]
+
+# seconds; an LLM request takes from a fraction of a second to a minute
+REQUEST_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+# seconds; a database round-trip or tool call takes from a fraction of a millisecond to a second
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def format_value(value: float) -> str:
+    """A sample value in the Prometheus text format."""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def escape_label(value: Any) -> str:
+    """A label value with backslashes, double quotes and newlines escaped."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    """Label pairs in the Prometheus text format."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Shard:
+    """The values of one thread, referenced only by that thread's locals, so that it dies with the thread."""
+
+    __slots__ = ("values", "__weakref__")
+
+    def __init__(self):
+        self.values: Dict[Tuple[str, ...], Any] = {}
+
+
+class Shards:
+    """
+    Per-thread dicts of a metric's values, keyed by label values.
+
+    Each thread only writes to its own dict, so no lock is needed to record.
+    When a thread ends, its values are folded into a shared dict of retired
+    values and its dict is dropped, so that neither the counts nor the number
+    of dicts to sum at render time depend on how many threads have come and gone.
+
+    Args:
+        merge: Adds a value of a finished thread to the retired values: merge(retired, key, value)
+    """
+
+    def __init__(self, merge: Callable[[Dict[Tuple[str, ...], Any], Tuple[str, ...], Any], None]):
+        self._merge = merge
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], Any]] = []
+        self._retired: Dict[Tuple[str, ...], Any] = {}
+        # reentrant: a thread's finalizer may run wherever its locals are released
+        self._lock = threading.RLock()
+
+    def local(self) -> Dict[Tuple[str, ...], Any]:
+        """The dict of the calling thread."""
+        try:
+            return self._local.shard.values
+        except AttributeError:
+            shard = _Shard()
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard.values)
+            weakref.finalize(shard, self._retire, shard.values)
+            return shard.values
+
+    def _retire(self, values: Dict[Tuple[str, ...], Any]) -> None:
+        """Fold the values of a finished thread into the retired values."""
+        with self._lock:
+            self._shards = [shard for shard in self._shards if shard is not values]
+            for key, value in values.items():
+                self._merge(self._retired, key, value)
+
+    def __len__(self) -> int:
+        """The number of live thread dicts."""
+        return len(self._shards)
+
+    def snapshot(self) -> List[Dict[Tuple[str, ...], Any]]:
+        """Copies of the retired values and of the dicts of live threads; copying a dict is atomic under the GIL."""
+        with self._lock:
+            shards = list(self._shards)
+            retired = {key: list(value) if isinstance(value, list) else value for key, value in self._retired.items()}
+        return [retired] + [dict(shard) for shard in shards]
+
+    def clear(self) -> None:
+        """Forget all values, e.g. between tests."""
+        with self._lock:
+            self._retired.clear()
+            for shard in self._shards:
+                shard.clear()
+
+
+class Metric(abc.ABC):
+    """
+    A metric family with a fixed set of label names.
+
+    Args:
+        name: The metric name, e.g. stackademy_tool_calls_total
+        documentation: The HELP text
+        labelnames: The names of the label values passed when recording
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._shards = Shards(self.merge)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+    def _check(self, labels: Tuple[str, ...]) -> None:
+        """Validate the label values of a new series."""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+
+    def labels(self, values: Tuple[str, ...]) -> Dict[str, str]:
+        """The label values of a series, by label name."""
+        return dict(zip(self.labelnames, values))
+
+    @staticmethod
+    @abc.abstractmethod
+    def merge(totals: Dict[Tuple[str, ...], Any], key: Tuple[str, ...], value: Any) -> None:
+        """Add the value of one series to totals."""
+
+    @abc.abstractmethod
+    def samples(self) -> Samples:
+        """The current samples, summed over all threads."""
+
+    def clear(self) -> None:
+        """Reset all series."""
+        self._shards.clear()
+
+
+class Counter(Metric):
+    """A monotonically increasing count, per combination of label values."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Add amount to the series of the label values."""
+        values = self._shards.local()
+        current = values.get(labels)
+        if current is None:
+            self._check(labels)
+            current = 0
+        values[labels] = current + amount
+
+    def value(self, *labels: str) -> float:
+        """The total of one series."""
+        return sum(shard.get(labels, 0) for shard in self._shards.snapshot())
+
+    @staticmethod
+    def merge(totals: Dict[Tuple[str, ...], Any], key: Tuple[str, ...], value: Any) -> None:
+        totals[key] = totals.get(key, 0) + value
+
+    def samples(self) -> Samples:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for shard in self._shards.snapshot():
+            for key, value in shard.items():
+                self.merge(totals, key, value)
+        return [("", self.labels(key), value) for key, value in sorted(totals.items())]
+
+
+class Histogram(Metric):
+    """
+    The distribution of observed values, e.g. latencies, in cumulative buckets.
+
+    Args:
+        buckets: The upper bounds of the buckets, in increasing order; +Inf is added
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = FAST_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        if list(buckets) != sorted(buckets):
+            raise ValueError("Histogram buckets must be in increasing order")
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one value in the series of the label values."""
+        values = self._shards.local()
+        counts = values.get(labels)
+        if counts is None:
+            self._check(labels)
+            # one count per bucket and one for +Inf, then the sum
+            counts = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def timed(self, *labels: str) -> Callable[[Callable], Callable]:
+        """Decorator that observes the duration of every call, including failed ones."""
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labels)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def merge(totals: Dict[Tuple[str, ...], Any], key: Tuple[str, ...], value: Any) -> None:
+        total = totals.setdefault(key, [0] * len(value))
+        for i, count in enumerate(list(value)):
+            total[i] += count
+
+    def _totals(self) -> Dict[Tuple[str, ...], List[float]]:
+        totals: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in self._shards.snapshot():
+            for key, counts in shard.items():
+                self.merge(totals, key, counts)
+        return totals
+
+    def count(self, *labels: str) -> int:
+        """The number of values observed in one series."""
+        counts = self._totals().get(labels)
+        return int(sum(counts[:-1])) if counts else 0
+
+    def samples(self) -> Samples:
+        samples: Samples = []
+        for key, counts in sorted(self._totals().items()):
+            labels = self.labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": format_value(bound)}, cumulative))
+            samples.append(("_sum", labels, counts[-1]))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """The metrics of the process, rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric; names must be unique."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = FAST_BUCKETS
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Collector) -> None:
+        """Add a function that reports metric families when the metrics are rendered."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector: Collector) -> None:
+        """Remove a collector added with add_collector()."""
+        with self._lock:
+            self._collectors.remove(collector)
+
+    def clear(self) -> None:
+        """Reset all counters and histograms."""
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def families(self) -> List[Tuple[str, str, str, Samples]]:
+        """The (name, type, help, samples) of every metric family."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        families = [(metric.name, metric.kind, metric.documentation, metric.samples()) for metric in metrics]
+        merged: Dict[str, Tuple[str, str, str, Samples]] = {}
+        for collector in collectors:
+            try:
+                for name, kind, documentation, samples in collector():
+                    merged.setdefault(name, (name, kind, documentation, []))[3].extend(samples)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Metrics collector %r failed: %s", collector, e)
+        return families + list(merged.values())
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format, version 0.0.4."""
+        lines = []
+        for name, kind, documentation, samples in self.families():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write the metrics to a file, atomically so that readers never see a partial file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".prom")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+registry = MetricsRegistry()
+
+OPENAI_REQUEST_SECONDS = registry.histogram(
+    "stackademy_openai_request_duration_seconds",
+    "Latency of OpenAI chat completion requests; streamed requests until the last chunk.",
+    ("model", "stream"),
+    buckets=REQUEST_BUCKETS,
+)
+OPENAI_TOKENS = registry.counter(
+    "stackademy_openai_tokens_total", "Tokens reported in the usage of OpenAI responses.", ("model", "type")
+)
+OPENAI_ERRORS = registry.counter(
+    "stackademy_openai_errors_total", "Failed OpenAI chat completion requests.", ("model", "error")
+)
+OPENAI_RETRIES = registry.counter(
+    "stackademy_openai_retries_total", "OpenAI requests retried after a failed attempt.", ("error",)
+)
+OPENAI_RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    "stackademy_openai_rate_limit_wait_seconds",
+    "Time OpenAI requests waited for the client-side rate limiter.",
+    buckets=(0.0,) + REQUEST_BUCKETS,
+)
+TOOL_CALLS = registry.counter("stackademy_tool_calls_total", "Tool calls requested by the LLM.", ("function",))
+TOOL_CALL_SECONDS = registry.histogram(
+    "stackademy_tool_call_duration_seconds", "Time to execute a tool call and serialize its result.", ("function",)
+)
+DB_CONNECT_SECONDS = registry.histogram(
+    "stackademy_db_connect_duration_seconds", "Time to open a new MySQL connection."
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "stackademy_db_query_duration_seconds",
+    "MySQL round-trips, including the connection checkout.",
+    ("operation",),
+)
+
+
+def record_openai_response(model: str, seconds: float, usage: Any, stream: bool = False) -> None:
+    """
+    Record a completed OpenAI request.
+
+    Args:
+        model: The requested model
+        seconds: The latency of the request
+        usage: The usage of the response, if reported
+        stream: Whether the response was streamed
+    """
+    OPENAI_REQUEST_SECONDS.observe(seconds, model, "true" if stream else "false")
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if isinstance(tokens, int):
+            OPENAI_TOKENS.inc(model, kind, amount=tokens)
+
+
+def logging_metrics():
+    """Metrics collector of the logging queue."""
+    yield (
+        "stackademy_log_records_dropped_total",
+        "counter",
+        "Log records dropped because the logging queue was full.",
+        [("", {}, dropped_records())],
+    )
+
+
+registry.add_collector(logging_metrics)
+
+
+def cache_collector(caches: Dict[str, Any]) -> Collector:
+    """
+    A collector of the hit counters of caches.
+
+    Args:
+        caches: Objects with a stats() method like app.cache.BaseCache, by name
+    """
+
+    def collect():
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        yield (
+            "stackademy_cache_hits_total",
+            "counter",
+            "Cache lookups that found an entry.",
+            [("", {"cache": name}, s["hits"]) for name, s in stats.items()],
+        )
+        yield (
+            "stackademy_cache_misses_total",
+            "counter",
+            "Cache lookups that found no entry.",
+            [("", {"cache": name}, s["misses"]) for name, s in stats.items()],
+        )
+        yield (
+            "stackademy_cache_hit_ratio",
+            "gauge",
+            "Share of cache lookups that found an entry, since the start of the process.",
+            [("", {"cache": name}, s["hit_rate"]) for name, s in stats.items()],
+        )
+        yield (
+            "stackademy_cache_entries",
+            "gauge",
+            "Entries in the cache.",
+            [("", {"cache": name}, s["entries"]) for name, s in stats.items()],
+        )
+
+    return collect
+
+
+def track_cache(name: str, cache: Any) -> None:
+    """Report the hits, misses, hit ratio and size of a cache with the metrics."""
+    registry.add_collector(cache_collector({name: cache}))
+
+
+class FileExport:
+    """
+    Writes the metrics to a file every interval seconds, on a daemon thread, and once more at exit.
+
+    Args:
+        path: The file, e.g. in node_exporter's textfile collector directory
+        interval: Seconds between writes
+    """
+
+    def __init__(self, path: str, interval: float, metrics: Optional[MetricsRegistry] = None):
+        self.path = path
+        self.interval = interval
+        self.metrics = metrics or registry
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+
+    def start(self) -> "FileExport":
+        """Start writing, and write a final time when the interpreter exits."""
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def write(self) -> None:
+        """Write the metrics now; failures are logged and retried at the next interval."""
+        try:
+            self.metrics.write(self.path)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Could not write metrics to %s: %s", self.path, e)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def stop(self) -> None:
+        """Stop the thread and write the final metrics."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._thread.join()
+        self.write()
+        atexit.unregister(self.stop)
+
+
+_file_export: Optional[FileExport] = None
+_file_export_lock = threading.Lock()
+
+
+def start_file_export(path: Optional[str], interval: float) -> Optional[FileExport]:
+    """Start writing the metrics to path, once per process; does nothing without a path."""
+    global _file_export  # pylint: disable=global-statement
+    if not path:
+        return None
+    with _file_export_lock:
+        if _file_export is None:
+            _file_export = FileExport(path, interval).start()
+            logger.info("Writing metrics to %s every %gs", path, interval)
+    return _file_export
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Shared, explicitly configured OpenAI clients."""
+
+import asyncio
+import contextlib
+import importlib.util
+import threading
+from typing import Iterator, Optional, Set
+
+from app import settings
+from app.logging_config import get_logger, setup_logging
+from app.utils import lazy_import
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+# imported on first use: openai is most of the import time of the app
+httpx = lazy_import("httpx")
+openai = lazy_import("openai")
+
+_client: Optional["openai.OpenAI"] = None
+_async_client: Optional["openai.AsyncOpenAI"] = None
+_lock = threading.Lock()
+# closes of async clients scheduled on a running event loop, referenced until done
+_closing: Set["asyncio.Task"] = set()
+
+
+def http2_enabled() -> bool:
+    """Whether HTTP/2 was requested and the optional h2 package is installed."""
+    if not settings.OPENAI_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("OPENAI_HTTP2 is enabled but the h2 package is not installed. Falling back to HTTP/1.1.")
+        return False
+    return True
+
+
+def http_limits() -> "httpx.Limits":
+    """Connection pool limits for the OpenAI HTTP transport."""
+    return httpx.Limits(
+        max_connections=settings.OPENAI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.OPENAI_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def http_timeout() -> "httpx.Timeout":
+    """Timeouts for the OpenAI HTTP transport."""
+    return httpx.Timeout(
+        settings.OPENAI_HTTP_READ_TIMEOUT,
+        connect=settings.OPENAI_HTTP_CONNECT_TIMEOUT,
+    )
+
+
+def sdk_max_retries() -> int:
+    """Retries made by the SDK: none when the app retries requests itself (see app.rate_limit)."""
+    return 0 if settings.OPENAI_APP_RETRIES else settings.OPENAI_MAX_RETRIES
+
+
+def create_client() -> "openai.OpenAI":
+    """Build a new OpenAI client over a tuned, keep-alive HTTP transport."""
+    http_client = openai.DefaultHttpxClient(limits=http_limits(), timeout=http_timeout(), http2=http2_enabled())
+    return openai.OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        max_retries=sdk_max_retries(),
+        http_client=http_client,
+    )
+
+
+def create_async_client() -> "openai.AsyncOpenAI":
+    """Build a new AsyncOpenAI client over a tuned, keep-alive HTTP transport."""
+    http_client = openai.DefaultAsyncHttpxClient(limits=http_limits(), timeout=http_timeout(), http2=http2_enabled())
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        max_retries=sdk_max_retries(),
+        http_client=http_client,
+    )
+
+
+def get_client() -> "openai.OpenAI":
+    """Return the shared OpenAI client, creating it on first use."""
+    global _client  # pylint: disable=global-statement
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = create_client()
+    return _client
+
+
+def get_async_client() -> "openai.AsyncOpenAI":
+    """Return the shared AsyncOpenAI client, creating it on first use."""
+    global _async_client  # pylint: disable=global-statement
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = create_async_client()
+    return _async_client
+
+
+def close_clients(client: Optional["openai.OpenAI"], async_client: Optional["openai.AsyncOpenAI"]) -> None:
+    """
+    Close clients and their connection pools.
+
+    The async client is closed on the running event loop if there is one,
+    otherwise on a new one. Its connections may belong to an event loop that
+    is already closed, in which case they are only dropped.
+    """
+    if client is not None:
+        client.close()
+    if async_client is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        task = loop.create_task(async_client.close())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+        return
+    try:
+        asyncio.run(async_client.close())
+    except Exception as e:  # pylint: disable=broad-except
+        logger.debug("Could not close the AsyncOpenAI client cleanly: %s", e)
+
+
+def reset_clients(close: bool = True) -> None:
+    """
+    Forget the shared clients so that the next call builds new ones.
+
+    Call this after changing settings, or in a child process after a fork,
+    since HTTP connections must not be shared across processes.
+
+    Args:
+        close: Close the forgotten clients and their connections. Pass False
+            in a child process after a fork: the connections belong to the parent.
+    """
+    global _client, _async_client  # pylint: disable=global-statement
+    with _lock:
+        client, async_client = _client, _async_client
+        _client = None
+        _async_client = None
+    if close:
+        close_clients(client, async_client)
+
+
+@contextlib.contextmanager
+def scoped_clients() -> Iterator[None]:
+    """
+    Build new shared clients within the block, e.g. after patching the settings,
+    and restore the previous ones afterwards. Clients that already hold a
+    reference to the previous clients, such as mocks, keep working.
+    """
+    global _client, _async_client  # pylint: disable=global-statement
+    with _lock:
+        previous = (_client, _async_client)
+        _client = _async_client = None
+    try:
+        yield
+    finally:
+        with _lock:
+            scoped = (_client, _async_client)
+            _client, _async_client = previous
+        close_clients(*scoped)
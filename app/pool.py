@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""Bounded, thread-safe connection pool for the MySQL database connection."""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator
+
+from app.exceptions import ConnectionPoolTimeout
+from app.logging_config import get_logger, setup_logging
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+
+class PooledConnection:
+    """A connection owned by the pool, along with its bookkeeping timestamps."""
+
+    __slots__ = ("connection", "created_at", "last_used_at")
+
+    def __init__(self, connection: Any):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+    def age(self, now: float) -> float:
+        """Seconds since the connection was opened."""
+        return now - self.created_at
+
+    def idle_for(self, now: float) -> float:
+        """Seconds since the connection was last returned to the pool."""
+        return now - self.last_used_at
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections.
+
+    Connections are created on demand up to max_size; warm() opens min_size of
+    them ahead of the first checkout. Idle connections are kept
+    in LIFO order so that the most recently used (and therefore warmest)
+    connection is handed out first, while connections idle for longer than
+    idle_timeout are closed as long as at least min_size remain. Connections
+    older than max_lifetime are recycled, and idle connections are optionally
+    pinged before being handed out.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-instance-attributes
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        max_lifetime: float = 3600.0,
+        checkout_timeout: float = 10.0,
+        ping_on_checkout: bool = True,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if not 0 <= min_size <= max_size:
+            raise ValueError("min_size must be between 0 and max_size")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.ping_on_checkout = ping_on_checkout
+
+        self._idle: Deque[PooledConnection] = deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._size = 0
+        self._closed = False
+
+        # statistics
+        self._checkouts = 0
+        self._connects_created = 0
+        self._connects_closed = 0
+        self._ping_failures = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+
+    def _close_connection(self, pooled: PooledConnection) -> None:
+        """Close a connection that is leaving the pool. Caller must not hold the lock."""
+        try:
+            pooled.connection.close()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.debug("Error closing pooled connection: %s", e)
+
+    def _discard(self, pooled: PooledConnection) -> None:
+        """Close a connection and free its slot."""
+        self._close_connection(pooled)
+        with self._condition:
+            self._size -= 1
+            self._connects_closed += 1
+            self._condition.notify()
+
+    def _prune_idle(self, now: float) -> list:
+        """Remove idle connections that exceeded idle_timeout or max_lifetime. Caller must hold the lock."""
+        expired = []
+        # the oldest idle connections sit at the left end of the deque
+        while self._idle:
+            candidate = self._idle[0]
+            too_old = candidate.age(now) >= self.max_lifetime
+            too_idle = candidate.idle_for(now) >= self.idle_timeout and self._size - len(expired) > self.min_size
+            if not (too_old or too_idle):
+                break
+            expired.append(self._idle.popleft())
+        self._size -= len(expired)
+        self._connects_closed += len(expired)
+        return expired
+
+    def _is_usable(self, pooled: PooledConnection) -> bool:
+        """Check that an idle connection can be handed out."""
+        if pooled.age(time.monotonic()) >= self.max_lifetime:
+            return False
+        if self.ping_on_checkout:
+            try:
+                pooled.connection.ping(reconnect=False)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Discarding pooled connection that failed liveness ping: %s", e)
+                with self._condition:
+                    self._ping_failures += 1
+                return False
+        return True
+
+    def _checkout(self) -> tuple:
+        """
+        Reserve either an idle connection or a slot for a new one.
+
+        Returns:
+            tuple: (PooledConnection, or None when the caller should open a new
+            connection; list of expired idle connections the caller must close)
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+        waited_since = None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise ConnectionPoolTimeout("Connection pool is closed.")
+                # pruning frees slots, so reaching the wait below implies nothing expired
+                expired = self._prune_idle(time.monotonic())
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    pooled = None
+                    break
+
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    self._waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise ConnectionPoolTimeout(
+                        f"Timed out after {self.checkout_timeout}s waiting for a database connection "
+                        f"(max_size={self.max_size})."
+                    )
+                self._condition.wait(remaining)
+
+            if waited_since is not None:
+                waited = time.monotonic() - waited_since
+                self._wait_time_total += waited
+                self._wait_time_max = max(self._wait_time_max, waited)
+            self._checkouts += 1
+            return pooled, expired
+
+    def acquire(self) -> PooledConnection:
+        """
+        Check a connection out of the pool, opening a new one if needed.
+
+        Raises:
+            ConnectionPoolTimeout: If no connection becomes available within checkout_timeout
+        """
+        while True:
+            pooled, expired = self._checkout()
+            for stale in expired:
+                self._close_connection(stale)
+
+            if pooled is None:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._connects_created += 1
+                return PooledConnection(connection)
+
+            if self._is_usable(pooled):
+                return pooled
+            self._discard(pooled)
+
+    def release(self, pooled: PooledConnection, discard: bool = False) -> None:
+        """
+        Return a connection to the pool.
+
+        Args:
+            pooled: The connection returned by acquire()
+            discard: Close the connection instead of keeping it, e.g. after an error
+        """
+        now = time.monotonic()
+        if discard or self._closed or pooled.age(now) >= self.max_lifetime:
+            self._discard(pooled)
+            return
+        pooled.last_used_at = now
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Context manager that checks a connection out and returns it when done."""
+        pooled = self.acquire()
+        try:
+            yield pooled.connection
+        except Exception:
+            self.release(pooled, discard=True)
+            raise
+        self.release(pooled)
+
+    def warm(self) -> None:
+        """Open idle connections until at least min_size exist in the pool; they do not count as checkouts."""
+        while True:
+            with self._condition:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._connects_created += 1
+            self.release(PooledConnection(connection))
+
+    def close(self) -> None:
+        """Close all idle connections and refuse further checkouts."""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._connects_closed += len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            self._close_connection(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return a snapshot of pool usage, for sizing the pool under load.
+
+        Returns:
+            Dict[str, Any]: counters and gauges describing the pool
+        """
+        with self._condition:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "idle": idle,
+                "checked_out": self._size - idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "connects_created": self._connects_created,
+                "connects_closed": self._connects_closed,
+                "ping_failures": self._ping_failures,
+                "waits": self._waits,
+                "wait_time_total": self._wait_time_total,
+                "wait_time_max": self._wait_time_max,
+                "timeouts": self._timeouts,
+            }
@@ -4,44 +4,81 @@ Prompt engineering and management for Stackademy.
 Handles function calling and response parsing.
 """
 
+import asyncio
+import contextlib
 import json
-from typing import Optional, Union
-
-import openai
-from openai.types.chat import (
-    ChatCompletion,
-    ChatCompletionAssistantMessageParam,
-    ChatCompletionMessage,
-    ChatCompletionMessageFunctionToolCallParam,
-    ChatCompletionSystemMessageParam,
-    ChatCompletionToolMessageParam,
-    ChatCompletionUserMessageParam,
-)
+import time
+from typing import TYPE_CHECKING, AsyncGenerator, Generator, Optional, Union
 
 from app import settings
-from app.const import MISSING, ToolChoice
+from app.cache import create_cache
+from app.compaction import HistoryCompactor
+from app.completion_cache import CompletionCache
+from app.const import ToolChoice
 from app.logging_config import get_logger, setup_logging
-from app.settings import LLM_ASSISTANT_NAME, LLM_TOOL_CHOICE
+from app.metrics import (
+    OPENAI_ERRORS,
+    TOOL_CALL_SECONDS,
+    TOOL_CALLS,
+    record_openai_response,
+    track_cache,
+)
+from app.openai_client import get_async_client, get_client
+from app.rate_limit import asend, send
+from app.session import ConversationSession, SessionStore
+from app.settings import (
+    COMPLETION_CACHE,
+    COMPLETION_CACHE_BACKEND,
+    COMPLETION_CACHE_MAX_ENTRIES,
+    COMPLETION_CACHE_PATH,
+    COMPLETION_CACHE_TTL,
+    HISTORY_COMPACTION,
+    HISTORY_KEEP_TURNS,
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_TOOL_RESULT_MAX_CHARS,
+    LLM_ASSISTANT_NAME,
+    LLM_TOOL_CHOICE,
+    SESSION_IDLE_TTL,
+    SESSION_MAX_SESSIONS,
+    TOOL_CALL_MAX_CONCURRENCY,
+    TOOL_EXECUTOR_MAX_WORKERS,
+)
 from app.stackademy import stackademy_app
-from app.utils import color_text, dump_json_colored
+from app.streaming import AsyncCompletionStream, CompletionStream, StreamAccumulator
+from app.tool_executor import ToolExecutor
+from app.tools import tool_registry
+from app.tracing import span, traced
+from app.utils import LazyStr, lazy_color_text, lazy_import, lazy_json
 
 
-setup_logging()
-logger = get_logger(__name__)
-
-MessagesType = list[
-    Union[
-        ChatCompletionSystemMessageParam,
-        ChatCompletionUserMessageParam,
+if TYPE_CHECKING:
+    from openai.types.chat import (
+        ChatCompletion,
         ChatCompletionAssistantMessageParam,
+        ChatCompletionMessage,
+        ChatCompletionMessageFunctionToolCallParam,
+        ChatCompletionSystemMessageParam,
         ChatCompletionToolMessageParam,
+        ChatCompletionUserMessageParam,
+    )
+
+    MessagesType = list[
+        Union[
+            ChatCompletionSystemMessageParam,
+            ChatCompletionUserMessageParam,
+            ChatCompletionAssistantMessageParam,
+            ChatCompletionToolMessageParam,
+        ]
     ]
-]
 
-messages: MessagesType = [
-    ChatCompletionSystemMessageParam(
-        role="system",
-        content="""You are a helpful assistant for the Stackademy online learning platform.
+setup_logging()
+logger = get_logger(__name__)
+# imported on first use, so that importing the app does not pay for the openai package;
+# the chat types are imported where they are needed, and message params are TypedDicts,
+# which are plain dicts at runtime
+openai = lazy_import("openai")
+
+SYSTEM_PROMPT = """You are a helpful assistant for the Stackademy online learning platform.
             If the user wants no further assistance, respond with "Goodbye!".
             Prioritize use of the functions available to you as needed.
             Do not provide answers that are not based on the functions available to you.
@@ -49,157 +86,515 @@ messages: MessagesType = [
             including course information, enrollment procedures, and general support.
             You should respond in a concise and clear manner, providing accurate information based on the user's request.
             If you ask a follow up question, then place it at the bottom of the response and precede it with "QUESTION:".
-            """,
-        name=LLM_ASSISTANT_NAME,
-    ),
-    ChatCompletionAssistantMessageParam(
-        role="assistant",
-        content="How can I assist you with Stackademy today?",
-        name=LLM_ASSISTANT_NAME,
-    ),
-]
+            """
 
 
-def handle_function_call(function_name: str, arguments: dict) -> str:
-    """Handle function calls from the OpenAI API."""
-    if function_name == "get_courses":
-        # Extract parameters with defaults
-        description = arguments.get("description")
-        max_cost = arguments.get("max_cost")
+def initial_messages() -> "MessagesType":
+    """Return the messages that every new conversation starts with."""
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT,
+            "name": LLM_ASSISTANT_NAME,
+        },
+        {
+            "role": "assistant",
+            "content": "How can I assist you with Stackademy today?",
+            "name": LLM_ASSISTANT_NAME,
+        },
+    ]
 
-        # Call the actual function
-        courses = stackademy_app.get_courses(description=description, max_cost=max_cost)
 
-        # Return as JSON string
-        return json.dumps(courses, default=str, indent=2)
+session_store = SessionStore(
+    initial_messages=initial_messages,
+    max_sessions=SESSION_MAX_SESSIONS,
+    idle_ttl=SESSION_IDLE_TTL,
+)
+DEFAULT_SESSION_ID = "default"
+INITIAL_TOOLS = ("get_courses",)
+FOLLOWUP_TOOLS = ("get_courses", "register_course")
+# sent with streamed requests, so that the last chunk carries the token usage
+STREAM_OPTIONS = {"stream": True, "stream_options": {"include_usage": True}}
+tool_executor = ToolExecutor(max_concurrency=TOOL_CALL_MAX_CONCURRENCY, max_workers=TOOL_EXECUTOR_MAX_WORKERS)
+history_compactor = HistoryCompactor(
+    keep_turns=HISTORY_KEEP_TURNS,
+    token_budget=HISTORY_TOKEN_BUDGET,
+    tool_result_max_chars=HISTORY_TOOL_RESULT_MAX_CHARS,
+)
+completion_cache: Optional[CompletionCache] = None
+if COMPLETION_CACHE:
+    completion_cache = CompletionCache(
+        create_cache(
+            backend=COMPLETION_CACHE_BACKEND,
+            max_entries=COMPLETION_CACHE_MAX_ENTRIES,
+            ttl=COMPLETION_CACHE_TTL,
+            path=COMPLETION_CACHE_PATH,
+            table="completions",
+        )
+    )
+    track_cache("completion", completion_cache.cache)
+
+
+def default_session() -> ConversationSession:
+    """Return the process-wide session used when callers do not manage their own."""
+    return session_store.get_or_create(DEFAULT_SESSION_ID)
 
-    if function_name == "register_course":
-        course_code = arguments.get("course_code", MISSING)
-        email = arguments.get("email", MISSING)
-        full_name = arguments.get("full_name", MISSING)
 
-        # Call the actual function
-        success = stackademy_app.register_course(course_code=course_code, email=email, full_name=full_name)
+def handle_function_call(function_name: str, arguments: dict) -> str:
+    """Handle function calls from the OpenAI API."""
+    start = time.perf_counter()
+    with span("handle_function_call", function=function_name):
+        try:
+            return tool_registry.dispatch(function_name, arguments)
+        finally:
+            TOOL_CALL_SECONDS.observe(time.perf_counter() - start, _function_label(function_name))
+
 
-        # Return result as JSON string
-        return json.dumps({"success": success})
+def _function_label(function_name: str) -> str:
+    """The function name as a metrics label; unknown names requested by the LLM are grouped."""
+    return function_name if function_name in tool_registry else "unknown"
 
-    return json.dumps({"error": f"Unknown function: {function_name}"})
 
+def _function_tool_calls(message: "ChatCompletionMessage") -> list:
+    """Return the function tool calls of an assistant message."""
+    # pylint: disable=import-outside-toplevel
+    from openai.types.chat import ChatCompletionMessage
 
-def process_tool_calls(message: ChatCompletionMessage) -> list[str]:
-    """Process tool calls in the messages list."""
-    functions_called = []
     if not isinstance(message, ChatCompletionMessage) or not message.tool_calls:
-        return functions_called
-    for tool_call in message.tool_calls:
-
-        if tool_call.type == "function":
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
-            functions_called.append(function_name)
-            tool_calls_param = [
-                ChatCompletionMessageFunctionToolCallParam(
-                    id=tool_call.id,
-                    type="function",
-                    function={
-                        "name": function_name,
-                        "arguments": tool_call.function.arguments,
-                    },
-                )
-            ]
-            assistant_content = message.content if message.content else "Accessing tool..."
-            messages.append(
-                ChatCompletionAssistantMessageParam(
-                    role="assistant", content=assistant_content, tool_calls=tool_calls_param, name=LLM_ASSISTANT_NAME
-                )
-            )
-            msg = f"Calling function: {function_name} with args {json.dumps(function_args)}"
-            logger.info(color_text(msg, "green"))
+        return []
+    return [tool_call for tool_call in message.tool_calls if tool_call.type == "function"]
 
-            function_result = handle_function_call(function_name, function_args)
 
-            tool_message = ChatCompletionToolMessageParam(
-                role="tool", content=function_result, tool_call_id=tool_call.id
-            )
-            messages.append(tool_message)
+def _tool_calls_message(message: "ChatCompletionMessage", tool_calls: list) -> tuple:
+    """
+    Build the assistant message that records the tool calls, without adding it to the session yet.
 
-        logger.debug(
-            "Updated messages: %s",
-            [dump_json_colored(msg.model_dump(), "blue") if not isinstance(msg, dict) else msg for msg in messages],
+    Returns:
+        tuple: The assistant message, and the (function_name, arguments) pairs to execute
+    """
+    calls = []
+    tool_calls_param: "list[ChatCompletionMessageFunctionToolCallParam]" = []
+    for tool_call in tool_calls:
+        function_name = tool_call.function.name
+        function_args = json.loads(tool_call.function.arguments)
+        calls.append((function_name, function_args))
+        TOOL_CALLS.inc(_function_label(function_name))
+        tool_calls_param.append(
+            {
+                "id": tool_call.id,
+                "type": "function",
+                "function": {
+                    "name": function_name,
+                    "arguments": tool_call.function.arguments,
+                },
+            }
+        )
+        logger.info(
+            lazy_color_text("Calling function: %s with args %s", "green"),
+            function_name,
+            LazyStr(json.dumps, function_args),
         )
+    assistant_content = message.content if message.content else "Accessing tool..."
+    assistant_message: "ChatCompletionAssistantMessageParam" = {
+        "role": "assistant",
+        "content": assistant_content,
+        "tool_calls": tool_calls_param,
+        "name": LLM_ASSISTANT_NAME,
+    }
+    return assistant_message, calls
+
+
+def _record_tool_results(
+    assistant_message: "ChatCompletionAssistantMessageParam",
+    tool_calls: list,
+    results: list[str],
+    session: ConversationSession,
+) -> list[str]:
+    """
+    Record the assistant's tool calls and their results in the session, and return the functions called.
+
+    The calls and results are only added together, once all results exist: a
+    turn that fails or is cancelled while the tools run must not leave tool
+    calls without results in the history, which the API rejects from then on.
+    """
+    session.append(assistant_message)
+    for tool_call, function_result in zip(tool_calls, results):
+        tool_message: "ChatCompletionToolMessageParam" = {
+            "role": "tool",
+            "content": function_result,
+            "tool_call_id": tool_call.id,
+        }
+        session.append(tool_message)
+    logger.debug("Updated messages: %s", lazy_json(session.messages, "blue"))
+    functions_called = [tool_call.function.name for tool_call in tool_calls]
+    session.record_functions(functions_called)
     return functions_called
 
 
-def completion(prompt: str) -> tuple[Optional[ChatCompletion], list[str]]:
-    """LLM text completion"""
+@traced("process_tool_calls")
+def process_tool_calls(message: "ChatCompletionMessage", session: Optional[ConversationSession] = None) -> list[str]:
+    """
+    Process the tool calls of an assistant message.
 
-    def handle_completion(tools, tool_choice) -> ChatCompletion:
-        """Handle the OpenAI chat completion call."""
-        openai.api_key = settings.OPENAI_API_KEY
-        model = settings.OPENAI_API_MODEL
+    Independent tool calls run concurrently; repeated calls of an idempotent
+    tool with the same arguments run once. The calls are recorded in the
+    session as one assistant message, followed by their results in call order.
+    """
+    session = session or default_session()
+    tool_calls = _function_tool_calls(message)
+    if not tool_calls:
+        return []
+    assistant_message, calls = _tool_calls_message(message, tool_calls)
+    unique, positions = tool_registry.deduplicate(calls)
+    results = tool_executor.run(unique, handle_function_call)
+    return _record_tool_results(assistant_message, tool_calls, [results[i] for i in positions], session)
 
-        try:
-            logger.debug(
-                "Sending messages to OpenAI: %s %s",
-                dump_json_colored(messages, "blue"),
-                dump_json_colored(tools, "blue"),
+
+async def ahandle_function_call(function_name: str, arguments: dict) -> str:
+    """Handle a function call without blocking the event loop, by running it in a worker thread."""
+    return await asyncio.to_thread(handle_function_call, function_name, arguments)
+
+
+async def aprocess_tool_calls(
+    message: "ChatCompletionMessage", session: Optional[ConversationSession] = None
+) -> list[str]:
+    """Async counterpart of process_tool_calls()."""
+    session = session or default_session()
+    tool_calls = _function_tool_calls(message)
+    if not tool_calls:
+        return []
+    with span("process_tool_calls"):
+        assistant_message, calls = _tool_calls_message(message, tool_calls)
+        unique, positions = tool_registry.deduplicate(calls)
+        results = await tool_executor.arun(unique, ahandle_function_call)
+        return _record_tool_results(assistant_message, tool_calls, [results[i] for i in positions], session)
+
+
+def compact_history(session: ConversationSession) -> None:
+    """Shrink the session history to the configured token budget before it is sent."""
+    if not HISTORY_COMPACTION:
+        return
+    compacted, stats = history_compactor.compact(session.messages)
+    session.last_compaction = stats
+    if stats["tokens_saved"] > 0:
+        session.replace_messages(compacted)
+        session.tokens_saved += stats["tokens_saved"]
+        logger.info(
+            "Compacted history of session %s: %d -> %d estimated tokens (%d turns dropped, %d tool results shrunk)",
+            session.id,
+            stats["tokens_before"],
+            stats["tokens_after"],
+            stats["turns_dropped"],
+            stats["tool_results_shrunk"],
+        )
+
+
+def log_openai_error(error: Exception) -> None:
+    """Log an error raised by the OpenAI client."""
+    if isinstance(error, openai.RateLimitError):
+        logger.error("OpenAI rate limit exceeded: %s", error)
+    elif isinstance(error, openai.APIConnectionError):
+        logger.error("OpenAI API connection error: %s", error)
+    elif isinstance(error, openai.AuthenticationError):
+        logger.error("OpenAI authentication error. Did you set OPENAI_API_KEY in your .env file? %s", error)
+    elif isinstance(error, openai.BadRequestError):
+        logger.error("OpenAI bad request error: %s", error)
+    elif isinstance(error, openai.APIError):
+        logger.error("OpenAI API error: %s", error)
+    else:
+        logger.error("Unexpected error during OpenAI completion: %s", error)
+
+
+def _completion_request(session: ConversationSession, tools, tool_choice) -> dict:
+    """Compact the session history and build the chat completion request arguments."""
+    compact_history(session)
+    logger.debug("Sending messages to OpenAI: %s %s", lazy_json(session.messages, "blue"), lazy_json(tools, "blue"))
+    return {
+        "model": settings.OPENAI_API_MODEL,
+        "messages": session.messages,
+        "tools": tools,
+        "tool_choice": tool_choice,
+        "temperature": settings.OPENAI_API_TEMPERATURE,
+        "max_tokens": settings.OPENAI_API_MAX_TOKENS,
+    }
+
+
+def _cached_completion(request: dict, current) -> Optional["ChatCompletion"]:
+    """The cached response to an identical request, if any; the span is marked as served from the cache."""
+    if completion_cache is None:
+        return None
+    cached = completion_cache.get(request)
+    if cached is not None:
+        current.set(cached=True)
+    return cached
+
+
+@contextlib.contextmanager
+def _completion_errors(request: dict) -> Generator[None, None, None]:
+    """Count and log the errors of a chat completion request, and re-raise them."""
+    try:
+        yield
+    # pylint: disable=broad-except
+    except Exception as e:
+        OPENAI_ERRORS.inc(request["model"], type(e).__name__)
+        log_openai_error(e)
+        raise
+
+
+def _completion_response(
+    session: ConversationSession, response: "ChatCompletion", cached: bool = False
+) -> "ChatCompletion":
+    """Record the usage of a chat completion response. Cached responses consumed no tokens."""
+    logger.debug("OpenAI %sresponse: %s", "cached " if cached else "", lazy_json(response, "green"))
+    if not cached:
+        session.record_usage(getattr(response, "usage", None))
+    return response
+
+
+def _completion_received(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    session: ConversationSession,
+    request: dict,
+    response: "ChatCompletion",
+    reservation,
+    start: float,
+    current,
+    accumulator: Optional[StreamAccumulator] = None,
+) -> "ChatCompletion":
+    """
+    Bookkeeping of a response from the API: the rate limit reservation, metrics, completion cache and session usage.
+
+    Args:
+        session: The conversation the request was made for
+        request: The chat completion request arguments
+        response: The response, assembled from the chunks when streamed
+        reservation: The rate limit reservation of the request
+        start: perf_counter() when the request was sent
+        current: The handle_completion span
+        accumulator: The StreamAccumulator of a streamed response
+
+    Returns:
+        ChatCompletion: The response
+    """
+    if accumulator is not None and accumulator.ttft is not None:
+        current.set(ttft=accumulator.ttft)
+        logger.debug("Request time to first token: %.3fs", accumulator.ttft)
+    latency = time.perf_counter() - start
+    usage = getattr(response, "usage", None)
+    reservation.settle(usage)
+    record_openai_response(request["model"], latency, usage, stream=accumulator is not None)
+    if completion_cache is not None:
+        completion_cache.put(request, response, latency=latency)
+    return _completion_response(session, response)
+
+
+def handle_completion(session: ConversationSession, tools, tool_choice) -> "ChatCompletion":
+    """Handle the OpenAI chat completion call."""
+    with span("handle_completion") as current:
+        request = _completion_request(session, tools, tool_choice)
+        cached = _cached_completion(request, current)
+        if cached is not None:
+            return _completion_response(session, cached, cached=True)
+        start = time.perf_counter()
+        with _completion_errors(request):
+            response, reservation = send(lambda: get_client().chat.completions.create(**request), request)
+        return _completion_received(session, request, response, reservation, start, current)
+
+
+async def ahandle_completion(session: ConversationSession, tools, tool_choice) -> "ChatCompletion":
+    """Async counterpart of handle_completion()."""
+    with span("handle_completion") as current:
+        request = _completion_request(session, tools, tool_choice)
+        cached = _cached_completion(request, current)
+        if cached is not None:
+            return _completion_response(session, cached, cached=True)
+        start = time.perf_counter()
+        with _completion_errors(request):
+            response, reservation = await asend(lambda: get_async_client().chat.completions.create(**request), request)
+        return _completion_received(session, request, response, reservation, start, current)
+
+
+def handle_completion_stream(
+    session: ConversationSession, tools, tool_choice
+) -> Generator[str, None, "ChatCompletion"]:
+    """
+    Streaming counterpart of handle_completion().
+
+    Yields the text deltas as they arrive and returns the ChatCompletion
+    assembled from the chunks, with the tool call fragments joined into
+    complete calls. A cached response is yielded as a single delta.
+    """
+    with span("handle_completion", stream=True) as current:
+        request = _completion_request(session, tools, tool_choice)
+        cached = _cached_completion(request, current)
+        if cached is not None:
+            if cached.choices[0].message.content:
+                yield cached.choices[0].message.content
+            return _completion_response(session, cached, cached=True)
+        start = time.perf_counter()
+        accumulator = StreamAccumulator()
+        with _completion_errors(request):
+            # only sending the request is retried: deltas already yielded cannot be taken back
+            chunks, reservation = send(
+                lambda: get_client().chat.completions.create(**request, **STREAM_OPTIONS), request
             )
-            response = openai.chat.completions.create(
-                model=model,
-                messages=messages,
-                tools=tools,
-                tool_choice=tool_choice,
-                temperature=settings.OPENAI_API_TEMPERATURE,
-                max_tokens=settings.OPENAI_API_MAX_TOKENS,
+            with chunks:
+                for chunk in chunks:
+                    delta = accumulator.add(chunk)
+                    if delta:
+                        yield delta
+        return _completion_received(
+            session, request, accumulator.completion(), reservation, start, current, accumulator
+        )
+
+
+async def ahandle_completion_stream(
+    session: ConversationSession, tools, tool_choice
+) -> AsyncGenerator[Union[str, "ChatCompletion"], None]:
+    """
+    Async counterpart of handle_completion_stream().
+
+    Async generators cannot return a value, so the assembled ChatCompletion
+    is yielded as the last item, after the text deltas.
+    """
+    with span("handle_completion", stream=True) as current:
+        request = _completion_request(session, tools, tool_choice)
+        cached = _cached_completion(request, current)
+        if cached is not None:
+            if cached.choices[0].message.content:
+                yield cached.choices[0].message.content
+            yield _completion_response(session, cached, cached=True)
+            return
+        start = time.perf_counter()
+        accumulator = StreamAccumulator()
+        with _completion_errors(request):
+            chunks, reservation = await asend(
+                lambda: get_async_client().chat.completions.create(**request, **STREAM_OPTIONS), request
             )
-            logger.debug("OpenAI response: %s", dump_json_colored(response.model_dump(), "green"))
-            return response
-        except openai.RateLimitError as e:
-            logger.error("OpenAI rate limit exceeded: %s", e)
-            raise
-        except openai.APIConnectionError as e:
-            logger.error("OpenAI API connection error: %s", e)
-            raise
-        except openai.AuthenticationError as e:
-            logger.error("OpenAI authentication error. Did you set OPENAI_API_KEY in your .env file? %s", e)
-            raise
-        except openai.BadRequestError as e:
-            logger.error("OpenAI bad request error: %s", e)
-            raise
-        except openai.APIError as e:
-            logger.error("OpenAI API error: %s", e)
-            raise
-        # pylint: disable=broad-except
-        except Exception as e:
-            logger.error("Unexpected error during OpenAI completion: %s", e)
-            raise
+            async with chunks:
+                async for chunk in chunks:
+                    delta = accumulator.add(chunk)
+                    if delta:
+                        yield delta
+        yield _completion_received(session, request, accumulator.completion(), reservation, start, current, accumulator)
+
 
+def _initial_tools() -> tuple:
+    """Tools offered with the user's message."""
+    return tool_registry.tools(*INITIAL_TOOLS)
+
+
+def _followup_tools() -> tuple:
+    """Tools offered after tool results have been added to the conversation."""
+    return tool_registry.tools(*FOLLOWUP_TOOLS)
+
+
+def _begin_completion(prompt: str, session: ConversationSession) -> bool:
+    """Add the user's prompt to the session. Returns False if there is nothing to send."""
+    session.touch()
     if not prompt.strip():
         logger.warning("Received empty prompt.")
-        return None, []
+        return False
+    user_message: "ChatCompletionUserMessageParam" = {"role": "user", "content": prompt}
+    session.append(user_message)
+    return True
 
-    messages.append(ChatCompletionUserMessageParam(role="user", content=prompt))
-    functions_called = []
 
-    response = handle_completion(
-        # tool_choice={"type": "function", "function": {"name": "get_courses"}},
-        tool_choice=LLM_TOOL_CHOICE,
-        tools=[stackademy_app.tool_factory_get_courses()],
-    )
-    logger.debug("Initial response: %s", dump_json_colored(response.model_dump(), "green"))
+def _wants_tools(message: "ChatCompletionMessage") -> bool:
+    """Whether the assistant's message requests tool calls that should be run."""
+    if not message.tool_calls:
+        return False
+    return not (message.content and "Goodbye!" in message.content)
 
-    message = response.choices[0].message
-    while message.tool_calls:
-        if message.content and "Goodbye!" in message.content:
-            break
-        functions_called = process_tool_calls(message)
 
-        response = handle_completion(
-            tools=[stackademy_app.tool_factory_get_courses(), stackademy_app.tool_factory_register()],
-            tool_choice=ToolChoice.AUTO,
-        )
-        message = response.choices[0].message
-        logger.debug("Updated response: %s", dump_json_colored(response.model_dump(), "green"))
+def _turn(
+    prompt: str, session: ConversationSession, turn: CompletionStream, stream: bool
+) -> Generator[str, None, None]:
+    """
+    One conversation turn: the user's prompt, then a request per round of tool calls until the LLM answers.
+
+    Yields the text deltas if stream, and nothing otherwise; the final response
+    and the functions called are set on turn.
+    """
+    with span("turn", session=session.id, **({"stream": True} if stream else {})):
+        if not _begin_completion(prompt, session):
+            return
+        tools, tool_choice = _initial_tools(), LLM_TOOL_CHOICE
+        while True:
+            if stream:
+                response = yield from handle_completion_stream(session, tools=tools, tool_choice=tool_choice)
+            else:
+                response = handle_completion(session, tools=tools, tool_choice=tool_choice)
+            message = response.choices[0].message
+            if not _wants_tools(message):
+                break
+            turn.functions_called = process_tool_calls(message, session)
+            tools, tool_choice = _followup_tools(), ToolChoice.AUTO
+        turn.response = response
+
+
+def completion(
+    prompt: str, session: Optional[ConversationSession] = None, stream: bool = False
+) -> Union[tuple[Optional["ChatCompletion"], list[str]], CompletionStream]:
+    """
+    LLM text completion
+
+    Args:
+        prompt (str): The user's message
+        session (ConversationSession, optional): The conversation to continue. Defaults to the
+            process-wide default session.
+        stream (bool): Return a CompletionStream of the text deltas as they arrive instead
+
+    Returns:
+        tuple: The final ChatCompletion (or None for an empty prompt) and the functions called.
+            With stream, a CompletionStream that holds them once it has been iterated to the end.
+    """
+    session = session or default_session()
+    turn = CompletionStream(lambda turn: _turn(prompt, session, turn, stream))
+    if stream:
+        return turn
+    # without streaming the turn yields no deltas: run it to the end
+    turn.text()
+    return turn.response, turn.functions_called
+
+
+async def _aturn(
+    prompt: str, session: ConversationSession, turn: AsyncCompletionStream, stream: bool
+) -> AsyncGenerator[str, None]:
+    """Async counterpart of _turn()."""
+    with span("turn", session=session.id, **({"stream": True} if stream else {})):
+        if not _begin_completion(prompt, session):
+            return
+        tools, tool_choice = _initial_tools(), LLM_TOOL_CHOICE
+        while True:
+            if stream:
+                async for item in ahandle_completion_stream(session, tools=tools, tool_choice=tool_choice):
+                    if isinstance(item, str):
+                        yield item
+                    else:
+                        response = item
+            else:
+                response = await ahandle_completion(session, tools=tools, tool_choice=tool_choice)
+            message = response.choices[0].message
+            if not _wants_tools(message):
+                break
+            turn.functions_called = await aprocess_tool_calls(message, session)
+            tools, tool_choice = _followup_tools(), ToolChoice.AUTO
+        turn.response = response
+
+
+async def acompletion(
+    prompt: str, session: Optional[ConversationSession] = None, stream: bool = False
+) -> Union[tuple[Optional["ChatCompletion"], list[str]], AsyncCompletionStream]:
+    """
+    Async LLM text completion.
 
-    return response, functions_called
+    Same as completion(), but the OpenAI requests are awaited on the event loop
+    and tool calls run in worker threads, so that one event loop can serve many
+    concurrent conversations. With stream, returns an AsyncCompletionStream.
+    """
+    session = session or default_session()
+    turn = AsyncCompletionStream(lambda turn: _aturn(prompt, session, turn, stream))
+    if stream:
+        return turn
+    await turn.atext()
+    return turn.response, turn.functions_called
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+Client-side rate limiting and retries of OpenAI requests.
+
+    response, reservation = send(lambda: get_client().chat.completions.create(**request), request)
+    reservation.settle(response.usage)
+
+Every request of the process, whatever its session, reserves one request and
+its estimated tokens from two token buckets sized for OPENAI_RPM_LIMIT and
+OPENAI_TPM_LIMIT. A reservation is taken under a lock and may overdraw the
+buckets: it returns how long the caller must wait for the debt to be repaid,
+and every later reservation waits behind it. Queued requests are therefore
+admitted in the order they arrived, and the buckets are never idle while
+requests are waiting, which is the most the tier limits allow.
+
+The estimate is the prompt (compaction.messages_tokens() plus the tools)
+and max_tokens, as OpenAI counts them against the TPM limit; it is corrected
+with the usage of the response once it is known.
+
+Failed requests (429, 408, 409, 5xx, timeouts and connection errors) are
+retried up to OPENAI_MAX_RETRIES times with full-jitter exponential backoff.
+A 429 pauses the limiter for every request, for the Retry-After of the
+response or the backoff; the requests that queued up meanwhile are then
+admitted at the refill rate instead of all at once.
+"""
+
+import asyncio
+import email.utils
+import json
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from app import settings
+from app.compaction import estimate_tokens, messages_tokens
+from app.logging_config import get_logger, setup_logging
+from app.metrics import OPENAI_RATE_LIMIT_WAIT_SECONDS, OPENAI_RETRIES
+from app.tracing import span
+from app.utils import lazy_import
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+# imported on first use, when a request fails
+openai = lazy_import("openai")
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    A bucket of per_minute units, refilled continuously, that can be overdrawn.
+
+    Args:
+        per_minute: The capacity of the bucket and its refill per minute
+        now: The current time of the limiter's clock
+    """
+
+    def __init__(self, per_minute: int, now: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        """Add the units accrued since the last update, up to the capacity. Nothing accrues while paused."""
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Take amount units, overdrawing the bucket if need be.
+
+        Returns:
+            float: The seconds until the debt is repaid and the bucket is not paused, 0 if neither
+        """
+        self.refill(now)
+        self.level -= amount
+        return max(0.0, self.updated - now) + (-self.level / self.rate if self.level < 0 else 0.0)
+
+    def refund(self, amount: float) -> None:
+        """Give back units that were not used."""
+        self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, until: float) -> None:
+        """
+        Drop the units at hand and accrue none until the given time, so that the
+        reservations made meanwhile are paced by the refill rate once it resumes.
+        """
+        self.level = min(self.level, 0.0)
+        self.updated = max(self.updated, until)
+
+
+class Reservation:
+    """A request admitted by a RateLimiter, after delay seconds, with its estimated tokens."""
+
+    __slots__ = ("limiter", "tokens", "delay")
+
+    def __init__(self, owner: "RateLimiter", tokens: int, delay: float):
+        self.limiter = owner
+        self.tokens = tokens
+        self.delay = delay
+
+    def settle(self, usage: Any) -> None:
+        """Correct the estimated tokens with the usage of the response, if reported."""
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+            self.limiter.correct(self, prompt_tokens + completion_tokens)
+
+    def cancel(self) -> None:
+        """Give the reservation back, e.g. when the caller stopped waiting for it."""
+        self.limiter.cancel(self)
+
+
+class RateLimiter:  # pylint: disable=too-many-instance-attributes
+    """
+    Requests and tokens per minute, shared by all sessions of the process.
+
+    Args:
+        rpm: Requests per minute, 0 for no limit
+        tpm: Tokens per minute, 0 for no limit
+        clock: The monotonic clock in seconds
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        now = clock()
+        self.requests = TokenBucket(rpm, now) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, now) if tpm > 0 else None
+        self.paused_until = now
+        self.admitted = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+        self.pauses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether requests or tokens are limited."""
+        return self.requests is not None or self.tokens is not None
+
+    def reserve(self, tokens: int = 0) -> Reservation:
+        """
+        Reserve a request and its estimated tokens, behind the reservations already made.
+
+        Returns:
+            Reservation: The reservation, with the seconds to wait before sending the request
+        """
+        with self._lock:
+            now = self.clock()
+            delay = max(0.0, self.paused_until - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.reserve(tokens, now))
+            self.admitted += 1
+            if delay:
+                self.delayed += 1
+                self.wait_seconds += delay
+        return Reservation(self, tokens, delay)
+
+    def correct(self, reservation: Reservation, tokens: int) -> None:
+        """Replace the estimated tokens of a reservation with the tokens actually used."""
+        with self._lock:
+            if self.tokens is not None:
+                self.tokens.refill(self.clock())
+                self.tokens.level -= tokens - reservation.tokens
+            reservation.tokens = tokens
+
+    def cancel(self, reservation: Reservation) -> None:
+        """Give back the request and tokens of a reservation that will not be sent."""
+        with self._lock:
+            if self.requests is not None:
+                self.requests.refund(1)
+            if self.tokens is not None:
+                self.tokens.refund(reservation.tokens)
+            reservation.tokens = 0
+
+    def pause(self, seconds: float) -> None:
+        """Admit no request for the given seconds, e.g. the Retry-After of a 429."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+            self.pauses += 1
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.pause(self.paused_until)
+
+    def stats(self) -> Dict[str, Any]:
+        """Reservations made and delayed, the seconds waited, pauses, and the units at hand."""
+        with self._lock:
+            now = self.clock()
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.refill(now)
+            return {
+                "admitted": self.admitted,
+                "delayed": self.delayed,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "pauses": self.pauses,
+                "requests_available": None if self.requests is None else round(self.requests.level, 1),
+                "tokens_available": None if self.tokens is None else round(self.tokens.level, 1),
+            }
+
+
+limiter = RateLimiter(settings.OPENAI_RPM_LIMIT, settings.OPENAI_TPM_LIMIT)
+
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    """Estimate the tokens a chat completion request counts against the TPM limit: its prompt and max_tokens."""
+    tokens = messages_tokens(request.get("messages") or [])
+    if request.get("tools"):
+        tokens += estimate_tokens(json.dumps(request["tools"], default=str))
+    return tokens + (request.get("max_tokens") or 0)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """The seconds to wait given by the retry-after-ms or Retry-After header of a failed response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether a request failed because it exceeded a rate limit, as opposed to the account's quota."""
+    return isinstance(error, openai.RateLimitError) and getattr(error, "code", None) != "insufficient_quota"
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed if sent again, as the OpenAI SDK decides."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    should_retry = headers.get("x-should-retry")
+    if should_retry in ("true", "false"):
+        return should_retry == "true"
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.RateLimitError):
+        return is_rate_limited(error)
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in (408, 409) or status >= 500)
+
+
+def backoff(attempt: int, base: float, cap: float, rng: Callable[[float, float], float] = random.uniform) -> float:
+    """Full-jitter exponential backoff: a random delay of up to base * 2**attempt seconds, at most cap."""
+    return rng(0.0, min(cap, base * 2**attempt))
+
+
+def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Decide whether to retry a failed request.
+
+    Args:
+        error: The error raised by the request
+        attempt: The number of retries already made
+
+    Returns:
+        Optional[float]: The seconds to wait before the retry, or None to give up
+    """
+    if not settings.OPENAI_APP_RETRIES or attempt >= settings.OPENAI_MAX_RETRIES or not is_retryable(error):
+        return None
+    seconds = retry_after(error)
+    if seconds is None:
+        return backoff(attempt, settings.OPENAI_RETRY_BASE_DELAY, settings.OPENAI_RETRY_MAX_DELAY)
+    if seconds > settings.OPENAI_RETRY_MAX_DELAY:
+        # retrying sooner than the server asked would only be rejected again
+        return None
+    # spread the retries of the requests that were told the same Retry-After
+    return seconds + random.uniform(0.0, settings.OPENAI_RETRY_BASE_DELAY)
+
+
+def _failed(error: Exception, reservation: Reservation, attempt: int, rate_limiter: RateLimiter) -> Optional[float]:
+    """
+    Account for a failed attempt.
+
+    Returns:
+        Optional[float]: The seconds the caller must wait before retrying, or None to give up
+    """
+    delay = retry_delay(error, attempt)
+    if is_rate_limited(error):
+        # a rejected request consumed no tokens; after a timeout or a 5xx the
+        # usage is unknown, so the estimate is kept
+        rate_limiter.correct(reservation, 0)
+        # every waiting request backs off, not only this one, but never for longer
+        # than a retry would wait: a Retry-After of minutes must not stall the process
+        seconds = delay if delay is not None else retry_after(error)
+        if seconds:
+            rate_limiter.pause(min(seconds, settings.OPENAI_RETRY_MAX_DELAY))
+        delay = None if delay is None else 0.0
+    if delay is not None:
+        OPENAI_RETRIES.inc(type(error).__name__)
+        logger.warning(
+            "OpenAI request failed with %s, retry %d of %d in %.2fs",
+            type(error).__name__,
+            attempt + 1,
+            settings.OPENAI_MAX_RETRIES,
+            delay or rate_limiter.paused_until - rate_limiter.clock(),
+        )
+    return delay
+
+
+def _reserve(request: Dict[str, Any], rate_limiter: RateLimiter) -> Reservation:
+    """Reserve a request, with its estimated tokens only if tokens are limited."""
+    tokens = estimate_request_tokens(request) if rate_limiter.tokens is not None else 0
+    reservation = rate_limiter.reserve(tokens)
+    if rate_limiter.enabled:
+        OPENAI_RATE_LIMIT_WAIT_SECONDS.observe(reservation.delay)
+    return reservation
+
+
+def send(
+    create: Callable[[], T], request: Dict[str, Any], rate_limiter: Optional[RateLimiter] = None
+) -> Tuple[T, Reservation]:
+    """
+    Send a request when the rate limiter admits it, retrying it if it fails.
+
+    Args:
+        create: Sends the request, e.g. a call of client.chat.completions.create()
+        request: The arguments of the request, to estimate its tokens
+        rate_limiter: The limiter to use instead of the shared one
+
+    Returns:
+        Tuple[T, Reservation]: The result of create() and the reservation of the attempt that succeeded,
+            to settle() with the usage of the response
+    """
+    rate_limiter = rate_limiter or limiter
+    attempt = 0
+    while True:
+        reservation = _reserve(request, rate_limiter)
+        if reservation.delay:
+            with span("rate_limit_wait"):
+                time.sleep(reservation.delay)
+        try:
+            return create(), reservation
+        except Exception as e:  # pylint: disable=broad-except
+            delay = _failed(e, reservation, attempt, rate_limiter)
+            if delay is None:
+                raise
+        attempt += 1
+        if delay:
+            time.sleep(delay)
+
+
+async def asend(
+    create: Callable[[], Awaitable[T]], request: Dict[str, Any], rate_limiter: Optional[RateLimiter] = None
+) -> Tuple[T, Reservation]:
+    """Async counterpart of send(). A request cancelled while it waits gives its reservation back."""
+    rate_limiter = rate_limiter or limiter
+    attempt = 0
+    while True:
+        reservation = _reserve(request, rate_limiter)
+        if reservation.delay:
+            with span("rate_limit_wait"):
+                try:
+                    await asyncio.sleep(reservation.delay)
+                except asyncio.CancelledError:
+                    reservation.cancel()
+                    raise
+        try:
+            return await create(), reservation
+        except Exception as e:  # pylint: disable=broad-except
+            delay = _failed(e, reservation, attempt, rate_limiter)
+            if delay is None:
+                raise
+        attempt += 1
+        if delay:
+            await asyncio.sleep(delay)
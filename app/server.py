@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP and WebSocket front-end for the Stackademy agent.
+
+An ASGI application, so that one process serves many concurrent
+conversations on a single event loop:
+
+    POST   /sessions                  start a conversation
+    GET    /sessions/{id}             the conversation's counters
+    DELETE /sessions/{id}             end the conversation
+    POST   /sessions/{id}/messages    send {"message": "..."} and receive the complete reply
+    POST   /sessions/{id}/stream      the same, with the reply streamed as server-sent events
+    WS     /sessions/{id}/ws          send {"message": "..."} frames and receive streamed replies
+    GET    /healthz                   load and session counters
+    GET    /metrics                   Prometheus metrics, see app.metrics
+
+Messages to an unknown session id start a new conversation with that id.
+
+usage: python -m app.server [--host HOST] [--port PORT]
+
+It runs under uvicorn when that is installed, and otherwise under the
+built-in HTTP/1.1 host in app.asgi, which does not support the WebSocket
+endpoint.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.asgi import serve
+from app.exceptions import ServerOverloaded
+from app.logging_config import get_logger, setup_logging
+from app.metrics import registry, start_file_export
+from app.prompt import acompletion, session_store
+from app.session import ConversationSession, SessionStore
+from app.settings import (
+    METRICS_FILE,
+    METRICS_FILE_INTERVAL,
+    SERVER_HOST,
+    SERVER_MAX_BODY_BYTES,
+    SERVER_MAX_CONCURRENCY,
+    SERVER_MAX_QUEUE,
+    SERVER_PORT,
+    SERVER_QUEUE_TIMEOUT,
+    SERVER_REQUEST_TIMEOUT,
+)
+from app.utils import lazy_import
+
+
+setup_logging()
+logger = get_logger(__name__)
+openai = lazy_import("openai")
+
+PROMETHEUS_CONTENT_TYPE = b"text/plain; version=0.0.4; charset=utf-8"
+SESSION_PATH = re.compile(r"^/sessions/(?P<session_id>[A-Za-z0-9_-]{1,64})(?P<action>/messages|/stream|/ws)?/?$")
+
+
+class HTTPError(Exception):
+    """An error answered with a status code and a JSON message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the reply was complete."""
+
+
+class Backpressure:
+    """
+    Admission control for conversation turns.
+
+    At most max_concurrency turns run at a time. Up to max_queue more wait
+    for a slot, each for at most timeout seconds; anything beyond that is
+    rejected with ServerOverloaded instead of queueing without bound.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the slots for the duration of a turn."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise ServerOverloaded("Too many requests are waiting")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError as e:
+            self.rejected += 1
+            raise ServerOverloaded(f"No capacity within {self.timeout:g}s") from e
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+class SessionLocks:
+    """One asyncio lock per active session, so that the turns of a conversation run one at a time."""
+
+    def __init__(self):
+        self._locks: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[None]:
+        """Hold the lock of a session; it is discarded once no request uses it."""
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+
+def error_response(error: Exception) -> Tuple[int, str, List[Tuple[bytes, bytes]]]:
+    """
+    Map an exception raised while serving a request to a response.
+
+    Returns:
+        tuple: status code, error message and extra headers
+    """
+    if isinstance(error, HTTPError):
+        return error.status, error.message, []
+    if isinstance(error, ServerOverloaded):
+        return 503, str(error), [(b"retry-after", b"1")]
+    if isinstance(error, asyncio.TimeoutError):
+        return 504, "The reply took too long", []
+    if isinstance(error, openai.APIError):
+        return 502, "The language model is not available", []
+    logger.error("Unexpected error: %s", error, exc_info=error)
+    return 500, "Internal server error", []
+
+
+def parse_message(raw: Any) -> str:
+    """Return the user's message from a JSON request body or WebSocket frame."""
+    try:
+        payload = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise HTTPError(400, "The body must be a JSON object") from e
+    message = payload.get("message") if isinstance(payload, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        raise HTTPError(400, 'Expected {"message": "..."} with a non-empty message')
+    return message
+
+
+class StackademyServer:  # pylint: disable=too-many-instance-attributes
+    """
+    ASGI application that serves the completion() workflow to many users.
+
+    Conversations live in a SessionStore, so idle ones expire and the least
+    recently used are evicted. Turns of one conversation are serialized;
+    turns of different conversations run concurrently, subject to
+    backpressure, and each is cancelled after request_timeout seconds or when
+    its client disconnects.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        store: SessionStore = session_store,
+        max_concurrency: int = SERVER_MAX_CONCURRENCY,
+        max_queue: int = SERVER_MAX_QUEUE,
+        queue_timeout: float = SERVER_QUEUE_TIMEOUT,
+        request_timeout: float = SERVER_REQUEST_TIMEOUT,
+        max_body_bytes: int = SERVER_MAX_BODY_BYTES,
+    ):
+        self.store = store
+        self.backpressure = Backpressure(max_concurrency, max_queue, queue_timeout)
+        self.locks = SessionLocks()
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+        self.turns = 0
+        self.timeouts = 0
+        self.disconnects = 0
+
+    async def __call__(self, scope: Dict[str, Any], receive, send) -> None:
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report the load of the server.
+
+        Returns:
+            Dict[str, Any]: turns in flight and waiting, rejections, timeouts and the session store counters
+        """
+        return {
+            "status": "ok",
+            "in_flight": self.backpressure.in_flight,
+            "waiting": self.backpressure.waiting,
+            "rejected": self.backpressure.rejected,
+            "turns": self.turns,
+            "timeouts": self.timeouts,
+            "disconnects": self.disconnects,
+            "sessions": self.store.stats(),
+        }
+
+    @staticmethod
+    def describe(session: ConversationSession) -> Dict[str, Any]:
+        """The public counters of a conversation."""
+        return {
+            "session_id": session.id,
+            "messages": len(session.messages),
+            "functions_called": session.functions_called,
+            "prompt_tokens": session.prompt_tokens,
+            "completion_tokens": session.completion_tokens,
+            "total_tokens": session.total_tokens,
+        }
+
+    @staticmethod
+    def result(session: ConversationSession, response: Any, functions_called: List[str]) -> Dict[str, Any]:
+        """The reply to one message."""
+        reply = response.choices[0].message.content if response is not None else None
+        return {
+            "session_id": session.id,
+            "reply": reply or "",
+            "functions_called": functions_called,
+            "total_tokens": session.total_tokens,
+        }
+
+    @contextlib.asynccontextmanager
+    async def _admit(self, session_id: str) -> AsyncIterator[ConversationSession]:
+        """Wait for the conversation's previous turn and for a free slot, then return the session."""
+        async with self.locks.hold(session_id):
+            async with self.backpressure.slot():
+                self.turns += 1
+                yield self.store.get_or_create(session_id)
+
+    async def _run(self, coro, receive) -> Any:
+        """Run a turn under the request timeout, cancelling it if the client disconnects."""
+        task = asyncio.ensure_future(coro)
+        watcher = asyncio.ensure_future(self._disconnected(receive))
+        try:
+            done, _ = await asyncio.wait(
+                {task, watcher}, timeout=self.request_timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if task in done:
+                return task.result()
+            if watcher in done:
+                self.disconnects += 1
+                raise ClientDisconnected()
+            self.timeouts += 1
+            raise asyncio.TimeoutError()
+        finally:
+            watcher.cancel()
+            if not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+    @staticmethod
+    async def _disconnected(receive) -> None:
+        """Return once the client has disconnected."""
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                logger.info(
+                    "Stackademy server ready: %d concurrent turns, %d queued, %gs timeout",
+                    self.backpressure.max_concurrency,
+                    self.backpressure.max_queue,
+                    self.request_timeout,
+                )
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Dict[str, Any], receive, send) -> None:
+        method, path = scope["method"], scope["path"]
+        try:
+            if path == "/healthz":
+                self._allow(method, "GET")
+                await self._send_json(send, 200, self.stats())
+                return
+            if path == "/metrics":
+                self._allow(method, "GET")
+                await self._send_text(send, 200, registry.render(), PROMETHEUS_CONTENT_TYPE)
+                return
+            if path in ("/sessions", "/sessions/"):
+                self._allow(method, "POST")
+                await self._send_json(send, 201, {"session_id": self.store.create().id})
+                return
+            match = SESSION_PATH.match(path)
+            if match is None:
+                raise HTTPError(404, f"Not found: {path}")
+            session_id, action = match["session_id"], match["action"]
+            if action is None:
+                await self._session(method, session_id, send)
+            elif action == "/ws":
+                raise HTTPError(426, "Connect with a WebSocket")
+            else:
+                self._allow(method, "POST")
+                message = parse_message(await self._read_body(receive))
+                if action == "/messages":
+                    await self._send_json(send, 200, await self._run(self._reply(session_id, message), receive))
+                else:
+                    await self._stream(session_id, message, receive, send)
+        except ClientDisconnected:
+            logger.debug("Client disconnected during %s %s", method, path)
+        except Exception as e:  # pylint: disable=broad-except
+            status, error, headers = error_response(e)
+            await self._send_json(send, status, {"error": error}, headers)
+
+    @staticmethod
+    def _allow(method: str, allowed: str) -> None:
+        if method != allowed:
+            raise HTTPError(405, f"Use {allowed}")
+
+    async def _session(self, method: str, session_id: str, send) -> None:
+        if method == "GET":
+            session = self.store.get(session_id)
+            if session is None:
+                raise HTTPError(404, f"No session {session_id}")
+            await self._send_json(send, 200, self.describe(session))
+        elif method == "DELETE":
+            self.store.delete(session_id)
+            await send({"type": "http.response.start", "status": 204, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+        else:
+            raise HTTPError(405, "Use GET or DELETE")
+
+    async def _read_body(self, receive) -> bytes:
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            body.extend(message.get("body", b""))
+            if len(body) > self.max_body_bytes:
+                raise HTTPError(413, f"The body exceeds {self.max_body_bytes} bytes")
+            if not message.get("more_body"):
+                return bytes(body)
+
+    async def _reply(self, session_id: str, message: str) -> Dict[str, Any]:
+        async with self._admit(session_id) as session:
+            response, functions_called = await acompletion(message, session=session)
+            return self.result(session, response, functions_called)
+
+    async def _stream(self, session_id: str, message: str, receive, send) -> None:
+        """Stream a reply as server-sent events: delta events, then a done or an error event."""
+        started = False
+
+        async def events() -> None:
+            nonlocal started
+            async with self._admit(session_id) as session:
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 200,
+                        "headers": [
+                            (b"content-type", b"text/event-stream; charset=utf-8"),
+                            (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no"),
+                        ],
+                    }
+                )
+                started = True
+                async with await acompletion(message, session=session, stream=True) as stream:
+                    async for delta in stream:
+                        await self._send_event(send, "delta", {"text": delta})
+                result = self.result(session, stream.response, stream.functions_called)
+                await self._send_event(send, "done", result, more_body=False)
+
+        try:
+            await self._run(events(), receive)
+        except ClientDisconnected:
+            raise
+        except Exception as e:  # pylint: disable=broad-except
+            if not started:
+                raise
+            status, error, _ = error_response(e)
+            await self._send_event(send, "error", {"status": status, "error": error}, more_body=False)
+
+    async def _websocket(self, scope: Dict[str, Any], receive, send) -> None:
+        """Serve one WebSocket: each text frame is a message, answered with delta frames and a done frame."""
+        if (await receive())["type"] != "websocket.connect":
+            return
+        match = SESSION_PATH.match(scope["path"])
+        if match is None or match["action"] != "/ws":
+            await send({"type": "websocket.close", "code": 4404})
+            return
+        session_id = match["session_id"]
+        await send({"type": "websocket.accept"})
+        while True:
+            frame = await receive()
+            if frame["type"] == "websocket.disconnect":
+                return
+            if frame["type"] != "websocket.receive":
+                continue
+            try:
+                message = parse_message(frame.get("text") or frame.get("bytes"))
+                await asyncio.wait_for(self._ws_turn(session_id, message, send), self.request_timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                await self._ws_send(send, {"type": "error", "status": 504, "error": "The reply took too long"})
+            except OSError:
+                self.disconnects += 1
+                return
+            except Exception as e:  # pylint: disable=broad-except
+                status, error, _ = error_response(e)
+                await self._ws_send(send, {"type": "error", "status": status, "error": error})
+
+    async def _ws_turn(self, session_id: str, message: str, send) -> None:
+        async with self._admit(session_id) as session:
+            async with await acompletion(message, session=session, stream=True) as stream:
+                async for delta in stream:
+                    await self._ws_send(send, {"type": "delta", "text": delta})
+            await self._ws_send(
+                send, {"type": "done", **self.result(session, stream.response, stream.functions_called)}
+            )
+
+    @staticmethod
+    async def _ws_send(send, payload: Dict[str, Any]) -> None:
+        await send({"type": "websocket.send", "text": json.dumps(payload, default=str)})
+
+    @staticmethod
+    async def _send_json(send, status: int, payload: Any, headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        body = json.dumps(payload, default=str).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    *(headers or []),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send_text(send, status: int, text: str, content_type: bytes) -> None:
+        body = text.encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode("latin-1"))],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send_event(send, event: str, payload: Dict[str, Any], more_body: bool = True) -> None:
+        data = json.dumps(payload, default=str)
+        await send(
+            {
+                "type": "http.response.body",
+                "body": f"event: {event}\ndata: {data}\n\n".encode("utf-8"),
+                "more_body": more_body,
+            }
+        )
+
+
+app = StackademyServer()
+
+
+def main() -> None:
+    """Serve the Stackademy agent."""
+    parser = argparse.ArgumentParser(description="Serve the Stackademy agent over HTTP.")
+    parser.add_argument("--host", default=SERVER_HOST, help="interface to listen on")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="port to listen on")
+    args = parser.parse_args()
+    start_file_export(METRICS_FILE, METRICS_FILE_INTERVAL)
+    if importlib.util.find_spec("uvicorn") is not None:
+        import uvicorn  # pylint: disable=import-outside-toplevel,import-error
+
+        uvicorn.run(app, host=args.host, port=args.port)
+    else:
+        logger.info("uvicorn is not installed; serving HTTP/1.1 without WebSocket support.")
+        serve(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""Per-user conversation state and a bounded in-process session store."""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from app.logging_config import get_logger, setup_logging
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+
+def message_size(message: Any) -> int:
+    """Approximate the memory footprint of a message by its serialized length."""
+    try:
+        return len(json.dumps(message, default=str))
+    except (TypeError, ValueError):
+        return len(str(message))
+
+
+class ConversationSession:  # pylint: disable=too-many-instance-attributes
+    """The message history and counters of one conversation."""
+
+    def __init__(self, session_id: Optional[str] = None, messages: Optional[List[Any]] = None):
+        self.id = session_id or uuid.uuid4().hex
+        self.messages: List[Any] = []
+        self.functions_called: List[str] = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.created_at = time.monotonic()
+        self.last_active_at = self.created_at
+        self.size_bytes = 0
+        self.tokens_saved = 0
+        self.last_compaction: Dict[str, int] = {}
+        for message in messages or []:
+            self.append(message)
+
+    def __repr__(self) -> str:
+        return f"ConversationSession(id={self.id!r}, messages={len(self.messages)})"
+
+    @property
+    def total_tokens(self) -> int:
+        """Prompt plus completion tokens used so far."""
+        return self.prompt_tokens + self.completion_tokens
+
+    def append(self, message: Any) -> None:
+        """Add a message to the history."""
+        self.messages.append(message)
+        self.size_bytes += message_size(message)
+
+    def replace_messages(self, messages: List[Any]) -> None:
+        """Replace the whole history, e.g. after it was compacted."""
+        self.messages = list(messages)
+        self.size_bytes = sum(message_size(message) for message in self.messages)
+
+    def record_functions(self, functions_called: List[str]) -> None:
+        """Remember which tools were called during the conversation."""
+        self.functions_called.extend(functions_called)
+
+    def record_usage(self, usage: Any) -> None:
+        """Add the token usage reported by an OpenAI response."""
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if isinstance(prompt_tokens, int):
+            self.prompt_tokens += prompt_tokens
+        if isinstance(completion_tokens, int):
+            self.completion_tokens += completion_tokens
+
+    def touch(self) -> None:
+        """Mark the session as active now."""
+        self.last_active_at = time.monotonic()
+
+
+class SessionStore:
+    """
+    Thread-safe store of conversation sessions with LRU eviction and an idle TTL.
+
+    Sessions are kept in least-recently-used order, so the sessions that have
+    been idle the longest are always at the front. This makes both TTL expiry
+    and capacity eviction proportional to the number of sessions removed.
+    """
+
+    def __init__(
+        self,
+        initial_messages: Optional[Callable[[], List[Any]]] = None,
+        max_sessions: int = 10000,
+        idle_ttl: float = 1800.0,
+    ):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.initial_messages = initial_messages or list
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evicted = 0
+        self._expired = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def _expire(self, now: float) -> None:
+        """Drop sessions idle for longer than idle_ttl. Caller must hold the lock."""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_active_at < self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self._expired += 1
+            logger.debug("Expired idle session %s", session_id)
+
+    def _evict(self) -> None:
+        """Drop least recently used sessions until there is room. Caller must hold the lock."""
+        while len(self._sessions) >= self.max_sessions:
+            session_id, _ = self._sessions.popitem(last=False)
+            self._evicted += 1
+            logger.debug("Evicted least recently used session %s", session_id)
+
+    def _lookup(self, session_id: str, now: float) -> Optional[ConversationSession]:
+        """Return an existing session and mark it as recently used, or None. Caller must hold the lock."""
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            session.last_active_at = now
+        return session
+
+    def _insert(self, session: ConversationSession) -> None:
+        """Add a session, replacing any with the same id. Caller must hold the lock."""
+        self._sessions.pop(session.id, None)
+        self._evict()
+        self._sessions[session.id] = session
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        """Return an existing session and mark it as recently used, or None."""
+        with self._lock:
+            return self._lookup(session_id, time.monotonic())
+
+    def create(self, session_id: Optional[str] = None) -> ConversationSession:
+        """Start a new session, seeded with the initial messages."""
+        session = ConversationSession(session_id=session_id, messages=self.initial_messages())
+        with self._lock:
+            self._expire(time.monotonic())
+            self._insert(session)
+        return session
+
+    def get_or_create(self, session_id: str) -> ConversationSession:
+        """
+        Return the session with the given id, creating it if needed.
+
+        The lookup and the insert are made under one lock, so that concurrent
+        requests for a new session id all get the same session.
+        """
+        with self._lock:
+            session = self._lookup(session_id, time.monotonic())
+            if session is None:
+                session = ConversationSession(session_id=session_id, messages=self.initial_messages())
+                self._insert(session)
+            return session
+
+    def delete(self, session_id: str) -> None:
+        """Remove a session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report resident sessions and their approximate memory use.
+
+        Returns:
+            Dict[str, Any]: session count, total message bytes and eviction counters
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            sessions = list(self._sessions.values())
+            return {
+                "sessions": len(sessions),
+                "bytes": sum(session.size_bytes for session in sessions),
+                "messages": sum(len(session.messages) for session in sessions),
+                "max_sessions": self.max_sessions,
+                "evicted": self._evicted,
+                "expired": self._expired,
+            }
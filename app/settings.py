@@ -3,6 +3,7 @@
 
 import logging
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -13,17 +14,148 @@ from app.exceptions import ConfigurationException
 load_dotenv()
 SET_ME_PLEASE = "SET-ME-PLEASE"
 
+
+def getenv_bool(name: str, default: bool) -> bool:
+    """Read a boolean flag from the environment."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 # General settings
 LOGGING_LEVEL = int(os.getenv("LOGGING_LEVEL", str(logging.INFO)))
+# text or json (one JSON object per line). ANSI colors are used when stdout is
+# a terminal with LOGGING_COLOR=auto, or always or never.
+LOGGING_FORMAT = os.getenv("LOGGING_FORMAT", "text")
+LOGGING_COLOR = os.getenv("LOGGING_COLOR", "auto")
+# Hand log records to a background thread through a queue of at most
+# LOGGING_QUEUE_SIZE records, so that request threads never wait on stdout.
+# When the queue is full, LOGGING_QUEUE_DROP decides: drop the newest record,
+# drop the oldest queued record, or block until there is room.
+LOGGING_QUEUE = getenv_bool("LOGGING_QUEUE", False)
+LOGGING_QUEUE_SIZE = int(os.getenv("LOGGING_QUEUE_SIZE", "10000"))
+LOGGING_QUEUE_DROP = os.getenv("LOGGING_QUEUE_DROP", "newest")
 
 
 # LLM/OpenAI API settings
 LLM_TOOL_CHOICE = os.getenv("LLM_TOOL_CHOICE", ToolChoice.REQUIRED)
 LLM_ASSISTANT_NAME = "StackademyAssistant"
+# render the agent's replies token by token as they are generated
+LLM_STREAM = getenv_bool("LLM_STREAM", True)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", SET_ME_PLEASE)
 OPENAI_API_MODEL = os.getenv("OPENAI_API_MODEL", "gpt-4o-mini")
 OPENAI_API_TEMPERATURE = float(os.getenv("OPENAI_API_TEMPERATURE", "0.0"))
 OPENAI_API_MAX_TOKENS = int(os.getenv("OPENAI_API_MAX_TOKENS", "4096"))
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# HTTP transport for the shared OpenAI clients. Connections are kept alive and
+# reused across requests; OPENAI_HTTP2 requires the optional h2 package.
+OPENAI_HTTP_MAX_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "100"))
+OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_HTTP_KEEPALIVE_EXPIRY", "30"))
+OPENAI_HTTP_CONNECT_TIMEOUT = float(os.getenv("OPENAI_HTTP_CONNECT_TIMEOUT", "5"))
+OPENAI_HTTP_READ_TIMEOUT = float(os.getenv("OPENAI_HTTP_READ_TIMEOUT", "60"))
+OPENAI_HTTP2 = getenv_bool("OPENAI_HTTP2", False)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+# Client-side rate limiting of OpenAI requests, shared by all sessions of the
+# process. Requests wait, in the order they arrived, for room in token buckets
+# of OPENAI_RPM_LIMIT requests and OPENAI_TPM_LIMIT tokens per minute (0 for no
+# limit); set them to your tier's limits. With OPENAI_APP_RETRIES, failed
+# requests are retried OPENAI_MAX_RETRIES times by the app instead of the SDK,
+# with full-jitter exponential backoff from OPENAI_RETRY_BASE_DELAY up to
+# OPENAI_RETRY_MAX_DELAY seconds, honoring Retry-After; a 429 pauses the limiter.
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "0"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "0"))
+OPENAI_APP_RETRIES = getenv_bool("OPENAI_APP_RETRIES", True)
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "30"))
+
+# Tool calls requested in one assistant message run concurrently, at most
+# TOOL_CALL_MAX_CONCURRENCY at a time, on a shared pool of worker threads.
+TOOL_CALL_MAX_CONCURRENCY = int(os.getenv("TOOL_CALL_MAX_CONCURRENCY", "4"))
+TOOL_EXECUTOR_MAX_WORKERS = int(os.getenv("TOOL_EXECUTOR_MAX_WORKERS", "32"))
+
+# Cache of serialized tool results, e.g. get_courses() for the same area and
+# budget. TOOL_RESULT_CACHE_BACKEND=sqlite shares the cache between worker
+# processes through the file TOOL_RESULT_CACHE_PATH (use /dev/shm to keep it
+# in shared memory). get_courses() budgets are bucketed to multiples of
+# TOOL_RESULT_CACHE_COST_BUCKET. The cache is cleared when the catalog changes
+# only with STACKADEMY_CATALOG_SNAPSHOT, which polls for changes; otherwise a
+# change to the courses table shows after at most TOOL_RESULT_CACHE_TTL seconds.
+TOOL_RESULT_CACHE = getenv_bool("TOOL_RESULT_CACHE", True)
+TOOL_RESULT_CACHE_BACKEND = os.getenv("TOOL_RESULT_CACHE_BACKEND", "memory")
+TOOL_RESULT_CACHE_PATH = os.getenv(
+    "TOOL_RESULT_CACHE_PATH", os.path.join(tempfile.gettempdir(), "stackademy-tool-cache.sqlite3")
+)
+TOOL_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_RESULT_CACHE_MAX_ENTRIES", "1024"))
+TOOL_RESULT_CACHE_TTL = float(os.getenv("TOOL_RESULT_CACHE_TTL", "60"))
+TOOL_RESULT_CACHE_COST_BUCKET = float(os.getenv("TOOL_RESULT_CACHE_COST_BUCKET", "0.01"))
+
+# Opt-in cache of chat completions, keyed on a hash of the model, messages,
+# tools, tool_choice, temperature and max_tokens of the request. Useful for
+# scripted runs and replays with OPENAI_API_TEMPERATURE=0. Backends: memory,
+# sqlite (COMPLETION_CACHE_PATH is a database file) or file
+# (COMPLETION_CACHE_PATH is a directory with one JSON file per completion).
+COMPLETION_CACHE = getenv_bool("COMPLETION_CACHE", False)
+COMPLETION_CACHE_BACKEND = os.getenv("COMPLETION_CACHE_BACKEND", "memory")
+COMPLETION_CACHE_PATH = os.getenv(
+    "COMPLETION_CACHE_PATH", os.path.join(tempfile.gettempdir(), "stackademy-completion-cache")
+)
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "1024"))
+COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", "86400"))
+
+# Cache of course codes checked by verify_course(). Existing codes are
+# remembered for COURSE_CODE_CACHE_TTL seconds; unknown codes, which the LLM
+# tends to repeat, for COURSE_CODE_NEGATIVE_TTL seconds. Both are cleared
+# when the course catalog changes.
+COURSE_CODE_CACHE = getenv_bool("COURSE_CODE_CACHE", True)
+COURSE_CODE_CACHE_MAX_ENTRIES = int(os.getenv("COURSE_CODE_CACHE_MAX_ENTRIES", "4096"))
+COURSE_CODE_CACHE_TTL = float(os.getenv("COURSE_CODE_CACHE_TTL", "300"))
+COURSE_CODE_NEGATIVE_TTL = float(os.getenv("COURSE_CODE_NEGATIVE_TTL", "30"))
+
+# Conversation session store settings
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+
+# Conversation history compaction. Tool results older than HISTORY_KEEP_TURNS
+# turns are shrunk, and the oldest turns are dropped once the estimated prompt
+# exceeds HISTORY_TOKEN_BUDGET tokens (0 disables the budget).
+HISTORY_COMPACTION = getenv_bool("HISTORY_COMPACTION", True)
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+HISTORY_TOOL_RESULT_MAX_CHARS = int(os.getenv("HISTORY_TOOL_RESULT_MAX_CHARS", "500"))
+
+# HTTP front-end (python -m app.server). At most SERVER_MAX_CONCURRENCY turns
+# run at a time and at most SERVER_MAX_QUEUE requests wait for a slot, each for
+# up to SERVER_QUEUE_TIMEOUT seconds; requests beyond that are answered with
+# 503 and a Retry-After header. A turn that takes longer than
+# SERVER_REQUEST_TIMEOUT seconds is cancelled and answered with 504.
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_MAX_CONCURRENCY = int(os.getenv("SERVER_MAX_CONCURRENCY", "64"))
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "256"))
+SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "5"))
+SERVER_REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", "120"))
+SERVER_MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", "65536"))
+
+# Per-turn tracing of where the time goes: the OpenAI requests, tool calls,
+# database connects and queries. Exporters: log (a breakdown per turn), file
+# (one JSON line per turn appended to TRACING_FILE) and otlp (OpenTelemetry,
+# requires the optional opentelemetry-sdk and opentelemetry-exporter-otlp
+# packages and reads the standard OTEL_EXPORTER_OTLP_* variables); several
+# can be combined, e.g. "log,file".
+TRACING = getenv_bool("TRACING", False)
+TRACING_EXPORTERS = os.getenv("TRACING_EXPORTERS", "log")
+TRACING_FILE = os.getenv("TRACING_FILE", os.path.join(tempfile.gettempdir(), "stackademy-traces.jsonl"))
+
+# Prometheus metrics: OpenAI latency and tokens, tool calls, database round-trips
+# and cache hit ratios. The server exposes them at GET /metrics; with
+# METRICS_FILE they are also written to that file every METRICS_FILE_INTERVAL
+# seconds and at exit, e.g. for node_exporter's textfile collector.
+METRICS_FILE = os.getenv("METRICS_FILE") or None
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))
 
 
 # MySQL database settings
@@ -34,6 +166,29 @@ MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", SET_ME_PLEASE)
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", SET_ME_PLEASE)
 MYSQL_CHARSET = os.getenv("MYSQL_CHARSET", "utf8mb4")
 
+# MySQL connection pool settings. Set MYSQL_POOL_MAX_SIZE=0 to disable pooling
+# and open a new connection for every query. MYSQL_POOL_MIN_SIZE connections are
+# opened on the first checkout and kept open however long they are idle.
+MYSQL_POOL_MIN_SIZE = int(os.getenv("MYSQL_POOL_MIN_SIZE", "1"))
+MYSQL_POOL_MAX_SIZE = int(os.getenv("MYSQL_POOL_MAX_SIZE", "10"))
+MYSQL_POOL_IDLE_TIMEOUT = float(os.getenv("MYSQL_POOL_IDLE_TIMEOUT", "300"))
+MYSQL_POOL_MAX_LIFETIME = float(os.getenv("MYSQL_POOL_MAX_LIFETIME", "3600"))
+MYSQL_POOL_CHECKOUT_TIMEOUT = float(os.getenv("MYSQL_POOL_CHECKOUT_TIMEOUT", "10"))
+MYSQL_POOL_PING_ON_CHECKOUT = getenv_bool("MYSQL_POOL_PING_ON_CHECKOUT", True)
+
+# Course catalog snapshot settings. When enabled, get_courses() is served from
+# an in-memory copy of the catalog that is revalidated every
+# STACKADEMY_CATALOG_TTL seconds with STACKADEMY_CATALOG_VERSION_QUERY. The
+# version must change with any insert, update or delete of a course, so it reads
+# courses.updated_at (added by app.bootstrap_db); if the query is empty or fails,
+# the catalog is reloaded every STACKADEMY_CATALOG_TTL seconds instead.
+STACKADEMY_CATALOG_SNAPSHOT = getenv_bool("STACKADEMY_CATALOG_SNAPSHOT", False)
+STACKADEMY_CATALOG_TTL = float(os.getenv("STACKADEMY_CATALOG_TTL", "300"))
+STACKADEMY_CATALOG_VERSION_QUERY = os.getenv(
+    "STACKADEMY_CATALOG_VERSION_QUERY",
+    "SELECT COUNT(*) AS row_count, MAX(updated_at) AS updated_at FROM courses",
+)
+
 # application configuration validations
 if SET_ME_PLEASE in (
     MYSQL_HOST,
@@ -43,5 +198,44 @@ if SET_ME_PLEASE in (
 ):
     raise ConfigurationException("MySQL configuration is incomplete. Please check your .env file.")
 
+if OPENAI_RPM_LIMIT < 0 or OPENAI_TPM_LIMIT < 0:
+    raise ConfigurationException("OPENAI_RPM_LIMIT and OPENAI_TPM_LIMIT must be at least 0.")
+
+if not 0 < OPENAI_RETRY_BASE_DELAY <= OPENAI_RETRY_MAX_DELAY:
+    raise ConfigurationException("OPENAI_RETRY_BASE_DELAY must be positive and at most OPENAI_RETRY_MAX_DELAY.")
+
+if MYSQL_POOL_MAX_SIZE > 0 and not 0 <= MYSQL_POOL_MIN_SIZE <= MYSQL_POOL_MAX_SIZE:
+    raise ConfigurationException("MYSQL_POOL_MIN_SIZE must be between 0 and MYSQL_POOL_MAX_SIZE.")
+
+if TOOL_RESULT_CACHE_BACKEND not in ("memory", "sqlite"):
+    raise ConfigurationException("TOOL_RESULT_CACHE_BACKEND must be 'memory' or 'sqlite'.")
+
+if TOOL_RESULT_CACHE_COST_BUCKET <= 0:
+    raise ConfigurationException("TOOL_RESULT_CACHE_COST_BUCKET must be positive.")
+
+if COMPLETION_CACHE_BACKEND not in ("memory", "sqlite", "file"):
+    raise ConfigurationException("COMPLETION_CACHE_BACKEND must be 'memory', 'sqlite' or 'file'.")
+
+if SERVER_MAX_CONCURRENCY < 1 or SERVER_MAX_QUEUE < 0:
+    raise ConfigurationException("SERVER_MAX_CONCURRENCY must be at least 1 and SERVER_MAX_QUEUE at least 0.")
+
+if not {name.strip() for name in TRACING_EXPORTERS.split(",") if name.strip()} <= {"log", "file", "otlp"}:
+    raise ConfigurationException("TRACING_EXPORTERS must be a comma-separated list of 'log', 'file' and 'otlp'.")
+
+if LOGGING_FORMAT not in ("text", "json"):
+    raise ConfigurationException("LOGGING_FORMAT must be 'text' or 'json'.")
+
+if LOGGING_COLOR not in ("auto", "always", "never"):
+    raise ConfigurationException("LOGGING_COLOR must be 'auto', 'always' or 'never'.")
+
+if LOGGING_QUEUE_SIZE < 1:
+    raise ConfigurationException("LOGGING_QUEUE_SIZE must be positive.")
+
+if LOGGING_QUEUE_DROP not in ("newest", "oldest", "block"):
+    raise ConfigurationException("LOGGING_QUEUE_DROP must be 'newest', 'oldest' or 'block'.")
+
+if METRICS_FILE_INTERVAL <= 0:
+    raise ConfigurationException("METRICS_FILE_INTERVAL must be positive.")
+
 if OPENAI_API_KEY in (None, SET_ME_PLEASE):
     raise ConfigurationException("No OpenAI API key found. Please add it to your .env file.")
@@ -1,18 +1,45 @@
 # -*- coding: utf-8 -*-
 """Stackademy application with MySQL database integration."""
 
+import json
+import math
+from bisect import bisect_right
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
 
-from openai.types.chat import ChatCompletionFunctionToolParam
 from pydantic import BaseModel, Field
 
+from app.cache import BaseCache, MemoryCache, create_cache
+from app.catalog import COURSES_ORDER_BY, COURSES_QUERY, CourseCatalog
 from app.const import MISSING
-from app.database import db
+from app.database import get_db
 from app.exceptions import ConfigurationException
 from app.logging_config import get_logger, setup_logging
-from app.utils import color_text
-
+from app.metrics import track_cache
+from app.settings import (
+    COURSE_CODE_CACHE,
+    COURSE_CODE_CACHE_MAX_ENTRIES,
+    COURSE_CODE_CACHE_TTL,
+    COURSE_CODE_NEGATIVE_TTL,
+    STACKADEMY_CATALOG_SNAPSHOT,
+    STACKADEMY_CATALOG_TTL,
+    STACKADEMY_CATALOG_VERSION_QUERY,
+    TOOL_RESULT_CACHE,
+    TOOL_RESULT_CACHE_BACKEND,
+    TOOL_RESULT_CACHE_COST_BUCKET,
+    TOOL_RESULT_CACHE_MAX_ENTRIES,
+    TOOL_RESULT_CACHE_PATH,
+    TOOL_RESULT_CACHE_TTL,
+)
+from app.tools import ToolSpec, Unavailable, tool_registry
+from app.tracing import traced
+from app.utils import lazy_color_text
+
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionFunctionToolParam
+
+    from app.database import DatabaseConnection
 
 setup_logging()
 logger = get_logger(__name__)
@@ -48,46 +75,143 @@ class StackademyRegisterCourseParams(BaseModel):
     full_name: str = Field(description="The full name of the new user.")
 
 
+class StackademyRegistrationResult(BaseModel):
+    """Outcome of one registration of a bulk registration."""
+
+    course_code: str = Field(description="The normalized course code.")
+    email: str = Field(description="The normalized email address.")
+    full_name: str = Field(description="The normalized full name.")
+    success: bool = Field(description="Whether the registration was stored.")
+    error: Optional[str] = Field(default=None, description="Why the registration failed.")
+
+
+COURSE_EXISTS_QUERY = "SELECT 1 FROM courses WHERE course_code = %s LIMIT 1"
+
+# idempotent: registering the same email for the same course again only updates the name.
+# VALUES(col) is deprecated since MySQL 8.0.20 in favour of a row alias, but the alias is a
+# syntax error before MySQL 8.0.19 and on MariaDB, while VALUES(col) works on all of them
+ENROLLMENTS_UPSERT = (
+    "INSERT INTO enrollments (course_code, email, full_name) VALUES (%s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE full_name = VALUES(full_name)"
+)
+
+
+def normalize_registration(course_code: Any, email: Any, full_name: Any) -> Tuple[Any, Any, Any]:
+    """Normalize registration fields: upper-case course code, lower-case email, title-case name."""
+    course_code = course_code.upper().strip() if isinstance(course_code, str) else course_code
+    email = email.lower().strip() if isinstance(email, str) else email
+    full_name = full_name.title().strip() if isinstance(full_name, str) else full_name
+    return course_code, email, full_name
+
+
 class Stackademy:
     """Main application class for Stackademy with database functionality."""
 
-    def __init__(self):
-        """Initialize the Stackademy application."""
-        self.db = db
+    def __init__(
+        self, catalog_snapshot: bool = STACKADEMY_CATALOG_SNAPSHOT, course_code_cache: bool = COURSE_CODE_CACHE
+    ):
+        """
+        Initialize the Stackademy application.
+
+        Args:
+            catalog_snapshot (bool): Serve get_courses() from an in-memory catalog snapshot
+            course_code_cache (bool): Remember which course codes exist and which do not
+        """
+        self._db: Optional["DatabaseConnection"] = None
+        self.catalog: Optional[CourseCatalog] = None
+        if catalog_snapshot:
+            self.catalog = CourseCatalog(
+                db=self.db,
+                areas=[area.value for area in StackademySpecializationArea],
+                ttl=STACKADEMY_CATALOG_TTL,
+                version_query=STACKADEMY_CATALOG_VERSION_QUERY,
+            )
+
+        self.valid_course_codes: Optional[MemoryCache] = None
+        self.invalid_course_codes: Optional[MemoryCache] = None
+        if course_code_cache:
+            self.valid_course_codes = MemoryCache(max_entries=COURSE_CODE_CACHE_MAX_ENTRIES, ttl=COURSE_CODE_CACHE_TTL)
+            self.invalid_course_codes = MemoryCache(
+                max_entries=COURSE_CODE_CACHE_MAX_ENTRIES, ttl=COURSE_CODE_NEGATIVE_TTL
+            )
+            if self.catalog is not None:
+                self.catalog.add_listener(self.invalidate_course_codes)
+
+    @property
+    def db(self) -> "DatabaseConnection":
+        """Use the shared database unless another was assigned to db, looked up on first use."""
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    @db.setter
+    def db(self, value: "DatabaseConnection") -> None:
+        self._db = value
+
+    @db.deleter
+    def db(self) -> None:
+        self._db = None
+
+    def invalidate_course_codes(self) -> None:
+        """Forget which course codes exist, e.g. after the catalog changed."""
+        if self.valid_course_codes is not None:
+            self.valid_course_codes.clear()
+            self.invalid_course_codes.clear()
+
+    def _remember_course_code(self, course_code: str, exists: bool) -> None:
+        """Cache the outcome of a course code lookup."""
+        if self.valid_course_codes is not None:
+            (self.valid_course_codes if exists else self.invalid_course_codes).set(course_code, "1")
+
+    def _cached_course_code(self, course_code: str) -> Optional[bool]:
+        """Return whether a course code is known to exist, or None if it is not cached."""
+        if self.valid_course_codes is None:
+            return None
+        if self.valid_course_codes.get(course_code) is not None:
+            return True
+        if self.invalid_course_codes.get(course_code) is not None:
+            return False
+        return None
 
     def _log_success(self, message: str) -> None:
         """
-        Log a success message with colorized console output.
+        Log a success message, in color when the log is shown in a terminal.
 
         Args:
             message: The success message to log
         """
-        print(f"\033[1;92m{message}\033[0m")
-        logger.info(message)
+        logger.info(lazy_color_text("%s", "green"), message)
+
+    def cost_bucket(self, max_cost: Optional[float]) -> Any:
+        """
+        Normalize a max_cost filter so that budgets selecting the same courses compare equal.
 
-    def tool_factory_get_courses(self) -> ChatCompletionFunctionToolParam:
+        With a catalog snapshot the bucket is the number of courses within the
+        budget, which is exact. Otherwise budgets are floored to multiples of
+        TOOL_RESULT_CACHE_COST_BUCKET, which is exact when course costs are too.
+
+        Args:
+            max_cost (float, optional): Maximum course cost
+
+        Returns:
+            Any: A JSON-serializable bucket
+        """
+        if max_cost is None:
+            return None
+        if self.catalog is not None:
+            try:
+                return ["courses", bisect_right(self.catalog.snapshot().costs, max_cost)]
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Catalog snapshot unavailable, bucketing max_cost by amount: %s", e)
+        return ["cost", math.floor(round(max_cost / TOOL_RESULT_CACHE_COST_BUCKET, 6))]
+
+    def tool_factory_get_courses(self) -> "ChatCompletionFunctionToolParam":
         """LLM Factory function to create a tool for getting courses"""
-        schema = StackademyGetCoursesParams.model_json_schema()
-        return ChatCompletionFunctionToolParam(
-            type="function",
-            function={
-                "name": "get_courses",
-                "description": "returns up to 10 rows of course detail data, filtered by the maximum cost a student is willing to pay for a course and the area of specialization.",
-                "parameters": schema,
-            },
-        )
-
-    def tool_factory_register(self) -> ChatCompletionFunctionToolParam:
+        return tool_registry.tool("get_courses")
+
+    def tool_factory_register(self) -> "ChatCompletionFunctionToolParam":
         """LLMFactory function to create a tool for registering a user"""
-        schema = StackademyRegisterCourseParams.model_json_schema()
-        return ChatCompletionFunctionToolParam(
-            type="function",
-            function={
-                "name": "register_course",
-                "description": "Register a student in a course with the provided details.",
-                "parameters": schema,
-            },
-        )
+        return tool_registry.tool("register_course")
 
     def test_database_connection(self) -> bool:
         """
@@ -103,6 +227,7 @@ class Stackademy:
             logger.error("Database connection test failed: %s", e)
             return False
 
+    @traced("Stackademy.get_courses")
     def get_courses(self, description: Optional[str] = None, max_cost: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         Retrieve a list of courses from the database.
@@ -112,20 +237,22 @@ class Stackademy:
             max_cost (float, optional): Filter courses by maximum cost
 
         Returns:
-            List[Dict[str, Any]]: List of courses matching the criteria
+            List[Dict[str, Any]]: List of courses matching the criteria. When the
+                database cannot be queried, an empty Unavailable list, which the
+                tool result cache does not store.
         """
 
-        query = """
-        SELECT
-            c.course_code,
-            c.course_name,
-            c.description,
-            c.cost,
-            prerequisite.course_code AS prerequisite_course_code,
-            prerequisite.course_name AS prerequisite_course_name
-        FROM courses c
-        LEFT JOIN courses prerequisite ON c.prerequisite_id = prerequisite.course_id
-        """
+        if self.catalog is not None:
+            try:
+                retval = self.catalog.get_courses(description=description, max_cost=max_cost)
+                logger.info(
+                    lazy_color_text("get_courses() retrieved %d rows from the catalog snapshot", "green"), len(retval)
+                )
+                return retval
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Catalog snapshot unavailable, falling back to SQL: %s", e)
+
+        query = COURSES_QUERY
 
         where_conditions = []
         params = []
@@ -141,39 +268,50 @@ class Stackademy:
         if where_conditions:
             query += " WHERE " + " AND ".join(where_conditions)
 
-        query += " ORDER BY c.prerequisite_id"
+        query += COURSES_ORDER_BY
 
         try:
             retval = self.db.execute_query(query, tuple(params))
-            msg = f"get_courses() retrieved {len(retval)} rows from {self.db.connection_string}"
-            logger.info(color_text(msg, "green"))
+            logger.info(
+                lazy_color_text("get_courses() retrieved %d rows from %s", "green"),
+                len(retval),
+                self.db.connection_string,
+            )
             return retval
         # pylint: disable=broad-except
         except Exception as e:
             logger.error("Failed to retrieve courses: %s", e)
-            return []
+            return Unavailable()
 
     def verify_course(self, course_code: str) -> bool:
         """
         Verify if a course exists in the database.
+
+        Recent answers are served from the course code caches; otherwise an
+        existence probe on the unique course_code index is run.
+
         Args:
             course_code (str): The course code to verify
         Returns:
             bool: True if the course exists, False otherwise
         """
-        query = "SELECT * FROM courses WHERE course_code = %s"
+        cached = self._cached_course_code(course_code)
+        if cached is not None:
+            logger.debug("course_code %s %s (cached)", course_code, "verified" if cached else "not found")
+            return cached
+
         try:
-            result = self.db.execute_query(query, (course_code,))
-            retval = len(result) > 0
-            if retval:
-                logger.info("verified course_code: %s", course_code)
-            else:
-                logger.warning("course_code not found: %s", course_code)
-            return retval
+            retval = bool(self.db.execute_query(COURSE_EXISTS_QUERY, (course_code,)))
         # pylint: disable=broad-except
         except Exception as e:
             logger.error("Failed to retrieve courses: %s", e)
             return False
+        self._remember_course_code(course_code, retval)
+        if retval:
+            logger.info("verified course_code: %s", course_code)
+        else:
+            logger.warning("course_code not found: %s", course_code)
+        return retval
 
     def register_course(self, course_code: str, email: str, full_name: str) -> bool:
         """
@@ -190,18 +328,162 @@ class Stackademy:
         if MISSING in (course_code, email, full_name):
             raise ConfigurationException("Missing required registration parameters.")
 
-        full_name = full_name.title().strip() if isinstance(full_name, str) else full_name
-        email = email.lower().strip() if isinstance(email, str) else email
-        course_code = course_code.upper().strip() if isinstance(course_code, str) else course_code
+        course_code, email, full_name = normalize_registration(course_code, email, full_name)
 
         logger.info("Registering %s (%s) for course %s...", full_name, email, course_code)
         if not self.verify_course(course_code):
             logger.error("Course code %s does not exist.", course_code)
             return False
 
+        try:
+            self.db.execute_update(ENROLLMENTS_UPSERT, (course_code, email, full_name))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Failed to register %s for course %s: %s", email, course_code, e)
+            return False
+
         success_message = f"Successfully registered {full_name} ({email}) for course {course_code}."
         self._log_success(success_message)
         return True
 
+    def existing_course_codes(self, course_codes: Iterable[str]) -> Set[str]:
+        """
+        Look up which course codes exist, with a single IN (...) query for the codes that are not cached.
+
+        Args:
+            course_codes (Iterable[str]): Normalized course codes
+
+        Returns:
+            Set[str]: The course codes that exist
+        """
+        existing = set()
+        unknown = []
+        for code in sorted(set(course_codes)):
+            cached = self._cached_course_code(code)
+            if cached is None:
+                unknown.append(code)
+            elif cached:
+                existing.add(code)
+        if not unknown:
+            return existing
+
+        placeholders = ", ".join(["%s"] * len(unknown))
+        query = f"SELECT course_code FROM courses WHERE course_code IN ({placeholders})"
+        found = {str(row["course_code"]).upper() for row in self.db.execute_query(query, tuple(unknown))}
+        for code in unknown:
+            self._remember_course_code(code, code in found)
+        return existing | found
+
+    def register_courses_bulk(
+        self, registrations: List[StackademyRegisterCourseParams]
+    ) -> List[StackademyRegistrationResult]:
+        """
+        Register a whole cohort at once.
+
+        All course codes are verified with one query, and all valid
+        registrations are inserted in one transaction. If the transaction
+        fails, none of its registrations are stored.
+
+        Args:
+            registrations (List[StackademyRegisterCourseParams]): The registrations
+
+        Returns:
+            List[StackademyRegistrationResult]: One result per registration, in the same order
+        """
+        results = []
+        for registration in registrations:
+            course_code, email, full_name = normalize_registration(
+                registration.course_code, registration.email, registration.full_name
+            )
+            results.append(
+                StackademyRegistrationResult(course_code=course_code, email=email, full_name=full_name, success=False)
+            )
+        if not results:
+            return results
+
+        try:
+            existing = self.existing_course_codes(result.course_code for result in results)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Failed to verify course codes: %s", e)
+            for result in results:
+                result.error = f"Course verification failed: {e}"
+            return results
+
+        valid = []
+        for result in results:
+            if result.course_code in existing:
+                valid.append(result)
+            else:
+                result.error = f"Course code {result.course_code} does not exist."
+
+        try:
+            self.db.execute_many(ENROLLMENTS_UPSERT, [(r.course_code, r.email, r.full_name) for r in valid])
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Bulk registration of %d students failed: %s", len(valid), e)
+            for result in valid:
+                result.error = f"Registration failed: {e}"
+            return results
+
+        for result in valid:
+            result.success = True
+        logger.info(lazy_color_text("Registered %d of %d students in bulk", "green"), len(valid), len(results))
+        return results
+
+
+def courses_cache_key(arguments: Dict[str, Any]) -> str:
+    """Cache key of validated get_courses arguments: the specialization area and the max_cost bucket."""
+    return json.dumps(
+        ["get_courses", arguments.get("description"), stackademy_app.cost_bucket(arguments.get("max_cost"))]
+    )
+
 
 stackademy_app = Stackademy()
+if stackademy_app.valid_course_codes is not None:
+    track_cache("valid_course_codes", stackademy_app.valid_course_codes)
+    track_cache("invalid_course_codes", stackademy_app.invalid_course_codes)
+tool_result_cache: Optional[BaseCache] = None
+if TOOL_RESULT_CACHE:
+    tool_result_cache = create_cache(
+        backend=TOOL_RESULT_CACHE_BACKEND,
+        max_entries=TOOL_RESULT_CACHE_MAX_ENTRIES,
+        ttl=TOOL_RESULT_CACHE_TTL,
+        path=TOOL_RESULT_CACHE_PATH,
+        table="tool_results",
+    )
+    track_cache("tool_results", tool_result_cache)
+    if stackademy_app.catalog is not None:
+        stackademy_app.catalog.add_listener(tool_result_cache.clear)
+
+
+# the handlers look up stackademy_app at call time rather than binding its methods, so that it can be patched
+def get_courses_handler(**arguments) -> List[Dict[str, Any]]:
+    """Tool handler for get_courses."""
+    return stackademy_app.get_courses(**arguments)
+
+
+def register_course_handler(**arguments) -> bool:
+    """Tool handler for register_course."""
+    return stackademy_app.register_course(**arguments)
+
+
+tool_registry.register(
+    ToolSpec(
+        name="get_courses",
+        description="returns up to 10 rows of course detail data, filtered by the maximum cost a student is willing to pay for a course and the area of specialization.",
+        params_model=StackademyGetCoursesParams,
+        handler=get_courses_handler,
+        cacheable=True,
+        idempotent=True,
+        cache=tool_result_cache,
+        cache_key=courses_cache_key,
+    )
+)
+tool_registry.register(
+    ToolSpec(
+        name="register_course",
+        description="Register a student in a course with the provided details.",
+        params_model=StackademyRegisterCourseParams,
+        handler=register_course_handler,
+        serializer=lambda success: json.dumps({"success": success}),
+        idempotent=True,
+    )
+)
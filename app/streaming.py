@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Assembly of streamed chat completion chunks, and the stream of text deltas of one turn."""
+
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from app.logging_config import get_logger, setup_logging
+
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+setup_logging()
+logger = get_logger(__name__)
+
+
+class StreamAccumulator:  # pylint: disable=too-many-instance-attributes
+    """
+    Rebuild a ChatCompletion from the chunks of a streamed response.
+
+    Text is collected per choice. Tool calls arrive as fragments keyed by
+    their index: the first fragment carries the id and function name, the
+    following ones append to the JSON arguments. The assembled response has
+    the same shape as a non-streamed one, so tool calls can be dispatched and
+    cached the same way.
+    """
+
+    def __init__(self):
+        self.id = ""
+        self.model = ""
+        self.created = 0
+        self.system_fingerprint: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+        self.ttft: Optional[float] = None
+        self._choices: Dict[int, Dict[str, Any]] = {}
+        self._start = time.perf_counter()
+
+    def _choice(self, index: int) -> Dict[str, Any]:
+        choice = self._choices.get(index)
+        if choice is None:
+            choice = {"role": "assistant", "content": [], "refusal": [], "tool_calls": {}, "finish_reason": None}
+            self._choices[index] = choice
+        return choice
+
+    def add(self, chunk: "ChatCompletionChunk") -> str:
+        """
+        Add a chunk.
+
+        Returns:
+            str: The text delta of the first choice, or "" if the chunk has none
+        """
+        self.id = self.id or chunk.id
+        self.model = self.model or chunk.model
+        self.created = self.created or chunk.created
+        self.system_fingerprint = self.system_fingerprint or chunk.system_fingerprint
+        if chunk.usage is not None:
+            self.usage = chunk.usage.model_dump()
+        text = ""
+        for choice in chunk.choices:
+            state = self._choice(choice.index)
+            delta = choice.delta
+            if delta.role:
+                state["role"] = delta.role
+            if delta.content:
+                state["content"].append(delta.content)
+                if choice.index == 0:
+                    text = delta.content
+            if delta.refusal:
+                state["refusal"].append(delta.refusal)
+            for fragment in delta.tool_calls or ():
+                call = state["tool_calls"].setdefault(
+                    fragment.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+                )
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function is not None:
+                    call["function"]["name"] += fragment.function.name or ""
+                    call["function"]["arguments"] += fragment.function.arguments or ""
+            if choice.finish_reason:
+                state["finish_reason"] = choice.finish_reason
+        if text and self.ttft is None:
+            self.ttft = time.perf_counter() - self._start
+        return text
+
+    def completion(self) -> "ChatCompletion":
+        """Return the assembled response."""
+        # pylint: disable=import-outside-toplevel
+        from openai.types.chat import ChatCompletion
+
+        choices = []
+        for index in sorted(self._choices):
+            state = self._choices[index]
+            message: Dict[str, Any] = {
+                "role": state["role"],
+                "content": "".join(state["content"]) or None,
+                "refusal": "".join(state["refusal"]) or None,
+            }
+            if state["tool_calls"]:
+                message["tool_calls"] = [state["tool_calls"][i] for i in sorted(state["tool_calls"])]
+            choices.append({"index": index, "message": message, "finish_reason": state["finish_reason"] or "stop"})
+        return ChatCompletion.model_validate(
+            {
+                "id": self.id,
+                "object": "chat.completion",
+                "created": self.created,
+                "model": self.model,
+                "system_fingerprint": self.system_fingerprint,
+                "choices": choices,
+                "usage": self.usage,
+            }
+        )
+
+
+class CompletionStream:
+    """
+    Iterator over the text deltas of one conversation turn.
+
+    A turn may take several API requests when the LLM calls tools; the deltas
+    of all of them are yielded in order. Once the stream is exhausted,
+    response and functions_called hold what completion() returns without
+    streaming, and ttft the seconds from the start of the turn to its first
+    text delta.
+    """
+
+    def __init__(self, deltas: Callable[[Any], Any]):
+        self.response: Optional["ChatCompletion"] = None
+        self.functions_called: List[str] = []
+        self.ttft: Optional[float] = None
+        self.elapsed: Optional[float] = None
+        self._start = time.perf_counter()
+        self._generator = deltas(self)
+
+    def _delta(self, delta: str) -> str:
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._start
+        return delta
+
+    def _finish(self) -> None:
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self._start
+            if self.ttft is not None:
+                logger.info("Time to first token: %.3fs (turn %.3fs)", self.ttft, self.elapsed)
+
+    def __iter__(self) -> "CompletionStream":
+        return self
+
+    def __next__(self) -> str:
+        try:
+            delta = next(self._generator)
+        except StopIteration:
+            self._finish()
+            raise
+        return self._delta(delta)
+
+    def __enter__(self) -> "CompletionStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def text(self) -> str:
+        """Consume the rest of the stream and return its text."""
+        return "".join(self)
+
+    def close(self) -> None:
+        """Stop streaming; the HTTP response of a request in progress is closed."""
+        self._generator.close()
+
+
+class AsyncCompletionStream(CompletionStream):
+    """Async counterpart of CompletionStream, for acompletion(stream=True)."""
+
+    def __aiter__(self) -> "AsyncCompletionStream":
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            delta = await self._generator.__anext__()
+        except StopAsyncIteration:
+            self._finish()
+            raise
+        return self._delta(delta)
+
+    async def __aenter__(self) -> "AsyncCompletionStream":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def atext(self) -> str:
+        """Consume the rest of the stream and return its text."""
+        return "".join([delta async for delta in self])
+
+    async def aclose(self) -> None:
+        """Stop streaming; the HTTP response of a request in progress is closed."""
+        await self._generator.aclose()
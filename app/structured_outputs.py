@@ -4,7 +4,6 @@
 import json
 from typing import List, Optional
 
-import openai
 from pydantic import BaseModel, Field, ValidationError
 
 from app import settings
@@ -15,6 +14,7 @@ from app.stackademy import (
     StackademySpecializationArea,
     stackademy_app,
 )
+from app.utils import lazy_import
 
 
 class Course(BaseModel):
@@ -44,6 +44,7 @@ class RegistrationResponse(BaseModel):
 
 
 logger = get_logger(__name__)
+openai = lazy_import("openai")
 
 
 def get_courses_with_structured_output(
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Local stub of the OpenAI chat completions API, for benchmarks and offline runs.
+
+It answers POST /v1/chat/completions with canned text, scripted replies
+(text, tool calls or errors) or replies computed by a responder function,
+with or without streaming, and paces them with a latency profile: a time to
+first token plus a token rate.
+
+usage:
+    with StubOpenAIServer(latency=0.05) as server:
+        client = openai.OpenAI(api_key="stub", base_url=server.base_url)
+
+    script = [
+        {"tool_calls": [{"name": "get_courses", "arguments": {"description": "AI"}}]},
+        "We have one AI course, AI101.",
+    ]
+    with StubOpenAIServer(script=script, profile="typical") as server:
+        ...
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+
+# text is streamed in word-sized pieces, and tool call arguments in pieces of this many characters
+ARGUMENT_FRAGMENT_CHARS = 8
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into word-sized pieces that join back to the same text."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def estimate_tokens(value: Any) -> int:
+    """Estimate the tokens of a value by the length of its JSON, at about four characters per token."""
+    return max(1, len(json.dumps(value, default=str)) // 4)
+
+
+class LatencyProfile:
+    """
+    How long the stub takes to answer.
+
+    Args:
+        ttft: Seconds before the first token
+        tokens_per_second: Rate at which the following tokens are generated, 0 for no delay
+        jitter: Relative random variation of ttft, e.g. 0.2 for +/-20%
+    """
+
+    def __init__(self, ttft: float = 0.0, tokens_per_second: float = 0.0, jitter: float = 0.0):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+
+    def __repr__(self) -> str:
+        return f"LatencyProfile(ttft={self.ttft}, tokens_per_second={self.tokens_per_second}, jitter={self.jitter})"
+
+    def first_token_delay(self, rng: random.Random) -> float:
+        """Seconds until the first token."""
+        if self.jitter:
+            return max(0.0, self.ttft * (1 + rng.uniform(-self.jitter, self.jitter)))
+        return self.ttft
+
+    def token_delay(self) -> float:
+        """Seconds between two tokens."""
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+PROFILES = {
+    "instant": LatencyProfile(),
+    "fast": LatencyProfile(ttft=0.15, tokens_per_second=250, jitter=0.2),
+    "typical": LatencyProfile(ttft=0.5, tokens_per_second=80, jitter=0.3),
+    "slow": LatencyProfile(ttft=1.5, tokens_per_second=25, jitter=0.3),
+}
+
+
+class StubReply:
+    """
+    One reply of the stub.
+
+    Args:
+        content: The assistant's text
+        tool_calls: Tool calls as {"name": ..., "arguments": {...}} dicts or (name, arguments) pairs
+        status: HTTP status; anything but 200 answers with an OpenAI error body
+        error: The error message of a failed reply
+        retry_after: Seconds sent in the Retry-After header of a failed reply
+        profile: Latency profile of this reply, instead of the server's
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        content: Optional[str] = None,
+        tool_calls: Optional[Sequence[Any]] = None,
+        status: int = 200,
+        error: str = "Stubbed error",
+        retry_after: Optional[float] = None,
+        profile: Optional[Union[LatencyProfile, str]] = None,
+    ):
+        self.content = content
+        self.tool_calls = [
+            call if isinstance(call, dict) else {"name": call[0], "arguments": call[1]} for call in tool_calls or ()
+        ]
+        self.status = status
+        self.error = error
+        self.retry_after = retry_after
+        self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+
+    @classmethod
+    def from_value(cls, value: Union["StubReply", str, Dict[str, Any]]) -> "StubReply":
+        """Build a reply from a string (its content), a dict of keyword arguments, or a reply."""
+        if isinstance(value, StubReply):
+            return value
+        if isinstance(value, str):
+            return cls(content=value)
+        return cls(**value)
+
+    def message(self) -> Dict[str, Any]:
+        """The assistant message of a chat.completion response, with new tool call ids."""
+        message: Dict[str, Any] = {"role": "assistant", "content": self.content}
+        if self.tool_calls:
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))},
+                }
+                for call in self.tool_calls
+            ]
+        return message
+
+    def completion_tokens(self) -> int:
+        """Number of tokens the reply is generated in."""
+        return len(split_tokens(self.content or "")) + sum(
+            estimate_tokens(call.get("arguments", {})) for call in self.tool_calls
+        )
+
+
+def chat_completion(
+    content: Optional[str], model: str = "gpt-4o-mini", message: Optional[Dict[str, Any]] = None, usage=None
+) -> Dict[str, Any]:
+    """Build a chat.completion response body with a single assistant message."""
+    message = message or {"role": "assistant", "content": content}
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                "message": message,
+            }
+        ],
+        "usage": usage or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def chunk_deltas(message: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """The deltas in which a message is streamed: the role, text pieces, then tool call fragments."""
+    yield {"role": "assistant", "content": ""}
+    for piece in split_tokens(message.get("content") or ""):
+        yield {"content": piece}
+    for index, call in enumerate(message.get("tool_calls") or ()):
+        function = call["function"]
+        yield {
+            "tool_calls": [
+                {"index": index, "id": call["id"], "type": "function", "function": {"name": function["name"]}}
+            ]
+        }
+        arguments = function["arguments"]
+        for start in range(0, len(arguments), ARGUMENT_FRAGMENT_CHARS):
+            fragment = arguments[start : start + ARGUMENT_FRAGMENT_CHARS]
+            yield {"tool_calls": [{"index": index, "function": {"arguments": fragment}}]}
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/chat/completions with the stub's next reply."""
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately; avoid delayed-ACK stalls on keep-alive connections
+    disable_nagle_algorithm = True
+    server: "_StubHTTPServer"
+
+    # pylint: disable=invalid-name
+    def do_POST(self) -> None:
+        """Handle a chat completion request."""
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        stub = self.server.stub
+        reply = stub.next_reply(request)
+        profile = reply.profile or stub.profile
+        first_token_delay = stub.first_token_delay(profile)
+        if reply.status != 200:
+            time.sleep(first_token_delay)
+            headers = {"Retry-After": f"{reply.retry_after:g}"} if reply.retry_after is not None else {}
+            error = {"message": reply.error, "type": "stub_error", "code": str(reply.status)}
+            self._send_json(reply.status, {"error": error}, headers)
+            return
+
+        message = reply.message()
+        completion_tokens = reply.completion_tokens()
+        prompt_tokens = estimate_tokens(request.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        model = request.get("model", "gpt-4o-mini")
+        if request.get("stream"):
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(message, model, usage if include_usage else None, first_token_delay, profile.token_delay())
+            return
+        time.sleep(first_token_delay + completion_tokens * profile.token_delay())
+        self._send_json(200, chat_completion(None, model=model, message=message, usage=usage))
+
+    def _stream(
+        self,
+        message: Dict[str, Any],
+        model: str,
+        usage: Optional[Dict[str, int]],
+        first_token_delay: float,
+        token_delay: float,
+    ) -> None:
+        """Write the reply as server-sent chat.completion.chunk events, paced by the latency profile."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk"}
+        base.update({"created": int(time.time()), "model": model})
+        time.sleep(first_token_delay)
+        for i, delta in enumerate(chunk_deltas(message)):
+            if i > 1 and token_delay:
+                time.sleep(token_delay)
+            self._send_event({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+        self._send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+        if usage is not None:
+            self._send_event({**base, "choices": [], "usage": usage})
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_event(self, payload: Dict[str, Any]) -> None:
+        self._send_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        """Write a JSON response."""
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        """Silence per-request access logging."""
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    """HTTP server that knows its StubOpenAIServer."""
+
+    daemon_threads = True
+    # the socketserver default backlog of 5 drops connections under concurrent load
+    request_queue_size = 1024
+    stub: "StubOpenAIServer"
+
+
+class StubOpenAIServer:  # pylint: disable=too-many-instance-attributes
+    """
+    A local OpenAI-compatible server running in a background thread.
+
+    Args:
+        host: The interface to listen on
+        port: The port, 0 for any free port
+        latency: Seconds before the first token, when no profile is given
+        content: The text of every reply that is neither scripted nor computed by the responder
+        script: Replies to send in order, as StubReply, str or dict (see StubReply.from_value)
+        responder: Computes the reply to a request body once the script is exhausted
+        profile: LatencyProfile, or the name of one of PROFILES
+        seed: Seed of the latency jitter, for repeatable runs
+        record: Keep the request bodies in requests
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        content: str = "Hello!",
+        script: Optional[Sequence[Union[StubReply, str, Dict[str, Any]]]] = None,
+        responder: Optional[Callable[[Dict[str, Any]], Union[StubReply, str, Dict[str, Any]]]] = None,
+        profile: Optional[Union[LatencyProfile, str]] = None,
+        seed: Optional[int] = None,
+        record: bool = False,
+    ):
+        self.host = host
+        self.port = port
+        self.content = content
+        self.script = [StubReply.from_value(reply) for reply in script or ()]
+        self.responder = responder
+        if isinstance(profile, str):
+            profile = PROFILES[profile]
+        self.profile = profile or LatencyProfile(ttft=latency)
+        self.record = record
+        self.requests: List[Dict[str, Any]] = []
+        self.request_count = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd: Optional[_StubHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """The base URL to pass to the OpenAI client."""
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def latency(self) -> float:
+        """Seconds before the first token."""
+        return self.profile.ttft
+
+    @property
+    def remaining(self) -> int:
+        """Scripted replies not sent yet."""
+        return max(0, len(self.script) - self.request_count)
+
+    def next_reply(self, request: Dict[str, Any]) -> StubReply:
+        """The reply to a request: the next scripted one, else the responder's, else the canned content."""
+        with self._lock:
+            index = self.request_count
+            self.request_count += 1
+            if self.record:
+                self.requests.append(request)
+        if index < len(self.script):
+            return self.script[index]
+        if self.responder is not None:
+            return StubReply.from_value(self.responder(request))
+        return StubReply(content=self.content)
+
+    def first_token_delay(self, profile: LatencyProfile) -> float:
+        """Seconds before the first token of the next reply."""
+        with self._lock:
+            return profile.first_token_delay(self._rng)
+
+    def start(self) -> "StubOpenAIServer":
+        """Start serving in a background thread."""
+        self._httpd = _StubHTTPServer((self.host, self.port), StubRequestHandler)
+        self._httpd.stub = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "StubOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
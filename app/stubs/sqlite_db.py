@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite stand-in for DatabaseConnection, for tests and benchmarks without MySQL.
+
+It implements the same query methods and accepts the same %s placeholders,
+so Stackademy can run unchanged against it:
+
+    app = Stackademy()
+    app.db = SQLiteDatabase()
+    app.db.add_courses([{"course_code": "AI101", "course_name": "AI", "description": "AI basics", "cost": 499}])
+"""
+
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from app.database import QueryStream
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    course_id INTEGER PRIMARY KEY,
+    course_code TEXT NOT NULL UNIQUE,
+    course_name TEXT NOT NULL,
+    description TEXT,
+    cost REAL,
+    prerequisite_id INTEGER REFERENCES courses (course_id),
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+-- MySQL's ON UPDATE CURRENT_TIMESTAMP(6)
+CREATE TRIGGER IF NOT EXISTS courses_updated_at AFTER UPDATE ON courses
+WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE courses SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE course_id = NEW.course_id;
+END;
+CREATE TABLE IF NOT EXISTS enrollments (
+    enrollment_id INTEGER PRIMARY KEY,
+    course_code TEXT NOT NULL,
+    email TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_enrollments_course_email ON enrollments (course_code, email);
+"""
+
+
+def translate(query: str) -> str:
+    """
+    Translate the MySQL dialect used by the app to SQLite.
+
+    %s placeholders become ?, and "ON DUPLICATE KEY UPDATE col = VALUES(col)"
+    becomes "ON CONFLICT DO UPDATE SET col = excluded.col".
+    """
+    query = query.replace("%s", "?")
+    head, separator, update = query.partition("ON DUPLICATE KEY UPDATE")
+    if separator:
+        query = head + "ON CONFLICT DO UPDATE SET" + re.sub(r"VALUES\((\w+)\)", r"excluded.\1", update)
+    return query
+
+
+def dict_factory(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    """Return rows as dicts, like pymysql's DictCursor."""
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """Wraps a sqlite3 cursor to accept the MySQL dialect used by the app."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, query: str, params: Sequence[Any] = ()) -> int:
+        """Execute one statement."""
+        self._cursor.execute(translate(query), tuple(params or ()))
+        return self._cursor.rowcount
+
+    def executemany(self, query: str, params_seq: Sequence[Sequence[Any]]) -> int:
+        """Execute one statement per parameter tuple."""
+        self._cursor.executemany(translate(query), [tuple(params) for params in params_seq])
+        return self._cursor.rowcount
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        """Fetch the next row."""
+        return self._cursor.fetchone()
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        """Fetch the remaining rows."""
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        """Rows affected by the last statement."""
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        """Row id of the last inserted row."""
+        return self._cursor.lastrowid
+
+
+class SQLiteDatabase:
+    """A DatabaseConnection look-alike backed by SQLite, in memory by default."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = dict_factory
+        self._lock = threading.RLock()
+        self._connection.executescript(SCHEMA)
+
+    @property
+    def connection_string(self) -> str:
+        """Return the database connection string."""
+        return f"sqlite:///{self.path}"
+
+    @contextmanager
+    def get_cursor(self) -> Iterator[SQLiteCursor]:
+        """Cursor for one unit of work, committed on success and rolled back on error."""
+        with self._lock:
+            cursor = SQLiteCursor(self._connection.cursor())
+            try:
+                yield cursor
+                self._connection.commit()
+            except Exception:
+                self._connection.rollback()
+                raise
+
+    def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Execute a SELECT query and return results."""
+        with self.get_cursor() as cursor:
+            cursor.execute(query, params or ())
+            return list(cursor.fetchall())
+
+    def iter_query(
+        self, query: str, params: Optional[tuple] = None, batch_size: int = 0, as_tuples: bool = False
+    ) -> QueryStream:
+        """Stream the results of a SELECT query; SQLite cursors step through the result lazily."""
+
+        def rows(stream: QueryStream) -> Iterator[Any]:
+            cursor = self._connection.cursor()
+            if as_tuples:
+                cursor.row_factory = None
+            try:
+                with self._lock:
+                    cursor.execute(translate(query), tuple(params or ()))
+                yield from stream.feed(cursor, batch_size, cursor)
+            finally:
+                cursor.close()
+
+        return QueryStream(rows)
+
+    def execute_update(self, query: str, params: Optional[tuple] = None) -> int:
+        """Execute an INSERT, UPDATE, or DELETE query."""
+        with self.get_cursor() as cursor:
+            return cursor.execute(query, params or ())
+
+    def execute_many(self, query: str, params_seq: Sequence[tuple]) -> int:
+        """Execute a query once per parameter tuple, in a single transaction."""
+        if not params_seq:
+            return 0
+        with self.get_cursor() as cursor:
+            return cursor.executemany(query, params_seq)
+
+    def test_connection(self) -> bool:
+        """Test the database connection."""
+        self.execute_query("SELECT 1")
+        return True
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """There is no connection pool."""
+        return {}
+
+    def add_courses(self, courses: List[Dict[str, Any]]) -> None:
+        """Insert course rows; missing columns default to NULL."""
+        columns = ("course_id", "course_code", "course_name", "description", "cost", "prerequisite_id")
+        self.execute_many(
+            f"INSERT INTO courses ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+            [tuple(course.get(column) for column in columns) for course in courses],
+        )
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
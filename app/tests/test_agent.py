@@ -9,6 +9,7 @@ from unittest.mock import patch
 
 from app import agent
 from app.agent import main  # noqa: E402
+from app.streaming import CompletionStream
 
 
 class TestApplication(unittest.TestCase):
@@ -35,7 +36,7 @@ class TestApplication(unittest.TestCase):
     def test_main_goodbye(self, mock_input, mock_completion):
         """Test that the application exits on "Goodbye!"."""
         mock_completion.return_value = (None, [])
-        agent.main(prompts=("no",))
+        agent.main(prompts=("no",), stream=False)
 
     @patch("app.agent.completion")
     @patch("builtins.input", side_effect=["yes", "no"])
@@ -53,7 +54,7 @@ class TestApplication(unittest.TestCase):
             (MockResponse(), ["register_course"]),
             (None, []),
         ]
-        agent.main(prompts=None)
+        agent.main(prompts=None, stream=False)
 
     @patch("app.agent.completion")
     @patch("builtins.input", side_effect=["something", "no"])
@@ -67,4 +68,29 @@ class TestApplication(unittest.TestCase):
             choices = [type("obj", (), {"message": MockMessage})]
 
         mock_completion.side_effect = [(MockResponse(), []), (None, [])]
-        agent.main(prompts=None)
+        agent.main(prompts=None, stream=False)
+
+    @patch("app.agent.completion")
+    @patch("builtins.input", side_effect=["something", "no"])
+    def test_main_streams_reply(self, mock_input, mock_completion):
+        """Test that a streamed reply is printed delta by delta."""
+
+        class MockMessage:
+            content = "Just a message"
+
+        class MockResponse:
+            choices = [type("obj", (), {"message": MockMessage})]
+
+        def stream(deltas, response):
+            def generate(completion_stream):
+                yield from deltas
+                completion_stream.response = response
+
+            return CompletionStream(generate)
+
+        mock_completion.side_effect = [stream(["Just ", "a message"], MockResponse()), stream([], None)]
+        with patch("builtins.print") as mock_print:
+            agent.main(prompts=None, stream=True)
+        mock_print.assert_any_call("Just ", end="", flush=True)
+        mock_print.assert_any_call("a message", end="", flush=True)
+        self.assertTrue(mock_completion.call_args.kwargs["stream"])
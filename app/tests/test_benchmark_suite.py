@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,C0115,W0613
+"""Test the benchmark suite's measurements and regression checks."""
+
+# python stuff
+import argparse
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from app.benchmarks.suite import (
+    Benchmark,
+    add_baseline_arguments,
+    bench_environment,
+    benchmarks,
+    compare,
+    run_benchmark,
+    save_and_compare,
+    summarize,
+    write_results,
+)
+
+
+def results(**benchmark_results) -> dict:
+    """Results of a run with the given benchmarks."""
+    return {"benchmarks": benchmark_results}
+
+
+class TestSummarize(unittest.TestCase):
+    """Test the latency summary."""
+
+    def test_percentiles(self):
+        """Percentiles are in microseconds and ordered."""
+        summary = summarize([i / 1e6 for i in range(1, 101)])
+        self.assertAlmostEqual(summary["p50_us"], 50.5)
+        self.assertLessEqual(summary["p50_us"], summary["p95_us"])
+        self.assertLessEqual(summary["p95_us"], summary["p99_us"])
+        self.assertAlmostEqual(summary["ops_per_second"], 1e6 / 50.5, places=0)
+
+    def test_run_benchmark(self):
+        """A run reports its number of calls, latency and allocations, and calls setup before each call."""
+        calls = []
+        benchmark = Benchmark("list", lambda n: calls.append([0] * n), number=20, setup=lambda: 1000)
+        result = run_benchmark(benchmark)
+        self.assertEqual(result["number"], 20)
+        self.assertGreater(result["alloc_peak_bytes"], 1000 * 8)
+        self.assertGreater(len(calls), 20)
+
+
+class TestCompare(unittest.TestCase):
+    """Test flagging regressions against a baseline."""
+
+    def test_regressions(self):
+        """Only growth beyond the threshold is flagged."""
+        baseline = results(a={"p50_us": 100.0, "p95_us": 200.0, "alloc_peak_bytes": 10000})
+        current = results(a={"p50_us": 110.0, "p95_us": 300.0, "alloc_peak_bytes": 20000}, new={"p50_us": 1.0})
+        regressions = compare(current, baseline, threshold=0.25)
+        self.assertEqual(
+            [(r["benchmark"], r["metric"]) for r in regressions], [("a", "p95_us"), ("a", "alloc_peak_bytes")]
+        )
+        self.assertAlmostEqual(regressions[0]["change"], 0.5)
+
+    def test_small_allocation_growth(self):
+        """Growth of a few bytes is not a regression."""
+        baseline = results(a={"alloc_peak_bytes": 100})
+        self.assertEqual(compare(results(a={"alloc_peak_bytes": 400}), baseline), [])
+
+
+class TestSuite(unittest.TestCase):
+    """Test running the suite's benchmarks."""
+
+    def test_every_benchmark_runs(self):
+        """Every benchmark runs against the stub LLM and the seeded database, and the results are saved."""
+        with bench_environment() as app:
+            run = results(**{benchmark.name: run_benchmark(benchmark, scale=0.01) for benchmark in benchmarks(app)})
+        self.assertIn("completion (tool turn)", run["benchmarks"])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results", "latest.json")
+            write_results(run, path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(json.load(f), run)
+
+
+class TestSaveAndCompare(unittest.TestCase):
+    """Test saving the results and comparing them with the baseline."""
+
+    def parse(self, directory: str, *argv: str) -> argparse.Namespace:
+        """Parse the baseline options with the result files in directory."""
+        parser = argparse.ArgumentParser()
+        add_baseline_arguments(parser, os.path.join(directory, "latest.json"), os.path.join(directory, "baseline.json"))
+        return parser.parse_args(argv)
+
+    def test_save_baseline_then_flag_regression(self):
+        """The first run becomes the baseline, and a slower run exits with status 1."""
+        report = MagicMock()
+        with tempfile.TemporaryDirectory() as directory:
+            save_and_compare(results(a={"p50_us": 100.0}), self.parse(directory, "--save-baseline"), report)
+            self.assertTrue(os.path.exists(os.path.join(directory, "baseline.json")))
+            report.assert_called_once_with(results(a={"p50_us": 100.0}), [])
+            with self.assertRaises(SystemExit) as raised:
+                save_and_compare(results(a={"p50_us": 200.0}), self.parse(directory), report, metrics=("p50_us",))
+        self.assertEqual(raised.exception.code, 1)
+        self.assertEqual([regression["benchmark"] for regression in report.call_args.args[1]], ["a"])
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test the database bootstrap script."""
+
+# python stuff
+import unittest
+from unittest.mock import MagicMock
+
+from app.bootstrap_db import (
+    COLUMNS,
+    INDEXES,
+    SEED_COURSES,
+    SEED_QUERY,
+    TABLES,
+    bootstrap,
+)
+
+
+def mock_database(existing_indexes=None, existing_columns=()):
+    """
+    A database whose cursor reports the given {table: {index: columns}} unique indexes,
+    and the given (table, column) pairs, as existing.
+    """
+    existing_indexes = existing_indexes or {}
+    cursor = MagicMock()
+    lookups = []
+
+    def execute(_query, params=None):
+        lookups.append(params)
+
+    def fetchall():
+        (table,) = lookups[-1]
+        indexes = existing_indexes.get(table, {})
+        return [
+            {"INDEX_NAME": index, "COLUMN_NAME": column} for index, columns in indexes.items() for column in columns
+        ]
+
+    cursor.execute.side_effect = execute
+    cursor.fetchall.side_effect = fetchall
+    cursor.fetchone.side_effect = lambda: {"1": 1} if lookups[-1] in existing_columns else None
+    database = MagicMock()
+    database.get_cursor.return_value.__enter__.return_value = cursor
+    return database, cursor
+
+
+class TestBootstrap(unittest.TestCase):
+    """Test the database bootstrap script."""
+
+    def executed(self, cursor):
+        """The statements executed on the cursor, whitespace squashed."""
+        return [" ".join(call.args[0].split()) for call in cursor.execute.call_args_list]
+
+    def test_creates_tables_and_indexes(self):
+        """Missing tables and indexes are created, including the unique enrollments index."""
+        database, cursor = mock_database()
+        report = bootstrap(database)
+        statements = self.executed(cursor)
+        for table, _ in TABLES:
+            self.assertTrue(any(s.startswith(f"CREATE TABLE IF NOT EXISTS {table} ") for s in statements))
+        self.assertIn("UNIQUE KEY uq_enrollments_course_email (course_code, email)", " ".join(statements))
+        for _, _, _, ddl in INDEXES:
+            self.assertIn(ddl, statements)
+        for _, _, ddl in COLUMNS:
+            self.assertIn(ddl, statements)
+        self.assertIn("UPDATE CURRENT_TIMESTAMP(6), PRIMARY KEY (course_id)", " ".join(statements))
+        self.assertIn("index enrollments.uq_enrollments_course_email: created", report)
+        self.assertIn("column courses.updated_at: created", report)
+        cursor.executemany.assert_not_called()
+
+    def test_existing_indexes_are_skipped(self):
+        """Running the script again does not try to add existing indexes."""
+        existing = {table: {index: columns} for table, index, columns, _ in INDEXES}
+        columns = {(table, column) for table, column, _ in COLUMNS}
+        database, cursor = mock_database(existing_indexes=existing, existing_columns=columns)
+        report = bootstrap(database)
+        statements = self.executed(cursor)
+        for _, _, _, ddl in INDEXES:
+            self.assertNotIn(ddl, statements)
+        for _, _, ddl in COLUMNS:
+            self.assertNotIn(ddl, statements)
+        self.assertIn("column courses.updated_at: exists", report)
+        self.assertIn("index courses.uq_courses_course_code: exists as uq_courses_course_code", report)
+
+    def test_indexes_are_matched_on_columns(self):
+        """A unique index on the same columns counts whatever its name; one of the same name on other columns does not."""
+        existing = {
+            "courses": {"course_code": ("course_code",)},
+            "enrollments": {"uq_enrollments_course_email": ("email",)},
+        }
+        database, cursor = mock_database(existing_indexes=existing)
+        with self.assertLogs("app.bootstrap_db", level="WARNING"):
+            report = bootstrap(database)
+        statements = self.executed(cursor)
+        for _, _, _, ddl in INDEXES:
+            self.assertNotIn(ddl, statements)
+        self.assertIn("index courses.uq_courses_course_code: exists as course_code", report)
+        self.assertIn("index enrollments.uq_enrollments_course_email: exists on other columns email", report)
+
+    def test_seed(self):
+        """Sample courses are inserted on request, ignoring existing ones."""
+        database, cursor = mock_database()
+        bootstrap(database, seed=True)
+        cursor.executemany.assert_called_once_with(SEED_QUERY, SEED_COURSES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test the LRU/TTL caches."""
+
+# python stuff
+import os
+import tempfile
+import time
+import unittest
+
+from app.cache import BaseCache, FileCache, MemoryCache, SQLiteCache, create_cache
+
+
+class CacheBehavior:  # pylint: disable=no-member
+    """Tests shared by all cache backends, mixed into a unittest.TestCase."""
+
+    def make_cache(self, max_entries: int = 3, ttl: float = 60.0):
+        """Build the cache under test."""
+        raise NotImplementedError
+
+    def test_get_set(self):
+        """Stored values are returned and counted as hits."""
+        cache = self.make_cache()
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", "1")
+        self.assertEqual(cache.get("a"), "1")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted first."""
+        cache = self.make_cache(max_entries=2)
+        cache.set("a", "1")
+        time.sleep(0.001)
+        cache.set("b", "2")
+        time.sleep(0.001)
+        cache.get("a")
+        time.sleep(0.001)
+        cache.set("c", "3")
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "3")
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        """Entries expire after the ttl."""
+        cache = self.make_cache(ttl=0.05)
+        cache.set("a", "1")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_clear_discards_stale_writes(self):
+        """A value computed before clear() is not stored."""
+        cache = self.make_cache()
+        cache.set("a", "1")
+        generation = cache.generation
+        cache.clear()
+        cache.set("b", "2", generation=generation)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        cache.set("b", "2", generation=cache.generation)
+        self.assertEqual(cache.get("b"), "2")
+
+    def test_delete(self):
+        """Entries can be removed one by one."""
+        cache = self.make_cache()
+        cache.set("a", "1")
+        cache.delete("a")
+        self.assertIsNone(cache.get("a"))
+
+
+class TestMemoryCache(CacheBehavior, unittest.TestCase):
+    """Test the in-process cache."""
+
+    def make_cache(self, max_entries: int = 3, ttl: float = 60.0):
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+
+    def test_no_ttl(self):
+        """A ttl of 0 keeps entries until they are evicted."""
+        cache = self.make_cache(ttl=0)
+        cache.set("a", "1")
+        self.assertEqual(cache.get("a"), "1")
+
+
+class TestSQLiteCache(CacheBehavior, unittest.TestCase):
+    """Test the cache shared through SQLite."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite3")
+        self.caches = []
+
+    def tearDown(self):
+        for cache in self.caches:
+            cache.close()
+        self.tmpdir.cleanup()
+
+    def make_cache(self, max_entries: int = 3, ttl: float = 60.0):
+        cache = SQLiteCache(path=self.path, table="test", max_entries=max_entries, ttl=ttl)
+        self.caches.append(cache)
+        return cache
+
+    def test_shared_between_instances(self):
+        """Caches opened on the same file, e.g. by other processes, share entries."""
+        writer = self.make_cache()
+        reader = self.make_cache()
+        writer.set("a", "1")
+        self.assertEqual(reader.get("a"), "1")
+        reader.clear()
+        self.assertIsNone(writer.get("a"))
+
+    def test_invalid_table(self):
+        """Table names are validated, as they cannot be query parameters."""
+        with self.assertRaises(ValueError):
+            SQLiteCache(path=self.path, table="x; DROP TABLE y")
+
+
+class TestFileCache(CacheBehavior, unittest.TestCase):
+    """Test the cache with one file per entry."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_cache(self, max_entries: int = 3, ttl: float = 60.0):
+        return FileCache(path=self.tmpdir.name, max_entries=max_entries, ttl=ttl)
+
+    def test_persistent(self):
+        """Entries survive the cache instance."""
+        self.make_cache().set("a", "1")
+        self.assertEqual(self.make_cache().get("a"), "1")
+
+
+class TestCreateCache(unittest.TestCase):
+    """Test the cache factory."""
+
+    def test_backends(self):
+        """The factory builds the requested backend."""
+        self.assertIsInstance(create_cache("memory"), MemoryCache)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = create_cache("sqlite", path=os.path.join(tmpdir, "c.sqlite3"))
+            self.assertIsInstance(cache, SQLiteCache)
+            cache.close()
+            self.assertIsInstance(create_cache("file", path=tmpdir), FileCache)
+
+    def test_base_is_abstract(self):
+        """Backends must implement the storage methods."""
+        with self.assertRaises(TypeError):
+            BaseCache()  # pylint: disable=abstract-class-instantiated
+
+    def test_invalid(self):
+        """Unknown backends and a sqlite cache without a path are rejected."""
+        with self.assertRaises(ValueError):
+            create_cache("redis")
+        with self.assertRaises(ValueError):
+            create_cache("sqlite")
+        with self.assertRaises(ValueError):
+            create_cache("file")
+        with self.assertRaises(ValueError):
+            create_cache("memory", max_entries=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
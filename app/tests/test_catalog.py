@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test the in-memory course catalog snapshot."""
+
+# python stuff
+import time
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from app.benchmarks.replay import seeded_database
+from app.cache import MemoryCache
+from app.catalog import CatalogSnapshot, CourseCatalog
+from app.settings import STACKADEMY_CATALOG_VERSION_QUERY
+from app.stackademy import Stackademy, StackademySpecializationArea
+
+
+AREAS = [area.value for area in StackademySpecializationArea]
+
+ROWS = [
+    {"course_code": "CS101", "description": "Intro to web development", "cost": Decimal("199.00")},
+    {"course_code": "AI101", "description": "Foundations of AI", "cost": Decimal("499.00")},
+    {"course_code": "DB101", "description": "Relational database design", "cost": None},
+    {"course_code": "ML201", "description": "Neural networks and ai agents", "cost": Decimal("899.00")},
+    {"course_code": "MB101", "description": "Mobile apps for the web", "cost": Decimal("299.00")},
+    {"course_code": "NW101", "description": "Network_basics 100%", "cost": Decimal("99.00")},
+]
+
+
+def sql_filter(rows, description=None, max_cost=None):
+    """Reference implementation of the SQL WHERE clause used by get_courses()."""
+    result = []
+    for row in rows:
+        if description is not None and description.lower() not in (row["description"] or "").lower():
+            continue
+        if max_cost is not None and (row["cost"] is None or row["cost"] > max_cost):
+            continue
+        result.append(row)
+    return result
+
+
+class TestCatalogSnapshot(unittest.TestCase):
+    """Test the in-memory course catalog snapshot."""
+
+    def setUp(self):
+        """Build a snapshot over the fixture rows."""
+        self.snapshot = CatalogSnapshot(rows=ROWS, areas=AREAS)
+
+    def test_matches_sql_filter(self):
+        """Test that every filter combination matches the SQL semantics row-for-row."""
+        descriptions = [None, "python"] + AREAS + ["WEB", "Ai"]
+        costs = [None, 0, 99, 150, 299, 299.5, 1000]
+        for description in descriptions:
+            for max_cost in costs:
+                with self.subTest(description=description, max_cost=max_cost):
+                    self.assertEqual(
+                        self.snapshot.filter(description=description, max_cost=max_cost),
+                        sql_filter(ROWS, description=description, max_cost=max_cost),
+                    )
+
+    def test_enum_description(self):
+        """Test that specialization area enum members are accepted."""
+        result = self.snapshot.filter(description=StackademySpecializationArea.AI)
+        self.assertEqual([row["course_code"] for row in result], ["AI101", "ML201"])
+
+    def test_like_wildcards(self):
+        """Test that LIKE wildcards and escapes behave like SQL."""
+        codes = [row["course_code"] for row in self.snapshot.filter(description="web_dev")]
+        self.assertEqual(codes, ["CS101"])
+        codes = [row["course_code"] for row in self.snapshot.filter(description="k\\_b")]
+        self.assertEqual(codes, ["NW101"])
+
+    def test_returns_copies(self):
+        """Test that callers cannot modify the snapshot through returned rows."""
+        self.snapshot.filter()[0]["course_code"] = "CHANGED"
+        self.assertEqual(ROWS[0]["course_code"], "CS101")
+
+
+class TestCourseCatalog(unittest.TestCase):
+    """Test snapshot loading and revalidation."""
+
+    def setUp(self):
+        """Create a catalog over a mock database."""
+        self.db = MagicMock()
+        self.version = [{"row_count": 6, "max_course_id": 6}]
+        self.db.execute_query.side_effect = lambda query, params=None: (
+            self.version if "COUNT(*)" in query else list(ROWS)
+        )
+        self.catalog = CourseCatalog(
+            db=self.db, areas=AREAS, ttl=0, version_query="SELECT COUNT(*) AS row_count FROM courses"
+        )
+
+    def test_unchanged_version_skips_reload(self):
+        """Test that the catalog is loaded once while the version is unchanged."""
+        self.catalog.get_courses()
+        self.catalog.get_courses(description="AI")
+        loads = [c for c in self.db.execute_query.call_args_list if "JOIN" in c.args[0]]
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(self.catalog.generation, 0)
+
+    def test_changed_version_reloads_and_notifies(self):
+        """Test that a new version reloads the snapshot and notifies listeners."""
+        listener = MagicMock()
+        self.catalog.add_listener(listener)
+        self.catalog.get_courses()
+        self.version = [{"row_count": 7, "max_course_id": 7}]
+        self.catalog.get_courses()
+        listener.assert_called_once()
+        self.assertEqual(self.catalog.generation, 1)
+
+    def test_without_version_reloads_and_notifies_on_change(self):
+        """Test that without a usable version query the catalog is reloaded, and listeners told only of changes."""
+        listener = MagicMock()
+        self.catalog.add_listener(listener)
+        self.catalog.get_courses()
+        rows = list(ROWS)
+
+        def execute_query(query, _params=None):
+            if "COUNT(*)" in query:
+                raise RuntimeError("Unknown column 'updated_at'")
+            return list(rows)
+
+        self.db.execute_query.side_effect = execute_query
+        with self.assertLogs("app.catalog", level="WARNING"):
+            self.catalog.get_courses()
+        listener.assert_not_called()
+        rows[0] = dict(ROWS[0], cost=Decimal("1.00"))
+        with self.assertLogs("app.catalog", level="WARNING"):
+            courses = self.catalog.get_courses(max_cost=50)
+        self.assertEqual([row["course_code"] for row in courses], ["CS101"])
+        listener.assert_called_once()
+
+    def test_edited_row_is_picked_up(self):
+        """Test that updating the cost of an existing course changes the version and reloads the snapshot."""
+        db = seeded_database()
+        catalog = CourseCatalog(db=db, areas=AREAS, ttl=0, version_query=STACKADEMY_CATALOG_VERSION_QUERY)
+        listener = MagicMock()
+        catalog.add_listener(listener)
+        self.assertEqual(catalog.get_courses(max_cost=1), [])
+        # the stub's timestamps are to the millisecond
+        time.sleep(0.002)
+        db.execute_update("UPDATE courses SET cost = 1 WHERE course_code = %s", ("AI101",))
+        self.assertEqual([row["course_code"] for row in catalog.get_courses(max_cost=1)], ["AI101"])
+        listener.assert_called_once()
+
+    def test_ttl_serves_from_memory(self):
+        """Test that no query runs while the snapshot is within its TTL."""
+        self.catalog.ttl = 3600
+        self.catalog.get_courses()
+        calls = self.db.execute_query.call_count
+        self.catalog.get_courses(max_cost=100)
+        self.assertEqual(self.db.execute_query.call_count, calls)
+
+    def test_invalidate(self):
+        """Test that invalidate() forces a reload and notifies listeners."""
+        listener = MagicMock()
+        self.catalog.add_listener(listener)
+        self.catalog.ttl = 3600
+        self.catalog.get_courses()
+        self.catalog.invalidate()
+        self.catalog.get_courses()
+        loads = [c for c in self.db.execute_query.call_args_list if "JOIN" in c.args[0]]
+        self.assertEqual(len(loads), 2)
+        listener.assert_called_once()
+
+
+class TestStackademyCatalogMode(unittest.TestCase):
+    """Test Stackademy.get_courses() in catalog snapshot mode."""
+
+    def test_get_courses_uses_snapshot(self):
+        """Test that get_courses() filters the snapshot in memory."""
+        app = Stackademy(catalog_snapshot=True)
+        with patch.object(app.db, "execute_query", return_value=list(ROWS)) as mock_query:
+            courses = app.get_courses(description="AI", max_cost=500)
+            app.catalog.ttl = 3600
+            app.get_courses(description="web")
+        self.assertEqual([row["course_code"] for row in courses], ["AI101"])
+        self.assertEqual(mock_query.call_count, 2)
+
+    def test_cost_bucket_counts_courses(self):
+        """Budgets that select the same courses share a cache bucket."""
+        app = Stackademy(catalog_snapshot=True)
+        with patch.object(app.db, "execute_query", return_value=list(ROWS)):
+            self.assertEqual(app.cost_bucket(300), app.cost_bucket(498.99))
+            self.assertNotEqual(app.cost_bucket(498.99), app.cost_bucket(499))
+            self.assertIsNone(app.cost_bucket(None))
+
+    def test_cost_bucket_without_snapshot(self):
+        """Without a snapshot, budgets are bucketed by amount."""
+        app = Stackademy(catalog_snapshot=False)
+        self.assertEqual(app.cost_bucket(500), app.cost_bucket(500.001))
+        self.assertNotEqual(app.cost_bucket(499.99), app.cost_bucket(500))
+
+    def test_catalog_change_clears_cache(self):
+        """A catalog change invalidates caches that listen to it."""
+        app = Stackademy(catalog_snapshot=True)
+        cache = MemoryCache()
+        app.catalog.add_listener(cache.clear)
+        cache.set("key", "value")
+        app.catalog.invalidate()
+        self.assertIsNone(cache.get("key"))
+
+    def test_get_courses_falls_back_to_sql(self):
+        """Test that get_courses() queries SQL when the snapshot cannot be loaded."""
+        app = Stackademy(catalog_snapshot=True)
+        with (
+            patch.object(app.catalog, "get_courses", side_effect=Exception("boom")),
+            patch.object(app.db, "execute_query", return_value=ROWS[:1]),
+        ):
+            self.assertEqual(app.get_courses(description="web"), ROWS[:1])
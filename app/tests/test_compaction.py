@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test conversation history compaction."""
+
+# python stuff
+import json
+import unittest
+from unittest.mock import patch
+
+from app import prompt
+from app.compaction import (
+    HistoryCompactor,
+    estimate_tokens,
+    message_tokens,
+    messages_tokens,
+    shrink_tool_result,
+)
+
+
+SYSTEM = {"role": "system", "content": "You are a helpful assistant."}
+COURSES = json.dumps([{"course_code": f"CS{i:03d}", "description": "x" * 40} for i in range(20)], indent=2)
+
+
+def turn(i: int, tool_result: str = COURSES) -> list:
+    """Build one tool-calling turn."""
+    call_id = f"call_{i}"
+    return [
+        {"role": "user", "content": f"question {i}"},
+        {
+            "role": "assistant",
+            "content": "Accessing tool...",
+            "tool_calls": [{"id": call_id, "type": "function", "function": {"name": "get_courses", "arguments": "{}"}}],
+        },
+        {"role": "tool", "content": tool_result, "tool_call_id": call_id},
+        {"role": "assistant", "content": f"answer {i}"},
+    ]
+
+
+def history(turns: int) -> list:
+    """Build a history with the given number of turns."""
+    messages = [SYSTEM]
+    for i in range(turns):
+        messages.extend(turn(i))
+    return messages
+
+
+class TestTokenEstimates(unittest.TestCase):
+    """Test the local token estimator."""
+
+    def test_estimate_tokens(self):
+        """Test the characters-per-token heuristic."""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcd"), 1)
+        self.assertEqual(estimate_tokens("abcde"), 2)
+
+    def test_message_tokens_counts_tool_calls(self):
+        """Test that tool call arguments count towards the estimate."""
+        message = turn(0)[1]
+        self.assertGreater(
+            message_tokens(message), message_tokens({"role": "assistant", "content": "Accessing tool..."})
+        )
+
+
+class TestHistoryCompactor(unittest.TestCase):
+    """Test conversation history compaction."""
+
+    def test_shrink_tool_result(self):
+        """Test that tool results are re-serialized compactly, then truncated."""
+        compact = shrink_tool_result(COURSES, max_chars=100000)
+        self.assertEqual(json.loads(compact), json.loads(COURSES))
+        self.assertLess(len(compact), len(COURSES))
+        self.assertIn("omitted", shrink_tool_result(COURSES, max_chars=50))
+        self.assertEqual(shrink_tool_result("short", max_chars=50), "short")
+
+    def test_truncated_result_not_shrunk_again(self):
+        """Test that a truncated tool result is left alone by later compactions."""
+        truncated = shrink_tool_result(COURSES, max_chars=50)
+        self.assertEqual(shrink_tool_result(truncated, max_chars=50), truncated)
+        compactor = HistoryCompactor(keep_turns=1, token_budget=0, tool_result_max_chars=50)
+        compacted, _ = compactor.compact(history(3))
+        recompacted, stats = compactor.compact(compacted)
+        self.assertEqual(recompacted, compacted)
+        self.assertEqual((stats["tool_results_shrunk"], stats["tokens_saved"]), (0, 0))
+
+    def test_recent_turns_untouched(self):
+        """Test that a short history is returned unchanged."""
+        messages = history(2)
+        compacted, stats = HistoryCompactor(keep_turns=2, token_budget=0).compact(messages)
+        self.assertEqual(compacted, messages)
+        self.assertEqual(stats["tokens_saved"], 0)
+
+    def test_old_tool_results_shrunk(self):
+        """Test that tool results outside the keep window are shrunk."""
+        messages = history(4)
+        compacted, stats = HistoryCompactor(keep_turns=2, token_budget=0, tool_result_max_chars=100).compact(messages)
+        self.assertEqual(len(compacted), len(messages))
+        self.assertEqual(stats["tool_results_shrunk"], 2)
+        self.assertLess(len(compacted[3]["content"]), len(COURSES))
+        self.assertEqual(compacted[-2]["content"], COURSES)
+        self.assertEqual(messages[3]["content"], COURSES)
+        self.assertGreater(stats["tokens_saved"], 0)
+
+    def test_budget_drops_oldest_turns(self):
+        """Test that whole turns are dropped to meet the token budget."""
+        messages = history(6)
+        budget = messages_tokens([SYSTEM] + turn(0) * 2)
+        compacted, stats = HistoryCompactor(keep_turns=6, token_budget=budget).compact(messages)
+        self.assertLessEqual(stats["tokens_after"], budget)
+        self.assertEqual(compacted[0], SYSTEM)
+        self.assertEqual(compacted[1]["role"], "user")
+        self.assertEqual(compacted[-1], messages[-1])
+        self.assertEqual(stats["turns_dropped"], 4)
+
+    def test_latest_turn_always_kept(self):
+        """Test that the latest turn survives even when it alone exceeds the budget."""
+        messages = history(3)
+        compacted, _ = HistoryCompactor(keep_turns=1, token_budget=1).compact(messages)
+        self.assertEqual(compacted, [SYSTEM] + turn(2))
+
+
+class TestPromptCompaction(unittest.TestCase):
+    """Test that completion compacts the session history."""
+
+    def test_compact_history_updates_session(self):
+        """Test that compaction replaces the history and records tokens saved."""
+        session = prompt.session_store.create()
+        for i in range(10):
+            for message in turn(i):
+                session.append(message)
+        with patch("app.prompt.history_compactor", HistoryCompactor(keep_turns=2, token_budget=2000)):
+            prompt.compact_history(session)
+        self.assertGreater(session.tokens_saved, 0)
+        self.assertEqual(session.tokens_saved, session.last_compaction["tokens_saved"])
+        self.assertLessEqual(messages_tokens(session.messages), 2000)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test the chat completion cache."""
+
+# python stuff
+import tempfile
+import unittest
+
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+
+from app.cache import FileCache, MemoryCache
+from app.completion_cache import CompletionCache, request_key
+
+
+def make_request(**overrides) -> dict:
+    """Build chat completion request arguments."""
+    request = {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "AI courses?"}],
+        "tools": ({"type": "function", "function": {"name": "get_courses", "parameters": {}}},),
+        "tool_choice": "required",
+        "temperature": 0.0,
+        "max_tokens": 4096,
+    }
+    request.update(overrides)
+    return request
+
+
+RESPONSE = ChatCompletion.model_validate(
+    {
+        "id": "chatcmpl-cached",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [
+            {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "AI101 and ML201."}}
+        ],
+        "usage": {"prompt_tokens": 20, "completion_tokens": 5, "total_tokens": 25},
+    }
+)
+
+
+class TestRequestKey(unittest.TestCase):
+    """Test the request hash."""
+
+    def test_stable(self):
+        """The key does not depend on dict key order or on messages being models or dicts."""
+        message = {"role": "assistant", "content": "Hello", "refusal": None}
+        reordered = {"content": "Hello", "refusal": None, "role": "assistant"}
+        model = ChatCompletionMessage.model_validate(message)
+        self.assertEqual(request_key(make_request(messages=[message])), request_key(make_request(messages=[reordered])))
+        self.assertEqual(len(request_key(make_request(messages=[model]))), 64)
+
+    def test_key_fields(self):
+        """Every field that determines the completion changes the key."""
+        key = request_key(make_request())
+        for field, value in (
+            ("model", "gpt-4o"),
+            ("messages", [{"role": "user", "content": "Web courses?"}]),
+            ("tools", ()),
+            ("tool_choice", "auto"),
+            ("temperature", 0.5),
+            ("max_tokens", 100),
+        ):
+            with self.subTest(field=field):
+                self.assertNotEqual(request_key(make_request(**{field: value})), key)
+        self.assertEqual(request_key({**make_request(), "stream": False}), key)
+
+
+class TestCompletionCache(unittest.TestCase):
+    """Test the completion cache."""
+
+    def test_roundtrip_and_metrics(self):
+        """Cached responses are returned as ChatCompletion models, and hits report what they saved."""
+        cache = CompletionCache(MemoryCache())
+        self.assertIsNone(cache.get(make_request()))
+        cache.put(make_request(), RESPONSE, latency=1.5)
+        cached = cache.get(make_request())
+        self.assertIsInstance(cached, ChatCompletion)
+        self.assertEqual(cached, RESPONSE)
+        cache.get(make_request())
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+        self.assertEqual(stats["saved_latency"], 3.0)
+        self.assertEqual(stats["saved_tokens"], 50)
+
+    def test_file_backend(self):
+        """Completions persist on disk across cache instances."""
+        with tempfile.TemporaryDirectory() as path:
+            CompletionCache(FileCache(path)).put(make_request(), RESPONSE, latency=0.2)
+            self.assertEqual(CompletionCache(FileCache(path)).get(make_request()), RESPONSE)
+
+    def test_unreadable_entry(self):
+        """A corrupt entry is dropped and treated as a miss."""
+        backend = MemoryCache()
+        backend.set(request_key(make_request()), "not json")
+        cache = CompletionCache(backend)
+        self.assertIsNone(cache.get(make_request()))
+        self.assertEqual(len(backend), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,7 @@ from unittest.mock import MagicMock, patch
 
 import pymysql
 
+from app import database
 from app.database import ConfigurationException, DatabaseConnection
 from app.logging_config import get_logger
 
@@ -26,6 +27,12 @@ class TestDatabase(unittest.TestCase):
         self.assertIn("@", conn_str)
         self.assertIn("/", conn_str)
 
+    def test_global_instance_is_lazy(self):
+        """Test that the global db is created on first access and shared."""
+        self.assertNotIn("db", vars(database))
+        self.assertIs(database.db, database.get_db())
+        self.assertIsInstance(database.db, DatabaseConnection)
+
     @patch("app.database.pymysql.connect")
     def test_get_connection_success(self, mock_connect):
         """Test that a connection is returned on success."""
@@ -53,6 +60,68 @@ class TestDatabase(unittest.TestCase):
         with db.get_cursor() as cursor:
             self.assertEqual(cursor, mock_cursor)
         mock_conn.commit.assert_called_once()
+        # the connection goes back to the pool instead of being closed
+        mock_conn.close.assert_not_called()
+        self.assertEqual(db.pool_stats()["idle"], 1)
+
+    @patch("app.database.DatabaseConnection.get_connection")
+    def test_get_cursor_reuses_pooled_connection(self, mock_get_conn):
+        """Test that consecutive cursors share one pooled connection."""
+        db = DatabaseConnection()
+        mock_get_conn.return_value = MagicMock()
+        for _ in range(3):
+            with db.get_cursor():
+                pass
+        mock_get_conn.assert_called_once()
+        stats = db.pool_stats()
+        self.assertEqual(stats["connects_created"], 1)
+        self.assertEqual(stats["checkouts"], 3)
+        self.assertEqual(stats["checked_out"], 0)
+
+    @patch("app.database.DatabaseConnection.get_connection")
+    def test_first_checkout_warms_pool(self, mock_get_conn):
+        """Test that the first checkout opens MYSQL_POOL_MIN_SIZE connections, and creating the pool opens none."""
+        mock_get_conn.side_effect = MagicMock
+        with patch("app.database.MYSQL_POOL_MIN_SIZE", 3):
+            db = DatabaseConnection()
+        mock_get_conn.assert_not_called()
+        with db.get_cursor():
+            with db.get_cursor():
+                pass
+        with db.get_cursor():
+            pass
+        stats = db.pool_stats()
+        self.assertEqual(mock_get_conn.call_count, 3)
+        self.assertEqual((stats["connects_created"], stats["checkouts"], stats["idle"]), (3, 3, 3))
+
+    @patch("app.database.DatabaseConnection.get_connection")
+    def test_get_cursor_interrupted(self, mock_get_conn):
+        """Test that an interrupted unit of work discards its connection instead of leaking the pool slot."""
+        db = DatabaseConnection()
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        with self.assertRaises(KeyboardInterrupt):
+            with db.get_cursor():
+                raise KeyboardInterrupt()
+        generator = db.get_cursor().gen  # pylint: disable=no-member
+        next(generator)
+        generator.close()
+        mock_conn.commit.assert_not_called()
+        self.assertEqual(mock_conn.close.call_count, 2)
+        self.assertEqual(db.pool_stats()["checked_out"], 0)
+
+    @patch("app.database.DatabaseConnection.get_connection")
+    def test_get_cursor_without_pool(self, mock_get_conn):
+        """Test that a connection is opened and closed per call when pooling is disabled."""
+        with patch("app.database.MYSQL_POOL_MAX_SIZE", 0):
+            db = DatabaseConnection()
+        self.assertIsNone(db.pool)
+        self.assertEqual(db.pool_stats(), {})
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        with db.get_cursor():
+            pass
+        mock_conn.commit.assert_called_once()
         mock_conn.close.assert_called_once()
 
     @patch("app.database.DatabaseConnection.get_connection")
@@ -95,6 +164,24 @@ class TestDatabase(unittest.TestCase):
         result = db.execute_update("UPDATE test SET a=1")
         self.assertEqual(result, 2)
 
+    @patch("app.database.DatabaseConnection.get_cursor")
+    def test_execute_many(self, mock_get_cursor):
+        """Test that a batch runs with one executemany call on one cursor."""
+        db = DatabaseConnection()
+        mock_cursor = MagicMock()
+        mock_cursor.rowcount = 3
+        mock_get_cursor.return_value.__enter__.return_value = mock_cursor
+        rows = [(1,), (2,), (3,)]
+        self.assertEqual(db.execute_many("INSERT INTO test VALUES (%s)", rows), 3)
+        mock_cursor.executemany.assert_called_once_with("INSERT INTO test VALUES (%s)", rows)
+        mock_get_cursor.assert_called_once()
+
+    @patch("app.database.DatabaseConnection.get_cursor")
+    def test_execute_many_empty(self, mock_get_cursor):
+        """Test that an empty batch does not touch the database."""
+        self.assertEqual(DatabaseConnection().execute_many("INSERT INTO test VALUES (%s)", []), 0)
+        mock_get_cursor.assert_not_called()
+
     @patch("app.database.DatabaseConnection.get_cursor")
     def test_test_connection_success(self, mock_get_cursor):
         """Test that the database connection is successful."""
@@ -128,3 +215,87 @@ class TestDatabase(unittest.TestCase):
         with self.assertRaises(pymysql.Error) as ctx:
             db.get_connection()
         self.assertIn("Failed to connect to MySQL database", str(ctx.exception))
+
+
+def streaming_connection(rows, columns=("course_code", "cost")):
+    """A mock connection whose server-side cursor returns rows."""
+    connection = MagicMock()
+    cursor = connection.cursor.return_value
+    cursor.description = [(column,) for column in columns]
+    cursor.fetchall_unbuffered.side_effect = lambda: iter(rows)
+    pending = list(rows)
+
+    def fetchmany(size):
+        batch = pending[:size]
+        del pending[:size]
+        return batch
+
+    cursor.fetchmany.side_effect = fetchmany
+    return connection, cursor
+
+
+@patch("app.database.DatabaseConnection.get_connection")
+class TestIterQuery(unittest.TestCase):
+    """Test streaming query results with server-side cursors."""
+
+    ROWS = [
+        {"course_code": "AI101", "cost": 1},
+        {"course_code": "WEB101", "cost": 2},
+        {"course_code": "DB101", "cost": 3},
+    ]
+
+    def test_rows(self, mock_get_conn):
+        """Rows come from an unbuffered dict cursor and the connection returns to the pool."""
+        connection, cursor = streaming_connection(self.ROWS)
+        mock_get_conn.return_value = connection
+        db = DatabaseConnection()
+        stream = db.iter_query("SELECT course_code, cost FROM courses WHERE cost > %s", (0,))
+        mock_get_conn.assert_not_called()
+        self.assertEqual(list(stream), self.ROWS)
+        self.assertEqual(stream.columns, ["course_code", "cost"])
+        self.assertEqual(stream.rowcount, 3)
+        connection.cursor.assert_called_once_with(pymysql.cursors.SSDictCursor)
+        cursor.execute.assert_called_once_with("SELECT course_code, cost FROM courses WHERE cost > %s", (0,))
+        cursor.fetchall.assert_not_called()
+        connection.close.assert_not_called()
+        self.assertEqual(db.pool_stats()["idle"], 1)
+
+    def test_batches_of_tuples(self, mock_get_conn):
+        """Batches of tuples use an unbuffered tuple cursor, with the columns available up front."""
+        rows = [tuple(row.values()) for row in self.ROWS]
+        connection, _ = streaming_connection(rows)
+        mock_get_conn.return_value = connection
+        stream = DatabaseConnection().iter_query("SELECT course_code, cost FROM courses", batch_size=2, as_tuples=True)
+        self.assertEqual(stream.start(), ["course_code", "cost"])
+        self.assertEqual(list(stream), [rows[:2], rows[2:]])
+        connection.cursor.assert_called_once_with(pymysql.cursors.SSCursor)
+
+    def test_closed_early(self, mock_get_conn):
+        """A stream that is not read to the end discards its connection instead of draining it."""
+        connection, cursor = streaming_connection(self.ROWS)
+        mock_get_conn.return_value = connection
+        db = DatabaseConnection()
+        with db.iter_query("SELECT course_code, cost FROM courses") as stream:
+            next(stream)
+        cursor.close.assert_not_called()
+        connection.close.assert_called_once()
+        self.assertEqual(db.pool_stats()["size"], 0)
+
+    def test_query_error(self, mock_get_conn):
+        """A failing query raises on first use and discards the connection."""
+        connection, cursor = streaming_connection([])
+        cursor.execute.side_effect = pymysql.err.ProgrammingError("syntax error")
+        mock_get_conn.return_value = connection
+        db = DatabaseConnection()
+        with self.assertRaises(pymysql.err.ProgrammingError):
+            list(db.iter_query("SELEC 1"))
+        self.assertEqual(db.pool_stats()["size"], 0)
+
+    def test_without_pool(self, mock_get_conn):
+        """Without pooling the dedicated connection is closed at the end."""
+        connection, _ = streaming_connection(self.ROWS)
+        mock_get_conn.return_value = connection
+        with patch("app.database.MYSQL_POOL_MAX_SIZE", 0):
+            db = DatabaseConnection()
+        self.assertEqual(len(list(db.iter_query("SELECT course_code, cost FROM courses"))), 3)
+        connection.close.assert_called_once()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,C0115,W0613
+"""Test the logging pipeline."""
+
+# python stuff
+import io
+import json
+import logging
+import queue
+import sys
+import unittest
+from unittest.mock import patch
+
+from app import logging_config, utils
+from app.logging_config import (
+    DroppingQueueHandler,
+    JSONFormatter,
+    TextFormatter,
+    create_handler,
+    start_queue,
+    stop_queue,
+    use_color,
+)
+from app.stackademy import Stackademy
+
+
+def make_record(msg, *args, exc_info=None) -> logging.LogRecord:
+    """A log record of the app.test logger."""
+    return logging.LogRecord("app.test", logging.INFO, __file__, 1, msg, args, exc_info)
+
+
+class TestFormatters(unittest.TestCase):
+    """Test the text and JSON formatters."""
+
+    def test_json(self):
+        """Records are formatted as one JSON object, without colors."""
+        exc_info = None
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            exc_info = sys.exc_info()
+        self.assertIsNotNone(exc_info)
+        record = make_record(utils.lazy_color_text("%d rows", "green"), 3, exc_info=exc_info)
+        line = JSONFormatter().format(record)
+        self.assertNotIn("\n", line)
+        entry = json.loads(line)
+        self.assertEqual(entry["message"], "3 rows")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "app.test")
+        self.assertTrue(entry["time"].endswith("+00:00"))
+        self.assertIn("ValueError: boom", entry["exception"])
+
+    def test_text_color(self):
+        """The text formatter removes colors unless they are wanted."""
+        record = make_record(utils.color_text("hello", "green"))
+        self.assertEqual(TextFormatter("%(message)s", color=False).format(record), "hello")
+        self.assertEqual(TextFormatter("%(message)s", color=True).format(record), utils.color_text("hello", "green"))
+
+    def test_use_color(self):
+        """Colors are used for terminals only, unless forced."""
+        self.assertFalse(use_color(io.StringIO()))
+        self.assertTrue(use_color(io.StringIO(), "always"))
+        self.assertFalse(use_color(io.StringIO(), "never"))
+
+    def test_ansi_colors_off(self):
+        """With colors off, lazily formatted messages are not colored at all."""
+        with patch.object(utils, "_ansi_colors", False):
+            self.assertEqual(str(utils.lazy_color_text("hello", "green")), "hello")
+            self.assertEqual(json.loads(str(utils.lazy_json({"a": 1}))), {"a": 1})
+            self.assertNotIn("\033", str(utils.lazy_json({"a": 1})))
+
+
+class TestQueueHandler(unittest.TestCase):
+    """Test the bounded logging queue."""
+
+    def test_drop_newest(self):
+        """A full queue drops the records being logged."""
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2), "newest")
+        for i in range(5):
+            handler.handle(make_record("record %d", i))
+        self.assertEqual([handler.queue.get_nowait().msg for _ in range(2)], ["record 0", "record 1"])
+        self.assertEqual(handler.dropped, 3)
+
+    def test_drop_oldest(self):
+        """A full queue drops its oldest records to make room."""
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2), "oldest")
+        for i in range(5):
+            handler.handle(make_record("record %d", i))
+        self.assertEqual([handler.queue.get_nowait().msg for _ in range(2)], ["record 3", "record 4"])
+        self.assertEqual(handler.dropped, 3)
+
+    def test_prepare(self):
+        """The message is rendered by the caller, with its arguments as they are now."""
+        rows = [1, 2]
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+        handler.handle(make_record("rows: %s", rows))
+        rows.append(3)
+        record = handler.queue.get_nowait()
+        self.assertEqual((record.msg, record.args), ("rows: [1, 2]", None))
+
+    def test_listener(self):
+        """The listener thread formats and writes the queued records."""
+        stream = io.StringIO()
+        queue_handler = start_queue(create_handler(stream, "json"), size=100, policy="block")
+        logger = logging.getLogger("app.tests.test_logging_config.listener")
+        logger.propagate = False
+        logger.addHandler(queue_handler)
+        try:
+            for i in range(10):
+                logger.warning("request %d", i)
+        finally:
+            stop_queue()
+            logger.removeHandler(queue_handler)
+        messages = [json.loads(line)["message"] for line in stream.getvalue().splitlines()]
+        self.assertEqual(messages, [f"request {i}" for i in range(10)])
+        self.assertIsNone(logging_config._listener)  # pylint: disable=protected-access
+
+    def test_stop_full_queue(self):
+        """The listener can be stopped while the queue is full."""
+        stream = io.StringIO()
+        queue_handler = start_queue(create_handler(stream, "json"), size=1, policy="newest")
+        with patch.object(queue_handler.queue, "full", return_value=False):
+            for i in range(50):
+                queue_handler.handle(make_record("record %d", i))
+        stop_queue()
+        self.assertEqual(len(stream.getvalue().splitlines()) + queue_handler.dropped, 50)
+
+
+class TestLogSuccess(unittest.TestCase):
+    """Test that success messages go through logging."""
+
+    def test_log_success(self):
+        """The message is logged, not printed."""
+        with patch("builtins.print") as mock_print, self.assertLogs("app.stackademy", level="INFO") as logs:
+            app = Stackademy(catalog_snapshot=False, course_code_cache=False)
+            app._log_success("Registered 100%")  # pylint: disable=protected-access
+        mock_print.assert_not_called()
+        self.assertIn("Registered 100%", logs.output[0])
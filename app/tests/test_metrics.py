@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,C0115,W0613
+"""Test the metrics registry."""
+
+# python stuff
+import contextlib
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from app import prompt, stackademy
+from app.benchmarks.replay import seeded_database
+from app.cache import MemoryCache
+from app.metrics import (
+    OPENAI_REQUEST_SECONDS,
+    OPENAI_TOKENS,
+    TOOL_CALL_SECONDS,
+    TOOL_CALLS,
+    FileExport,
+    MetricsRegistry,
+    cache_collector,
+)
+from app.openai_client import scoped_clients
+from app.session import ConversationSession
+from app.stubs.openai_server import StubOpenAIServer
+
+
+class TestMetrics(unittest.TestCase):
+    """Test counters, histograms and the exposition format."""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_across_threads(self):
+        """Increments from many threads are summed without losing any."""
+        counter = self.registry.counter("calls_total", "Calls.", ("function",))
+
+        def work():
+            for _ in range(1000):
+                counter.inc("get_courses")
+            counter.inc("register_course", amount=2)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.value("get_courses"), 8000)
+        self.assertEqual(counter.value("register_course"), 16)
+        with self.assertRaises(ValueError):
+            counter.inc("a", "b")
+
+    def test_finished_threads_are_folded(self):
+        """The values of finished threads are kept in one shared total, not in a dict per thread."""
+        counter = self.registry.counter("calls_total", "Calls.", ("function",))
+        histogram = self.registry.histogram("latency_seconds", "Latency.", ("operation",), buckets=(0.1, 1.0))
+
+        def work():
+            counter.inc("get_courses")
+            histogram.observe(0.5, "query")
+
+        for _ in range(50):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(counter._shards), 0)  # pylint: disable=protected-access
+        self.assertEqual(len(histogram._shards), 0)  # pylint: disable=protected-access
+        self.assertEqual(counter.value("get_courses"), 50)
+        self.assertEqual(histogram.count("query"), 50)
+        self.assertIn('latency_seconds_sum{operation="query"} 25', self.registry.render())
+
+    def test_histogram(self):
+        """Observations fall into cumulative buckets, with their sum and count."""
+        histogram = self.registry.histogram("latency_seconds", "Latency.", ("operation",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, "query")
+        self.assertEqual(histogram.count("query"), 4)
+        text = self.registry.render()
+        self.assertIn("# TYPE latency_seconds histogram", text)
+        self.assertIn('latency_seconds_bucket{operation="query",le="0.1"} 2', text)
+        self.assertIn('latency_seconds_bucket{operation="query",le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{operation="query",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_sum{operation="query"} 3.65', text)
+        self.assertIn('latency_seconds_count{operation="query"} 4', text)
+
+    def test_timed(self):
+        """The timed decorator observes failed calls too."""
+        histogram = self.registry.histogram("connect_seconds", "Connects.")
+
+        @histogram.timed()
+        def connect(fail):
+            if fail:
+                raise ConnectionError()
+
+        connect(False)
+        with self.assertRaises(ConnectionError):
+            connect(True)
+        self.assertEqual(histogram.count(), 2)
+
+    def test_render(self):
+        """Label values are escaped, and collectors are merged by family."""
+        counter = self.registry.counter("errors_total", "Errors.", ("error",))
+        counter.inc('say "hi"\\\n')
+        first, second = MemoryCache(), MemoryCache()
+        first.set("a", "1")
+        first.get("a")
+        first.get("b")
+        self.registry.add_collector(cache_collector({"first": first}))
+        self.registry.add_collector(cache_collector({"second": second}))
+        self.registry.add_collector(lambda: 1 / 0)
+        with self.assertLogs("app.metrics", level="WARNING"):
+            text = self.registry.render()
+        self.assertIn('errors_total{error="say \\"hi\\"\\\\\\n"} 1', text)
+        self.assertEqual(text.count("# TYPE stackademy_cache_hit_ratio gauge"), 1)
+        self.assertIn('stackademy_cache_hit_ratio{cache="first"} 0.5', text)
+        self.assertIn('stackademy_cache_hit_ratio{cache="second"} 0', text)
+        with self.assertRaises(ValueError):
+            self.registry.counter("errors_total", "Again.")
+
+    def test_file_export(self):
+        """The metrics are written to the file periodically and when stopped."""
+        counter = self.registry.counter("turns_total", "Turns.")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stackademy.prom")
+            export = FileExport(path, interval=0.01, metrics=self.registry).start()
+            counter.inc()
+            export.stop()
+            with open(path, encoding="utf-8") as f:
+                self.assertIn("turns_total 1", f.read())
+            self.assertEqual(os.listdir(directory), ["stackademy.prom"])
+
+
+class TestTurnMetrics(unittest.TestCase):
+    """Test the metrics recorded by a turn."""
+
+    def test_completion(self):
+        """Requests, tokens and tool calls of a turn are counted."""
+        model = prompt.settings.OPENAI_API_MODEL
+        script = [{"tool_calls": [("get_courses", {"description": "AI"})]}, "Here you go."]
+        before = (
+            OPENAI_REQUEST_SECONDS.count(model, "false"),
+            OPENAI_TOKENS.value(model, "completion"),
+            TOOL_CALLS.value("get_courses"),
+            TOOL_CALL_SECONDS.count("get_courses"),
+            TOOL_CALLS.value("unknown"),
+        )
+        with contextlib.ExitStack() as stack:
+            stub = stack.enter_context(StubOpenAIServer(script=script))
+            stack.enter_context(patch("app.settings.OPENAI_BASE_URL", stub.base_url))
+            stack.enter_context(patch("app.settings.OPENAI_API_KEY", "stub"))
+            stack.enter_context(patch.object(stackademy.stackademy_app, "db", seeded_database()))
+            stack.enter_context(patch.object(prompt, "completion_cache", None))
+            stack.enter_context(scoped_clients())
+            prompt.completion("AI courses?", session=ConversationSession())
+        after = (
+            OPENAI_REQUEST_SECONDS.count(model, "false"),
+            OPENAI_TOKENS.value(model, "completion"),
+            TOOL_CALLS.value("get_courses"),
+            TOOL_CALL_SECONDS.count("get_courses"),
+            TOOL_CALLS.value("unknown"),
+        )
+        self.assertEqual(after[0] - before[0], 2)
+        self.assertGreater(after[1], before[1])
+        self.assertEqual(after[2] - before[2], 1)
+        self.assertEqual(after[3] - before[3], 1)
+        self.assertEqual(after[4], before[4])
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test the shared OpenAI client factory."""
+
+# python stuff
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import openai
+
+from app import openai_client
+from app.stubs.openai_server import StubOpenAIServer
+
+
+class TestOpenAIClient(unittest.TestCase):
+    """Test the shared OpenAI client factory."""
+
+    def setUp(self):
+        """Start each test without cached clients, and restore the shared ones afterwards."""
+        self.enterContext(openai_client.scoped_clients())
+
+    def test_client_is_shared(self):
+        """Test that the same client instance is reused."""
+        client = openai_client.get_client()
+        self.assertIsInstance(client, openai.OpenAI)
+        self.assertIs(openai_client.get_client(), client)
+        openai_client.reset_clients()
+        self.assertIsNot(openai_client.get_client(), client)
+
+    def test_async_client_is_shared(self):
+        """Test that the same async client instance is reused."""
+        client = openai_client.get_async_client()
+        self.assertIsInstance(client, openai.AsyncOpenAI)
+        self.assertIs(openai_client.get_async_client(), client)
+
+    def test_scoped_clients(self):
+        """Test that clients built within the block are replaced by the previous ones afterwards."""
+        client = openai_client.get_client()
+        with patch("app.settings.OPENAI_BASE_URL", "http://127.0.0.1:1/v1"), openai_client.scoped_clients():
+            self.assertEqual(str(openai_client.get_client().base_url), "http://127.0.0.1:1/v1/")
+        self.assertIs(openai_client.get_client(), client)
+
+    def test_dropped_clients_are_closed(self):
+        """Test that reset_clients() and scoped_clients() close the clients they drop, async ones included."""
+        client, async_client = openai_client.get_client(), openai_client.get_async_client()
+        with patch.object(client, "close") as close, patch.object(async_client, "close", AsyncMock()) as aclose:
+            openai_client.reset_clients()
+        close.assert_called_once()
+        aclose.assert_awaited_once()
+        with openai_client.scoped_clients():
+            client, async_client = openai_client.get_client(), openai_client.get_async_client()
+            close = patch.object(client, "close").start()
+            aclose = patch.object(async_client, "close", AsyncMock()).start()
+            self.addCleanup(patch.stopall)
+        close.assert_called_once()
+        aclose.assert_awaited_once()
+
+    def test_reset_after_fork_does_not_close(self):
+        """Test that the clients are only dropped with close=False."""
+        client = openai_client.get_client()
+        with patch.object(client, "close") as close:
+            openai_client.reset_clients(close=False)
+        close.assert_not_called()
+
+    def test_transport_settings(self):
+        """Test that limits and timeouts come from settings."""
+        with (
+            patch("app.settings.OPENAI_HTTP_MAX_CONNECTIONS", 7),
+            patch("app.settings.OPENAI_HTTP_KEEPALIVE_EXPIRY", 12.0),
+            patch("app.settings.OPENAI_HTTP_CONNECT_TIMEOUT", 1.5),
+        ):
+            limits = openai_client.http_limits()
+            timeout = openai_client.http_timeout()
+        self.assertEqual(limits.max_connections, 7)
+        self.assertEqual(limits.keepalive_expiry, 12.0)
+        self.assertEqual(timeout.connect, 1.5)
+
+    def test_http2_requires_h2(self):
+        """Test that HTTP/2 falls back to HTTP/1.1 without the h2 package."""
+        with (
+            patch("app.settings.OPENAI_HTTP2", True),
+            patch("app.openai_client.importlib.util.find_spec", return_value=None),
+        ):
+            self.assertFalse(openai_client.http2_enabled())
+        with patch("app.settings.OPENAI_HTTP2", False):
+            self.assertFalse(openai_client.http2_enabled())
+
+    def test_requests_reach_base_url(self):
+        """Test that the shared client talks to the configured base URL."""
+        with StubOpenAIServer(content="pong") as server:
+            with patch("app.settings.OPENAI_BASE_URL", server.base_url):
+                openai_client.reset_clients()
+                response = openai_client.get_client().chat.completions.create(
+                    model="gpt-4o-mini", messages=[{"role": "user", "content": "ping"}]
+                )
+        self.assertEqual(response.choices[0].message.content, "pong")
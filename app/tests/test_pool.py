@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,W0212
+"""Test the database connection pool."""
+
+# python stuff
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from app.exceptions import ConnectionPoolTimeout
+from app.pool import ConnectionPool
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test the database connection pool."""
+
+    def setUp(self):
+        """Create a pool backed by mock connections."""
+        self.connect = MagicMock(side_effect=MagicMock)
+
+    def test_invalid_sizes(self):
+        """Test that inconsistent pool sizes are rejected."""
+        with self.assertRaises(ValueError):
+            ConnectionPool(self.connect, max_size=0)
+        with self.assertRaises(ValueError):
+            ConnectionPool(self.connect, min_size=3, max_size=2)
+
+    def test_connection_is_reused(self):
+        """Test that a released connection is handed out again."""
+        pool = ConnectionPool(self.connect, max_size=2)
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+        self.assertIs(first, second)
+        self.assertEqual(self.connect.call_count, 1)
+        second.connection.ping.assert_called_once_with(reconnect=False)
+
+    def test_ping_failure_replaces_connection(self):
+        """Test that a connection failing its liveness ping is replaced."""
+        pool = ConnectionPool(self.connect, max_size=1)
+        dead = pool.acquire()
+        dead.connection.ping.side_effect = Exception("gone away")
+        pool.release(dead)
+        fresh = pool.acquire()
+        self.assertIsNot(dead, fresh)
+        dead.connection.close.assert_called_once()
+        self.assertEqual(pool.stats()["ping_failures"], 1)
+
+    def test_max_lifetime_recycles_connection(self):
+        """Test that connections older than max_lifetime are not reused."""
+        pool = ConnectionPool(self.connect, max_size=1, max_lifetime=60)
+        old = pool.acquire()
+        old.created_at -= 120
+        pool.release(old)
+        old.connection.close.assert_called_once()
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_idle_timeout_respects_min_size(self):
+        """Test that idle connections expire but min_size connections are kept."""
+        pool = ConnectionPool(self.connect, min_size=1, max_size=3, idle_timeout=30)
+        checked_out = [pool.acquire() for _ in range(3)]
+        for pooled in checked_out:
+            pool.release(pooled)
+            pooled.last_used_at -= 60
+        pool.release(pool.acquire())
+        stats = pool.stats()
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["connects_closed"], 2)
+
+    def test_checkout_timeout(self):
+        """Test that an exhausted pool raises after checkout_timeout."""
+        pool = ConnectionPool(self.connect, max_size=1, checkout_timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(ConnectionPoolTimeout):
+            pool.acquire()
+        stats = pool.stats()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["waits"], 1)
+
+    def test_waiter_receives_released_connection(self):
+        """Test that a blocked checkout is served when a connection is released."""
+        pool = ConnectionPool(self.connect, max_size=1, checkout_timeout=5)
+        held = pool.acquire()
+        result = {}
+
+        def waiter():
+            result["pooled"] = pool.acquire()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+        pool.release(held)
+        thread.join(timeout=5)
+        self.assertIs(result["pooled"], held)
+        self.assertGreater(pool.stats()["wait_time_total"], 0)
+
+    def test_connect_failure_frees_slot(self):
+        """Test that a failed connect does not leak a pool slot."""
+        self.connect.side_effect = Exception("refused")
+        pool = ConnectionPool(self.connect, max_size=1)
+        with self.assertRaises(Exception):
+            pool.acquire()
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_connection_context_discards_on_error(self):
+        """Test that the context manager closes a connection that raised."""
+        pool = ConnectionPool(self.connect, max_size=1)
+        with self.assertRaises(RuntimeError):
+            with pool.connection() as connection:
+                raise RuntimeError("boom")
+        connection.close.assert_called_once()
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_warm_and_close(self):
+        """Test that warm() opens min_size connections and close() releases them."""
+        pool = ConnectionPool(self.connect, min_size=2, max_size=4)
+        pool.warm()
+        self.assertEqual(pool.stats()["idle"], 2)
+        pool.close()
+        self.assertEqual(pool.stats()["size"], 0)
+        with self.assertRaises(ConnectionPoolTimeout):
+            pool.acquire()
@@ -4,13 +4,19 @@
 """Test prompt."""
 
 # python stuff
+import asyncio
+import json
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import httpx
 import openai
+from openai.types.chat import ChatCompletion
 
 from app import prompt
+from app.cache import MemoryCache
+from app.completion_cache import CompletionCache
+from app.stackademy import tool_result_cache
 
 
 class DummyResponse:
@@ -30,8 +36,10 @@ class TestPrompt(unittest.TestCase):
 
     def test_handle_function_call_get_courses(self):
         """Test that get_courses function call is handled correctly."""
+        if tool_result_cache is not None:
+            tool_result_cache.clear()
         with patch("app.prompt.stackademy_app.get_courses", return_value=[{"course_code": "TEST"}]):
-            result = prompt.handle_function_call("get_courses", {"description": "test"})
+            result = prompt.handle_function_call("get_courses", {"description": "AI"})
             self.assertIn("TEST", result)
 
     def test_handle_function_call_register_course(self):
@@ -42,6 +50,14 @@ class TestPrompt(unittest.TestCase):
             )
             self.assertIn("success", result)
 
+    def test_handle_function_call_invalid_arguments(self):
+        """Arguments that do not match the tool's model are reported back instead of executed."""
+        with patch("app.prompt.stackademy_app.register_course", return_value=True) as mock_register:
+            result = json.loads(prompt.handle_function_call("register_course", {"course_code": "TEST"}))
+            self.assertIn("Invalid arguments", result["error"])
+            self.assertEqual({detail["loc"][0] for detail in result["details"]}, {"email", "full_name"})
+            mock_register.assert_not_called()
+
     def test_handle_function_call_unknown(self):
         """Test that unknown function call is handled correctly."""
         result = prompt.handle_function_call("unknown_func", {})
@@ -65,7 +81,7 @@ class TestPrompt(unittest.TestCase):
             patch("app.prompt.handle_function_call", return_value='{"success": true}'),
             patch("app.prompt.stackademy_app.tool_factory_get_courses", return_value={"tool": "get_courses"}),
             patch("app.prompt.stackademy_app.tool_factory_register", return_value={"tool": "register_course"}),
-            patch("app.prompt.openai.chat.completions.create") as mock_create,
+            patch.object(prompt.get_client().chat.completions, "create") as mock_create,
         ):
             # Simulate OpenAI response with no tool_calls
             class Msg:
@@ -133,41 +149,50 @@ class TestPrompt(unittest.TestCase):
             self.assertIsNotNone(response)
             self.assertIsInstance(functions_called, list)
 
-    @patch("app.prompt.openai.chat.completions.create", side_effect=Exception("unexpected"))
+    @patch.object(prompt.get_client().chat.completions, "create", side_effect=Exception("unexpected"))
     def test_handle_completion_unexpected_error(self, mock_create):
         """Test that unexpected errors during completion are handled."""
         with self.assertRaises(Exception):
             prompt.completion("test prompt")
 
-    @patch(
-        "app.prompt.openai.chat.completions.create",
+    @patch.object(
+        prompt.get_client().chat.completions,
+        "create",
         side_effect=openai.RateLimitError(message="rate limit", response=dummy_response, body=None),  # type: ignore
     )
+    @patch("app.settings.OPENAI_RETRY_BASE_DELAY", 0.001)
     def test_handle_completion_rate_limit_error(self, mock_create):
-        """Test that rate limit errors during completion are handled."""
+        """Test that rate limit errors during completion are retried, then re-raised."""
         with self.assertRaises(openai.RateLimitError):
             prompt.completion("test prompt")
+        self.assertEqual(mock_create.call_count, prompt.settings.OPENAI_MAX_RETRIES + 1)
 
-    @patch(
-        "app.prompt.openai.chat.completions.create",
+    @patch.object(
+        prompt.get_client().chat.completions,
+        "create",
         side_effect=openai.APIConnectionError(message="api connection", request=dummy_request),
     )
+    @patch("app.settings.OPENAI_RETRY_BASE_DELAY", 0.001)
     def test_handle_completion_api_connection_error(self, mock_create):
-        """Test that API connection errors during completion are handled."""
+        """Test that API connection errors during completion are retried, then re-raised."""
         with self.assertRaises(openai.APIConnectionError):
             prompt.completion("test prompt")
+        self.assertEqual(mock_create.call_count, prompt.settings.OPENAI_MAX_RETRIES + 1)
 
-    @patch(
-        "app.prompt.openai.chat.completions.create",
+    @patch.object(
+        prompt.get_client().chat.completions,
+        "create",
         side_effect=openai.AuthenticationError(message="auth error", response=dummy_response, body=None),  # type: ignore
     )
     def test_handle_completion_authentication_error(self, mock_create):
-        """Test that authentication errors during completion are handled."""
+        """Test that authentication errors during completion are handled, and not retried."""
         with self.assertRaises(openai.AuthenticationError):
             prompt.completion("test prompt")
+        mock_create.assert_called_once()
 
-    @patch(
-        "app.prompt.openai.chat.completions.create",
+    @patch.object(
+        prompt.get_client().chat.completions,
+        "create",
         side_effect=openai.BadRequestError(message="bad request", response=dummy_response, body=None),  # type: ignore
     )
     def test_handle_completion_bad_request_error(self, mock_create):
@@ -175,10 +200,159 @@ class TestPrompt(unittest.TestCase):
         with self.assertRaises(openai.BadRequestError):
             prompt.completion("test prompt")
 
-    @patch(
-        "app.prompt.openai.chat.completions.create", side_effect=openai.APIError(dummy_request, "api error", body=None)  # type: ignore
+    @patch.object(
+        prompt.get_client().chat.completions,
+        "create",
+        side_effect=openai.APIError(dummy_request, "api error", body=None),  # type: ignore
     )
     def test_handle_completion_api_error(self, mock_create):
         """Test that API errors during completion are handled."""
         with self.assertRaises(openai.APIError):
             prompt.completion("test prompt")
+
+    def test_completion_uses_session(self):
+        """Test that completion appends to the given session only."""
+        session = prompt.session_store.create()
+        other = prompt.session_store.create()
+        with patch.object(prompt.get_client().chat.completions, "create") as mock_create:
+            mock_create.return_value.choices[0].message.tool_calls = None
+            mock_create.return_value.usage.prompt_tokens = 12
+            mock_create.return_value.usage.completion_tokens = 3
+            prompt.completion("hello", session=session)
+        self.assertEqual(session.messages[-1], {"role": "user", "content": "hello"})
+        self.assertEqual(len(other.messages), len(prompt.initial_messages()))
+        self.assertEqual(session.total_tokens, 15)
+        self.assertIs(mock_create.call_args.kwargs["messages"], session.messages)
+
+
+def make_completion(content=None, tool_calls=None) -> ChatCompletion:
+    """Build a ChatCompletion with a single assistant message."""
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = [
+            {"id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+            for i, (name, args) in enumerate(tool_calls)
+        ]
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        }
+    )
+
+
+class TestAsyncPrompt(unittest.IsolatedAsyncioTestCase):
+    """Test the async completion path."""
+
+    async def test_acompletion_runs_tools(self):
+        """Test that acompletion dispatches tool calls and returns the final response."""
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(
+            side_effect=[
+                make_completion(tool_calls=[("get_courses", {"description": "AI"})]),
+                make_completion(content="Here you go."),
+            ]
+        )
+        session = prompt.session_store.create()
+        with (
+            patch("app.prompt.get_async_client", return_value=client),
+            patch("app.prompt.handle_function_call", return_value='[{"course_code": "AI101"}]') as mock_call,
+        ):
+            response, functions_called = await prompt.acompletion("AI courses?", session=session)
+        self.assertEqual(response.choices[0].message.content, "Here you go.")
+        self.assertEqual(functions_called, ["get_courses"])
+        mock_call.assert_called_once_with("get_courses", {"description": "AI"})
+        self.assertEqual(session.messages[-1]["role"], "tool")
+        self.assertEqual(session.total_tokens, 24)
+
+    async def test_cancelled_tool_calls_are_not_recorded(self):
+        """Test that a turn cancelled while its tools run leaves no tool calls without results in the history."""
+        session = prompt.session_store.create()
+        before = list(session.messages)
+        message = make_completion(tool_calls=[("get_courses", {"description": "AI"})]).choices[0].message
+        started = asyncio.Event()
+
+        async def hang(function_name, arguments):
+            started.set()
+            await asyncio.Event().wait()
+
+        with patch("app.prompt.ahandle_function_call", side_effect=hang):
+            task = asyncio.ensure_future(prompt.aprocess_tool_calls(message, session))
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        self.assertEqual(session.messages, before)
+
+    async def test_acompletion_empty_prompt(self):
+        """Test that acompletion with an empty prompt returns None."""
+        self.assertEqual(await prompt.acompletion("  "), (None, []))
+
+    @patch("app.settings.OPENAI_RETRY_BASE_DELAY", 0.001)
+    async def test_ahandle_completion_error(self):
+        """Test that client errors are logged and re-raised."""
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(side_effect=openai.APIConnectionError(request=dummy_request))
+        with patch("app.prompt.get_async_client", return_value=client):
+            with self.assertRaises(openai.APIConnectionError):
+                await prompt.acompletion("hello", session=prompt.session_store.create())
+
+
+class TestCompletionCache(unittest.TestCase):
+    """Test serving repeated requests from the completion cache."""
+
+    def test_repeated_request_served_from_cache(self):
+        """An identical history and toolset is answered without calling the API again."""
+        cache = CompletionCache(MemoryCache())
+        with (
+            patch.object(prompt, "completion_cache", cache),
+            patch.object(
+                prompt.get_client().chat.completions, "create", return_value=make_completion(content="Hello!")
+            ) as mock_create,
+        ):
+            first = prompt.session_store.create()
+            second = prompt.session_store.create()
+            prompt.completion("hello", session=first)
+            response, _ = prompt.completion("hello", session=second)
+        self.assertEqual(response.choices[0].message.content, "Hello!")
+        mock_create.assert_called_once()
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(first.total_tokens, 12)
+        self.assertEqual(second.total_tokens, 0)
+
+
+class TestParallelToolCalls(unittest.TestCase):
+    """Test processing of several tool calls in one assistant message."""
+
+    def test_single_assistant_message_for_all_calls(self):
+        """Test that parallel tool calls are recorded as one assistant message with ordered results."""
+        session = prompt.session_store.create()
+        start = len(session.messages)
+        message = (
+            make_completion(tool_calls=[("get_courses", {"description": "AI"}), ("get_courses", {"max_cost": 100})])
+            .choices[0]
+            .message
+        )
+        with patch("app.prompt.handle_function_call", side_effect=lambda name, args: json.dumps(args)):
+            functions_called = prompt.process_tool_calls(message, session)
+        added = session.messages[start:]
+        self.assertEqual(functions_called, ["get_courses", "get_courses"])
+        self.assertEqual([m["role"] for m in added], ["assistant", "tool", "tool"])
+        self.assertEqual(len(added[0]["tool_calls"]), 2)
+        self.assertEqual([m["tool_call_id"] for m in added[1:]], ["call_0", "call_1"])
+        self.assertEqual(json.loads(added[2]["content"]), {"max_cost": 100})
+
+    def test_repeated_idempotent_call_runs_once(self):
+        """Test that the same get_courses call requested twice runs once and both calls get its result."""
+        session = prompt.session_store.create()
+        call = ("get_courses", {"description": "AI"})
+        message = make_completion(tool_calls=[call, call]).choices[0].message
+        with patch("app.prompt.handle_function_call", return_value="[]") as mock_call:
+            functions_called = prompt.process_tool_calls(message, session)
+        mock_call.assert_called_once_with(*call)
+        self.assertEqual(functions_called, ["get_courses", "get_courses"])
+        self.assertEqual([m["content"] for m in session.messages[-2:]], ["[]", "[]"])
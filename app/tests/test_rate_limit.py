@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,C0115,W0613
+"""Test the OpenAI rate limiter and retries."""
+
+# python stuff
+import asyncio
+import contextlib
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import openai
+
+from app import prompt, rate_limit, stackademy
+from app.benchmarks.replay import seeded_database
+from app.metrics import OPENAI_RETRIES
+from app.openai_client import scoped_clients
+from app.rate_limit import (
+    RateLimiter,
+    asend,
+    backoff,
+    estimate_request_tokens,
+    is_retryable,
+    retry_after,
+    send,
+)
+from app.session import ConversationSession
+from app.stubs.openai_server import StubOpenAIServer
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def rate_limit_error(headers=None, code=None) -> openai.RateLimitError:
+    """A 429 error with the given response headers."""
+    response = httpx.Response(429, headers=headers or {}, request=httpx.Request("POST", "https://example.com"))
+    return openai.RateLimitError("Slow down", response=response, body={"code": code} if code else None)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test the token buckets."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_requests_per_minute(self):
+        """A full bucket admits a minute's worth of requests at once, then one per refill interval, in order."""
+        limiter = RateLimiter(rpm=60, clock=self.clock)
+        delays = [limiter.reserve().delay for _ in range(63)]
+        self.assertEqual(delays[:60], [0.0] * 60)
+        self.assertEqual(delays[60:], [1.0, 2.0, 3.0])
+        self.clock.now += 10
+        self.assertAlmostEqual(limiter.reserve().delay, 0.0)
+        self.assertEqual(limiter.stats()["delayed"], 3)
+
+    def test_tokens_per_minute(self):
+        """Requests wait for their estimated tokens, and the estimate is corrected with the usage."""
+        limiter = RateLimiter(tpm=6000, clock=self.clock)
+        first = limiter.reserve(5000)
+        self.assertEqual(first.delay, 0.0)
+        self.assertAlmostEqual(limiter.reserve(2000).delay, 10.0)
+        first.settle(SimpleNamespace(prompt_tokens=800, completion_tokens=200))
+        self.assertEqual(first.tokens, 1000)
+        self.assertAlmostEqual(limiter.reserve(100).delay, 0.0)
+        first.settle(None)
+        self.assertEqual(first.tokens, 1000)
+
+    @patch("app.settings.OPENAI_RETRY_BASE_DELAY", 0.001)
+    def test_failed_keeps_estimate(self):
+        """A request that timed out keeps its estimated tokens, since its usage is unknown."""
+        limiter = RateLimiter(tpm=6000, clock=self.clock)
+        timeout = openai.APITimeoutError(httpx.Request("POST", "https://example.com"))
+        with self.assertLogs("app.rate_limit", level="WARNING"):
+            send(MagicMock(side_effect=[timeout, "ok"]), {"messages": [], "max_tokens": 1000}, limiter)
+        self.assertEqual(limiter.stats()["tokens_available"], 4000)
+
+    def test_cancel(self):
+        """A cancelled reservation gives its request and tokens back."""
+        limiter = RateLimiter(rpm=1, tpm=100, clock=self.clock)
+        limiter.reserve(100).cancel()
+        self.assertEqual(limiter.reserve(100).delay, 0.0)
+
+    def test_pause(self):
+        """A pause holds every request; those queued meanwhile are then admitted at the refill rate."""
+        limiter = RateLimiter(rpm=60, clock=self.clock)
+        limiter.pause(5)
+        self.assertEqual([limiter.reserve().delay for _ in range(2)], [6.0, 7.0])
+        self.clock.now += 5
+        self.assertAlmostEqual(limiter.reserve().delay, 3.0)
+        self.clock.now += 10
+        self.assertAlmostEqual(limiter.reserve().delay, 0.0)
+        unlimited = RateLimiter(clock=self.clock)
+        self.assertFalse(unlimited.enabled)
+        unlimited.pause(2)
+        self.assertEqual(unlimited.reserve().delay, 2.0)
+
+    def test_estimate_request_tokens(self):
+        """The estimate counts the messages, the tools and max_tokens."""
+        request = {"messages": [{"role": "user", "content": "x" * 40}], "tools": (), "max_tokens": 100}
+        self.assertEqual(estimate_request_tokens(request), 114)
+        request["tools"] = ({"type": "function", "function": {"name": "get_courses"}},)
+        self.assertGreater(estimate_request_tokens(request), 114)
+
+
+class TestRetries(unittest.TestCase):
+    """Test which failures are retried, and when."""
+
+    def test_retry_after(self):
+        """Retry-After is read in milliseconds, seconds or as an HTTP date."""
+        self.assertEqual(retry_after(rate_limit_error({"retry-after-ms": "1500"})), 1.5)
+        self.assertEqual(retry_after(rate_limit_error({"Retry-After": "2"})), 2.0)
+        self.assertEqual(retry_after(rate_limit_error({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})), 0.0)
+        self.assertIsNone(retry_after(rate_limit_error()))
+        self.assertIsNone(retry_after(ValueError()))
+
+    def test_is_retryable(self):
+        """Rate limits, connection errors and server errors are retried; quota and client errors are not."""
+        request = httpx.Request("POST", "https://example.com")
+        self.assertTrue(is_retryable(rate_limit_error()))
+        self.assertFalse(is_retryable(rate_limit_error(code="insufficient_quota")))
+        self.assertFalse(is_retryable(rate_limit_error({"x-should-retry": "false"})))
+        self.assertTrue(is_retryable(openai.APITimeoutError(request)))
+        response = httpx.Response(503, request=request)
+        self.assertTrue(is_retryable(openai.InternalServerError("down", response=response, body=None)))
+        response = httpx.Response(400, request=request)
+        self.assertFalse(is_retryable(openai.BadRequestError("bad", response=response, body=None)))
+        self.assertFalse(is_retryable(ValueError()))
+
+    def test_backoff(self):
+        """The backoff grows exponentially up to the cap, with full jitter."""
+        self.assertEqual([backoff(attempt, 0.5, 3.0, max) for attempt in range(5)], [0.5, 1.0, 2.0, 3.0, 3.0])
+        self.assertEqual(backoff(3, 0.5, 3.0, min), 0.0)
+
+    @patch("app.settings.OPENAI_RETRY_BASE_DELAY", 0.001)
+    def test_send_retries(self):
+        """A failed request is retried and the limiter is paused for everyone on a 429."""
+        limiter = RateLimiter()
+        create = MagicMock(side_effect=[rate_limit_error({"retry-after-ms": "20"}), "ok"])
+        before = OPENAI_RETRIES.value("RateLimitError")
+        with self.assertLogs("app.rate_limit", level="WARNING"):
+            response, reservation = send(create, {"messages": []}, limiter)
+        self.assertEqual(response, "ok")
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(limiter.stats()["pauses"], 1)
+        self.assertGreaterEqual(reservation.delay, 0.01)
+        self.assertEqual(OPENAI_RETRIES.value("RateLimitError") - before, 1)
+
+    def test_send_gives_up(self):
+        """Errors that cannot succeed, and Retry-After longer than the maximum delay, are not retried."""
+        create = MagicMock(side_effect=rate_limit_error(code="insufficient_quota"))
+        with self.assertRaises(openai.RateLimitError):
+            send(create, {"messages": []}, RateLimiter())
+        create = MagicMock(side_effect=rate_limit_error({"retry-after": "3600"}))
+        limiter = RateLimiter()
+        with self.assertRaises(openai.RateLimitError):
+            send(create, {"messages": []}, limiter)
+        create.assert_called_once()
+        self.assertEqual(limiter.stats()["pauses"], 1)
+        self.assertLessEqual(limiter.paused_until - limiter.clock(), rate_limit.settings.OPENAI_RETRY_MAX_DELAY)
+        with patch("app.settings.OPENAI_APP_RETRIES", False):
+            create = MagicMock(side_effect=openai.APITimeoutError(httpx.Request("POST", "https://example.com")))
+            with self.assertRaises(openai.APITimeoutError):
+                send(create, {"messages": []}, RateLimiter())
+            create.assert_called_once()
+
+
+class TestAsyncSend(unittest.IsolatedAsyncioTestCase):
+    """Test the async admission."""
+
+    async def test_fifo(self):
+        """Waiting requests are sent in the order they arrived."""
+        limiter = RateLimiter(rpm=600)
+        for _ in range(600):
+            limiter.reserve()
+        sent = []
+
+        async def request(index):
+            await asend(AsyncMock(side_effect=lambda: sent.append(index)), {"messages": []}, limiter)
+
+        await asyncio.gather(*(request(index) for index in range(5)))
+        self.assertEqual(sent, list(range(5)))
+
+    async def test_cancelled_wait(self):
+        """A request cancelled while waiting gives its reservation back."""
+        limiter = RateLimiter(rpm=60)
+        for _ in range(60):
+            limiter.reserve()
+        task = asyncio.ensure_future(asend(AsyncMock(), {"messages": []}, limiter))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertLess(limiter.stats()["requests_available"], 0.1)
+        self.assertGreater(limiter.stats()["requests_available"], -0.1)
+
+
+class TestRateLimitedCompletion(unittest.TestCase):
+    """Test a turn against the stub server's 429s."""
+
+    def test_completion_retries_429(self):
+        """A 429 with Retry-After is waited out and the turn completes."""
+        script = [{"status": 429, "error": "Slow down", "retry_after": 0.05}, "Hello!"]
+        with contextlib.ExitStack() as stack:
+            stub = stack.enter_context(StubOpenAIServer(script=script, record=True))
+            stack.enter_context(patch("app.settings.OPENAI_BASE_URL", stub.base_url))
+            stack.enter_context(patch("app.settings.OPENAI_API_KEY", "stub"))
+            stack.enter_context(patch.object(stackademy.stackademy_app, "db", seeded_database()))
+            stack.enter_context(patch.object(prompt, "completion_cache", None))
+            stack.enter_context(patch.object(rate_limit, "limiter", RateLimiter(rpm=600, tpm=100000)))
+            stack.enter_context(scoped_clients())
+            with self.assertLogs("app.rate_limit", level="WARNING"):
+                response, _ = prompt.completion("hi", session=ConversationSession())
+            stats = rate_limit.limiter.stats()
+        self.assertEqual(response.choices[0].message.content, "Hello!")
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual((stats["admitted"], stats["pauses"]), (2, 1))
+        self.assertGreaterEqual(stats["wait_seconds"], 0.05)
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,C0115,W0613
+"""Test the HTTP front-end."""
+
+# python stuff
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+
+from app.asgi import ASGIServer
+from app.prompt import initial_messages
+from app.server import Backpressure, StackademyServer
+from app.session import SessionStore
+from app.streaming import AsyncCompletionStream
+from app.tests.test_prompt import make_completion
+
+
+async def call(app, method: str, path: str, body: bytes = b""):
+    """Send one HTTP request to an ASGI app and return the status, headers and body."""
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+    finished = asyncio.Event()
+    sent = []
+
+    async def receive():
+        if requests:
+            return requests.pop(0)
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            finished.set()
+
+    await app({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+    headers = dict(sent[0]["headers"])
+    return sent[0]["status"], headers, b"".join(message.get("body", b"") for message in sent[1:])
+
+
+def message_body(text: str) -> bytes:
+    """A JSON request body with a user message."""
+    return json.dumps({"message": text}).encode("utf-8")
+
+
+def streamed(*deltas: str, content: str = "done"):
+    """A fake acompletion(stream=True) that yields the given deltas."""
+
+    async def fake_acompletion(prompt, session=None, stream=False):
+        async def generate(completion_stream):
+            for delta in deltas:
+                yield delta
+            completion_stream.response = make_completion(content=content)
+
+        return AsyncCompletionStream(generate)
+
+    return fake_acompletion
+
+
+def server(**kwargs) -> StackademyServer:
+    """A server with its own session store."""
+    return StackademyServer(store=SessionStore(initial_messages=initial_messages), **kwargs)
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    """Test the HTTP endpoints."""
+
+    async def test_create_and_describe_session(self):
+        """A new session can be created, inspected and deleted."""
+        app = server()
+        status, _, body = await call(app, "POST", "/sessions")
+        self.assertEqual(status, 201)
+        session_id = json.loads(body)["session_id"]
+        status, _, body = await call(app, "GET", f"/sessions/{session_id}")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["messages"], 2)
+        status, _, _ = await call(app, "DELETE", f"/sessions/{session_id}")
+        self.assertEqual(status, 204)
+        status, _, _ = await call(app, "GET", f"/sessions/{session_id}")
+        self.assertEqual(status, 404)
+
+    async def test_metrics(self):
+        """The metrics are served in the Prometheus text format."""
+        status, headers, body = await call(server(), "GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertTrue(headers[b"content-type"].startswith(b"text/plain; version=0.0.4"))
+        self.assertIn("# TYPE stackademy_openai_request_duration_seconds histogram", body.decode("utf-8"))
+        status, _, _ = await call(server(), "POST", "/metrics")
+        self.assertEqual(status, 405)
+
+    async def test_message(self):
+        """A message is answered with the reply and the functions called."""
+        app = server()
+        mock = AsyncMock(return_value=(make_completion(content="Hello!"), ["get_courses"]))
+        with patch("app.server.acompletion", mock):
+            status, _, body = await call(app, "POST", "/sessions/abc/messages", message_body("hi"))
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["reply"], "Hello!")
+        self.assertEqual(json.loads(body)["functions_called"], ["get_courses"])
+        self.assertIs(mock.call_args.kwargs["session"], app.store.get("abc"))
+
+    async def test_invalid_requests(self):
+        """Malformed, oversized and misrouted requests are rejected."""
+        app = server(max_body_bytes=100)
+        self.assertEqual((await call(app, "POST", "/sessions/abc/messages", b"not json"))[0], 400)
+        self.assertEqual((await call(app, "POST", "/sessions/abc/messages", message_body(" ")))[0], 400)
+        self.assertEqual((await call(app, "POST", "/sessions/abc/messages", message_body("x" * 200)))[0], 413)
+        self.assertEqual((await call(app, "GET", "/sessions/abc/messages"))[0], 405)
+        self.assertEqual((await call(app, "GET", "/nowhere"))[0], 404)
+        self.assertEqual((await call(app, "POST", "/sessions/a%20b/messages"))[0], 404)
+
+    async def test_backpressure(self):
+        """Requests beyond the concurrency and queue limits are answered with 503."""
+        app = server(max_concurrency=1, max_queue=0)
+        release = asyncio.Event()
+
+        async def slow(prompt, session=None):
+            await release.wait()
+            return make_completion(content="ok"), []
+
+        with patch("app.server.acompletion", slow):
+            first = asyncio.ensure_future(call(app, "POST", "/sessions/a/messages", message_body("hi")))
+            await asyncio.sleep(0.01)
+            status, headers, _ = await call(app, "POST", "/sessions/b/messages", message_body("hi"))
+            release.set()
+            self.assertEqual((await first)[0], 200)
+        self.assertEqual(status, 503)
+        self.assertEqual(headers[b"retry-after"], b"1")
+        self.assertEqual(app.stats()["rejected"], 1)
+
+    async def test_timeout(self):
+        """A turn that takes too long is cancelled and answered with 504."""
+        app = server(request_timeout=0.05)
+        cancelled = asyncio.Event()
+
+        async def hang(prompt, session=None):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with patch("app.server.acompletion", hang):
+            status, _, _ = await call(app, "POST", "/sessions/a/messages", message_body("hi"))
+        self.assertEqual(status, 504)
+        self.assertTrue(cancelled.is_set())
+
+    async def test_turns_of_a_session_are_serialized(self):
+        """Concurrent messages to one session run one at a time; other sessions are not blocked."""
+        app = server()
+        active = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+
+        async def turn(prompt, session=None):
+            active[session.id] += 1
+            peak[session.id] = max(peak[session.id], active[session.id])
+            await asyncio.sleep(0.01)
+            active[session.id] -= 1
+            return make_completion(content="ok"), []
+
+        with patch("app.server.acompletion", turn):
+            await asyncio.gather(
+                *(call(app, "POST", f"/sessions/{sid}/messages", message_body("hi")) for sid in "aabb" * 2)
+            )
+        self.assertEqual(peak, {"a": 1, "b": 1})
+        self.assertEqual(len(app.locks), 0)
+
+    async def test_stream(self):
+        """A streamed reply is sent as delta events followed by a done event."""
+        app = server()
+        with patch("app.server.acompletion", streamed("Hel", "lo", content="Hello")):
+            status, headers, body = await call(app, "POST", "/sessions/a/stream", message_body("hi"))
+        self.assertEqual(status, 200)
+        self.assertTrue(headers[b"content-type"].startswith(b"text/event-stream"))
+        events = [block.split("\n") for block in body.decode("utf-8").strip().split("\n\n")]
+        self.assertEqual([event[0] for event in events], ["event: delta", "event: delta", "event: done"])
+        self.assertEqual(json.loads(events[1][1][len("data: ") :]), {"text": "lo"})
+        self.assertEqual(json.loads(events[2][1][len("data: ") :])["reply"], "Hello")
+
+    async def test_websocket(self):
+        """Each WebSocket message is answered with delta frames and a done frame."""
+        app = server()
+        incoming = asyncio.Queue()
+        for frame in (
+            {"type": "websocket.connect"},
+            {"type": "websocket.receive", "text": json.dumps({"message": "hi"})},
+            {"type": "websocket.receive", "text": "oops"},
+            {"type": "websocket.disconnect"},
+        ):
+            incoming.put_nowait(frame)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        with patch("app.server.acompletion", streamed("Hi", "!", content="Hi!")):
+            await app({"type": "websocket", "path": "/sessions/a/ws", "headers": []}, incoming.get, send)
+        self.assertEqual(sent[0]["type"], "websocket.accept")
+        frames = [json.loads(message["text"]) for message in sent[1:]]
+        self.assertEqual([frame["type"] for frame in frames], ["delta", "delta", "done", "error"])
+        self.assertEqual(frames[2]["reply"], "Hi!")
+        self.assertEqual(frames[3]["status"], 400)
+
+
+class TestBackpressure(unittest.IsolatedAsyncioTestCase):
+    """Test admission control."""
+
+    async def test_queue_timeout(self):
+        """A request that cannot get a slot in time is rejected."""
+        backpressure = Backpressure(max_concurrency=1, max_queue=5, timeout=0.01)
+        async with backpressure.slot():
+            with self.assertRaises(Exception) as context:
+                async with backpressure.slot():
+                    pass
+        self.assertIn("No capacity", str(context.exception))
+        self.assertEqual((backpressure.in_flight, backpressure.waiting, backpressure.rejected), (0, 0, 1))
+
+
+class TestASGIServer(unittest.IsolatedAsyncioTestCase):
+    """Test the built-in HTTP/1.1 host."""
+
+    async def test_keep_alive_and_streaming(self):
+        """Requests share a keep-alive connection and streamed responses are delivered in chunks."""
+        app = server()
+        mock = AsyncMock(return_value=(make_completion(content="Hello!"), []))
+        with patch("app.server.acompletion", mock):
+            async with ASGIServer(app) as host:
+                async with httpx.AsyncClient(base_url=host.base_url) as client:
+                    health = await client.get("/healthz")
+                    reply = await client.post("/sessions/a/messages", json={"message": "hi"})
+                    with patch("app.server.acompletion", streamed("a", "b")):
+                        async with client.stream("POST", "/sessions/a/stream", json={"message": "hi"}) as response:
+                            chunks = [chunk async for chunk in response.aiter_text()]
+        self.assertEqual(health.json()["status"], "ok")
+        self.assertEqual(reply.json()["reply"], "Hello!")
+        self.assertEqual(reply.headers.get("connection"), None)
+        self.assertIn("event: done", "".join(chunks))
+
+    async def test_client_disconnect_cancels_turn(self):
+        """A client that closes the connection while its turn runs gets the turn cancelled."""
+        app = server()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def hang(prompt, session=None, stream=False):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        body = message_body("hi")
+        request = b"POST /sessions/a/messages HTTP/1.1\r\nhost: x\r\ncontent-length: %d\r\n\r\n%s" % (len(body), body)
+        with patch("app.server.acompletion", hang):
+            async with ASGIServer(app) as host:
+                reader, writer = await asyncio.open_connection(host.host, host.port)
+                writer.write(request)
+                await asyncio.wait_for(started.wait(), 5)
+                writer.close()
+                await writer.wait_closed()
+                await asyncio.wait_for(cancelled.wait(), 5)
+                self.assertEqual(await reader.read(), b"")
+        self.assertEqual(app.disconnects, 1)
+
+    async def test_client_disconnect_after_pipelined_bytes(self):
+        """A client that sends part of its next request and then closes the connection is still seen leaving."""
+        app = server()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def hang(prompt, session=None, stream=False):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        body = message_body("hi")
+        request = b"POST /sessions/a/messages HTTP/1.1\r\nhost: x\r\ncontent-length: %d\r\n\r\n%s" % (len(body), body)
+        with patch("app.server.acompletion", hang):
+            async with ASGIServer(app) as host:
+                _, writer = await asyncio.open_connection(host.host, host.port)
+                writer.write(request)
+                await asyncio.wait_for(started.wait(), 5)
+                writer.write(b"GET /healthz HTTP/1.1\r\n")
+                await writer.drain()
+                await asyncio.sleep(0.05)
+                writer.close()
+                await writer.wait_closed()
+                await asyncio.wait_for(cancelled.wait(), 5)
+        self.assertEqual(app.disconnects, 1)
+
+    async def test_ambiguous_framing_is_rejected(self):
+        """Requests whose body length a proxy could read differently are answered with 400 and not served."""
+        cases = {
+            "repeated": b"content-length: 2\r\ncontent-length: 2\r\n",
+            "conflicting": b"content-length: 2\r\ncontent-length: 30\r\n",
+            "list": b"content-length: 2, 2\r\n",
+            "negative": b"content-length: -2\r\n",
+            "not a number": b"content-length: 0x2\r\n",
+            "chunked": b"transfer-encoding: chunked\r\n",
+            "other coding": b"transfer-encoding: gzip\r\ncontent-length: 2\r\n",
+        }
+        app = server()
+        mock = AsyncMock(return_value=(make_completion(content="Hello!"), []))
+        with patch("app.server.acompletion", mock):
+            async with ASGIServer(app) as host:
+                for case, headers in cases.items():
+                    with self.subTest(case):
+                        reader, writer = await asyncio.open_connection(host.host, host.port)
+                        writer.write(b"POST /sessions/a/messages HTTP/1.1\r\nhost: x\r\n" + headers + b"\r\n{}")
+                        data = await asyncio.wait_for(reader.read(), 5)
+                        writer.close()
+                        await writer.wait_closed()
+                        self.assertTrue(data.startswith(b"HTTP/1.1 400 "), data)
+        mock.assert_not_called()
+
+    async def test_pipelined_requests(self):
+        """A request sent while the previous turn runs is not taken for a disconnect, and is served next."""
+        app = server()
+
+        async def slow(prompt, session=None, stream=False):
+            await asyncio.sleep(0.05)
+            return make_completion(content="Hello!"), []
+
+        body = message_body("hi")
+        request = b"POST /sessions/a/messages HTTP/1.1\r\nhost: x\r\ncontent-length: %d\r\n\r\n%s" % (len(body), body)
+        with patch("app.server.acompletion", slow):
+            async with ASGIServer(app) as host:
+                reader, writer = await asyncio.open_connection(host.host, host.port)
+                writer.write(request * 2 + b"GET /healthz HTTP/1.1\r\nhost: x\r\nconnection: close\r\n\r\n")
+                data = await asyncio.wait_for(reader.read(), 5)
+                writer.close()
+                await writer.wait_closed()
+        self.assertEqual(data.count(b"HTTP/1.1 200 OK"), 3)
+        self.assertEqual(data.count(b"Hello!"), 2)
+        self.assertEqual(app.disconnects, 0)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test conversation sessions and the session store."""
+
+# python stuff
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.session import ConversationSession, SessionStore, message_size
+
+
+class TestConversationSession(unittest.TestCase):
+    """Test conversation sessions."""
+
+    def test_append_tracks_size(self):
+        """Test that appending messages updates the byte estimate."""
+        session = ConversationSession()
+        message = {"role": "user", "content": "hello"}
+        session.append(message)
+        self.assertEqual(session.size_bytes, message_size(message))
+        session.replace_messages([])
+        self.assertEqual(session.size_bytes, 0)
+
+    def test_record_usage(self):
+        """Test that token usage from responses is accumulated."""
+        session = ConversationSession()
+        session.record_usage(MagicMock(prompt_tokens=10, completion_tokens=5))
+        session.record_usage(MagicMock(prompt_tokens=3, completion_tokens=2))
+        session.record_usage(None)
+        self.assertEqual(session.prompt_tokens, 13)
+        self.assertEqual(session.completion_tokens, 7)
+        self.assertEqual(session.total_tokens, 20)
+
+    def test_unique_ids(self):
+        """Test that sessions get distinct ids by default."""
+        self.assertNotEqual(ConversationSession().id, ConversationSession().id)
+
+
+class TestSessionStore(unittest.TestCase):
+    """Test the session store."""
+
+    def test_create_seeds_initial_messages(self):
+        """Test that new sessions receive their own copy of the initial messages."""
+        store = SessionStore(initial_messages=lambda: [{"role": "system", "content": "hi"}])
+        first = store.create()
+        second = store.create()
+        first.append({"role": "user", "content": "x"})
+        self.assertEqual(len(first.messages), 2)
+        self.assertEqual(len(second.messages), 1)
+
+    def test_get_or_create(self):
+        """Test that get_or_create returns the same session for the same id."""
+        store = SessionStore()
+        session = store.get_or_create("abc")
+        self.assertIs(store.get_or_create("abc"), session)
+        self.assertIsNone(store.get("missing"))
+
+    def test_get_or_create_concurrent(self):
+        """Test that concurrent requests for a new session id all get the same session."""
+        store = SessionStore()
+        barrier = threading.Barrier(8)
+        sessions = []
+
+        def worker():
+            barrier.wait()
+            sessions.append(store.get_or_create("new"))
+
+        with patch.object(store, "get", side_effect=AssertionError("not atomic")):
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len({id(session) for session in sessions}), 1)
+        self.assertEqual(len(sessions), 8)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used session is evicted at capacity."""
+        store = SessionStore(max_sessions=2)
+        store.create("a")
+        store.create("b")
+        store.get("a")
+        store.create("c")
+        self.assertIn("a", store)
+        self.assertNotIn("b", store)
+        self.assertEqual(store.stats()["evicted"], 1)
+
+    def test_idle_ttl(self):
+        """Test that idle sessions expire."""
+        store = SessionStore(idle_ttl=60)
+        session = store.create("a")
+        session.last_active_at -= 120
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.stats()["expired"], 1)
+
+    def test_stats(self):
+        """Test that stats report resident sessions and bytes."""
+        store = SessionStore(initial_messages=lambda: [{"role": "system", "content": "hi"}])
+        store.create("a")
+        store.create("b")
+        stats = store.stats()
+        self.assertEqual(stats["sessions"], 2)
+        self.assertEqual(stats["messages"], 2)
+        self.assertGreater(stats["bytes"], 0)
+        store.delete("a")
+        self.assertEqual(len(store), 1)
@@ -4,12 +4,16 @@
 """Test Stackademy application."""
 
 # python stuff
+import time
 import unittest
 from unittest.mock import Mock, patch
 
+from app.cache import MemoryCache
+from app.database import get_db
 from app.exceptions import ConfigurationException
 from app.logging_config import get_logger
-from app.stackademy import Stackademy
+from app.stackademy import Stackademy, StackademyRegisterCourseParams
+from app.stubs.sqlite_db import SQLiteDatabase
 
 
 logger = get_logger(__name__)
@@ -25,7 +29,8 @@ class TestStackademy(unittest.TestCase):
     def test_stackademy_initialization(self):
         """Test that the Stackademy application initializes successfully."""
         self.assertIsNotNone(self.app)
-        self.assertIsNotNone(self.app.db)
+        self.assertNotIn("db", vars(self.app))
+        self.assertIs(self.app.db, get_db())
 
     def test_database_connection_success(self):
         """Test successful database connection."""
@@ -199,5 +204,175 @@ class TestStackademy(unittest.TestCase):
             self.fail(f"Unexpected application error: {e}")
 
 
+class TestBulkRegistration(unittest.TestCase):
+    """Test registering a cohort against the SQLite stand-in."""
+
+    def setUp(self):
+        self.app = Stackademy(catalog_snapshot=False)
+        self.app.db = SQLiteDatabase()
+        self.app.db.add_courses(
+            [
+                {"course_code": "AI101", "course_name": "Intro to AI", "cost": 499},
+                {"course_code": "WEB101", "course_name": "Web basics", "cost": 199},
+            ]
+        )
+
+    def tearDown(self):
+        self.app.db.close()
+
+    def enrollments(self):
+        """Stored enrollments."""
+        return self.app.db.execute_query("SELECT course_code, email, full_name FROM enrollments ORDER BY enrollment_id")
+
+    def test_per_row_results(self):
+        """Each registration gets a result, in order, and only valid ones are stored."""
+        registrations = [
+            StackademyRegisterCourseParams(course_code="ai101", email=" Ada@Example.com", full_name="ada lovelace"),
+            StackademyRegisterCourseParams(course_code="XX999", email="bob@example.com", full_name="Bob"),
+            StackademyRegisterCourseParams(course_code="WEB101", email="cy@example.com", full_name="Cy"),
+        ]
+        results = self.app.register_courses_bulk(registrations)
+        self.assertEqual([r.success for r in results], [True, False, True])
+        self.assertIn("XX999", results[1].error)
+        self.assertEqual(
+            self.enrollments(),
+            [
+                {"course_code": "AI101", "email": "ada@example.com", "full_name": "Ada Lovelace"},
+                {"course_code": "WEB101", "email": "cy@example.com", "full_name": "Cy"},
+            ],
+        )
+
+    def test_single_verification_query_and_batch(self):
+        """All course codes are verified with one query and inserted with one batch."""
+        registrations = [
+            StackademyRegisterCourseParams(course_code="AI101", email=f"s{i}@example.com", full_name=f"Student {i}")
+            for i in range(500)
+        ]
+        with (
+            patch.object(self.app.db, "execute_query", wraps=self.app.db.execute_query) as mock_query,
+            patch.object(self.app.db, "execute_many", wraps=self.app.db.execute_many) as mock_many,
+        ):
+            results = self.app.register_courses_bulk(registrations)
+        self.assertTrue(all(r.success for r in results))
+        mock_query.assert_called_once()
+        self.assertIn("IN (%s)", mock_query.call_args.args[0])
+        mock_many.assert_called_once()
+        self.assertEqual(len(self.enrollments()), 500)
+
+    def test_failed_transaction(self):
+        """If the insert fails, no registration is reported as successful."""
+        registrations = [StackademyRegisterCourseParams(course_code="AI101", email="a@b.com", full_name="A")]
+        with patch.object(self.app.db, "execute_many", side_effect=Exception("deadlock")):
+            results = self.app.register_courses_bulk(registrations)
+        self.assertFalse(results[0].success)
+        self.assertIn("deadlock", results[0].error)
+
+    def test_failed_verification(self):
+        """If the course codes cannot be verified, nothing is inserted."""
+        registrations = [StackademyRegisterCourseParams(course_code="AI101", email="a@b.com", full_name="A")]
+        with patch.object(self.app.db, "execute_query", side_effect=Exception("gone away")):
+            results = self.app.register_courses_bulk(registrations)
+        self.assertFalse(results[0].success)
+        self.assertEqual(self.enrollments(), [])
+
+    def test_duplicates_are_idempotent(self):
+        """Registering the same student twice, even within one batch, stores one row."""
+        registrations = [
+            StackademyRegisterCourseParams(course_code="AI101", email="a@b.com", full_name="a"),
+            StackademyRegisterCourseParams(course_code="AI101", email="A@B.com", full_name="a b"),
+        ]
+        results = self.app.register_courses_bulk(registrations)
+        self.assertEqual([r.success for r in results], [True, True])
+        self.assertEqual(self.enrollments(), [{"course_code": "AI101", "email": "a@b.com", "full_name": "A B"}])
+
+    def test_register_course_persists(self):
+        """A single registration is stored, and retrying it does not duplicate it."""
+        with patch.object(self.app, "_log_success"):
+            self.assertTrue(self.app.register_course("ai101", "ada@example.com", "ada"))
+            self.assertTrue(self.app.register_course("AI101", "ada@example.com", "ada lovelace"))
+        self.assertEqual(
+            self.enrollments(), [{"course_code": "AI101", "email": "ada@example.com", "full_name": "Ada Lovelace"}]
+        )
+
+    def test_register_course_database_error(self):
+        """A failed insert is reported as a failed registration."""
+        with (
+            patch.object(self.app.db, "execute_update", side_effect=Exception("lock wait timeout")),
+            patch.object(self.app, "_log_success") as mock_success,
+        ):
+            self.assertFalse(self.app.register_course("AI101", "ada@example.com", "Ada"))
+        mock_success.assert_not_called()
+
+    def test_empty(self):
+        """An empty cohort is a no-op."""
+        self.assertEqual(self.app.register_courses_bulk([]), [])
+
+
+class TestVerifyCourse(unittest.TestCase):
+    """Test the course existence probe and its caches."""
+
+    def setUp(self):
+        self.app = Stackademy(catalog_snapshot=False, course_code_cache=True)
+        self.app.db = SQLiteDatabase()
+        self.app.db.add_courses([{"course_code": "AI101", "course_name": "Intro to AI", "cost": 499}])
+        self.query = patch.object(self.app.db, "execute_query", wraps=self.app.db.execute_query).start()
+        self.addCleanup(patch.stopall)
+        self.addCleanup(self.app.db.close)
+
+    def test_existence_probe(self):
+        """The probe selects a constant with LIMIT 1 instead of whole rows."""
+        self.assertTrue(self.app.verify_course("AI101"))
+        query = self.query.call_args.args[0]
+        self.assertTrue(query.startswith("SELECT 1 FROM courses"))
+        self.assertTrue(query.endswith("LIMIT 1"))
+
+    def test_known_codes_cached(self):
+        """Repeated checks of existing and unknown codes query the database once each."""
+        for _ in range(3):
+            self.assertTrue(self.app.verify_course("AI101"))
+            self.assertFalse(self.app.verify_course("HALLUCINATED999"))
+        self.assertEqual(self.query.call_count, 2)
+
+    def test_negative_ttl(self):
+        """Unknown codes are only remembered for a short time."""
+        self.app.invalid_course_codes = MemoryCache(ttl=0.05)
+        self.assertFalse(self.app.verify_course("NEW101"))
+        self.app.db.add_courses([{"course_code": "NEW101", "course_name": "New"}])
+        self.assertFalse(self.app.verify_course("NEW101"))
+        time.sleep(0.1)
+        self.assertTrue(self.app.verify_course("NEW101"))
+
+    def test_invalidated_with_catalog(self):
+        """A catalog change clears both caches."""
+        app = Stackademy(catalog_snapshot=True, course_code_cache=True)
+        app.valid_course_codes.set("AI101", "1")
+        app.invalid_course_codes.set("XX999", "1")
+        app.catalog.invalidate()
+        self.assertEqual((len(app.valid_course_codes), len(app.invalid_course_codes)), (0, 0))
+
+    def test_errors_not_cached(self):
+        """A failed lookup is not remembered as an unknown code."""
+        self.query.side_effect = Exception("gone away")
+        self.assertFalse(self.app.verify_course("AI101"))
+        self.query.side_effect = None
+        self.assertTrue(self.app.verify_course("AI101"))
+
+    def test_bulk_uses_cache(self):
+        """Bulk registration only queries course codes that are not cached."""
+        self.app.verify_course("AI101")
+        self.app.verify_course("XX999")
+        self.query.reset_mock()
+        self.assertEqual(self.app.existing_course_codes(["AI101", "XX999"]), {"AI101"})
+        self.query.assert_not_called()
+
+    def test_cache_disabled(self):
+        """Without the cache every check queries the database."""
+        app = Stackademy(catalog_snapshot=False, course_code_cache=False)
+        app.db = self.app.db
+        app.verify_course("AI101")
+        app.verify_course("AI101")
+        self.assertEqual(self.query.call_count, 2)
+
+
 if __name__ == "__main__":
     unittest.main()
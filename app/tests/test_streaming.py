@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,C0115,W0613
+"""Test streaming completions."""
+
+# python stuff
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from openai.types.chat import ChatCompletionChunk
+
+from app import prompt
+from app.cache import MemoryCache
+from app.completion_cache import CompletionCache
+from app.streaming import CompletionStream, StreamAccumulator
+
+
+def make_chunk(content=None, tool_calls=None, finish_reason=None, usage=None, choices=True) -> ChatCompletionChunk:
+    """Build one chunk of a streamed response."""
+    delta = {"role": "assistant"}
+    if content is not None:
+        delta["content"] = content
+    if tool_calls is not None:
+        delta["tool_calls"] = tool_calls
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chatcmpl-stream",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+            "usage": usage,
+        }
+    )
+
+
+def text_chunks(*deltas: str) -> list:
+    """The chunks of a streamed text reply, ending with the usage chunk."""
+    chunks = [make_chunk(content=delta) for delta in deltas]
+    chunks.append(make_chunk(finish_reason="stop"))
+    chunks.append(make_chunk(usage={"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12}, choices=False))
+    return chunks
+
+
+def tool_call_chunks(name: str, arguments: dict, call_id: str = "call_0") -> list:
+    """The chunks of a streamed tool call, with its arguments split into fragments."""
+    encoded = json.dumps(arguments)
+    middle = len(encoded) // 2
+    return [
+        make_chunk(tool_calls=[{"index": 0, "id": call_id, "type": "function", "function": {"name": name}}]),
+        make_chunk(tool_calls=[{"index": 0, "function": {"arguments": encoded[:middle]}}]),
+        make_chunk(tool_calls=[{"index": 0, "function": {"arguments": encoded[middle:]}}]),
+        make_chunk(finish_reason="tool_calls"),
+    ]
+
+
+class FakeStream:
+    """Stands in for openai.Stream: an iterable of chunks and a context manager."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeStream):
+    """Stands in for openai.AsyncStream."""
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+
+class TestStreamAccumulator(unittest.TestCase):
+    """Test assembling chunks into a ChatCompletion."""
+
+    def test_text(self):
+        """Text deltas are returned as they are added and joined in the response."""
+        accumulator = StreamAccumulator()
+        deltas = [accumulator.add(chunk) for chunk in text_chunks("Hel", "lo", "!")]
+        self.assertEqual(deltas, ["Hel", "lo", "!", "", ""])
+        response = accumulator.completion()
+        self.assertEqual(response.choices[0].message.content, "Hello!")
+        self.assertEqual(response.choices[0].finish_reason, "stop")
+        self.assertEqual(response.usage.total_tokens, 12)
+        self.assertIsNotNone(accumulator.ttft)
+
+    def test_tool_call_fragments(self):
+        """Tool call fragments are joined into complete calls."""
+        accumulator = StreamAccumulator()
+        for chunk in tool_call_chunks("get_courses", {"description": "AI", "max_cost": 500}):
+            self.assertEqual(accumulator.add(chunk), "")
+        message = accumulator.completion().choices[0].message
+        self.assertIsNone(message.content)
+        self.assertEqual(len(message.tool_calls), 1)
+        self.assertEqual(message.tool_calls[0].id, "call_0")
+        self.assertEqual(message.tool_calls[0].function.name, "get_courses")
+        self.assertEqual(json.loads(message.tool_calls[0].function.arguments), {"description": "AI", "max_cost": 500})
+        self.assertIsNone(accumulator.ttft)
+
+    def test_interleaved_tool_calls(self):
+        """Fragments of parallel tool calls are kept apart by their index."""
+        accumulator = StreamAccumulator()
+        for fragment in (
+            {"index": 0, "id": "call_a", "type": "function", "function": {"name": "get_courses"}},
+            {"index": 1, "id": "call_b", "type": "function", "function": {"name": "get_courses"}},
+            {"index": 1, "function": {"arguments": '{"max_cost": 1'}},
+            {"index": 0, "function": {"arguments": '{"description": "AI"}'}},
+            {"index": 1, "function": {"arguments": "00}"}},
+        ):
+            accumulator.add(make_chunk(tool_calls=[fragment]))
+        tool_calls = accumulator.completion().choices[0].message.tool_calls
+        self.assertEqual([call.id for call in tool_calls], ["call_a", "call_b"])
+        self.assertEqual(json.loads(tool_calls[1].function.arguments), {"max_cost": 100})
+
+
+class TestCompletionStream(unittest.TestCase):
+    """Test the stream of one turn."""
+
+    def test_ttft_and_results(self):
+        """The stream measures the time to its first delta and exposes the results when exhausted."""
+
+        def deltas(stream):
+            yield "a"
+            yield "b"
+            stream.response = "response"
+            stream.functions_called = ["get_courses"]
+
+        stream = CompletionStream(deltas)
+        self.assertEqual(stream.text(), "ab")
+        self.assertEqual(stream.response, "response")
+        self.assertEqual(stream.functions_called, ["get_courses"])
+        self.assertGreaterEqual(stream.elapsed, stream.ttft)
+
+
+class TestStreamingCompletion(unittest.TestCase):
+    """Test completion(stream=True)."""
+
+    def test_text_reply(self):
+        """Text deltas are yielded as they arrive and the assembled response is recorded."""
+        session = prompt.session_store.create()
+        with patch.object(
+            prompt.get_client().chat.completions, "create", return_value=FakeStream(text_chunks("Hi", " there"))
+        ) as mock_create:
+            stream = prompt.completion("hello", session=session, stream=True)
+            self.assertEqual(list(stream), ["Hi", " there"])
+        self.assertTrue(mock_create.call_args.kwargs["stream"])
+        self.assertEqual(mock_create.call_args.kwargs["stream_options"], {"include_usage": True})
+        self.assertEqual(stream.response.choices[0].message.content, "Hi there")
+        self.assertEqual(stream.functions_called, [])
+        self.assertEqual(session.total_tokens, 12)
+
+    def test_tool_calls_dispatched_after_assembly(self):
+        """Streamed tool call fragments are dispatched as one call with the complete arguments."""
+        session = prompt.session_store.create()
+        responses = [
+            FakeStream(tool_call_chunks("get_courses", {"description": "AI"})),
+            FakeStream(text_chunks("AI101 ", "is available.")),
+        ]
+        with (
+            patch.object(prompt.get_client().chat.completions, "create", side_effect=responses),
+            patch("app.prompt.handle_function_call", return_value='[{"course_code": "AI101"}]') as mock_call,
+        ):
+            stream = prompt.completion("AI courses?", session=session, stream=True)
+            self.assertEqual(stream.text(), "AI101 is available.")
+        mock_call.assert_called_once_with("get_courses", {"description": "AI"})
+        self.assertEqual(stream.functions_called, ["get_courses"])
+        self.assertTrue(all(response.closed for response in responses))
+        self.assertEqual(session.messages[-1]["role"], "tool")
+
+    def test_empty_prompt(self):
+        """An empty prompt yields nothing and has no response."""
+        stream = prompt.completion("  ", session=prompt.session_store.create(), stream=True)
+        self.assertEqual(list(stream), [])
+        self.assertIsNone(stream.response)
+
+    def test_cached_reply(self):
+        """A cached response is yielded as a single delta without calling the API."""
+        cache = CompletionCache(MemoryCache())
+        with (
+            patch.object(prompt, "completion_cache", cache),
+            patch.object(
+                prompt.get_client().chat.completions,
+                "create",
+                side_effect=lambda **kwargs: FakeStream(text_chunks("Hel", "lo!")),
+            ) as mock_create,
+        ):
+            first = prompt.completion("hello", session=prompt.session_store.create(), stream=True)
+            self.assertEqual(list(first), ["Hel", "lo!"])
+            second = prompt.completion("hello", session=prompt.session_store.create(), stream=True)
+            self.assertEqual(list(second), ["Hello!"])
+        mock_create.assert_called_once()
+
+
+class TestAsyncStreamingCompletion(unittest.IsolatedAsyncioTestCase):
+    """Test acompletion(stream=True)."""
+
+    async def test_tool_calls_then_text(self):
+        """Deltas of the follow-up request are streamed after the assembled tool call is dispatched."""
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(
+            side_effect=[
+                FakeAsyncStream(tool_call_chunks("get_courses", {"max_cost": 300})),
+                FakeAsyncStream(text_chunks("Two ", "courses.")),
+            ]
+        )
+        session = prompt.session_store.create()
+        with (
+            patch("app.prompt.get_async_client", return_value=client),
+            patch("app.prompt.handle_function_call", return_value="[]") as mock_call,
+        ):
+            stream = await prompt.acompletion("Cheap courses?", session=session, stream=True)
+            self.assertEqual([delta async for delta in stream], ["Two ", "courses."])
+        mock_call.assert_called_once_with("get_courses", {"max_cost": 300})
+        self.assertEqual(stream.response.choices[0].message.content, "Two courses.")
+        self.assertEqual(stream.functions_called, ["get_courses"])
+        self.assertIsNotNone(stream.ttft)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,C0115,W0613
+"""Test the stub OpenAI server and the replay harness."""
+
+# python stuff
+import json
+import os
+import time
+import unittest
+
+import openai
+
+from app.benchmarks.replay import (
+    CONVERSATIONS_DIR,
+    conversation_from_session,
+    load_conversation,
+    replay,
+)
+from app.session import ConversationSession
+from app.streaming import StreamAccumulator
+from app.stubs.openai_server import (
+    PROFILES,
+    LatencyProfile,
+    StubOpenAIServer,
+    StubReply,
+    split_tokens,
+)
+
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def client(server: StubOpenAIServer) -> openai.OpenAI:
+    """An OpenAI client of the stub, without retries."""
+    return openai.OpenAI(api_key="stub", base_url=server.base_url, max_retries=0)
+
+
+class TestStubOpenAIServer(unittest.TestCase):
+    """Test the stub's replies."""
+
+    def test_script_then_canned_content(self):
+        """Scripted replies are sent in order, then the canned content."""
+        script = [{"tool_calls": [("get_courses", {"description": "AI"})]}, "Here you go."]
+        with StubOpenAIServer(script=script, content="fallback", record=True) as server:
+            responses = [
+                client(server).chat.completions.create(model="gpt-4o-mini", messages=MESSAGES) for _ in range(3)
+            ]
+        tool_call = responses[0].choices[0].message.tool_calls[0]
+        self.assertEqual(responses[0].choices[0].finish_reason, "tool_calls")
+        self.assertEqual(tool_call.function.name, "get_courses")
+        self.assertEqual(json.loads(tool_call.function.arguments), {"description": "AI"})
+        self.assertEqual(responses[1].choices[0].message.content, "Here you go.")
+        self.assertEqual(responses[2].choices[0].message.content, "fallback")
+        self.assertGreater(responses[1].usage.prompt_tokens, 0)
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(server.remaining, 0)
+
+    def test_responder(self):
+        """The responder computes replies from the request."""
+        with StubOpenAIServer(responder=lambda request: request["messages"][-1]["content"].upper()) as server:
+            response = client(server).chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+        self.assertEqual(response.choices[0].message.content, "PING")
+
+    def test_streaming(self):
+        """Streamed text and tool call fragments assemble into the scripted reply."""
+        script = [StubReply(content="Two courses match.", tool_calls=[("get_courses", {"max_cost": 300})])]
+        with StubOpenAIServer(script=script) as server:
+            chunks = client(server).chat.completions.create(
+                model="gpt-4o-mini", messages=MESSAGES, stream=True, stream_options={"include_usage": True}
+            )
+            accumulator = StreamAccumulator()
+            deltas = [accumulator.add(chunk) for chunk in chunks]
+        message = accumulator.completion().choices[0].message
+        self.assertEqual([delta for delta in deltas if delta], split_tokens("Two courses match."))
+        self.assertEqual(message.content, "Two courses match.")
+        self.assertEqual(json.loads(message.tool_calls[0].function.arguments), {"max_cost": 300})
+        self.assertEqual(accumulator.usage["completion_tokens"], script[0].completion_tokens())
+
+    def test_error_reply(self):
+        """A scripted error status is raised by the client, with its Retry-After header."""
+        with StubOpenAIServer(script=[{"status": 429, "error": "Slow down", "retry_after": 2}]) as server:
+            with self.assertRaises(openai.RateLimitError) as context:
+                client(server).chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+        self.assertEqual(context.exception.response.headers["retry-after"], "2")
+
+    def test_latency_profile(self):
+        """Replies take the time to first token plus one token interval per token."""
+        profile = LatencyProfile(ttft=0.05, tokens_per_second=100)
+        with StubOpenAIServer(script=["one two three four five"], profile=profile) as server:
+            start = time.perf_counter()
+            client(server).chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+            elapsed = time.perf_counter() - start
+        self.assertGreaterEqual(elapsed, 0.05 + 5 * 0.01)
+        self.assertEqual(PROFILES["instant"].token_delay(), 0.0)
+
+
+class TestReplay(unittest.TestCase):
+    """Test replaying recorded conversations through agent.main()."""
+
+    def test_bundled_conversation(self):
+        """The recorded responses drive the agent loop and its tool calls."""
+        conversation = load_conversation(os.path.join(CONVERSATIONS_DIR, "browse-and-register.json"))
+        for stream in (False, True):
+            result = replay(conversation, PROFILES["instant"], stream=stream)
+            self.assertEqual(result["turns"], 2)
+            self.assertEqual(result["requests"], len(conversation["responses"]))
+            self.assertEqual(result["unused_responses"], 0)
+            self.assertEqual(result["functions_called"], ["get_courses", "register_course"])
+        self.assertEqual(len(result["ttfts"]), 2)
+
+    def test_conversation_from_session(self):
+        """A session is recorded as prompts and responses."""
+        session = ConversationSession(
+            messages=[
+                {"role": "system", "content": "You are helpful."},
+                {"role": "user", "content": "AI courses?"},
+                {
+                    "role": "assistant",
+                    "content": "Accessing tool...",
+                    "tool_calls": [
+                        {"id": "call_0", "type": "function", "function": {"name": "get_courses", "arguments": "{}"}}
+                    ],
+                },
+                {"role": "tool", "content": "[]", "tool_call_id": "call_0"},
+                {"role": "assistant", "content": "None, sorry."},
+            ]
+        )
+        recording = conversation_from_session(session, "sorry")
+        self.assertEqual(recording["prompts"], ["AI courses?"])
+        self.assertEqual(
+            recording["responses"], [{"tool_calls": [{"name": "get_courses", "arguments": {}}]}, "None, sorry."]
+        )
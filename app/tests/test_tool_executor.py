@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test the concurrent tool executor."""
+
+# python stuff
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+from app.tool_executor import ToolExecutor
+
+
+class ConcurrencyProbe:
+    """Tool handler that records how many calls run at the same time."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, function_name: str, arguments: dict) -> str:
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        # finish in reverse order to prove that results are re-ordered
+        time.sleep(self.delay / (arguments["i"] + 1))
+        with self.lock:
+            self.active -= 1
+        return json.dumps({"function": function_name, "i": arguments["i"]})
+
+
+class TestToolExecutor(unittest.TestCase):
+    """Test the concurrent tool executor."""
+
+    def make_executor(self, **kwargs) -> ToolExecutor:
+        """Create an executor whose worker threads are stopped after the test."""
+        executor = ToolExecutor(**kwargs)
+        self.addCleanup(executor.shutdown)
+        return executor
+
+    def test_results_in_call_order(self):
+        """Test that results keep the order of the calls."""
+        executor = self.make_executor(max_concurrency=4)
+        calls = [("get_courses", {"i": i}) for i in range(4)]
+        results = executor.run(calls, ConcurrencyProbe())
+        self.assertEqual([json.loads(result)["i"] for result in results], [0, 1, 2, 3])
+
+    def test_runs_concurrently_up_to_cap(self):
+        """Test that calls overlap but never exceed max_concurrency."""
+        executor = self.make_executor(max_concurrency=2)
+        probe = ConcurrencyProbe()
+        executor.run([("get_courses", {"i": i}) for i in range(6)], probe)
+        self.assertEqual(probe.peak, 2)
+
+    def test_single_call_runs_inline(self):
+        """Test that a single call does not start worker threads."""
+        executor = self.make_executor()
+        executor.run([("get_courses", {"i": 0})], ConcurrencyProbe(delay=0))
+        self.assertIsNone(executor._executor)  # pylint: disable=protected-access
+
+    def test_errors_become_results(self):
+        """Test that a failing call yields an error result without affecting the others."""
+        executor = self.make_executor()
+
+        def handler(_function_name, arguments):
+            if arguments["i"] == 1:
+                raise RuntimeError("boom")
+            return "ok"
+
+        results = executor.run([("f", {"i": 0}), ("f", {"i": 1})], handler)
+        self.assertEqual(results[0], "ok")
+        self.assertIn("boom", json.loads(results[1])["error"])
+
+    def test_async_results_in_call_order(self):
+        """Test that the async runner keeps call order and respects the cap."""
+        executor = self.make_executor(max_concurrency=2)
+        probe = ConcurrencyProbe()
+
+        async def handler(function_name, arguments):
+            return await asyncio.to_thread(probe, function_name, arguments)
+
+        calls = [("get_courses", {"i": i}) for i in range(5)]
+        results = asyncio.run(executor.arun(calls, handler))
+        self.assertEqual([json.loads(result)["i"] for result in results], list(range(5)))
+        self.assertEqual(probe.peak, 2)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801
+"""Test the tool registry."""
+
+# python stuff
+import json
+import pickle
+import unittest
+from unittest.mock import patch
+
+from pydantic import BaseModel, Field
+
+from app.cache import MemoryCache
+from app.stackademy import StackademyGetCoursesParams, stackademy_app, tool_result_cache
+from app.tools import FrozenDict, ToolRegistry, ToolSpec, freeze, tool_registry
+
+
+class EchoParams(BaseModel):
+    """Arguments of a test tool."""
+
+    text: str = Field(description="Text to echo.")
+    tags: list = Field(default_factory=list, description="Tags.")
+
+
+class TestToolRegistry(unittest.TestCase):
+    """Test the tool registry."""
+
+    def setUp(self):
+        self.registry = ToolRegistry()
+        self.registry.register(
+            ToolSpec(
+                name="echo",
+                description="Echo text.",
+                params_model=EchoParams,
+                handler=lambda text, tags: {"text": text, "tags": tags},
+                cacheable=True,
+            )
+        )
+
+    def test_tool_definition(self):
+        """The definition matches what the OpenAI API expects."""
+        tool = self.registry.tool("echo")
+        self.assertEqual(tool["type"], "function")
+        self.assertEqual(tool["function"]["name"], "echo")
+        self.assertEqual(tool["function"]["description"], "Echo text.")
+        self.assertEqual(tool["function"]["parameters"]["properties"]["text"]["type"], "string")
+        self.assertIn("echo", self.registry)
+
+    def test_schema_built_once(self):
+        """model_json_schema() runs only on first use."""
+        with patch.object(EchoParams, "model_json_schema", wraps=EchoParams.model_json_schema) as schema:
+            registry = ToolRegistry()
+            registry.register(ToolSpec(name="echo", description="Echo text.", params_model=EchoParams))
+            for _ in range(5):
+                registry.tool("echo")
+                registry.tools("echo")
+            self.assertEqual(schema.call_count, 1)
+
+    def test_definitions_are_immutable(self):
+        """Cached definitions cannot be modified by a caller."""
+        tool = self.registry.tool("echo")
+        self.assertIsInstance(tool, FrozenDict)
+        with self.assertRaises(TypeError):
+            tool["type"] = "other"
+        with self.assertRaises(TypeError):
+            tool["function"].update({"name": "other"})
+        self.assertIsInstance(tool["function"]["parameters"]["required"], tuple)
+
+    def test_tools_array_cached(self):
+        """The same array object is returned for the same names."""
+        first = self.registry.tools("echo")
+        self.assertIs(first, self.registry.tools("echo"))
+        self.assertIs(first[0], self.registry.tool("echo"))
+
+    def test_tools_json(self):
+        """The pre-serialized array decodes to the definitions."""
+        payload = self.registry.tools_json("echo")
+        self.assertIsInstance(payload, bytes)
+        self.assertIs(payload, self.registry.tools_json("echo"))
+        self.assertEqual(json.loads(payload), json.loads(json.dumps(self.registry.tools("echo"))))
+
+    def test_register_resets_arrays(self):
+        """Registering a tool invalidates the cached arrays."""
+        first = self.registry.tools("echo")
+        self.registry.register(ToolSpec(name="echo", description="Say it again.", params_model=EchoParams))
+        self.assertIsNot(first, self.registry.tools("echo"))
+        self.assertEqual(self.registry.tool("echo")["function"]["description"], "Say it again.")
+
+    def test_dispatch(self):
+        """Validated arguments are passed to the handler and the result is serialized."""
+        result = self.registry.dispatch("echo", {"text": "hi"})
+        self.assertEqual(json.loads(result), {"text": "hi", "tags": []})
+        self.assertTrue(self.registry.get("echo").cacheable)
+        self.assertFalse(self.registry.get("echo").idempotent)
+
+    def test_dispatch_unknown(self):
+        """Unknown tools are reported back as an error result."""
+        self.assertIn("Unknown function: nope", self.registry.dispatch("nope", {}))
+
+    def test_dispatch_invalid_arguments(self):
+        """Invalid arguments never reach the handler."""
+        calls = []
+        self.registry.register(
+            ToolSpec(name="strict", description="Strict.", params_model=EchoParams, handler=calls.append)
+        )
+        result = json.loads(self.registry.dispatch("strict", {"text": 42}))
+        self.assertIn("Invalid arguments for strict", result["error"])
+        self.assertEqual(result["details"][0]["loc"], ["text"])
+        self.assertEqual(calls, [])
+
+    def test_adapter_cached(self):
+        """The TypeAdapter of a tool is built once."""
+        spec = self.registry.get("echo")
+        self.assertIs(spec.adapter, spec.adapter)
+
+    def test_custom_serializer(self):
+        """A tool can serialize its own results."""
+        self.registry.register(
+            ToolSpec(
+                name="ok",
+                description="Ok.",
+                params_model=EchoParams,
+                handler=lambda text, tags: True,
+                serializer=lambda result: json.dumps({"success": result}),
+            )
+        )
+        self.assertEqual(self.registry.dispatch("ok", {"text": "x"}), '{"success": true}')
+
+    def test_dispatch_cached(self):
+        """Results of cacheable tools are served from their cache."""
+        calls = []
+        cache = MemoryCache()
+        self.registry.register(
+            ToolSpec(
+                name="cached",
+                description="Cached.",
+                params_model=EchoParams,
+                handler=lambda text, tags: calls.append(text) or text,
+                cacheable=True,
+                cache=cache,
+            )
+        )
+        first = self.registry.dispatch("cached", {"text": "hi"})
+        self.assertEqual(self.registry.dispatch("cached", {"text": "hi", "tags": []}), first)
+        self.registry.dispatch("cached", {"text": "bye"})
+        self.assertEqual(calls, ["hi", "bye"])
+        self.assertEqual(cache.stats()["hits"], 1)
+        cache.clear()
+        self.registry.dispatch("cached", {"text": "hi"})
+        self.assertEqual(calls, ["hi", "bye", "hi"])
+
+    def test_deduplicate_idempotent_calls(self):
+        """Repeated calls of an idempotent tool with the same arguments run once; other calls all run."""
+        self.registry.register(
+            ToolSpec(name="set", description="Set.", params_model=EchoParams, handler=print, idempotent=True)
+        )
+        calls = [
+            ("set", {"text": "a"}),
+            ("echo", {"text": "a"}),
+            ("set", {"text": "b"}),
+            ("echo", {"text": "a"}),
+            ("set", {"text": "a"}),
+            ("nope", {}),
+        ]
+        unique, positions = self.registry.deduplicate(calls)
+        self.assertEqual(unique, [calls[0], calls[1], calls[2], calls[3], calls[5]])
+        self.assertEqual([unique[i] for i in positions], calls)
+
+    def test_cache_requires_cacheable(self):
+        """Only cacheable tools can have a result cache."""
+        with self.assertRaises(ValueError):
+            ToolSpec(name="write", description="Write.", params_model=EchoParams, cache=MemoryCache())
+
+    def test_freeze_pickles_as_dict(self):
+        """Frozen definitions can still be copied into plain dicts."""
+        frozen = freeze({"a": [1, {"b": 2}]})
+        self.assertEqual(frozen, {"a": (1, {"b": 2})})
+        self.assertIs(type(pickle.loads(pickle.dumps(frozen))), dict)
+
+
+class TestStackademyTools(unittest.TestCase):
+    """Test the Stackademy tool factories."""
+
+    def setUp(self):
+        if tool_result_cache is not None:
+            tool_result_cache.clear()
+
+    def test_factories_return_cached_definitions(self):
+        """The factories return the registry's cached definitions."""
+        self.assertIs(stackademy_app.tool_factory_get_courses(), tool_registry.tool("get_courses"))
+        self.assertIs(stackademy_app.tool_factory_register(), tool_registry.tool("register_course"))
+        self.assertIs(stackademy_app.tool_factory_get_courses(), stackademy_app.tool_factory_get_courses())
+
+    def test_enum_arguments_passed_as_values(self):
+        """Enum arguments reach the handler as plain strings."""
+        with patch.object(stackademy_app, "get_courses", return_value=[]) as mock_get_courses:
+            tool_registry.dispatch("get_courses", {"description": "AI", "max_cost": 100})
+        mock_get_courses.assert_called_once_with(description="AI", max_cost=100.0)
+        self.assertIs(type(mock_get_courses.call_args.kwargs["description"]), str)
+
+    def test_get_courses_cached_by_area_and_bucket(self):
+        """get_courses results are cached by specialization area and max_cost bucket."""
+        self.assertIs(tool_registry.get("get_courses").cache, tool_result_cache)
+        self.assertIsNone(tool_registry.get("register_course").cache)
+        with patch.object(stackademy_app, "get_courses", return_value=[{"course_code": "AI101"}]) as mock_get_courses:
+            first = tool_registry.dispatch("get_courses", {"description": "AI", "max_cost": 500})
+            second = tool_registry.dispatch("get_courses", {"max_cost": "500.001", "description": "AI"})
+            tool_registry.dispatch("get_courses", {"description": "AI", "max_cost": 499.99})
+            tool_registry.dispatch("get_courses", {"description": "web", "max_cost": 500})
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get_courses.call_count, 3)
+
+    def test_database_error_not_cached(self):
+        """An empty result returned because the database failed is served, but not cached."""
+        with patch.object(stackademy_app.db, "execute_query", side_effect=Exception("Database error")):
+            with self.assertLogs("app.stackademy", level="ERROR"):
+                result = tool_registry.dispatch("get_courses", {"description": "AI", "max_cost": 500})
+        self.assertEqual(json.loads(result), [])
+        with patch.object(stackademy_app, "get_courses", return_value=[{"course_code": "AI101"}]) as mock_get_courses:
+            result = tool_registry.dispatch("get_courses", {"description": "AI", "max_cost": 500})
+        mock_get_courses.assert_called_once()
+        self.assertEqual(json.loads(result), [{"course_code": "AI101"}])
+
+    def test_schema_unchanged(self):
+        """The cached schema is the pydantic schema."""
+        parameters = stackademy_app.tool_factory_get_courses()["function"]["parameters"]
+        self.assertEqual(json.loads(json.dumps(parameters)), StackademyGetCoursesParams.model_json_schema())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=wrong-import-position
+# pylint: disable=R0801,C0115,W0613
+"""Test request tracing."""
+
+# python stuff
+import asyncio
+import contextlib
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import prompt, stackademy, tracing
+from app.benchmarks.replay import seeded_database
+from app.openai_client import scoped_clients
+from app.session import ConversationSession
+from app.stubs.openai_server import StubOpenAIServer
+from app.tool_executor import ToolExecutor
+from app.tracing import NOOP_SPAN, FileExporter, Tracer
+
+
+@contextlib.contextmanager
+def tracing_enabled():
+    """Enable the shared tracer and collect the root span of every turn."""
+    roots = []
+    with patch.object(tracing.tracer, "enabled", True), patch.object(tracing.tracer, "exporters", [roots.append]):
+        yield roots
+
+
+class TestSpans(unittest.TestCase):
+    """Test spans and the tracer."""
+
+    def test_disabled(self):
+        """A disabled tracer hands out the shared no-op span and traced functions run as they are."""
+        tracer = Tracer(enabled=False, exporters=[self.fail])
+        with tracer.span("turn", session="a") as span:
+            span.set(cached=True)
+        self.assertIs(span, NOOP_SPAN)
+        self.assertIsNone(tracing.current_span())
+
+        @tracing.traced("double")
+        def double(value):
+            return value * 2
+
+        self.assertEqual(double(2), 4)
+
+    def test_nesting_and_breakdown(self):
+        """Child spans nest under the current span, and the root is exported with its breakdown."""
+        roots = []
+        tracer = Tracer(enabled=True, exporters=[roots.append])
+        with tracer.span("turn") as root:
+            for _ in range(2):
+                with tracer.span("handle_completion"):
+                    with tracer.span("serialize"):
+                        pass
+            with self.assertRaises(ValueError):
+                with tracer.span("handle_function_call", function="get_courses"):
+                    raise ValueError("boom")
+        self.assertEqual(roots, [root])
+        root = roots[0]
+        self.assertEqual([child.name for child in root.children], ["handle_completion"] * 2 + ["handle_function_call"])
+        self.assertEqual(root.children[2].attributes, {"function": "get_courses", "error": "ValueError"})
+        self.assertIsNone(tracing.current_span())
+
+        stages = root.breakdown()
+        self.assertEqual(list(stages), ["turn", "handle_completion", "serialize", "handle_function_call"])
+        self.assertEqual(stages["handle_completion"]["count"], 2)
+        self.assertAlmostEqual(
+            stages["turn"]["total_ms"],
+            stages["turn"]["self_ms"]
+            + stages["handle_completion"]["total_ms"]
+            + stages["handle_function_call"]["total_ms"],
+            places=6,
+        )
+
+    def test_tool_executor_propagation(self):
+        """Tool calls in worker threads are children of the calling span."""
+        executor = ToolExecutor(max_concurrency=2)
+
+        def handler(function_name, arguments):
+            with tracing.span(function_name):
+                return function_name
+
+        with tracing_enabled() as roots:
+            with tracing.span("process_tool_calls"):
+                results = executor.run([("a", {}), ("b", {})], handler)
+        executor.shutdown()
+        self.assertEqual(results, ["a", "b"])
+        self.assertEqual(len(roots), 1)
+        self.assertEqual(sorted(child.name for child in roots[0].children), ["a", "b"])
+
+    def test_file_exporter(self):
+        """Every turn is appended as a JSON line with its span tree and breakdown."""
+        tracer = Tracer(enabled=True)
+        with tempfile.TemporaryDirectory() as directory:
+            tracer.exporters.append(FileExporter(os.path.join(directory, "traces.jsonl")))
+            for session in ("a", "b"):
+                with tracer.span("turn", session=session):
+                    with tracer.span("handle_completion"):
+                        pass
+            with open(os.path.join(directory, "traces.jsonl"), encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual([line["trace"]["attributes"]["session"] for line in lines], ["a", "b"])
+        self.assertEqual(lines[0]["trace"]["children"][0]["name"], "handle_completion")
+        self.assertEqual(lines[0]["breakdown"]["handle_completion"]["count"], 1)
+
+    def test_create_exporters(self):
+        """OpenTelemetry falls back to logging the traces when it is not installed."""
+        with patch("app.tracing.importlib.util.find_spec", return_value=None):
+            with self.assertLogs("app.tracing", level="WARNING"):
+                exporters = tracing.create_exporters("log, otlp")
+        self.assertEqual(exporters, [tracing.log_breakdown])
+
+    def test_failing_exporter(self):
+        """A failing exporter does not fail the turn."""
+        tracer = Tracer(enabled=True, exporters=[lambda root: 1 / 0])
+        with self.assertLogs("app.tracing", level="WARNING"):
+            with tracer.span("turn"):
+                pass
+
+
+class TestTurnTracing(unittest.TestCase):
+    """Test the timing breakdown of turns through the agent loop."""
+
+    EXPECTED = [
+        "turn",
+        "handle_completion",
+        "process_tool_calls",
+        "handle_function_call",
+        "Stackademy.get_courses",
+        "serialize",
+    ]
+
+    def run_turn(self, run):
+        """Run a turn with a tool call against the stub server and return its root span."""
+        script = [{"tool_calls": [("get_courses", {"description": "AI"})]}, "Here you go."]
+        with contextlib.ExitStack() as stack:
+            stub = stack.enter_context(StubOpenAIServer(script=script))
+            stack.enter_context(patch("app.settings.OPENAI_BASE_URL", stub.base_url))
+            stack.enter_context(patch("app.settings.OPENAI_API_KEY", "stub"))
+            stack.enter_context(patch.object(stackademy.stackademy_app, "db", seeded_database()))
+            stack.enter_context(patch.object(prompt, "completion_cache", None))
+            stack.enter_context(scoped_clients())
+            if stackademy.tool_result_cache is not None:
+                stackademy.tool_result_cache.clear()
+            roots = stack.enter_context(tracing_enabled())
+            run(ConversationSession())
+        self.assertEqual(len(roots), 1)
+        return roots[0]
+
+    def assert_breakdown(self, root):
+        """The turn made two requests and one tool call."""
+        stages = root.breakdown()
+        self.assertEqual(list(stages), self.EXPECTED)
+        self.assertEqual(stages["handle_completion"]["count"], 2)
+        self.assertEqual(stages["handle_function_call"]["count"], 1)
+
+    def test_completion(self):
+        """completion() records a turn with its requests and tool calls."""
+        root = self.run_turn(lambda session: prompt.completion("AI courses?", session=session))
+        self.assert_breakdown(root)
+        self.assertNotIn("stream", root.attributes)
+
+    def test_stream(self):
+        """A streamed turn is recorded once it has been consumed."""
+        root = self.run_turn(lambda session: list(prompt.completion("AI courses?", session=session, stream=True)))
+        self.assert_breakdown(root)
+        self.assertEqual(root.attributes["stream"], True)
+        self.assertIn("ttft", root.children[-1].attributes)
+
+    def test_acompletion(self):
+        """acompletion() records the same breakdown, with the tool call run in a worker thread."""
+        root = self.run_turn(lambda session: asyncio.run(prompt.acompletion("AI courses?", session=session)))
+        self.assert_breakdown(root)
@@ -4,8 +4,13 @@
 """Test utils."""
 
 # python stuff
+import logging
+import os
+import subprocess
+import sys
+import threading
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from app import utils
 
@@ -47,3 +52,78 @@ class TestUtils(unittest.TestCase):
         with self.assertRaises(TypeError) as ctx:
             utils.dump_json_colored(NotSerializable(), "blue")
         self.assertIn("Data is not JSON serializable", str(ctx.exception))
+
+    def test_lazy_str_defers_work(self):
+        """Test that LazyStr only calls its function when converted to a string."""
+        func = MagicMock(return_value="formatted")
+        lazy = utils.LazyStr(func, 1, key="value")
+        func.assert_not_called()
+        self.assertEqual(str(lazy), "formatted")
+        func.assert_called_once_with(1, key="value")
+
+    def test_lazy_json_skipped_when_level_disabled(self):
+        """Test that lazy_json payloads are not serialized for disabled log levels."""
+        logger = logging.getLogger("app.tests.test_utils.lazy")
+        logger.setLevel(logging.INFO)
+        with patch("app.utils.dump_json_colored") as mock_dump:
+            logger.debug("payload: %s", utils.lazy_json([{"a": 1}], "blue"))
+            mock_dump.assert_not_called()
+
+    def test_lazy_json_dumps_models(self):
+        """Test that lazy_json dumps pydantic models found in lists."""
+        model = MagicMock()
+        model.model_dump.return_value = {"role": "assistant"}
+        result = str(utils.lazy_json([model, {"role": "user"}], "green"))
+        self.assertIn('"assistant"', result)
+        self.assertIn('"user"', result)
+
+    def test_lazy_color_text_with_logging_args(self):
+        """Test that lazy_color_text works as a %-style logging message."""
+        record = logging.LogRecord(
+            "x", logging.INFO, __file__, 1, utils.lazy_color_text("%d rows", "green"), (3,), None
+        )
+        self.assertEqual(record.getMessage(), utils.color_text("3 rows", "green"))
+
+    def test_lazy_import_defers_execution(self):
+        """Test that lazy_import executes the module on first attribute access."""
+        with patch.dict(sys.modules):
+            sys.modules.pop("tabnanny", None)
+            module = utils.lazy_import("tabnanny")
+            self.assertIsInstance(module, utils.LazyModule)
+            self.assertNotIn("tabnanny", sys.modules)
+            self.assertIs(utils.lazy_import("tabnanny"), module)
+            self.assertTrue(callable(module.check))
+            self.assertIn("tabnanny", sys.modules)
+        self.assertIs(utils.lazy_import("json"), sys.modules["json"])
+        with self.assertRaises(ModuleNotFoundError):
+            utils.lazy_import("no_such_module_here")
+
+    def test_lazy_import_across_threads(self):
+        """Test that threads using a lazy module at the same time all see it fully imported."""
+        with patch.dict(sys.modules):
+            sys.modules.pop("tabnanny", None)
+            module = utils.LazyModule("tabnanny")
+            barrier = threading.Barrier(8)
+            found = []
+
+            def use():
+                barrier.wait()
+                found.append(module.check)
+
+            threads = [threading.Thread(target=use) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(found), 8)
+            self.assertTrue(all(check is sys.modules["tabnanny"].check for check in found))
+
+    def test_app_import_defers_heavy_modules(self):
+        """Test that importing the app does not import openai or pymysql."""
+        probe = (
+            "import sys; import app.agent, app.server; "
+            "print([name for name in ('openai', 'pymysql') if name in sys.modules])"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        completed = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True, cwd=root)
+        self.assertEqual(completed.stdout.strip(), "[]")
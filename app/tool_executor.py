@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Concurrent execution of the tool calls requested in one assistant message."""
+
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from app.logging_config import get_logger, setup_logging
+from app.tracing import in_context
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+ToolCall = Tuple[str, dict]
+
+
+def tool_error(function_name: str, error: Exception) -> str:
+    """Build the tool result that reports a failed tool call back to the model."""
+    logger.error("Tool call %s failed: %s", function_name, error)
+    return json.dumps({"error": f"{function_name} failed: {error}"})
+
+
+class ToolExecutor:
+    """
+    Runs independent tool calls concurrently.
+
+    Results are always returned in the order of the calls, regardless of the
+    order in which they complete. At most max_concurrency calls of one
+    assistant message run at the same time; the worker threads are shared by
+    all conversations and bounded by max_workers.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_workers: int = 32):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_workers = max(max_workers, 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """The shared worker thread pool, created on first use."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool-call")
+        return self._executor
+
+    @staticmethod
+    def _call(handler: Callable[[str, dict], str], call: ToolCall) -> str:
+        """Run one tool call, turning exceptions into an error result."""
+        function_name, arguments = call
+        try:
+            return handler(function_name, arguments)
+        except Exception as e:  # pylint: disable=broad-except
+            return tool_error(function_name, e)
+
+    def run(self, calls: List[ToolCall], handler: Callable[[str, dict], str]) -> List[str]:
+        """
+        Run tool calls with a synchronous handler.
+
+        Args:
+            calls: (function_name, arguments) pairs
+            handler: Function that executes one tool call and returns its result
+
+        Returns:
+            List[str]: The results, in the same order as calls
+        """
+        if len(calls) <= 1 or self.max_concurrency == 1:
+            return [self._call(handler, call) for call in calls]
+
+        semaphore = threading.BoundedSemaphore(self.max_concurrency)
+
+        def bounded(call: ToolCall) -> str:
+            with semaphore:
+                return self._call(handler, call)
+
+        # every call runs in its own copy of the caller's context, so that its spans nest under the caller's
+        runners = [in_context(bounded) for _ in calls]
+        return list(self.executor.map(lambda runner, call: runner(call), runners, calls))
+
+    async def arun(self, calls: List[ToolCall], handler: Callable[[str, dict], Awaitable[str]]) -> List[str]:
+        """
+        Run tool calls with an async handler.
+
+        Args:
+            calls: (function_name, arguments) pairs
+            handler: Coroutine function that executes one tool call and returns its result
+
+        Returns:
+            List[str]: The results, in the same order as calls
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(call: ToolCall) -> str:
+            function_name, arguments = call
+            async with semaphore:
+                try:
+                    return await handler(function_name, arguments)
+                except Exception as e:  # pylint: disable=broad-except
+                    return tool_error(function_name, e)
+
+        return list(await asyncio.gather(*(bounded(call) for call in calls)))
+
+    def shutdown(self) -> None:
+        """Stop the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
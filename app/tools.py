@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""Declarative registry of the tools offered to the LLM, with memoized schemas and O(1) dispatch."""
+
+import json
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from app.cache import BaseCache
+from app.logging_config import get_logger, setup_logging
+from app.tracing import span
+
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionFunctionToolParam
+
+setup_logging()
+logger = get_logger(__name__)
+
+
+class FrozenDict(dict):
+    """A dict that refuses modification, so cached tool definitions can be shared safely."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Tool definitions are cached and shared; copy them before modifying.")
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    __ior__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+
+    def __hash__(self):  # pragma: no cover - identity is enough for caching
+        return id(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """Recursively convert dicts to FrozenDict and lists to tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class Unavailable(list):
+    """
+    An empty result returned in place of a tool's data when it could not be
+    read, e.g. during a database outage. It is served to the LLM like any
+    other result but never cached, so that an outage outlives no request.
+    """
+
+
+def serialize_json(result: Any) -> str:
+    """Default tool result serializer."""
+    return json.dumps(result, default=str, indent=2)
+
+
+class ToolSpec:  # pylint: disable=too-many-instance-attributes
+    """
+    Declaration of one tool.
+
+    Args:
+        name: The function name the LLM calls
+        description: What the tool does, as shown to the LLM
+        params_model: Pydantic model of the arguments
+        handler: Called with the validated arguments as keyword arguments
+        serializer: Turns the handler's result into the tool message content
+        cacheable: The result only depends on the arguments and may be cached
+        idempotent: Repeating the call with the same arguments has no further effect, so repeated
+            calls in one assistant message run once (see ToolRegistry.deduplicate)
+        cache: Cache of serialized results, only allowed for cacheable tools
+        cache_key: Builds the cache key from the validated arguments; defaults to their canonical JSON
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        name: str,
+        description: str,
+        params_model: Type[BaseModel],
+        handler: Optional[Callable[..., Any]] = None,
+        serializer: Callable[[Any], str] = serialize_json,
+        cacheable: bool = False,
+        idempotent: bool = False,
+        cache: Optional[BaseCache] = None,
+        cache_key: Optional[Callable[[Dict[str, Any]], str]] = None,
+    ):
+        if cache is not None and not cacheable:
+            raise ValueError(f"Tool {name} is not cacheable")
+        self.name = name
+        self.description = description
+        self.params_model = params_model
+        self.handler = handler
+        self.serializer = serializer
+        self.cacheable = cacheable
+        self.idempotent = idempotent
+        self.cache = cache
+        self.cache_key = cache_key
+        self._param: Any = None
+        self._adapter: Optional[TypeAdapter] = None
+
+    def __repr__(self) -> str:
+        return f"ToolSpec(name={self.name!r})"
+
+    @property
+    def adapter(self) -> TypeAdapter:
+        """TypeAdapter of the arguments model, built once."""
+        if self._adapter is None:
+            self._adapter = TypeAdapter(self.params_model)
+        return self._adapter
+
+    def validate(self, arguments: Any) -> Dict[str, Any]:
+        """
+        Validate the arguments sent by the LLM.
+
+        Returns:
+            Dict[str, Any]: JSON-compatible keyword arguments for the handler
+
+        Raises:
+            ValidationError: If the arguments do not match params_model
+        """
+        return self.adapter.dump_python(self.adapter.validate_python(arguments), mode="json")
+
+    def key(self, arguments: Dict[str, Any]) -> str:
+        """The result cache key of validated arguments."""
+        if self.cache_key is not None:
+            return self.cache_key(arguments)
+        return json.dumps([self.name, arguments], sort_keys=True, default=str)
+
+    @property
+    def param(self) -> "ChatCompletionFunctionToolParam":
+        """The tool definition sent to the OpenAI API, built once from the pydantic schema."""
+        if self._param is None:
+            # a ChatCompletionFunctionToolParam; TypedDicts are plain dicts at runtime
+            self._param = freeze(
+                {
+                    "type": "function",
+                    "function": {
+                        "name": self.name,
+                        "description": self.description,
+                        "parameters": self.params_model.model_json_schema(),
+                    },
+                }
+            )
+        return self._param
+
+
+class ToolRegistry:
+    """
+    Tools by name, with their OpenAI definitions built once and cached.
+
+    Tool calls are dispatched with a single dict lookup, so the cost of
+    dispatching does not grow with the number of registered tools.
+
+    Tool arrays are cached per combination of names, both as immutable
+    objects for the OpenAI client and pre-serialized to JSON bytes, e.g. for
+    hashing request payloads.
+    """
+
+    def __init__(self):
+        self._specs: Dict[str, ToolSpec] = {}
+        self._arrays: Dict[Tuple[str, ...], Tuple["ChatCompletionFunctionToolParam", ...]] = {}
+        self._json: Dict[Tuple[str, ...], bytes] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def register(self, spec: ToolSpec) -> ToolSpec:
+        """Add a tool to the registry."""
+        with self._lock:
+            self._specs[spec.name] = spec
+            self._arrays.clear()
+            self._json.clear()
+        return spec
+
+    def get(self, name: str) -> ToolSpec:
+        """Return the declaration of a tool."""
+        return self._specs[name]
+
+    def dispatch(self, name: str, arguments: Any) -> str:
+        """
+        Execute a tool call requested by the LLM.
+
+        Unknown tools and invalid arguments are reported back to the LLM as an
+        error result, so that it can correct the call.
+
+        Args:
+            name: The function name
+            arguments: The decoded JSON arguments
+
+        Returns:
+            str: The tool result
+        """
+        spec = self._specs.get(name)
+        if spec is None:
+            return json.dumps({"error": f"Unknown function: {name}"})
+        try:
+            arguments = spec.validate(arguments)
+        except ValidationError as e:
+            logger.warning("Invalid arguments for %s: %s", name, e)
+            errors = e.errors(include_url=False, include_context=False)
+            return json.dumps({"error": f"Invalid arguments for {name}", "details": errors}, default=str)
+        if spec.handler is None:
+            return json.dumps({"error": f"Function {name} is not available"})
+        if spec.cache is None:
+            return self._call(spec, arguments)[1]
+
+        key = spec.key(arguments)
+        content = spec.cache.get(key)
+        if content is None:
+            generation = spec.cache.generation
+            result, content = self._call(spec, arguments)
+            if not isinstance(result, Unavailable):
+                spec.cache.set(key, content, generation=generation)
+        return content
+
+    def deduplicate(self, calls: List[Tuple[str, Any]]) -> Tuple[List[Tuple[str, Any]], List[int]]:
+        """
+        Merge the calls of an idempotent tool with the same arguments, so that they run once.
+
+        Args:
+            calls: (function_name, arguments) pairs requested in one assistant message
+
+        Returns:
+            tuple: The calls to run, and for each of the given calls the index of its result among them
+        """
+        unique: List[Tuple[str, Any]] = []
+        positions: List[int] = []
+        seen: Dict[str, int] = {}
+        for name, arguments in calls:
+            spec = self._specs.get(name)
+            if spec is not None and spec.idempotent:
+                key = json.dumps([name, arguments], sort_keys=True, default=str)
+                if key in seen:
+                    positions.append(seen[key])
+                    continue
+                seen[key] = len(unique)
+            positions.append(len(unique))
+            unique.append((name, arguments))
+        return unique, positions
+
+    @staticmethod
+    def _call(spec: ToolSpec, arguments: Dict[str, Any]) -> Tuple[Any, str]:
+        """
+        Run a tool's handler and serialize its result, timing the serialization separately.
+
+        Returns:
+            tuple: The handler's result and the serialized tool result
+        """
+        result = spec.handler(**arguments)
+        with span("serialize", function=spec.name):
+            return result, spec.serializer(result)
+
+    def tool(self, name: str) -> "ChatCompletionFunctionToolParam":
+        """Return the cached OpenAI definition of a tool."""
+        return self._specs[name].param
+
+    def tools(self, *names: str) -> Tuple["ChatCompletionFunctionToolParam", ...]:
+        """Return the cached OpenAI definitions of several tools, as an immutable array."""
+        array = self._arrays.get(names)
+        if array is None:
+            array = tuple(self.tool(name) for name in names)
+            self._arrays[names] = array
+        return array
+
+    def tools_json(self, *names: str) -> bytes:
+        """Return the tools array serialized to compact JSON bytes."""
+        payload = self._json.get(names)
+        if payload is None:
+            payload = json.dumps(self.tools(*names), separators=(",", ":")).encode("utf-8")
+            self._json[names] = payload
+        return payload
+
+
+tool_registry = ToolRegistry()
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight spans that time the stages of a conversation turn.
+
+    with tracing.span("DatabaseConnection.execute_query", rows=10):
+        ...
+
+    @tracing.traced("Stackademy.get_courses")
+    def get_courses(...): ...
+
+Spans nest through a context variable, across threads of the tool executor
+and asyncio tasks alike. When the outermost span of a turn ends, the tree is
+handed to the exporters: a per-turn breakdown in the log, JSON lines in a
+file, or OpenTelemetry spans sent to a collector. When tracing is disabled,
+span() returns a shared no-op span and traced functions are called
+directly, so instrumentation costs a function call and an attribute check.
+"""
+
+import contextvars
+import functools
+import importlib.util
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.logging_config import get_logger, setup_logging
+from app.settings import TRACING, TRACING_EXPORTERS, TRACING_FILE
+
+
+setup_logging()
+logger = get_logger(__name__)
+
+Exporter = Callable[["Span"], None]
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:  # pylint: disable=too-many-instance-attributes
+    """
+    A timed stage of a turn, with attributes and child spans.
+
+    Args:
+        name: What is timed, e.g. "handle_completion"
+        attributes: Details such as the model or the number of rows
+        parent: The enclosing span, None for the root of a turn
+        owner: The tracer that receives the span tree when the root ends
+    """
+
+    __slots__ = ("name", "attributes", "parent", "children", "start", "end", "start_ns", "_tracer", "_token")
+
+    def __init__(
+        self, name: str, attributes: Dict[str, Any], parent: Optional["Span"], owner: Optional["Tracer"] = None
+    ):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.children: List["Span"] = []
+        self.start = 0.0
+        self.end: Optional[float] = None
+        self.start_ns = 0
+        self._tracer = owner
+        self._token: Optional[contextvars.Token] = None
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, duration={self.duration:.6f})"
+
+    def __enter__(self) -> "Span":
+        if self.parent is not None:
+            self.parent.children.append(self)
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # ended in another context, e.g. a generator closed by the garbage collector
+            _current_span.set(self.parent)
+        if self.parent is None and self._tracer is not None:
+            self._tracer.export(self)
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes, e.g. ones that are only known at the end of the stage."""
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        """Seconds from start to end, or until now while the span is open."""
+        return ((self.end if self.end is not None else time.perf_counter()) - self.start) if self.start else 0.0
+
+    def walk(self):
+        """This span and all of its descendants, depth first."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """
+        Where the time went, per span name.
+
+        Returns:
+            Dict[str, Dict[str, float]]: for every span name in the tree, in order of first appearance,
+                the number of spans, their total milliseconds, and their self milliseconds (not spent
+                in child spans)
+        """
+        stages: Dict[str, Dict[str, float]] = {}
+        for current in self.walk():
+            stage = stages.setdefault(current.name, {"count": 0, "total_ms": 0.0, "self_ms": 0.0})
+            duration = current.duration
+            children = sum(child.duration for child in current.children)
+            stage["count"] += 1
+            stage["total_ms"] += duration * 1000
+            stage["self_ms"] += max(duration - children, 0.0) * 1000
+        return stages
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The span tree as JSON-serializable data."""
+        return {
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class NoopSpan:
+    """The span of disabled tracing: a reusable context manager that records nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set(self, **attributes: Any) -> None:
+        """Ignore the attributes."""
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Tracer:
+    """
+    Creates spans and exports the span tree of every turn.
+
+    Args:
+        enabled: Record spans; when False, span() returns NOOP_SPAN
+        exporters: Called with the root span of every finished turn
+    """
+
+    def __init__(self, enabled: bool = False, exporters: Optional[List[Exporter]] = None):
+        self.enabled = enabled
+        self.exporters: List[Exporter] = list(exporters or [])
+
+    def span(self, name: str, **attributes: Any):
+        """A span as a child of the current one, or the root of a new turn."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(name, attributes, _current_span.get(), self)
+
+    def export(self, root: Span) -> None:
+        """Hand a finished span tree to the exporters."""
+        for exporter in self.exporters:
+            try:
+                exporter(root)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Trace exporter %r failed: %s", exporter, e)
+
+
+def current_span() -> Optional[Span]:
+    """The innermost open span, if any."""
+    return _current_span.get()
+
+
+def log_breakdown(root: Span) -> None:
+    """Exporter: log where the time of a turn went."""
+    stages = root.breakdown()
+    parts = [
+        f"{name} {stage['total_ms']:.1f} ms" + (f" x{stage['count']}" if stage["count"] > 1 else "")
+        for name, stage in stages.items()
+        if name != root.name
+    ]
+    parts.append(f"other {stages[root.name]['self_ms']:.1f} ms")
+    logger.info("%s %.1f ms: %s", root.name, root.duration * 1000, ", ".join(parts))
+
+
+class FileExporter:
+    """Exporter: append every turn as one JSON line with its span tree and breakdown."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"FileExporter({self.path!r})"
+
+    def __call__(self, root: Span) -> None:
+        line = json.dumps({"trace": root.to_dict(), "breakdown": root.breakdown()}, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class OpenTelemetryExporter:
+    """
+    Exporter: replay every turn as OpenTelemetry spans, with their original timestamps.
+
+    Requires the optional opentelemetry-sdk and opentelemetry-exporter-otlp
+    packages. Spans are batched and sent to the collector configured by the
+    standard OTEL_EXPORTER_OTLP_* environment variables.
+    """
+
+    def __init__(self, service_name: str = "stackademy"):
+        # optional dependencies, see create_exporters()
+        # pylint: disable=import-outside-toplevel,import-error
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        self.provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        self.provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self.otel_tracer = self.provider.get_tracer(__name__)
+        self._set_span_in_context = trace.set_span_in_context
+
+    def __call__(self, root: Span) -> None:
+        self._emit(root, None)
+
+    def _emit(self, current: Span, context: Any) -> None:
+        attributes = {
+            key: value if isinstance(value, (str, bool, int, float)) else str(value)
+            for key, value in current.attributes.items()
+        }
+        otel_span = self.otel_tracer.start_span(
+            current.name, context=context, start_time=current.start_ns, attributes=attributes
+        )
+        child_context = self._set_span_in_context(otel_span)
+        for child in current.children:
+            self._emit(child, child_context)
+        otel_span.end(end_time=current.start_ns + int(current.duration * 1e9))
+
+    def shutdown(self) -> None:
+        """Send the remaining spans."""
+        self.provider.shutdown()
+
+
+def create_exporters(names: str, path: str = TRACING_FILE) -> List[Exporter]:
+    """
+    Build the exporters named in a comma-separated list.
+
+    Falls back to the log exporter if OpenTelemetry was requested but is not installed.
+    """
+    exporters: List[Exporter] = []
+    for name in (name.strip() for name in names.split(",")):
+        if name == "log":
+            exporters.append(log_breakdown)
+        elif name == "file":
+            exporters.append(FileExporter(path))
+        elif name == "otlp":
+            if importlib.util.find_spec("opentelemetry") is None:
+                logger.warning("TRACING_EXPORTERS includes otlp but opentelemetry is not installed. Logging traces.")
+                if log_breakdown not in exporters:
+                    exporters.append(log_breakdown)
+                continue
+            exporters.append(OpenTelemetryExporter())
+    return exporters
+
+
+tracer = Tracer(enabled=TRACING, exporters=create_exporters(TRACING_EXPORTERS) if TRACING else None)
+
+
+# a span of the shared tracer, see Tracer.span(); bound once to save a call per span
+span = tracer.span
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """
+    Decorator that runs a function in a span, named after the function by default.
+
+    Coroutine functions are not supported; use span() inside them.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def in_context(func: Callable) -> Callable:
+    """
+    Bind a function to a copy of the current context, so that spans it opens
+    in a worker thread are children of the current span.
+    """
+    if _current_span.get() is None:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
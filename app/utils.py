@@ -3,7 +3,13 @@
 Utility functions for Stackademy.
 """
 
+import importlib
+import importlib.util
 import json
+import sys
+import threading
+import types
+from typing import Any, Dict, List
 
 
 # ANSI color codes
@@ -12,6 +18,19 @@ colors = {
     "green": "\033[92m",  # Bright green
     "reset": "\033[0m",  # Reset to default color
 }
+# whether lazy_color_text() and lazy_json() color their output; see set_ansi_colors()
+_ansi_colors = True
+
+
+def set_ansi_colors(enabled: bool) -> None:
+    """
+    Turn the coloring of lazily formatted log messages on or off.
+
+    Logging turns it off when its output is not a terminal, so that no time
+    is spent adding escape codes that would only have to be removed again.
+    """
+    global _ansi_colors  # pylint: disable=global-statement
+    _ansi_colors = enabled
 
 
 def color_text(text, color="blue"):
@@ -62,3 +81,145 @@ def dump_json_colored(data, color="reset", indent=2, sort_keys=False):
         return colored_json
     except (TypeError, ValueError) as e:
         raise TypeError(f"Data is not JSON serializable: {e}") from e
+
+
+def to_jsonable(data):
+    """
+    Convert pydantic models, possibly nested in lists, into JSON-serializable data.
+
+    Args:
+        data: A pydantic model, a list of models and/or dicts, or plain data
+
+    Returns:
+        The data with every pydantic model replaced by its model_dump()
+    """
+    if hasattr(data, "model_dump"):
+        return data.model_dump()
+    if isinstance(data, (list, tuple)):
+        return [to_jsonable(item) for item in data]
+    return data
+
+
+class LazyStr:
+    """
+    Defer building a string until something actually needs it.
+
+    Pass instances as logging arguments so that expensive formatting, such as
+    serializing the whole conversation history, only happens when the log
+    record is emitted rather than on every call:
+
+        logger.debug("messages: %s", lazy_json(messages, "blue"))
+    """
+
+    __slots__ = ("func", "args", "kwargs")
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
+
+def _dump_jsonable_colored(data, color):
+    """Serialize data that may contain pydantic models as colored JSON, or plain JSON if colors are off."""
+    if not _ansi_colors:
+        return json.dumps(to_jsonable(data), indent=2, ensure_ascii=False)
+    return dump_json_colored(to_jsonable(data), color)
+
+
+def _color_text_if_enabled(text, color):
+    """Color a string, unless colors are off."""
+    return color_text(text, color) if _ansi_colors else text
+
+
+def lazy_json(data, color="blue") -> LazyStr:
+    """
+    Lazily dump data as colored JSON. Pydantic models are dumped with model_dump().
+
+    Args:
+        data: JSON-serializable data, a pydantic model, or a list of either
+        color: Color for the text output ("blue" or "green")
+
+    Returns:
+        LazyStr: Formats the data when converted to a string
+    """
+    return LazyStr(_dump_jsonable_colored, data, color)
+
+
+def lazy_color_text(text, color="blue") -> LazyStr:
+    """
+    Lazily color a string. Useful as a logging message with %-style arguments.
+
+    Args:
+        text (str): The string to color
+        color (str): Color to apply - either "blue" or "green" (default: "blue")
+
+    Returns:
+        LazyStr: Colors the text when converted to a string
+    """
+    return LazyStr(_color_text_if_enabled, text, color)
+
+
+class LazyModule(types.ModuleType):
+    """
+    A placeholder for a module that imports it on first attribute access.
+
+    Unlike importlib.util.LazyLoader, the placeholder is never put in
+    sys.modules, and the module is imported with a regular import under a
+    lock, so threads that use it at the same time all see it fully executed.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_lock = threading.Lock()
+        self._lazy_module = None
+
+    def _load(self) -> types.ModuleType:
+        """Import the module, once."""
+        module = self._lazy_module
+        if module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self.__name__)
+                module = self._lazy_module
+        return module
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._load(), attribute)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self.__name__!r}{'' if self._lazy_module is None else ' (imported)'}>"
+
+
+_lazy_modules: Dict[str, LazyModule] = {}
+_lazy_modules_lock = threading.Lock()
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Import a module on first attribute access instead of now.
+
+    Heavy dependencies such as openai (most of the cold start of the app) are
+    imported this way, so that processes that never call them do not pay for
+    them. Annotations that mention the module must be strings.
+
+    Args:
+        name (str): The module to import, e.g. "openai"
+
+    Returns:
+        types.ModuleType: The module, or a placeholder that imports it when used
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    with _lazy_modules_lock:
+        if name not in _lazy_modules:
+            spec = importlib.util.find_spec(name)
+            if spec is None or spec.loader is None:
+                raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+            _lazy_modules[name] = LazyModule(name)
+        return _lazy_modules[name]